@@ -0,0 +1,152 @@
+"""
+Load test: đo độ trễ mỗi request với các chế độ kết nối database khác nhau.
+
+Mỗi chế độ chạy trong một process riêng (DB_CONNECTION_MODE được đọc khi import settings),
+gửi request thẳng vào WSGIHandler từ nhiều luồng song song (giống một worker thật: cuối mỗi
+request Django đóng kết nối hoặc trả về pool) và ghi lại:
+  - độ trễ p50 / p95 / p99 của từng endpoint
+  - số kết nối PostgreSQL thực sự được mở (đếm pg_backend_pid khác nhau)
+
+Cần database PostGIS đang chạy với dữ liệu mẫu.
+
+    python benchmarks/db_connection_load.py --modes none,persistent,pool --requests 400 --concurrency 8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ENDPOINTS = [
+    '/api/flood-data/',
+    '/api/statistics/',
+    '/api/recent-reports/',
+    '/api/fixed-floodings/',
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_worker(total_requests, concurrency):
+    """Chạy trong process con: gửi request và trả về kết quả dạng JSON"""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hanoi_flood.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.signals import request_finished
+    from django.db import close_old_connections, connection
+    from django.test import RequestFactory
+
+    settings.ALLOWED_HOSTS = ['*']
+    backend_pids = set()
+    lock = threading.Lock()
+
+    def _record_backend(**kwargs):
+        # Chạy trước khi Django đóng/trả kết nối về pool ở cuối request
+        if connection.connection is not None:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_backend_pid()')
+                pid = cursor.fetchone()[0]
+            with lock:
+                backend_pids.add(pid)
+
+    # Ghi nhận backend trước khi close_old_connections đóng kết nối
+    request_finished.disconnect(close_old_connections)
+    request_finished.connect(_record_backend)
+    request_finished.connect(close_old_connections)
+
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+
+    def _call(i):
+        endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+        environ = factory.get(endpoint).environ
+        status = []
+        started = time.perf_counter()
+        response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        for _ in response:
+            pass
+        response.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies[endpoint].append(elapsed)
+        return int(status[0].split()[0])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(_call, range(total_requests)))
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = {
+        'mode': getattr(settings, 'DB_CONNECTION_MODE', 'none'),
+        'requests': total_requests,
+        'errors': sum(1 for status in statuses if status >= 500),
+        'connections_opened': len(backend_pids),
+        'p50_ms': round(statistics.median(all_latencies), 2),
+        'p95_ms': round(_percentile(all_latencies, 95), 2),
+        'p99_ms': round(_percentile(all_latencies, 99), 2),
+        'endpoints': {
+            endpoint: {
+                'p50_ms': round(statistics.median(values), 2),
+                'p95_ms': round(_percentile(values, 95), 2),
+            }
+            for endpoint, values in latencies.items() if values
+        },
+    }
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='none,persistent,pool')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--output', default=None, help='Ghi kết quả ra file JSON')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.requests, args.concurrency)
+        return
+
+    results = []
+    for mode in args.modes.split(','):
+        env = dict(os.environ, DB_CONNECTION_MODE=mode)
+        # Pool phải đủ lớn cho số luồng, nếu không request sẽ phải chờ kết nối
+        env.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+        process = subprocess.run(
+            [sys.executable, __file__, '--worker',
+             '--requests', str(args.requests), '--concurrency', str(args.concurrency)],
+            env=env, capture_output=True, text=True, cwd=BASE_DIR,
+        )
+        if process.returncode != 0:
+            print(f"❌ Chế độ {mode} lỗi:\n{process.stderr}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{mode:<12} p50={result['p50_ms']:>8} ms  p95={result['p95_ms']:>8} ms  "
+              f"p99={result['p99_ms']:>8} ms  kết nối mở={result['connections_opened']:>4}  "
+              f"lỗi={result['errors']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Thay các API bên ngoài (Nominatim, OpenWeatherMap) bằng phản hồi cục bộ khi chạy benchmark.
+
+Patch ở tầng transport (requests HTTPAdapter / httpx transport) nên code của service, cùng bộ đếm
+HTTP của hanoi_map.metrics, vẫn chạy y như khi gọi API thật:
+
+    with stub_upstream(rain_mm=45, latency_ms=80):
+        FloodCheckService.check_flood_at_location(21.03, 105.85)
+"""
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from unittest import mock
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def _weather_item(rain_mm, rain_key):
+    return {
+        'main': {'temp': 29.5, 'feels_like': 34.0, 'humidity': 88, 'pressure': 1004},
+        'rain': {rain_key: rain_mm},
+        'weather': [{'description': 'mưa vừa', 'icon': '10d'}],
+        'wind': {'speed': 3.2},
+        'clouds': {'all': 90},
+    }
+
+
+def stub_payload(url, rain_mm=0.0):
+    """(status, dữ liệu JSON) cho một URL của API bên ngoài"""
+    parts = urlsplit(str(url))
+    if parts.netloc == 'nominatim.openstreetmap.org':
+        address = {'road': 'Phố Huế', 'suburb': 'Phường Hàng Bài', 'city_district': 'Hoàn Kiếm', 'city': 'Hà Nội'}
+        place = {'display_name': 'Phố Huế, Hoàn Kiếm, Hà Nội', 'lat': '21.0175', 'lon': '105.8513',
+                 'address': address}
+        if parts.path.startswith('/search'):
+            return 200, [place]
+        if parts.path.startswith('/reverse'):
+            return 200, place
+    if parts.netloc == 'api.openweathermap.org':
+        if parts.path.endswith('/weather'):
+            return 200, _weather_item(rain_mm, '1h')
+        if parts.path.endswith('/forecast'):
+            items = [dict(_weather_item(rain_mm * 3, '3h'), dt_txt=f"2025-07-01 {hour:02d}:00:00")
+                     for hour in range(0, 24, 3)]
+            return 200, {'city': {'name': 'Hà Nội'}, 'list': items}
+    return 404, {'error': 'không có stub cho URL này'}
+
+
+@contextmanager
+def stub_upstream(rain_mm=0.0, latency_ms=0.0):
+    """
+    Trong khối with, mọi request ra ngoài qua requests / httpx nhận phản hồi stub sau latency_ms.
+    rain_mm có thể là hàm không tham số (lượng mưa thay đổi theo thời gian, ví dụ kịch bản bão).
+    """
+    delay = latency_ms / 1000
+
+    def current_rain():
+        return rain_mm() if callable(rain_mm) else rain_mm
+
+    def requests_send(adapter, request, **kwargs):
+        if delay:
+            time.sleep(delay)
+        status, payload = stub_payload(request.url, current_rain())
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json'
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def httpx_send(transport, request):
+        if delay:
+            time.sleep(delay)
+        status, payload = stub_payload(request.url, current_rain())
+        return httpx.Response(status, json=payload, request=request)
+
+    async def httpx_async_send(transport, request):
+        if delay:
+            await asyncio.sleep(delay)
+        status, payload = stub_payload(request.url, current_rain())
+        return httpx.Response(status, json=payload, request=request)
+
+    with mock.patch.object(HTTPAdapter, 'send', requests_send), \
+            mock.patch.object(httpx.HTTPTransport, 'handle_request', httpx_send), \
+            mock.patch.object(httpx.AsyncHTTPTransport, 'handle_async_request', httpx_async_send):
+        yield
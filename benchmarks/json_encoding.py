@@ -0,0 +1,106 @@
+"""
+Micro-benchmark tuần tự hóa payload của get_all_flood_data:
+
+  legacy : geometry json.loads(geojson) + JsonResponse (json chuẩn + DjangoJSONEncoder)
+  fast   : geometry RawJSON + FastJsonResponse (orjson, ghi thẳng fragment)
+
+Mặc định dùng dữ liệu tổng hợp (seed cố định); --source db đọc dữ liệu thật qua get_all_flood_data.
+
+    python benchmarks/json_encoding.py --zones 2000 --reports 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / 'benchmarks'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hanoi_flood.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.http import JsonResponse  # noqa: E402
+
+from hanoi_map import responses  # noqa: E402
+from hanoi_map.responses import FastJsonResponse, RawJSON  # noqa: E402
+from hanoi_map.services import FloodDataService  # noqa: E402
+
+
+def load_payload(args):
+    if args.source == 'db':
+        return FloodDataService.get_all_flood_data()
+    from wire_format import build_dataset, report_row, zone_row
+    zones, reports = build_dataset(args.zones, args.reports, args.seed)
+    data = {
+        'flood_zones': [FloodDataService.zone_feature(zone_row(zone)) for zone in zones],
+        'flood_reports': [FloodDataService.report_feature(report_row(report)) for report in reports],
+        'stats': {'total_zones': len(zones), 'total_reports': len(reports)},
+        'success': True,
+    }
+    return data
+
+
+def legacy_payload(data):
+    """Payload như trước khi có RawJSON: geometry đã được json.loads thành dict"""
+    def parsed(features):
+        return [
+            dict(feature, geometry=json.loads(feature['geometry'].value))
+            if isinstance(feature['geometry'], RawJSON) else feature
+            for feature in features
+        ]
+    return dict(data, flood_zones=parsed(data['flood_zones']), flood_reports=parsed(data['flood_reports']))
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', choices=['synthetic', 'db'], default='synthetic')
+    parser.add_argument('--zones', type=int, default=2000)
+    parser.add_argument('--reports', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='Ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    data = load_payload(args)
+
+    # Bước json.loads(geojson) thuộc về đường cũ nên được tính vào thời gian legacy
+    legacy_ms, legacy = timed(lambda: JsonResponse({'success': True, 'data': legacy_payload(data)}), args.repeat)
+    fast_ms, fast = timed(lambda: FastJsonResponse({'success': True, 'data': data}), args.repeat)
+
+    assert json.loads(legacy.content) == json.loads(fast.content), 'Hai cách tuần tự hóa cho kết quả khác nhau'
+
+    results = {
+        'encoder': 'orjson' if responses.orjson else 'json',
+        'fragments': responses.HAS_FRAGMENT,
+        'features': len(data['flood_zones']) + len(data['flood_reports']),
+        'legacy_ms': round(legacy_ms, 1),
+        'fast_ms': round(fast_ms, 1),
+        'speedup': round(legacy_ms / fast_ms, 1),
+        'bytes': len(fast.content),
+    }
+    print(f"{results['features']} features, {results['bytes'] / 1024:.0f} KB")
+    print(f"legacy (json + DjangoJSONEncoder): {results['legacy_ms']:>8} ms")
+    print(f"fast   ({results['encoder']}, fragments={results['fragments']}): {results['fast_ms']:>8} ms  "
+          f"(x{results['speedup']})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
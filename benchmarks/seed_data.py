@@ -0,0 +1,144 @@
+"""
+Sinh dữ liệu tổng hợp (seed cố định) cho các benchmark cần database: điểm ngập, báo cáo và điểm ngập
+cố định rải trong nội thành Hà Nội, ghi bằng bulk_create (không chạy signal).
+
+Chỉ dùng trên database benchmark / test: seed_database() xóa sạch các bảng hanoi_map trước khi ghi.
+
+    from seed_data import SCALES, seed_database
+    counts = seed_database('medium', seed=42)
+"""
+import random
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.gis.geos import Point
+from django.db import connection, transaction
+from django.utils import timezone
+
+from hanoi_map.models import FixedFlooding, FloodReport, FloodZone
+
+SRID = 4326
+# Khung nội thành Hà Nội (lat, lng)
+LAT_RANGE = (21.0, 21.1)
+LNG_RANGE = (105.78, 105.88)
+
+DISTRICTS = ['Ba Đình', 'Hoàn Kiếm', 'Đống Đa', 'Hai Bà Trưng', 'Cầu Giấy', 'Thanh Xuân',
+             'Hoàng Mai', 'Long Biên', 'Tây Hồ', 'Nam Từ Liêm', 'Bắc Từ Liêm', 'Hà Đông']
+
+# Quy mô dữ liệu: số báo cáo / điểm ngập / điểm ngập cố định
+SCALES = {
+    'small': {'reports': 1000, 'zones': 500, 'fixed_floodings': 1000},
+    'medium': {'reports': 10000, 'zones': 5000, 'fixed_floodings': 1000},
+    'large': {'reports': 100000, 'zones': 5000, 'fixed_floodings': 1000},
+}
+
+# Tỷ lệ báo cáo nằm sát một điểm ngập (phần còn lại rải đều)
+REPORTS_NEAR_ZONE = 0.4
+BULK_BATCH_SIZE = 2000
+
+
+def random_point(rng):
+    return Point(rng.uniform(*LNG_RANGE), rng.uniform(*LAT_RANGE), srid=SRID)
+
+
+def query_points(count, seed):
+    """Các tọa độ (lat, lng) dùng làm tham số truy vấn, cố định theo seed"""
+    rng = random.Random(f"points-{seed}")
+    return [(round(rng.uniform(*LAT_RANGE), 6), round(rng.uniform(*LNG_RANGE), 6)) for _ in range(count)]
+
+
+def _severity(depth):
+    return 'light' if depth < 20 else 'medium' if depth < 40 else 'heavy' if depth < 70 else 'severe'
+
+
+def build_zones(rng, count, now):
+    zones = []
+    for i in range(count):
+        center = random_point(rng)
+        zone = FloodZone(
+            name=f"Điểm ngập {i + 1}", zone_type=rng.choice(['black', 'frequent', 'seasonal', 'rain', 'tide']),
+            geometry=center.buffer(rng.uniform(0.0001, 0.0004)).envelope, district=rng.choice(DISTRICTS),
+            ward=f"Phường {rng.randint(1, 20)}", street=f"Phố {rng.randint(1, 200)}",
+            max_depth_cm=round(rng.uniform(10, 90), 1), avg_duration_hours=round(rng.uniform(1, 6), 1),
+            report_count=rng.randint(0, 40), last_reported_at=now - timedelta(minutes=rng.randint(0, 72 * 60)),
+            description='Ngập do hệ thống thoát nước quá tải ' * rng.randint(0, 4), is_active=rng.random() < 0.8,
+            flood_cause='Hệ thống thoát nước quá tải',
+            external_id=f"bench-{i + 1}" if rng.random() < 0.5 else None,
+        )
+        # bulk_create không gọi save() nên tự tạo các mức hình học
+        zone.build_geometry_levels()
+        zones.append(zone)
+    return zones
+
+
+def build_reports(rng, count, zones, now):
+    reports = []
+    for i in range(count):
+        zone = rng.choice(zones) if zones and rng.random() < REPORTS_NEAR_ZONE else None
+        if zone is not None:
+            center = zone.geometry.centroid
+            location = Point(center.x + rng.uniform(-0.0008, 0.0008), center.y + rng.uniform(-0.0008, 0.0008),
+                             srid=SRID)
+        else:
+            location = random_point(rng)
+        depth = round(rng.uniform(5, 100), 1)
+        reports.append(FloodReport(
+            location=location, address=f"Số {rng.randint(1, 500)} phố {rng.randint(1, 200)}",
+            district=rng.choice(DISTRICTS), ward=f"Phường {rng.randint(1, 20)}",
+            water_depth=depth, severity=_severity(depth),
+            description='Nước ngập qua bánh xe máy' if rng.random() < 0.5 else '',
+            reporter_name=rng.choice(['', 'Nguyễn Văn A', 'Trần Thị B']),
+            status='verified' if rng.random() < 0.85 else 'pending',
+            created_at=now - timedelta(minutes=rng.randint(0, 72 * 60)),
+            estimated_duration_hours=round(rng.uniform(1, 6), 1),
+            is_active=rng.random() < 0.7, flood_zone=zone,
+        ))
+    return reports
+
+
+def build_fixed_floodings(rng, count):
+    floodings = []
+    for i in range(count):
+        depth = round(rng.uniform(10, 80), 1)
+        flooding = FixedFlooding(
+            name=f"Điểm ngập cố định {i + 1}", flood_type=rng.choice(['rain', 'drainage', 'sewer', 'urban']),
+            location=random_point(rng), address=f"Số {rng.randint(1, 500)} phố {rng.randint(1, 200)}",
+            district=rng.choice(DISTRICTS), ward=f"Phường {rng.randint(1, 20)}",
+            radius_meters=rng.randint(30, 150), rainfall_threshold_mm=round(rng.uniform(20, 80), 1),
+            predicted_depth_cm=depth, severity=FixedFlooding.severity_for_depth(depth),
+            duration_hours=round(rng.uniform(1, 4), 1),
+            is_monitored=rng.random() < 0.9, is_active=rng.random() < 0.1,
+        )
+        flooding.build_flood_area()
+        floodings.append(flooding)
+    return floodings
+
+
+def reset_tables():
+    """Xóa toàn bộ bảng của hanoi_map và đặt lại id (id giống nhau giữa các lần chạy)"""
+    tables = [model._meta.db_table for model in apps.get_app_config('hanoi_map').get_models()]
+    with connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(connection.ops.quote_name(t) for t in tables)} RESTART IDENTITY CASCADE")
+
+
+def seed_database(scale, seed=42):
+    """Xóa dữ liệu cũ rồi ghi dữ liệu của quy mô scale; trả về số dòng đã ghi"""
+    sizes = SCALES[scale]
+    rng = random.Random(f"{scale}-{seed}")
+    now = timezone.now()
+
+    with transaction.atomic():
+        reset_tables()
+        zones = FloodZone.objects.bulk_create(build_zones(rng, sizes['zones'], now), batch_size=BULK_BATCH_SIZE)
+        FloodReport.objects.bulk_create(
+            build_reports(rng, sizes['reports'], zones, now), batch_size=BULK_BATCH_SIZE
+        )
+        FixedFlooding.objects.bulk_create(
+            build_fixed_floodings(rng, sizes['fixed_floodings']), batch_size=BULK_BATCH_SIZE
+        )
+
+    # Cập nhật thống kê để planner chọn kế hoạch như trên dữ liệu thật
+    with connection.cursor() as cursor:
+        for model in (FloodZone, FloodReport, FixedFlooding):
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+    return dict(sizes)
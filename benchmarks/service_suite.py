@@ -0,0 +1,246 @@
+"""
+Benchmark tầng service / API của hanoi_map trên dữ liệu tổng hợp ở nhiều quy mô.
+
+Với mỗi quy mô (xem seed_data.SCALES) script sinh lại dữ liệu với seed cố định, thay API bên ngoài
+bằng stub cục bộ (http_stubs) rồi đo từng service / endpoint: min / trung vị / p95 thời gian
+và số câu SQL, số lần gọi HTTP mỗi lần chạy. Mỗi lần chạy nằm trong một transaction được rollback
+nên các service có ghi dữ liệu (kích hoạt điểm ngập, lưu dự đoán) không làm lệch lần chạy sau.
+
+Cần PostgreSQL + PostGIS đang chạy. Script chạy trên database test riêng (test_<DB_NAME>,
+tạo bằng migrate), không đụng tới dữ liệu thật.
+
+    python benchmarks/service_suite.py --scales small,medium --repeat 30 --output bench.json
+    python benchmarks/service_suite.py --scales small --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hanoi_flood.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.gis.geos import Point  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from hanoi_map.alert_index import alert_index  # noqa: E402
+from hanoi_map.clusters import cluster_index  # noqa: E402
+from hanoi_map.encodings import COLUMNAR_MEDIA_TYPE  # noqa: E402
+from hanoi_map.metrics import track_queries  # noqa: E402
+from hanoi_map.models import FloodReport  # noqa: E402
+from hanoi_map.services import (  # noqa: E402
+    DrainageTimeService, FixedFloodingService, FloodCheckService, FloodDataService,
+)
+from http_stubs import stub_upstream  # noqa: E402
+from seed_data import SCALES, query_points, seed_database  # noqa: E402
+
+# Lượng mưa stub trả về (mm/h): đủ lớn để vượt ngưỡng của một phần điểm ngập cố định
+STUB_RAIN_MM = 45.0
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def service_cases(reports):
+    """(tên, hàm(lat, lng, i)) gọi thẳng service"""
+    return [
+        ('FloodCheckService.check_flood_at_location',
+         lambda lat, lng, i: FloodCheckService.check_flood_at_location(lat, lng, 1000)),
+        ('FloodCheckService.get_area_flood_status',
+         lambda lat, lng, i: FloodCheckService.get_area_flood_status(lat, lng, 2000)),
+        ('FloodDataService.get_all_flood_data',
+         lambda lat, lng, i: FloodDataService.get_all_flood_data()),
+        ('FloodDataService.get_all_flood_data[10km,z12]',
+         lambda lat, lng, i: FloodDataService.get_all_flood_data(
+             Point(lng, lat, srid=4326), 10, 12)),
+        ('FixedFloodingService.check_and_activate_by_rainfall',
+         lambda lat, lng, i: FixedFloodingService.check_and_activate_by_rainfall(lat, lng, STUB_RAIN_MM)),
+        ('DrainageTimeService.predict_drainage_time',
+         lambda lat, lng, i: DrainageTimeService.predict_drainage_time(reports[i % len(reports)])),
+    ]
+
+
+def view_cases():
+    """(tên, hàm(lat, lng, i)) gửi request qua toàn bộ middleware bằng test Client"""
+    client = Client()
+
+    def get(path, **headers):
+        def call(lat, lng, i):
+            response = client.get(path.format(lat=lat, lng=lng), **headers)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{path} trả về {response.status_code}")
+            return response
+        return call
+
+    return [
+        ('GET /api/flood-data/', get('/api/flood-data/')),
+        ('GET /api/flood-data/ (columnar)', get('/api/flood-data/', HTTP_ACCEPT=COLUMNAR_MEDIA_TYPE)),
+        ('GET /api/flood-data/?lat&lng&zoom', get('/api/flood-data/?lat={lat}&lng={lng}&radius=3&zoom=14')),
+        ('GET /api/check-flood/', get('/api/check-flood/?lat={lat}&lng={lng}')),
+        ('GET /api/area-status/', get('/api/area-status/?lat={lat}&lng={lng}')),
+        ('GET /api/weather/', get('/api/weather/?lat={lat}&lng={lng}')),
+        ('GET /api/fixed-floodings/', get('/api/fixed-floodings/?lat={lat}&lng={lng}')),
+        ('GET /api/recent-reports/', get('/api/recent-reports/')),
+        ('GET /api/statistics/', get('/api/statistics/')),
+        ('GET /api/clusters/', get('/api/clusters/?zoom=12')),
+        ('GET /api/drainage-predictions/', get('/api/drainage-predictions/')),
+        ('GET /api/all-zones-status/', get('/api/all-zones-status/')),
+    ]
+
+
+def measure(func, points, repeat, warmup):
+    """Chạy func repeat lần (bỏ warmup lần đầu), mỗi lần trong một transaction được rollback"""
+    durations, queries, http_calls = [], [], []
+    for i in range(warmup + repeat):
+        lat, lng = points[i % len(points)]
+        with transaction.atomic():
+            with track_queries() as metrics:
+                started = time.perf_counter()
+                func(lat, lng, i)
+                elapsed = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        if i >= warmup:
+            durations.append(elapsed)
+            queries.append(metrics.sql_count)
+            http_calls.append(metrics.http_count)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(durations), 3),
+        'median_ms': round(statistics.median(durations), 3),
+        'p95_ms': round(_percentile(durations, 95), 3),
+        'mean_ms': round(statistics.fmean(durations), 3),
+        'queries': round(statistics.median(queries), 1),
+        'http_calls': round(statistics.median(http_calls), 1),
+    }
+
+
+def run_scale(scale, args):
+    started = time.perf_counter()
+    counts = seed_database(scale, seed=args.seed)
+    print(f"🌱 {scale}: {counts} ({time.perf_counter() - started:.1f}s)")
+    # Chỉ mục trong bộ nhớ của process còn giữ dữ liệu của mức trước (seed xóa rồi ghi lại bảng):
+    # dựng lại để các endpoint đọc chỉ mục (như /api/clusters/) đo trên đúng dữ liệu vừa seed
+    started = time.perf_counter()
+    cluster_index.rebuild()
+    alert_index.rebuild()
+    print(f"🗂️  {scale}: dựng lại chỉ mục cụm và cảnh báo ({time.perf_counter() - started:.1f}s)")
+
+    points = query_points(50, args.seed)
+    reports = list(FloodReport.objects.filter(status='verified').order_by('id')[:50])
+    cases = service_cases(reports) + view_cases()
+    if args.only:
+        cases = [(name, func) for name, func in cases if any(part in name for part in args.only)]
+
+    results = {}
+    with stub_upstream(rain_mm=STUB_RAIN_MM, latency_ms=args.http_latency_ms):
+        for name, func in cases:
+            results[name] = measure(func, points, args.repeat, args.warmup)
+            stats = results[name]
+            print(f"  {name:<55} median={stats['median_ms']:>9.2f} ms  p95={stats['p95_ms']:>9.2f} ms  "
+                  f"sql={stats['queries']:>6}  http={stats['http_calls']}")
+    return {'counts': counts, 'cases': results}
+
+
+def environment_info(args):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT version(), postgis_lib_version()')
+        postgres, postgis = cursor.fetchone()
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'postgres': postgres,
+        'postgis': postgis,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'warmup': args.warmup,
+        'http_latency_ms': args.http_latency_ms,
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """In thay đổi trung vị so với file kết quả trước; trả về số trường hợp chậm đi quá threshold %"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['scales']
+
+    regressions = 0
+    print(f"\n📊 So với {baseline_path} (ngưỡng {threshold:.0f}%)")
+    for scale, scale_result in results.items():
+        for name, stats in scale_result['cases'].items():
+            before = baseline.get(scale, {}).get('cases', {}).get(name)
+            if not before:
+                print(f"  {scale:<7} {name:<55} (mới)")
+                continue
+            change = (stats['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+            marker = ''
+            if change > threshold:
+                marker = ' ⚠️'
+                regressions += 1
+            print(f"  {scale:<7} {name:<55} {before['median_ms']:>9.2f} -> {stats['median_ms']:>9.2f} ms "
+                  f"({change:+6.1f}%)  sql {before['queries']} -> {stats['queries']}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='small', help=f"Các quy mô, cách nhau dấu phẩy: {', '.join(SCALES)}")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--http-latency-ms', type=float, default=0.0,
+                        help='Độ trễ giả lập của API bên ngoài (mặc định 0: chỉ đo code của mình)')
+    parser.add_argument('--only', nargs='*', help='Chỉ chạy các trường hợp có tên chứa chuỗi này')
+    parser.add_argument('--keepdb', action='store_true', help='Giữ database test giữa các lần chạy')
+    parser.add_argument('--output', default=None, help='Ghi kết quả ra file JSON')
+    parser.add_argument('--compare', default=None, help='File JSON kết quả trước để so sánh')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Chậm đi quá N%% so với --compare thì thoát với mã lỗi 1')
+    args = parser.parse_args()
+
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    unknown = set(scales) - set(SCALES)
+    if unknown:
+        parser.error(f"Không có quy mô: {', '.join(sorted(unknown))}")
+
+    settings.ALLOWED_HOSTS = ['*']
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb,
+                                                  serialize=False)
+    try:
+        report = {'environment': environment_info(args), 'scales': {}}
+        for scale in scales:
+            report['scales'][scale] = run_scale(scale, args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi {args.output}")
+
+    if args.compare and compare(report['scales'], args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
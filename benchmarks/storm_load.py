@@ -0,0 +1,346 @@
+"""
+Kịch bản tải "cơn bão": lượng mưa tăng dần tới đỉnh rồi giảm, kích hoạt hàng trăm FixedFlooding,
+trong khi hàng nghìn người dùng tăng dần cùng mở bản đồ, bấm kiểm tra ngập và gửi báo cáo.
+
+Hai bước, chạy trong hai terminal:
+
+1. Server có API thời tiết / địa chỉ là stub cục bộ. Lượng mưa stub đọc từ --rain-file do bước 2 ghi.
+   --seed sinh lại dữ liệu tổng hợp (XÓA các bảng hanoi_map, chỉ dùng trên database thử tải):
+
+    python benchmarks/storm_load.py serve --server uvicorn --port 8001 --seed medium
+
+2. Bộ tạo tải: tăng dần số người dùng ảo, mỗi giây ghi lượng mưa theo đường cong bão
+   và lấy mẫu số kết nối PostgreSQL / số FixedFlooding đang kích hoạt:
+
+    python benchmarks/storm_load.py run --base-url http://127.0.0.1:8001 --users 2000 --duration 600 \\
+        --output storm.json
+
+Kết quả: throughput, p50 / p95 / p99 và tỷ lệ lỗi theo endpoint, chuỗi thời gian theo từng giây.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hanoi_flood.settings')
+
+import django  # noqa: E402
+django.setup()
+
+import httpx  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from seed_data import LAT_RANGE, LNG_RANGE, SCALES  # noqa: E402
+
+DEFAULT_RAIN_FILE = os.path.join(tempfile.gettempdir(), 'hanoi_flood_storm_rain.json')
+
+# Hành động của người dùng ảo và trọng số mặc định
+ACTIONS = {
+    'map': 50,        # tải bản đồ lần đầu, sau đó đồng bộ tăng dần qua /changes/
+    'check': 25,      # bấm vào bản đồ để kiểm tra ngập
+    'weather': 15,    # xem thời tiết (kích hoạt FixedFlooding theo lượng mưa)
+    'report': 5,      # gửi báo cáo ngập
+    'area': 5,        # trạng thái khu vực
+}
+
+
+def storm_rain(elapsed, duration, peak_mm):
+    """Đường cong mưa: 0 -> peak_mm ở 40% thời gian -> giảm dần về 0"""
+    if elapsed <= 0 or elapsed >= duration:
+        return 0.0
+    peak_at = 0.4 * duration
+    if elapsed <= peak_at:
+        phase = elapsed / peak_at
+    else:
+        phase = 1 - (elapsed - peak_at) / (duration - peak_at)
+    return round(peak_mm * math.sin(phase * math.pi / 2) ** 2, 2)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ============ SERVER ============
+
+class RainFile:
+    """Đọc lượng mưa hiện tại từ file JSON, chỉ đọc lại khi file đổi"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.value = 0.0
+
+    def __call__(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self.mtime:
+                with open(self.path, encoding='utf-8') as f:
+                    self.value = float(json.load(f)['rain_mm'])
+                self.mtime = mtime
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.value
+
+
+def serve(args):
+    from django.conf import settings
+    from http_stubs import stub_upstream
+    from seed_data import seed_database
+
+    settings.ALLOWED_HOSTS = ['*']
+    if args.seed:
+        counts = seed_database(args.seed)
+        print(f"🌱 Đã sinh dữ liệu {args.seed}: {counts}")
+        connection.close()
+
+    with stub_upstream(rain_mm=RainFile(args.rain_file), latency_ms=args.http_latency_ms):
+        print(f"🌧️ API bên ngoài là stub, lượng mưa đọc từ {args.rain_file}")
+        if args.server == 'uvicorn':
+            import uvicorn
+            uvicorn.run('hanoi_flood.asgi:application', host=args.host, port=args.port,
+                        workers=1, log_level='warning')
+        else:
+            from django.core.management import call_command
+            call_command('runserver', f"{args.host}:{args.port}", use_reloader=False)
+
+
+# ============ BỘ TẠO TẢI ============
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.completed_per_second = Counter()
+
+    def record(self, endpoint, started, elapsed_ms, status):
+        self.latencies[endpoint].append(elapsed_ms)
+        self.statuses[endpoint][status] += 1
+        if status == 'error' or status >= 500:
+            self.errors[endpoint] += 1
+        self.completed_per_second[int(started + elapsed_ms / 1000)] += 1
+
+
+class VirtualUser:
+    """Một người dùng: vị trí ngẫu nhiên cố định theo seed, chọn hành động theo trọng số, nghỉ giữa các lần"""
+
+    def __init__(self, user_id, client, stats, args):
+        self.rng = random.Random(f"user-{args.seed}-{user_id}")
+        self.lat = self.rng.uniform(*LAT_RANGE)
+        self.lng = self.rng.uniform(*LNG_RANGE)
+        self.client = client
+        self.stats = stats
+        self.think_s = args.think
+        self.cursor = None
+        self.actions = list(ACTIONS)
+        self.weights = [ACTIONS[action] for action in self.actions]
+
+    def nearby(self, spread=0.01):
+        return (round(self.lat + self.rng.uniform(-spread, spread), 6),
+                round(self.lng + self.rng.uniform(-spread, spread), 6))
+
+    async def request(self, endpoint, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 'error'
+        self.stats.record(endpoint, started, (time.perf_counter() - started) * 1000, status)
+        return response
+
+    async def act(self, action):
+        lat, lng = self.nearby()
+        if action == 'map':
+            if self.cursor is None:
+                response = await self.request('flood-data', 'GET', '/api/flood-data/',
+                                              params={'lat': self.lat, 'lng': self.lng, 'radius': 5, 'zoom': 14})
+            else:
+                response = await self.request('flood-data/changes', 'GET', '/api/flood-data/changes/',
+                                              params={'since': self.cursor, 'zoom': 14})
+            if response is not None and response.status_code == 200:
+                self.cursor = response.json().get('cursor', self.cursor)
+        elif action == 'check':
+            await self.request('check-flood', 'GET', '/api/check-flood/', params={'lat': lat, 'lng': lng})
+        elif action == 'weather':
+            await self.request('weather', 'GET', '/api/weather/', params={'lat': self.lat, 'lng': self.lng})
+        elif action == 'area':
+            await self.request('area-status', 'GET', '/api/area-status/', params={'lat': lat, 'lng': lng})
+        elif action == 'report':
+            await self.request('report-flood', 'POST', '/api/report-flood/', json={
+                'lat': lat, 'lng': lng, 'water_depth': round(self.rng.uniform(5, 80), 1),
+                'description': 'Báo cáo từ kịch bản tải', 'reporter_name': 'storm-load',
+            })
+
+    async def run(self, stop_at):
+        # Mở bản đồ trước, sau đó hành động ngẫu nhiên
+        await self.act('map')
+        while time.perf_counter() < stop_at:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_s))
+            if time.perf_counter() >= stop_at:
+                break
+            await self.act(self.rng.choices(self.actions, self.weights)[0])
+
+
+def sample_database():
+    """Số kết nối tới database (theo trạng thái) và số FixedFlooding đang kích hoạt"""
+    from hanoi_map.models import FixedFlooding
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT state, count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND pid <> pg_backend_pid() GROUP BY state"
+        )
+        states = {state or 'unknown': count for state, count in cursor.fetchall()}
+    return {
+        'db_connections': sum(states.values()),
+        'db_connections_active': states.get('active', 0),
+        'active_fixed_floodings': FixedFlooding.objects.filter(is_active=True).count(),
+    }
+
+
+def write_rain(path, rain_mm):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'rain_mm': rain_mm}, f)
+    os.replace(tmp_path, path)
+
+
+async def run_load(args):
+    stats = LoadStats()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    timeline = []
+    started = time.perf_counter()
+    stop_at = started + args.duration
+    tasks = []
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        users_started = 0
+        while time.perf_counter() < stop_at:
+            tick = time.perf_counter()
+            elapsed = tick - started
+
+            # Tăng dần số người dùng trong --ramp giây đầu
+            target_users = args.users if elapsed >= args.ramp else int(args.users * elapsed / args.ramp)
+            while users_started < target_users:
+                user = VirtualUser(users_started, client, stats, args)
+                tasks.append(asyncio.create_task(user.run(stop_at)))
+                users_started += 1
+
+            rain_mm = storm_rain(elapsed, args.duration, args.peak_rain)
+            write_rain(args.rain_file, rain_mm)
+
+            point = {'t': round(elapsed, 1), 'rain_mm': rain_mm, 'users': users_started,
+                     'rps': stats.completed_per_second.get(int(tick) - 1, 0)}
+            if not args.no_db_stats:
+                try:
+                    point.update(await asyncio.to_thread(sample_database))
+                except Exception as e:
+                    point['db_error'] = str(e)
+            timeline.append(point)
+            if len(timeline) % 10 == 0:
+                print(f"⏱️ t={point['t']:>6}s  mưa={rain_mm:>6} mm/h  users={users_started:>5}  "
+                      f"rps={point['rps']:>5}  kết nối DB={point.get('db_connections', '-'):>4}  "
+                      f"FixedFlooding kích hoạt={point.get('active_fixed_floodings', '-')}")
+
+            await asyncio.sleep(max(0.0, 1.0 - (time.perf_counter() - tick)))
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+    write_rain(args.rain_file, 0.0)
+
+    total_elapsed = time.perf_counter() - started
+    return summarize(stats, timeline, total_elapsed)
+
+
+def summarize(stats, timeline, total_elapsed):
+    endpoints = {}
+    for endpoint, values in sorted(stats.latencies.items()):
+        count = len(values)
+        endpoints[endpoint] = {
+            'requests': count,
+            'throughput_rps': round(count / total_elapsed, 2),
+            'p50_ms': round(statistics.median(values), 2),
+            'p95_ms': round(_percentile(values, 95), 2),
+            'p99_ms': round(_percentile(values, 99), 2),
+            'error_rate': round(stats.errors[endpoint] / count, 4),
+            'statuses': {str(status): n for status, n in stats.statuses[endpoint].items()},
+        }
+    total = sum(len(values) for values in stats.latencies.values())
+    return {
+        'duration_s': round(total_elapsed, 1),
+        'requests': total,
+        'throughput_rps': round(total / total_elapsed, 2) if total_elapsed else 0,
+        'error_rate': round(sum(stats.errors.values()) / total, 4) if total else 0,
+        'peak_db_connections': max((point.get('db_connections', 0) for point in timeline), default=0),
+        'peak_active_fixed_floodings': max((point.get('active_fixed_floodings', 0) for point in timeline), default=0),
+        'endpoints': endpoints,
+        'timeline': timeline,
+    }
+
+
+def run(args):
+    result = asyncio.run(run_load(args))
+    result['config'] = {key: value for key, value in vars(args).items() if key != 'func'}
+
+    print(f"\n📊 {result['requests']} request trong {result['duration_s']}s: {result['throughput_rps']} req/s, "
+          f"lỗi {result['error_rate'] * 100:.2f}%, kết nối DB tối đa {result['peak_db_connections']}, "
+          f"FixedFlooding kích hoạt tối đa {result['peak_active_fixed_floodings']}")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"  {endpoint:<20} {stats['throughput_rps']:>8} req/s  p50={stats['p50_ms']:>8} ms  "
+              f"p95={stats['p95_ms']:>8} ms  p99={stats['p99_ms']:>8} ms  lỗi={stats['error_rate'] * 100:.2f}%")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Chạy server với API bên ngoài là stub')
+    serve_parser.add_argument('--server', choices=['uvicorn', 'runserver'], default='uvicorn')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8001)
+    serve_parser.add_argument('--seed', choices=list(SCALES), default=None,
+                              help='Sinh lại dữ liệu tổng hợp trước khi chạy (XÓA các bảng hanoi_map)')
+    serve_parser.add_argument('--http-latency-ms', type=float, default=50.0,
+                              help='Độ trễ giả lập của API thời tiết / địa chỉ')
+    serve_parser.add_argument('--rain-file', default=DEFAULT_RAIN_FILE)
+    serve_parser.set_defaults(func=serve)
+
+    run_parser = subparsers.add_parser('run', help='Chạy kịch bản tải')
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:8001')
+    run_parser.add_argument('--users', type=int, default=1000, help='Số người dùng ảo tối đa')
+    run_parser.add_argument('--ramp', type=float, default=120, help='Thời gian tăng dần số người dùng (giây)')
+    run_parser.add_argument('--duration', type=float, default=600, help='Thời lượng kịch bản (giây)')
+    run_parser.add_argument('--think', type=float, default=5.0, help='Thời gian nghỉ trung bình giữa các hành động')
+    run_parser.add_argument('--peak-rain', type=float, default=90.0, help='Lượng mưa đỉnh (mm/h)')
+    run_parser.add_argument('--max-connections', type=int, default=200, help='Số kết nối HTTP tối đa tới server')
+    run_parser.add_argument('--timeout', type=float, default=30.0)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--rain-file', default=DEFAULT_RAIN_FILE)
+    run_parser.add_argument('--no-db-stats', action='store_true',
+                            help='Không lấy mẫu pg_stat_activity (khi bộ tạo tải không truy cập được database)')
+    run_parser.add_argument('--output', default=None, help='Ghi kết quả ra file JSON')
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
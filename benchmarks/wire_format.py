@@ -0,0 +1,156 @@
+"""
+So sánh kích thước và thời gian mã hóa của /api/flood-data/: GeoJSON hiện tại và định dạng cột (columnar).
+
+Dữ liệu tổng hợp (seed cố định) mô phỏng điểm ngập / báo cáo tại Hà Nội, không cần database:
+
+    python benchmarks/wire_format.py --zones 2000 --reports 20000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hanoi_flood.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.contrib.gis.geos import Point  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from hanoi_map.encodings import COLUMNAR_FORMAT_VERSION, COORD_SCALE, choice_labels, encode_layer  # noqa: E402
+from hanoi_map.models import FloodReport, FloodZone  # noqa: E402
+from hanoi_map.responses import dumps  # noqa: E402
+from hanoi_map.services import (  # noqa: E402
+    REPORT_COLUMNS, REPORT_FEATURE_FIELDS, ZONE_COLUMNS, ZONE_FEATURE_FIELDS, FloodDataService,
+)
+
+DISTRICTS = ['Ba Đình', 'Hoàn Kiếm', 'Đống Đa', 'Hai Bà Trưng', 'Cầu Giấy', 'Thanh Xuân',
+             'Hoàng Mai', 'Long Biên', 'Tây Hồ', 'Nam Từ Liêm', 'Bắc Từ Liêm', 'Hà Đông']
+
+
+def build_dataset(n_zones, n_reports, seed):
+    rng = random.Random(seed)
+    now = timezone.now()
+    zones = []
+    for i in range(n_zones):
+        lat, lng = 21.0 + rng.random() * 0.1, 105.78 + rng.random() * 0.1
+        zone = FloodZone(
+            id=i + 1, name=f"Điểm ngập {i + 1}", zone_type=rng.choice(['black', 'frequent', 'seasonal', 'rain']),
+            geometry=Point(lng, lat, srid=4326).buffer(0.0002).envelope, district=rng.choice(DISTRICTS),
+            ward=f"Phường {rng.randint(1, 20)}", street=f"Phố {rng.randint(1, 200)}",
+            max_depth_cm=round(rng.uniform(10, 90), 1), report_count=rng.randint(0, 40),
+            last_reported_at=now - timedelta(minutes=rng.randint(0, 10000)),
+            description='Ngập do hệ thống thoát nước quá tải ' * rng.randint(0, 4), is_active=True,
+            flood_cause='Hệ thống thoát nước quá tải',
+        )
+        zones.append(zone)
+
+    reports = []
+    for i in range(n_reports):
+        lat, lng = 21.0 + rng.random() * 0.1, 105.78 + rng.random() * 0.1
+        depth = round(rng.uniform(5, 100), 1)
+        reports.append(FloodReport(
+            id=i + 1, location=Point(lng, lat, srid=4326), address=f"Số {rng.randint(1, 500)} phố {rng.randint(1, 200)}",
+            water_depth=depth, severity='light' if depth < 20 else 'medium' if depth < 40 else 'heavy' if depth < 70 else 'severe',
+            created_at=now - timedelta(minutes=rng.randint(0, 10000)), reporter_name=rng.choice(['', 'Nguyễn Văn A', 'Trần Thị B']),
+            reporter_phone='', photo_url='', description='Nước ngập qua bánh xe máy' if rng.random() < 0.5 else '',
+            district=rng.choice(DISTRICTS), ward=f"Phường {rng.randint(1, 20)}", status='verified',
+        ))
+    return zones, reports
+
+
+def zone_row(zone):
+    """Dòng giống FloodDataService.zone_rows() (AsGeoJSON + Left do PostGIS tính) dựng từ instance tổng hợp"""
+    row = {field: getattr(zone, field) for field in ZONE_FEATURE_FIELDS}
+    row.update(geojson=zone.geometry.json, short_description=zone.description[:100])
+    return row
+
+
+def report_row(report):
+    row = {field: getattr(report, field) for field in REPORT_FEATURE_FIELDS}
+    row.update(geojson=report.location.json, short_description=report.description[:100])
+    return row
+
+
+def geojson_payload(zone_rows, report_rows):
+    return {
+        'flood_zones': [FloodDataService.zone_feature(zone) for zone in zone_rows],
+        'flood_reports': [FloodDataService.report_feature(report) for report in report_rows],
+    }
+
+
+def columnar_row(instance, columns):
+    """Dòng .values() của định dạng cột; short_description là Left('description', 100) do PostgreSQL tính"""
+    instance.short_description = instance.description[:100]
+    return {column.source: getattr(instance, column.source) for column in columns}
+
+
+def columnar_payload(zones, reports):
+    zone_rows = [{'geometry': zone.geometry, **columnar_row(zone, ZONE_COLUMNS)} for zone in zones]
+    report_rows = [{'location': r.location, **columnar_row(r, REPORT_COLUMNS)} for r in reports]
+    return {
+        'format': COLUMNAR_FORMAT_VERSION,
+        'scale': COORD_SCALE,
+        'flood_zones': encode_layer(zone_rows, ZONE_COLUMNS, 'geometry', 'Polygon'),
+        'flood_reports': encode_layer(report_rows, REPORT_COLUMNS, 'location'),
+        'labels': {**choice_labels(FloodZone, 'zone_type'), **choice_labels(FloodReport, 'severity', 'status')},
+    }
+
+
+def measure(name, build, repeat):
+    best_build = best_dump = float('inf')
+    body = b''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = build()
+        built = time.perf_counter()
+        body = dumps(payload)
+        dumped = time.perf_counter()
+        best_build = min(best_build, built - started)
+        best_dump = min(best_dump, dumped - built)
+    return {
+        'format': name,
+        'bytes': len(body),
+        'gzip_bytes': len(gzip.compress(body, 6)),
+        'build_ms': round(best_build * 1000, 1),
+        'dump_ms': round(best_dump * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zones', type=int, default=2000)
+    parser.add_argument('--reports', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='Ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    zones, reports = build_dataset(args.zones, args.reports, args.seed)
+    zone_rows, report_rows = [zone_row(zone) for zone in zones], [report_row(report) for report in reports]
+    results = [
+        measure('geojson', lambda: geojson_payload(zone_rows, report_rows), args.repeat),
+        measure('columnar', lambda: columnar_payload(zones, reports), args.repeat),
+    ]
+
+    base = results[0]
+    for result in results:
+        print(f"{result['format']:<10} {result['bytes'] / 1024:>9.1f} KB  gzip {result['gzip_bytes'] / 1024:>8.1f} KB  "
+              f"build {result['build_ms']:>7} ms  dump {result['dump_ms']:>7} ms  "
+              f"({result['bytes'] / base['bytes']:.0%} / gzip {result['gzip_bytes'] / base['gzip_bytes']:.0%})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
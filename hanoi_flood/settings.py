@@ -63,6 +63,8 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    # Đứng đầu để đo cả các câu SQL của session / auth
+    'hanoi_map.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,14 +100,46 @@ WSGI_APPLICATION = 'hanoi_flood.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
-        'NAME': 'hanoiflood',
-        'USER': 'postgres',
-        'PASSWORD': '1',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'hanoiflood'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '1'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'OPTIONS': {},
     }
 }
 
+# Chế độ kết nối database (biến môi trường DB_CONNECTION_MODE):
+#   pool       - connection pool của psycopg3 (mặc định khi đã cài psycopg + psycopg-pool)
+#   pgbouncer  - kết nối qua PgBouncer (transaction pooling), tắt server-side cursor
+#   persistent - giữ kết nối theo từng worker bằng CONN_MAX_AGE (dùng với psycopg2)
+#   none       - mở kết nối mới cho mỗi request như trước
+try:
+    import psycopg  # noqa: F401
+    import psycopg_pool  # noqa: F401
+    _DEFAULT_DB_MODE = 'pool'
+except ImportError:
+    _DEFAULT_DB_MODE = 'persistent'
+
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', _DEFAULT_DB_MODE)
+
+if DB_CONNECTION_MODE == 'pool':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+        'name': 'hanoiflood',
+    }
+elif DB_CONNECTION_MODE == 'pgbouncer':
+    # PgBouncer ở chế độ transaction không giữ được cursor giữa các transaction
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+elif DB_CONNECTION_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 
 
 # Password validation
@@ -150,6 +184,49 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Ngân sách số câu SQL theo tên URL; vượt ngân sách thì ghi cảnh báo và tăng
+# flood_query_budget_exceeded_total, hoặc báo lỗi khi FLOOD_QUERY_BUDGET_STRICT (bật khi chạy test)
+FLOOD_QUERY_BUDGETS = {
+    'flood_data_api': 6,
+    'flood_changes_api': 8,
+    'recent_reports_api': 4,
+    'clusters_api': 4,
+    'fixed_floodings_api': 4,
+    'check_flood_api': 20,
+    'all_zones_status_api': 4,
+}
+FLOOD_QUERY_BUDGET_STRICT = os.environ.get('FLOOD_QUERY_BUDGET_STRICT') == '1'
+# Token cho Prometheus đọc /metrics (header Authorization: Bearer <token>)
+FLOOD_METRICS_TOKEN = os.environ.get('FLOOD_METRICS_TOKEN', '')
+
+# Logging: mỗi module một logger (logging.getLogger(__name__)); handler đẩy record vào queue,
+# thread nền format và ghi ra stderr nên request không chờ ghi console.
+# FLOOD_LOG_LEVEL=DEBUG để xem log chi tiết từng request, FLOOD_LOG_FORMAT=json cho log có cấu trúc.
+FLOOD_LOG_LEVEL = os.environ.get('FLOOD_LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'hanoi_map.logs.JsonFormatter'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'hanoi_map.logs.QueueStreamHandler',
+            'formatter': os.environ.get('FLOOD_LOG_FORMAT', 'text'),
+        },
+    },
+    'loggers': {
+        'hanoi_map': {'handlers': ['queue'], 'level': FLOOD_LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Xuất dữ liệu từ admin: số bản ghi mỗi lần đọc và ngưỡng chuyển sang xuất nền
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BACKGROUND_THRESHOLD = 50000
+# File xuất nền nằm ngoài MEDIA_ROOT, chỉ tải qua /exports/<token>/ (staff)
+EXPORT_DIR = BASE_DIR / "private" / "exports"
+
 import os
 GDAL_LIBRARY_PATH = os.environ.get(
     "GDAL_LIBRARY_PATH",
@@ -1,16 +1,23 @@
 # hanoi_map/admin.py - PHIÊN BẢN ĐÃ SỬA LỖI HOÀN CHỈNH
+import logging
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
 from django.utils.html import format_html
 from django.contrib import messages
-from django.http import HttpResponse
-import csv
 from django.utils.safestring import mark_safe
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db.models import Count, Q
 
-from .models import FloodZone, FloodReport, FloodPrediction, FixedFlooding, FloodHistory
+from django.urls import reverse
+from .exports import StreamingExportMixin, ExportSpec, ExportColumn, mark_interrupted_exports
+from .changelog import record_changes
+from .events import publish_reports_verified, publish_zone_status
+from .models import FloodZone, FloodReport, FloodPrediction, FixedFlooding, FloodHistory, FixedFloodingCalibration
+from .models import AlertNotification, AlertSubscription, ExportJob, FloodPreWarning
+from .simulation import ActivationSimulationService
+
+logger = logging.getLogger(__name__)
 
 # =============================================================================
 # FLOOD ZONE ADMIN - SỬA LỖI TRƯỚC
@@ -40,16 +47,20 @@ class FloodZoneAdmin(GISModelAdmin):
             'fields': ('geometry',)
         }),
         ('⚡ TRẠNG THÁI', {
-            'fields': ('is_active', 'last_flood_date')
+            'fields': ('is_active', 'last_flood_date', 'merged_into')
         }),
     )
+    readonly_fields = ['merged_into']
     
     # người dùng actions
     actions = ['activate_zones', 'deactivate_zones']
     
     def activate_zones(self, request, queryset):
         """Activate selected flood zones"""
+        changed = list(queryset.filter(is_active=False).values_list('pk', flat=True))
         updated = queryset.update(is_active=True)
+        record_changes('zone', changed)
+        publish_zone_status(changed, True)
         self.message_user(
             request, 
             f"✅ Đã kích hoạt {updated} điểm ngập", 
@@ -59,7 +70,10 @@ class FloodZoneAdmin(GISModelAdmin):
     
     def deactivate_zones(self, request, queryset):
         """Deactivate selected flood zones"""
+        changed = list(queryset.filter(is_active=True).values_list('pk', flat=True))
         updated = queryset.update(is_active=False)
+        record_changes('zone', changed)
+        publish_zone_status(changed, False)
         self.message_user(
             request, 
             f"⭕ Đã tắt {updated} điểm ngập", 
@@ -71,7 +85,7 @@ class FloodZoneAdmin(GISModelAdmin):
 # FLOOD REPORT ADMIN
 # =============================================================================
 @admin.register(FloodReport)
-class FloodReportAdmin(GISModelAdmin):
+class FloodReportAdmin(StreamingExportMixin, GISModelAdmin):
     """Admin configuration for FloodReport model"""
     list_display = [
         'id',
@@ -98,7 +112,20 @@ class FloodReportAdmin(GISModelAdmin):
         }),
     )
     
-    actions = ['mark_as_verified', 'mark_as_resolved', 'export_to_csv']
+    actions = ['mark_as_verified', 'mark_as_resolved', 'export_to_csv', 'export_to_geojsonseq', 'export_to_gpkg']
+
+    export_spec = ExportSpec(
+        filename='flood_reports',
+        only=['id', 'location', 'address', 'district', 'water_depth', 'status', 'created_at'],
+        columns=[
+            ExportColumn('ID', 'id', lambda r: r.id),
+            ExportColumn('ĐỊA CHỈ', 'address', lambda r: r.address[:100]),
+            ExportColumn('QUẬN/HUYỆN', 'district', lambda r: r.district),
+            ExportColumn('ĐỘ SÂU (cm)', 'water_depth', lambda r: r.water_depth),
+            ExportColumn('TRẠNG THÁI', 'status', lambda r: r.get_status_display()),
+            ExportColumn('THỜI GIAN BÁO CÁO', 'created_at', lambda r: r.created_at.strftime('%d/%m/%Y %H:%M:%S')),
+        ]
+    )
     
     def address_display(self, obj):
         """Display truncated address for list view"""
@@ -116,7 +143,10 @@ class FloodReportAdmin(GISModelAdmin):
     
     def mark_as_verified(self, request, queryset):
         """Mark selected reports as verified"""
+        changed = list(queryset.exclude(status='verified').values_list('pk', flat=True))
         updated = queryset.update(status='verified')
+        record_changes('report', changed)
+        publish_reports_verified(changed)
         self.message_user(
             request, 
             f"✅ Đã xác nhận {updated} báo cáo", 
@@ -126,7 +156,9 @@ class FloodReportAdmin(GISModelAdmin):
     
     def mark_as_resolved(self, request, queryset):
         """Mark selected reports as resolved"""
+        changed = list(queryset.exclude(status='resolved').values_list('pk', flat=True))
         updated = queryset.update(status='resolved')
+        record_changes('report', changed)
         self.message_user(
             request, 
             f"🔄 Đã đánh dấu {updated} báo cáo đã xử lý", 
@@ -134,43 +166,12 @@ class FloodReportAdmin(GISModelAdmin):
         )
     mark_as_resolved.short_description = "🔄 Đánh dấu đã xử lý"
     
-    def export_to_csv(self, request, queryset):
-        """Export selected reports to CSV"""
-        response = HttpResponse(
-            content_type='text/csv',
-            charset='utf-8-sig' 
-        )
-        response['Content-Disposition'] = 'attachment; filename="flood_reports.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 
-            'ĐỊA CHỈ', 
-            'QUẬN/HUYỆN', 
-            'ĐỘ SÂU (cm)', 
-            'TRẠNG THÁI',
-            'THỜI GIAN BÁO CÁO'
-        ])
-        
-        # Write data
-        for report in queryset:
-            writer.writerow([
-                report.id,
-                report.address[:100],
-                report.district,
-                report.water_depth,
-                report.get_status_display(),
-                report.created_at.strftime('%d/%m/%Y %H:%M:%S')
-            ])
-        
-        return response
-    export_to_csv.short_description = "📊 Xuất CSV"
 
 # =============================================================================
 # FIXED FLOODING ADMIN - PHẦN QUAN TRỌNG NHẤT ĐÃ SỬA
 # =============================================================================
 @admin.register(FixedFlooding)
-class FixedFloodingAdmin(GISModelAdmin):
+class FixedFloodingAdmin(StreamingExportMixin, GISModelAdmin):
     """Admin configuration for FixedFlooding model"""
     
     # QUAN TRỌNG: Đặt list_display trước các methods
@@ -217,7 +218,28 @@ class FixedFloodingAdmin(GISModelAdmin):
         }),
     )
     
-    actions = ['activate_monitoring', 'deactivate_monitoring', 'test_activation', 'export_to_csv']
+    actions = ['activate_monitoring', 'deactivate_monitoring', 'test_activation', 'simulate_recorded_season',
+               'export_to_csv', 'export_to_geojsonseq', 'export_to_gpkg']
+
+    export_spec = ExportSpec(
+        filename='fixed_floodings',
+        only=['id', 'name', 'location', 'address', 'district', 'flood_type', 'rainfall_threshold_mm',
+              'predicted_depth_cm', 'is_active', 'is_monitored', 'activation_count', 'last_activated'],
+        columns=[
+            ExportColumn('ID', 'id', lambda f: f.id),
+            ExportColumn('TÊN', 'name', lambda f: f.name or ""),
+            ExportColumn('ĐỊA CHỈ', 'address', lambda f: f.address or ""),
+            ExportColumn('QUẬN/HUYỆN', 'district', lambda f: f.district or ""),
+            ExportColumn('LOẠI NGẬP', 'flood_type', lambda f: f.get_flood_type_display()),
+            ExportColumn('NGƯỠNG MƯA (mm/h)', 'rainfall_threshold_mm', lambda f: f.rainfall_threshold_mm or 0),
+            ExportColumn('ĐỘ SÂU DỰ BÁO (cm)', 'predicted_depth_cm', lambda f: f.predicted_depth_cm or 0),
+            ExportColumn('TRẠNG THÁI', 'status', lambda f: 'Đang cảnh báo' if f.is_active else 'Đang theo dõi'),
+            ExportColumn('GIÁM SÁT', 'monitored', lambda f: 'Bật' if f.is_monitored else 'Tắt'),
+            ExportColumn('SỐ LẦN KÍCH HOẠT', 'activation_count', lambda f: f.activation_count or 0),
+            ExportColumn('KÍCH HOẠT CUỐI', 'last_activated',
+                         lambda f: f.last_activated.strftime('%d/%m/%Y %H:%M') if f.last_activated else ''),
+        ]
+    )
     
     # CÁCH 1: Dùng mark_safe (đơn giản)
     def flood_type_display(self, obj):
@@ -311,19 +333,23 @@ class FixedFloodingAdmin(GISModelAdmin):
             else:
                 return "Vừa xong"
         except Exception as e:
-            print(f"⚠️ Lỗi format thời gian: {e}")
+            logger.warning("⚠️ Lỗi format thời gian: %s", e)
             return obj.last_activated.strftime('%d/%m %H:%M') if hasattr(obj.last_activated, 'strftime') else "Lỗi"
     last_activated_display.short_description = 'KÍCH HOẠT CUỐI'
     
     def activate_monitoring(self, request, queryset):
         """Enable monitoring for selected floodings"""
+        changed = list(queryset.filter(is_monitored=False).values_list('pk', flat=True))
         updated = queryset.update(is_monitored=True)
+        record_changes('fixed', changed)
         self.message_user(request, f"✅ Đã bật giám sát cho {updated} điểm ngập cố định", messages.SUCCESS)
     activate_monitoring.short_description = "✅ Bật giám sát"
     
     def deactivate_monitoring(self, request, queryset):
         """Disable monitoring for selected floodings"""
+        changed = list(queryset.filter(is_monitored=True).values_list('pk', flat=True))
         updated = queryset.update(is_monitored=False)
+        record_changes('fixed', changed)
         self.message_user(request, f"⭕ Đã tắt giám sát cho {updated} điểm ngập cố định", messages.WARNING)
     deactivate_monitoring.short_description = "⭕ Tắt giám sát"
     
@@ -358,49 +384,40 @@ class FixedFloodingAdmin(GISModelAdmin):
                 
                 success_count += 1
             except Exception as e:
-                print(f"❌ Lỗi test activation: {e}")
+                logger.error("❌ Lỗi test activation: %s", e)
         
         self.message_user(request, f"⚡ Đã test kích hoạt {success_count}/{len(queryset)} điểm ngập cố định", messages.INFO)
     test_activation.short_description = "⚡ Test kích hoạt"
     
-    def export_to_csv(self, request, queryset):
-        """Export selected fixed floodings to CSV"""
-        response = HttpResponse(
-            content_type='text/csv',
-            charset='utf-8-sig'
-        )
-        response['Content-Disposition'] = 'attachment; filename="fixed_floodings.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'TÊN', 'ĐỊA CHỈ', 'QUẬN/HUYỆN', 'LOẠI NGẬP', 'NGƯỠNG MƯA (mm/h)',
-            'ĐỘ SÂU DỰ BÁO (cm)', 'TRẠNG THÁI', 'GIÁM SÁT', 'SỐ LẦN KÍCH HOẠT', 'KÍCH HOẠT CUỐI'
-        ])
+    def simulate_recorded_season(self, request, queryset):
+        """Phát lại lượng mưa đã ghi nhận 365 ngày qua cho các điểm đã chọn, không ghi database"""
+        series = ActivationSimulationService.recorded_season(365)
+        if not len(series['time']):
+            self.message_user(request, "ℹ️ Chưa có lượng mưa ghi nhận để mô phỏng", messages.INFO)
+            return
         
-        for flooding in queryset:
-            writer.writerow([
-                flooding.id,
-                flooding.name or "",
-                flooding.address or "",
-                flooding.district or "",
-                flooding.get_flood_type_display() if hasattr(flooding, 'get_flood_type_display') else flooding.flood_type or "",
-                flooding.rainfall_threshold_mm or 0,
-                flooding.predicted_depth_cm or 0,
-                'Đang cảnh báo' if flooding.is_active else 'Đang theo dõi',
-                'Bật' if flooding.is_monitored else 'Tắt',
-                flooding.activation_count or 0,
-                flooding.last_activated.strftime('%d/%m/%Y %H:%M') if flooding.last_activated else ''
-            ])
+        result = ActivationSimulationService.simulate(series, only_ids=list(queryset.values_list('pk', flat=True)))
+        if not result['success']:
+            self.message_user(request, f"❌ Lỗi mô phỏng: {result['error']}", messages.ERROR)
+            return
         
-        return response
-    export_to_csv.short_description = "📊 Xuất CSV"
+        top = ', '.join(f"#{row['fixed_flooding_id']}: {row['activations']} lần" for row in result['per_point'][:5])
+        self.message_user(
+            request,
+            f"🧪 Mô phỏng {result['steps']} mốc mưa: {result['activations']} lần kích hoạt ở "
+            f"{result['points_activated']}/{result['points']} điểm, tối đa {result['peak_active']} điểm cùng lúc"
+            + (f" ({top})" if top else ""),
+            messages.INFO
+        )
+    simulate_recorded_season.short_description = "🧪 Mô phỏng kích hoạt (mưa 365 ngày, không ghi DB)"
+    
 
     
 # =============================================================================
 # FLOOD HISTORY ADMIN
 # =============================================================================
 @admin.register(FloodHistory)
-class FloodHistoryAdmin(GISModelAdmin):
+class FloodHistoryAdmin(StreamingExportMixin, GISModelAdmin):
     """Admin configuration for FloodHistory model"""
     list_display = [
         'district',
@@ -440,8 +457,33 @@ class FloodHistoryAdmin(GISModelAdmin):
         }),
     )
     
-    actions = ['export_to_csv']
-    
+    actions = ['export_to_csv', 'export_to_geojsonseq', 'export_to_gpkg']
+
+    export_spec = ExportSpec(
+        filename='flood_history',
+        select_related=['related_zone'],
+        only=['id', 'location', 'district', 'address', 'flood_type', 'water_depth_cm', 'rainfall_mm',
+              'start_time', 'end_time', 'duration_minutes', 'source', 'severity', 'impact_level',
+              'related_zone__name'],
+        columns=[
+            ExportColumn('ID', 'id', lambda h: h.id),
+            ExportColumn('QUẬN/HUYỆN', 'district', lambda h: h.district or ""),
+            ExportColumn('ĐỊA CHỈ', 'address', lambda h: h.address[:100] if h.address else ""),
+            ExportColumn('LOẠI NGẬP', 'flood_type', lambda h: h.flood_type or ""),
+            ExportColumn('ĐỘ SÂU (cm)', 'water_depth_cm', lambda h: h.water_depth_cm or 0),
+            ExportColumn('LƯỢNG MƯA (mm/h)', 'rainfall_mm', lambda h: h.rainfall_mm or 0),
+            ExportColumn('THỜI GIAN BẮT ĐẦU', 'start_time',
+                         lambda h: h.start_time.strftime('%d/%m/%Y %H:%M') if h.start_time else ""),
+            ExportColumn('THỜI GIAN KẾT THÚC', 'end_time',
+                         lambda h: h.end_time.strftime('%d/%m/%Y %H:%M') if h.end_time else ""),
+            ExportColumn('THỜI LƯỢNG (phút)', 'duration_minutes', lambda h: h.duration_minutes or 0),
+            ExportColumn('NGUỒN', 'source', lambda h: h.get_source_display()),
+            ExportColumn('MỨC ĐỘ', 'severity', lambda h: h.get_severity_display()),
+            ExportColumn('ẢNH HƯỞNG', 'impact_level', lambda h: h.get_impact_level_display()),
+            ExportColumn('VÙNG NGẬP', 'related_zone', lambda h: h.related_zone.name if h.related_zone else ""),
+        ]
+    )
+
     def history_severity(self, obj):
         """Display severity"""
         if not obj:
@@ -522,48 +564,6 @@ class FloodHistoryAdmin(GISModelAdmin):
         )
     impact_level_display.short_description = 'ẢNH HƯỞNG'
     
-    def export_to_csv(self, request, queryset):
-        """Export selected history records to CSV"""
-        response = HttpResponse(
-            content_type='text/csv',
-            charset='utf-8-sig'
-        )
-        response['Content-Disposition'] = 'attachment; filename="flood_history.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 
-            'QUẬN/HUYỆN',
-            'ĐỊA CHỈ',
-            'LOẠI NGẬP',
-            'ĐỘ SÂU (cm)',
-            'LƯỢNG MƯA (mm/h)',
-            'THỜI GIAN BẮT ĐẦU',
-            'THỜI GIAN KẾT THÚC',
-            'THỜI LƯỢNG (phút)',
-            'NGUỒN',
-            'MỨC ĐỘ',
-            'ẢNH HƯỞNG'
-        ])
-        
-        for history in queryset:
-            writer.writerow([
-                history.id,
-                history.district or "",
-                history.address[:100] if history.address else "",
-                history.flood_type or "",
-                history.water_depth_cm or 0,
-                history.rainfall_mm or 0,
-                history.start_time.strftime('%d/%m/%Y %H:%M') if history.start_time else "",
-                history.end_time.strftime('%d/%m/%Y %H:%M') if history.end_time else "",
-                history.duration_minutes or 0,
-                history.get_source_display() if hasattr(history, 'get_source_display') else history.source or "",
-                history.get_severity_display() if hasattr(history, 'get_severity_display') else history.severity or "",
-                history.get_impact_level_display() if hasattr(history, 'get_impact_level_display') else history.impact_level or ""
-            ])
-        
-        return response
-    export_to_csv.short_description = "📊 Xuất CSV"
 
 # =============================================================================
 # FLOOD PREDICTION ADMIN
@@ -583,7 +583,7 @@ class FloodPredictionAdmin(admin.ModelAdmin):
         'prediction_time_display',
     ]
     
-    list_filter = ['risk_level', 'district', 'warning_triggered', 'drainage_capacity']
+    list_filter = ['risk_level', 'district', 'warning_triggered', 'drainage_capacity', 'source']
     search_fields = ['address', 'district', 'description', 'recommendations']
     ordering = ['-prediction_time']
     readonly_fields = ['created_at', 'updated_at']
@@ -634,6 +634,170 @@ class FloodPredictionAdmin(admin.ModelAdmin):
         return obj.prediction_time.strftime('%d/%m %H:%M')
     prediction_time_display.short_description = 'THỜI ĐIỂM DỰ BÁO'
 
+# =============================================================================
+# FIXED FLOODING CALIBRATION ADMIN
+# =============================================================================
+@admin.register(FixedFloodingCalibration)
+class FixedFloodingCalibrationAdmin(admin.ModelAdmin):
+    """Admin duyệt đề xuất hiệu chỉnh ngưỡng FixedFlooding"""
+
+    list_display = [
+        'fixed_flooding',
+        'threshold_change',
+        'depth_change',
+        'duration_change',
+        'confidence_percentage',
+        'event_count',
+        'confirmed_count',
+        'status',
+        'created_at',
+    ]
+    list_filter = ['status', 'fixed_flooding__district']
+    search_fields = ['fixed_flooding__name', 'fixed_flooding__address']
+    list_select_related = ['fixed_flooding']
+    ordering = ['-created_at']
+    readonly_fields = [
+        'fixed_flooding', 'current_threshold_mm', 'current_depth_cm', 'current_duration_hours',
+        'confidence', 'event_count', 'confirmed_count', 'report_count', 'metrics',
+        'reviewed_by', 'reviewed_at', 'created_at',
+    ]
+
+    actions = ['apply_calibrations', 'reject_calibrations']
+
+    def threshold_change(self, obj):
+        return f"{obj.current_threshold_mm} → {obj.proposed_threshold_mm}"
+    threshold_change.short_description = 'NGƯỠNG MƯA (mm/h)'
+
+    def depth_change(self, obj):
+        return f"{obj.current_depth_cm} → {obj.proposed_depth_cm}"
+    depth_change.short_description = 'ĐỘ SÂU (cm)'
+
+    def duration_change(self, obj):
+        return f"{obj.current_duration_hours} → {obj.proposed_duration_hours}"
+    duration_change.short_description = 'THỜI GIAN (giờ)'
+
+    def confidence_percentage(self, obj):
+        return f"{obj.confidence * 100:.0f}%"
+    confidence_percentage.short_description = 'ĐỘ TIN CẬY'
+    confidence_percentage.admin_order_field = 'confidence'
+
+    def apply_calibrations(self, request, queryset):
+        """Áp dụng các đề xuất đang chờ duyệt"""
+        applied = 0
+        for calibration in queryset.filter(status='pending').select_related('fixed_flooding'):
+            calibration.apply(user=request.user)
+            applied += 1
+        self.message_user(request, f"✅ Đã áp dụng {applied} đề xuất hiệu chỉnh", messages.SUCCESS)
+    apply_calibrations.short_description = "✅ Áp dụng đề xuất"
+
+    def reject_calibrations(self, request, queryset):
+        """Từ chối các đề xuất đang chờ duyệt"""
+        updated = queryset.filter(status='pending').update(
+            status='rejected',
+            reviewed_by=request.user,
+            reviewed_at=timezone.now()
+        )
+        self.message_user(request, f"❌ Đã từ chối {updated} đề xuất", messages.WARNING)
+    reject_calibrations.short_description = "❌ Từ chối đề xuất"
+
+
+@admin.register(FloodPreWarning)
+class FloodPreWarningAdmin(admin.ModelAdmin):
+    """Admin xem cảnh báo sớm theo dự báo (do refresh_prewarnings tạo, chỉ đọc)"""
+
+    list_display = [
+        'fixed_flooding',
+        'expected_activation_at',
+        'peak_rainfall_mm',
+        'threshold_mm',
+        'expected_depth_cm',
+        'expected_duration_hours',
+        'forecast_time',
+        'is_active',
+    ]
+    list_filter = ['is_active', 'fixed_flooding__district']
+    search_fields = ['fixed_flooding__name', 'fixed_flooding__address']
+    list_select_related = ['fixed_flooding']
+    ordering = ['-forecast_time', 'expected_activation_at']
+    readonly_fields = [
+        'fixed_flooding', 'forecast_time', 'expected_activation_at', 'threshold_mm', 'peak_rainfall_mm',
+        'peak_at', 'expected_depth_cm', 'expected_duration_hours', 'valid_until', 'is_active', 'created_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AlertSubscription)
+class AlertSubscriptionAdmin(GISModelAdmin):
+    """Admin đăng ký nhận cảnh báo theo vùng"""
+
+    list_display = [
+        'label',
+        'user',
+        'device_id',
+        'sink',
+        'target',
+        'radius_meters',
+        'is_active',
+        'last_notified_at',
+        'created_at',
+    ]
+    list_filter = ['sink', 'is_active']
+    search_fields = ['label', 'device_id', 'target', 'user__username']
+    list_select_related = ['user']
+    readonly_fields = ['last_notified_at', 'created_at']
+
+
+@admin.register(AlertNotification)
+class AlertNotificationAdmin(admin.ModelAdmin):
+    """Admin xem hàng đợi thông báo (do fan-out tạo, dispatch_notifications gửi)"""
+
+    list_display = ['id', 'subscription', 'event_type', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'event_type', 'subscription__sink']
+    search_fields = ['subscription__label', 'subscription__target']
+    list_select_related = ['subscription']
+    ordering = ['-id']
+    readonly_fields = [
+        'subscription', 'event_type', 'payload', 'status', 'attempts', 'error', 'created_at', 'claimed_at', 'sent_at',
+    ]
+
+    actions = ['retry_notifications']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_notifications(self, request, queryset):
+        """Đưa các thông báo lỗi về hàng đợi"""
+        updated = queryset.filter(status='failed').update(status='pending', attempts=0, error='')
+        self.message_user(request, f"🔁 Đã đưa {updated} thông báo lỗi về hàng đợi", messages.SUCCESS)
+    retry_notifications.short_description = "🔁 Gửi lại thông báo lỗi"
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """Admin theo dõi các lần xuất dữ liệu nền và tải file đã xuất"""
+
+    list_display = ['name', 'export_format', 'status', 'requested_by', 'created_at', 'finished_at', 'download_link']
+    list_filter = ['status', 'export_format']
+    list_select_related = ['requested_by']
+    readonly_fields = [
+        'token', 'name', 'export_format', 'status', 'error', 'requested_by', 'heartbeat_at', 'created_at', 'finished_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        mark_interrupted_exports()
+        return super().changelist_view(request, extra_context)
+
+    def download_link(self, obj):
+        if obj.status != 'done':
+            return '-'
+        return format_html('<a href="{}">⬇️ Tải file</a>', reverse('export_download', args=[obj.token]))
+    download_link.short_description = 'File'
+
 # =============================================================================
 # ADMIN SITE CONFIGURATION
 # =============================================================================
@@ -0,0 +1,326 @@
+import math
+import threading
+import time
+from django.conf import settings
+from django.contrib.gis.geos import Point, Polygon
+
+from .changelog import FloodChangeService
+from .clusters import SEVERITY_RANK
+from .models import FixedFlooding, FloodZone
+from .responses import dumps
+
+# Ô geohash của chỉ mục cảnh báo (6 ký tự ~ 1.1 x 0.6 km) và của cache ứng viên (8 ký tự ~ 36 x 19 m)
+ALERT_INDEX_PRECISION = getattr(settings, 'FLOOD_ALERT_INDEX_PRECISION', 6)
+ALERT_CACHE_PRECISION = getattr(settings, 'FLOOD_ALERT_CACHE_PRECISION', 8)
+# Khoảng cách (m) được coi là "gần" cảnh báo, và bán kính tìm cảnh báo gần nhất
+ALERT_NEAR_M = getattr(settings, 'FLOOD_ALERT_NEAR_M', 500)
+ALERT_SEARCH_M = getattr(settings, 'FLOOD_ALERT_SEARCH_M', 2000)
+# Kiểm tra nhật ký thay đổi tối đa một lần sau mỗi N giây (như ClusterIndex)
+ALERT_REFRESH_SECONDS = getattr(settings, 'FLOOD_ALERT_REFRESH_SECONDS', 1)
+# Số ô kết quả tối đa giữ trong cache, vượt thì xóa sạch
+ALERT_CACHE_MAX_CELLS = getattr(settings, 'FLOOD_ALERT_CACHE_MAX_CELLS', 200000)
+
+ALERT_KINDS = ('zone', 'fixed')
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Phép chiếu phẳng quanh Hà Nội: sai số khoảng cách < 0.5% trong vài chục km
+PLANAR_LAT = 21.03
+M_PER_DEG_LAT = 110574.0
+M_PER_DEG_LNG = 111320.0 * math.cos(math.radians(PLANAR_LAT))
+
+
+def _bits(precision):
+    """(số bit kinh độ, số bit vĩ độ) của geohash precision ký tự; bit đầu tiên là kinh độ"""
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+
+def geohash_cell(lat, lng, precision):
+    """Chỉ số (ix, iy) của ô geohash chứa điểm"""
+    lng_bits, lat_bits = _bits(precision)
+    ix = min(int((lng + 180.0) / 360.0 * (1 << lng_bits)), (1 << lng_bits) - 1)
+    iy = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    return ix, iy
+
+
+def geohash_encode(ix, iy, precision):
+    """Chuỗi geohash của ô (ix, iy): xen kẽ bit kinh độ / vĩ độ, 5 bit một ký tự"""
+    lng_bits, lat_bits = _bits(precision)
+    value = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (ix >> (lng_bits - 1 - i // 2)) & 1
+        else:
+            bit = (iy >> (lat_bits - 1 - i // 2)) & 1
+        value = (value << 1) | bit
+    return ''.join(GEOHASH_BASE32[(value >> (5 * (precision - 1 - k))) & 31] for k in range(precision))
+
+
+def geohash_center(ix, iy, precision):
+    """(lat, lng) tâm ô geohash"""
+    lng_bits, lat_bits = _bits(precision)
+    return (
+        (iy + 0.5) * 180.0 / (1 << lat_bits) - 90.0,
+        (ix + 0.5) * 360.0 / (1 << lng_bits) - 180.0,
+    )
+
+
+def _planar(lat, lng):
+    return lng * M_PER_DEG_LNG, lat * M_PER_DEG_LAT
+
+
+def _depth_severity(depth_cm):
+    """Mức độ theo độ sâu, cùng ngưỡng với FloodReport.save"""
+    if depth_cm < 20:
+        return 'light'
+    if depth_cm < 40:
+        return 'medium'
+    if depth_cm < 70:
+        return 'heavy'
+    return 'severe'
+
+
+# Cache kết quả giữ ô 8 ký tự trong nhóm theo ô chỉ mục 6 ký tự (tiền tố geohash): dịch bit để đổi ô
+_SHIFT_LNG = _bits(ALERT_CACHE_PRECISION)[0] - _bits(ALERT_INDEX_PRECISION)[0]
+_SHIFT_LAT = _bits(ALERT_CACHE_PRECISION)[1] - _bits(ALERT_INDEX_PRECISION)[1]
+# Nửa đường chéo (m) của ô cache
+_CACHE_CELL_HALF_DIAGONAL_M = math.hypot(
+    360.0 / (1 << _bits(ALERT_CACHE_PRECISION)[0]) * M_PER_DEG_LNG,
+    180.0 / (1 << _bits(ALERT_CACHE_PRECISION)[1]) * M_PER_DEG_LAT,
+) / 2
+
+
+class Alert:
+    """Một cảnh báo đang hiệu lực: vùng tròn của FixedFlooding hoặc đa giác FloodZone (tọa độ phẳng, mét)"""
+
+    __slots__ = ('kind', 'id', 'name', 'severity', 'lat', 'lng', 'radius', 'shape', 'bbox', 'cells')
+
+    def __init__(self, kind, object_id, name, severity, lat, lng, radius=0.0, shape=None, bbox=None):
+        self.kind = kind
+        self.id = object_id
+        self.name = name
+        self.severity = severity
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.shape = shape
+        # (min_lng, min_lat, max_lng, max_lat) của vùng cảnh báo
+        self.bbox = bbox or (
+            lng - radius / M_PER_DEG_LNG, lat - radius / M_PER_DEG_LAT,
+            lng + radius / M_PER_DEG_LNG, lat + radius / M_PER_DEG_LAT,
+        )
+        self.cells = ()
+
+    def distance_m(self, x, y):
+        """Khoảng cách (m) từ điểm phẳng (x, y) tới vùng cảnh báo, 0 nếu nằm trong"""
+        if self.shape is not None:
+            return self.shape.distance(Point(x, y))
+        cx, cy = _planar(self.lat, self.lng)
+        return max(math.hypot(x - cx, y - cy) - self.radius, 0.0)
+
+
+class AlertIndex:
+    """
+    Tra cứu "tôi có đang ở trong / gần vùng cảnh báo không" cho client di động, hoàn toàn trong bộ nhớ.
+    Mỗi cảnh báo (FixedFlooding đang kích hoạt, FloodZone đang hoạt động) được gắn vào các ô geohash
+    ALERT_INDEX_PRECISION ký tự mà vùng ALERT_SEARCH_M quanh nó phủ tới; danh sách ứng viên được cache theo ô
+    ALERT_CACHE_PRECISION ký tự, khoảng cách tính chính xác tại từng điểm yêu cầu. Cập nhật tăng dần theo FloodChangeLog như ClusterIndex, và chỉ xóa cache
+    của các ô có cảnh báo thay đổi.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._alerts = {}
+        self._cells = {}
+        self._cache = {}
+        self._cached = 0
+        self._cursor = None
+        self._checked_at = 0.0
+
+    # ---------- cập nhật ----------
+
+    @staticmethod
+    def _covered_cells(bbox):
+        """Các ô chỉ mục giao với bbox mở rộng ALERT_SEARCH_M"""
+        min_lng, min_lat, max_lng, max_lat = bbox
+        pad_lng, pad_lat = ALERT_SEARCH_M / M_PER_DEG_LNG, ALERT_SEARCH_M / M_PER_DEG_LAT
+        x0, y0 = geohash_cell(min_lat - pad_lat, min_lng - pad_lng, ALERT_INDEX_PRECISION)
+        x1, y1 = geohash_cell(max_lat + pad_lat, max_lng + pad_lng, ALERT_INDEX_PRECISION)
+        return tuple((ix, iy) for ix in range(x0, x1 + 1) for iy in range(y0, y1 + 1))
+
+    def _invalidate(self, cells):
+        for cell in cells:
+            entries = self._cache.pop(cell, None)
+            if entries:
+                self._cached -= len(entries)
+
+    def _remove(self, key):
+        alert = self._alerts.pop(key, None)
+        if alert is None:
+            return
+        for cell in alert.cells:
+            members = self._cells.get(cell)
+            if members is not None:
+                members.pop(key, None)
+                if not members:
+                    del self._cells[cell]
+        self._invalidate(alert.cells)
+
+    def _add(self, alert):
+        key = (alert.kind, alert.id)
+        self._remove(key)
+        alert.cells = self._covered_cells(alert.bbox)
+        self._alerts[key] = alert
+        for cell in alert.cells:
+            self._cells.setdefault(cell, {})[key] = alert
+        self._invalidate(alert.cells)
+
+    @staticmethod
+    def _load_alerts(kind, ids=None):
+        """Đọc các cảnh báo đang hiệu lực (ids=None: toàn bộ)"""
+        if kind == 'fixed':
+            queryset = FixedFlooding.objects.filter(is_active=True)
+            if ids is not None:
+                queryset = queryset.filter(pk__in=ids)
+            for row in queryset.values('id', 'name', 'severity', 'location', 'radius_meters').iterator(chunk_size=2000):
+                yield Alert('fixed', row['id'], row['name'], row['severity'],
+                            row['location'].y, row['location'].x, radius=row['radius_meters'] or 0.0)
+        else:
+            queryset = FloodZone.objects.filter(is_active=True)
+            if ids is not None:
+                queryset = queryset.filter(pk__in=ids)
+            for row in queryset.values('id', 'name', 'max_depth_cm', 'geometry').iterator(chunk_size=500):
+                geometry = row['geometry']
+                rings = [[_planar(lat, lng) for lng, lat in ring] for ring in geometry.coords]
+                center = geometry.centroid
+                yield Alert('zone', row['id'], row['name'], _depth_severity(row['max_depth_cm'] or 0),
+                            center.y, center.x, shape=Polygon(*rings), bbox=geometry.extent)
+
+    def rebuild(self):
+        with self._lock:
+            # Cursor lấy TRƯỚC khi đọc dữ liệu để không bỏ sót thay đổi xảy ra trong lúc đọc
+            cursor = FloodChangeService.current_cursor()
+            self._alerts = {}
+            self._cells = {}
+            self._cache = {}
+            self._cached = 0
+            for kind in ALERT_KINDS:
+                for alert in self._load_alerts(kind):
+                    self._add(alert)
+            self._cursor = cursor
+            self._checked_at = time.monotonic()
+
+    def refresh(self, force=False):
+        """Áp dụng các thay đổi mới trong nhật ký (tối đa một lần mỗi ALERT_REFRESH_SECONDS)"""
+        if not force and self._cursor is not None and time.monotonic() - self._checked_at < ALERT_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._cursor is None or self._cursor < FloodChangeService.compaction_floor():
+                self.rebuild()
+                return
+
+            entries, cursor, has_more = FloodChangeService.entries_after(self._cursor, ALERT_KINDS)
+            if has_more:
+                self.rebuild()
+                return
+
+            changed = {kind: set() for kind in ALERT_KINDS}
+            for entity, object_id in entries:
+                changed[entity].add(object_id)
+            for kind, ids in changed.items():
+                if not ids:
+                    continue
+                found = set()
+                for alert in self._load_alerts(kind, ids):
+                    self._add(alert)
+                    found.add(alert.id)
+                # Không còn hiệu lực (tắt kích hoạt, vùng ngập ngừng hoạt động) hoặc đã bị xóa
+                for object_id in ids - found:
+                    self._remove((kind, object_id))
+
+            self._cursor = cursor
+            self._checked_at = time.monotonic()
+
+    # ---------- truy vấn ----------
+
+    def _candidates(self, ix, iy):
+        """
+        Các cảnh báo có thể gần nhất với một điểm bất kỳ trong ô cache (ix, iy). Khoảng cách tới một vùng đổi
+        không quá độ dời của điểm, nên từ khoảng cách d tại tâm ô: mọi điểm trong ô cách vùng trong
+        [d - h, d + h] với h là nửa đường chéo ô. Giữ cảnh báo có cận dưới không vượt cận trên nhỏ nhất.
+        """
+        lat, lng = geohash_center(ix, iy, ALERT_CACHE_PRECISION)
+        x, y = _planar(lat, lng)
+        bounds = []
+        for alert in self._cells.get((ix >> _SHIFT_LNG, iy >> _SHIFT_LAT), {}).values():
+            distance = alert.distance_m(x, y)
+            if distance - _CACHE_CELL_HALF_DIAGONAL_M <= ALERT_SEARCH_M:
+                bounds.append((distance, alert))
+        if not bounds:
+            return ()
+        limit = min(ALERT_SEARCH_M, min(distance for distance, _alert in bounds) + _CACHE_CELL_HALF_DIAGONAL_M)
+        return tuple(
+            alert for distance, alert in bounds if distance - _CACHE_CELL_HALF_DIAGONAL_M <= limit
+        )
+
+    @staticmethod
+    def _evaluate(candidates, cell, lat, lng):
+        """Kết quả (JSON bytes) tại đúng điểm (lat, lng), tính trên danh sách ứng viên của ô"""
+        x, y = _planar(lat, lng)
+        best, best_key = None, None
+        for alert in candidates:
+            distance = alert.distance_m(x, y)
+            if distance > ALERT_SEARCH_M:
+                continue
+            # Cùng khoảng cách (cùng nằm trong nhiều vùng): ưu tiên mức độ cao hơn
+            key = (distance, -SEVERITY_RANK.get(alert.severity, 0))
+            if best_key is None or key < best_key:
+                best, best_key = alert, key
+
+        if best is None:
+            level, nearest, distance = 'none', None, None
+        else:
+            distance = round(best_key[0])
+            level = 'inside' if distance == 0 else 'near' if distance <= ALERT_NEAR_M else 'none'
+            nearest = {
+                'kind': best.kind,
+                'id': best.id,
+                'name': best.name,
+                'severity': best.severity,
+                'lat': round(best.lat, 6),
+                'lng': round(best.lng, 6),
+            }
+        return dumps({
+            'success': True,
+            'level': level,
+            'nearest': nearest,
+            'distance_m': distance,
+            'cell': cell,
+        })
+
+    def lookup(self, lat, lng):
+        """
+        JSON bytes: mức cảnh báo, cảnh báo gần nhất và khoảng cách tại đúng (lat, lng). Cache theo ô chỉ giữ
+        danh sách ứng viên, khoảng cách luôn tính tại điểm yêu cầu.
+        """
+        self.refresh()
+        ix, iy = geohash_cell(lat, lng, ALERT_CACHE_PRECISION)
+        cell = (ix >> _SHIFT_LNG, iy >> _SHIFT_LAT)
+        cached = self._cache.get(cell)
+        entry = cached.get((ix, iy)) if cached is not None else None
+
+        if entry is None:
+            with self._lock:
+                if self._cached >= ALERT_CACHE_MAX_CELLS:
+                    self._cache = {}
+                    self._cached = 0
+                entry = (geohash_encode(ix, iy, ALERT_CACHE_PRECISION), self._candidates(ix, iy))
+                entries = self._cache.setdefault(cell, {})
+                if (ix, iy) not in entries:
+                    self._cached += 1
+                entries[(ix, iy)] = entry
+        return self._evaluate(entry[1], entry[0], lat, lng)
+
+
+alert_index = AlertIndex()
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class HanoiMapConfig(AppConfig):
     name = 'hanoi_map'
+
+    def ready(self):
+        # Đăng ký các signal phát sự kiện realtime và ghi nhật ký thay đổi
+        from . import changelog, events  # noqa: F401
+        # Đếm SQL / HTTP ra ngoài cho RequestMetricsMiddleware
+        from . import metrics
+        metrics.install()
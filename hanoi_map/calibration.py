@@ -0,0 +1,309 @@
+import numpy as np
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from .models import FixedFlooding, FixedFloodingCalibration, FloodHistory, FloodPrediction, FloodReport
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Lưới ngưỡng mưa ứng viên (mm/h) dùng để tìm ngưỡng tối ưu
+THRESHOLD_GRID_MM = np.arange(0.5, 150.5, 0.5)
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    """Khoảng cách (m) giữa các cặp tọa độ, hỗ trợ broadcasting NumPy"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _match_points(point_lat, point_lon, radius_m, obs_lat, obs_lon, chunk_size=20000):
+    """
+    Ghép quan sát với các điểm trong bán kính.
+    Trả về 2 mảng (point_idx, obs_idx) cho mọi cặp khớp, xử lý theo khối để giới hạn bộ nhớ.
+    """
+    point_idx = []
+    obs_idx = []
+    radius_m = np.broadcast_to(radius_m, point_lat.shape)
+    for start in range(0, len(obs_lat), chunk_size):
+        stop = start + chunk_size
+        dist = _haversine_m(
+            point_lat[:, None], point_lon[:, None],
+            obs_lat[None, start:stop], obs_lon[None, start:stop]
+        )
+        p, o = np.nonzero(dist <= radius_m[:, None])
+        point_idx.append(p)
+        obs_idx.append(o + start)
+    if not point_idx:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(point_idx), np.concatenate(obs_idx)
+
+
+def _grouped_ols(group, x, y, n_groups):
+    """
+    Hồi quy tuyến tính y = a + b*x cho từng nhóm cùng lúc (bincount thay cho vòng lặp).
+    Trả về (count, intercept, slope, r2, mean_y); slope = NaN khi không đủ dữ liệu.
+    """
+    n = np.bincount(group, minlength=n_groups).astype(float)
+    sx = np.bincount(group, weights=x, minlength=n_groups)
+    sy = np.bincount(group, weights=y, minlength=n_groups)
+    sxx = np.bincount(group, weights=x * x, minlength=n_groups)
+    sxy = np.bincount(group, weights=x * y, minlength=n_groups)
+    syy = np.bincount(group, weights=y * y, minlength=n_groups)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_y = sy / n
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        cov = n * sxy - sx * sy
+        valid = (n >= 3) & (var_x > 1e-9)
+        slope = np.where(valid, cov / var_x, np.nan)
+        intercept = np.where(valid, (sy - slope * sx) / n, np.nan)
+        r2 = np.where(valid & (var_y > 1e-9), cov * cov / (var_x * var_y), 0.0)
+    return n, intercept, slope, r2, mean_y
+
+
+class ThresholdCalibrationService:
+    """Service hiệu chỉnh ngưỡng FixedFlooding từ lịch sử ngập, báo cáo và lượng mưa"""
+
+    @staticmethod
+    def collect_observations(since=None, rain_radius_m=2000):
+        """Thu thập dữ liệu thô dưới dạng mảng NumPy (không khởi tạo model)"""
+        points = list(FixedFlooding.objects.values_list(
+            'id', 'location', 'radius_meters',
+            'rainfall_threshold_mm', 'predicted_depth_cm', 'duration_hours'
+        ))
+
+        # Lượng mưa ghi nhận: lịch sử ngập + dự đoán (gồm cả các đợt mưa dưới ngưỡng)
+        history_rain = FloodHistory.objects.filter(rainfall_mm__isnull=False)
+        prediction_rain = FloodPrediction.objects.filter(rainfall_mm__gt=0)
+        # Báo cáo do người dân gửi và đã xác nhận là bằng chứng ngập thực tế
+        reports = FloodReport.objects.filter(status='verified', source='user')
+        # Thời gian ngập đo được (có end_time)
+        durations = FloodHistory.objects.filter(end_time__isnull=False, duration_minutes__gt=0)
+
+        if since:
+            history_rain = history_rain.filter(start_time__gte=since)
+            prediction_rain = prediction_rain.filter(prediction_time__gte=since)
+            reports = reports.filter(created_at__gte=since)
+            durations = durations.filter(start_time__gte=since)
+
+        rain_rows = (
+            list(history_rain.values_list('location', 'rainfall_mm', 'start_time')) +
+            list(prediction_rain.values_list('location', 'rainfall_mm', 'prediction_time'))
+        )
+        report_rows = list(reports.values_list('location', 'water_depth', 'created_at'))
+        duration_rows = list(durations.values_list('location', 'rainfall_mm', 'duration_minutes'))
+
+        def _coords(rows):
+            lat = np.array([row[0].y for row in rows], dtype=float)
+            lon = np.array([row[0].x for row in rows], dtype=float)
+            return lat, lon
+
+        def _epoch(values):
+            return np.array([value.timestamp() for value in values], dtype=np.int64)
+
+        point_lat, point_lon = _coords(points)
+        rain_lat, rain_lon = _coords(rain_rows)
+        report_lat, report_lon = _coords(report_rows)
+        duration_lat, duration_lon = _coords(duration_rows)
+
+        return {
+            'point_ids': np.array([row[0] for row in points], dtype=np.int64),
+            'point_lat': point_lat,
+            'point_lon': point_lon,
+            'point_radius': np.array([row[2] for row in points], dtype=float),
+            'current_threshold': np.array([row[3] for row in points], dtype=float),
+            'current_depth': np.array([row[4] for row in points], dtype=float),
+            'current_duration': np.array([row[5] for row in points], dtype=float),
+            'rain_lat': rain_lat,
+            'rain_lon': rain_lon,
+            'rain_mm': np.array([row[1] for row in rain_rows], dtype=float),
+            'rain_time': _epoch(row[2] for row in rain_rows),
+            'report_lat': report_lat,
+            'report_lon': report_lon,
+            'report_depth': np.array([row[1] for row in report_rows], dtype=float),
+            'report_time': _epoch(row[2] for row in report_rows),
+            'duration_lat': duration_lat,
+            'duration_lon': duration_lon,
+            'duration_rain': np.array([row[1] or 0 for row in duration_rows], dtype=float),
+            'duration_hours': np.array([row[2] / 60.0 for row in duration_rows], dtype=float),
+            'rain_radius_m': rain_radius_m,
+        }
+
+    @staticmethod
+    def fit(obs, window_hours=6, min_events=3):
+        """
+        Hiệu chỉnh cho toàn bộ điểm cùng lúc.
+
+        - Đợt mưa tại một điểm được coi là "có ngập" nếu có báo cáo xác nhận trong bán kính
+          điểm đó trong khoảng [t - 1h, t + window_hours].
+        - Ngưỡng mưa: giá trị trên lưới THRESHOLD_GRID_MM có ít phân loại sai nhất
+          (đợt có ngập dưới ngưỡng + đợt không ngập trên ngưỡng).
+        - Độ sâu / thời gian ngập: hồi quy tuyến tính theo lượng mưa, tính tại ngưỡng mới.
+        """
+        n_points = len(obs['point_ids'])
+        if n_points == 0:
+            return []
+
+        # ============ 1. GHÉP ĐỢT MƯA VÀ BÁO CÁO VỚI ĐIỂM ============
+        rain_radius = np.maximum(obs['point_radius'], obs['rain_radius_m'])
+        ev_point, ev_obs = _match_points(
+            obs['point_lat'], obs['point_lon'], rain_radius, obs['rain_lat'], obs['rain_lon']
+        )
+        rp_point, rp_obs = _match_points(
+            obs['point_lat'], obs['point_lon'], obs['point_radius'], obs['report_lat'], obs['report_lon']
+        )
+        du_point, du_obs = _match_points(
+            obs['point_lat'], obs['point_lon'], obs['point_radius'], obs['duration_lat'], obs['duration_lon']
+        )
+
+        ev_rain = obs['rain_mm'][ev_obs]
+        ev_time = obs['rain_time'][ev_obs]
+        rp_time = obs['report_time'][rp_obs]
+        rp_depth = obs['report_depth'][rp_obs]
+
+        # ============ 2. XÁC NHẬN ĐỢT MƯA BẰNG BÁO CÁO (searchsorted theo khóa điểm+thời gian) ============
+        t0 = min(
+            ev_time.min() if len(ev_time) else 0,
+            rp_time.min() if len(rp_time) else 0
+        )
+        stride = np.int64(10 ** 10)
+        rp_key = rp_point.astype(np.int64) * stride + (rp_time - t0)
+        order = np.argsort(rp_key, kind='stable')
+        rp_key = rp_key[order]
+        depth_cumsum = np.concatenate([[0.0], np.cumsum(rp_depth[order])])
+
+        ev_base = ev_point.astype(np.int64) * stride + (ev_time - t0)
+        lo = np.searchsorted(rp_key, ev_base - 3600, side='left')
+        hi = np.searchsorted(rp_key, ev_base + int(window_hours * 3600), side='right')
+        ev_reports = hi - lo
+        confirmed = ev_reports > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ev_depth = np.where(confirmed, (depth_cumsum[hi] - depth_cumsum[lo]) / ev_reports, np.nan)
+
+        event_count = np.bincount(ev_point, minlength=n_points)
+        confirmed_count = np.bincount(ev_point, weights=confirmed, minlength=n_points).astype(int)
+        report_count = np.bincount(rp_point, minlength=n_points)
+
+        # ============ 3. NGƯỠNG MƯA TỐI ƯU ============
+        grid = THRESHOLD_GRID_MM
+        n_grid = len(grid)
+        # b = số ngưỡng ứng viên <= lượng mưa, tức đợt mưa vượt ngưỡng T_k khi k < b
+        bins = np.searchsorted(grid, ev_rain, side='right')
+        pos_hist = np.zeros((n_points, n_grid + 1))
+        neg_hist = np.zeros((n_points, n_grid + 1))
+        np.add.at(pos_hist, (ev_point[confirmed], bins[confirmed]), 1)
+        np.add.at(neg_hist, (ev_point[~confirmed], bins[~confirmed]), 1)
+
+        pos_below = np.cumsum(pos_hist, axis=1)[:, :n_grid]                # có ngập nhưng dưới ngưỡng
+        neg_above = neg_hist.sum(axis=1, keepdims=True) - np.cumsum(neg_hist, axis=1)[:, :n_grid]  # kích hoạt sai
+        errors = pos_below + neg_above
+        # Khi hòa, ưu tiên ngưỡng gần giá trị hiện tại
+        tie_break = np.abs(grid[None, :] - obs['current_threshold'][:, None]) * 1e-6
+        best = np.argmin(errors + tie_break, axis=1)
+        proposed_threshold = grid[best]
+        min_errors = errors[np.arange(n_points), best]
+
+        neg_total = neg_hist.sum(axis=1)
+        current_bins = np.searchsorted(grid, obs['current_threshold'], side='left')
+        current_bins = np.clip(current_bins, 0, n_grid - 1)
+        false_now = neg_above[np.arange(n_points), current_bins]
+        false_new = neg_above[np.arange(n_points), best]
+
+        # ============ 4. HỒI QUY ĐỘ SÂU VÀ THỜI GIAN NGẬP ============
+        depth_n, depth_a, depth_b, depth_r2, depth_mean = _grouped_ols(
+            ev_point[confirmed], ev_rain[confirmed], ev_depth[confirmed], n_points
+        )
+        depth_b = np.maximum(depth_b, 0)
+        proposed_depth = np.where(
+            np.isnan(depth_b),
+            np.where(depth_n > 0, depth_mean, obs['current_depth']),
+            depth_a + depth_b * proposed_threshold
+        )
+
+        dur_n, dur_a, dur_b, dur_r2, dur_mean = _grouped_ols(
+            du_point, obs['duration_rain'][du_obs], obs['duration_hours'][du_obs], n_points
+        )
+        dur_b = np.maximum(dur_b, 0)
+        proposed_duration = np.where(
+            np.isnan(dur_b),
+            np.where(dur_n > 0, dur_mean, obs['current_duration']),
+            dur_a + dur_b * proposed_threshold
+        )
+
+        proposed_depth = np.clip(np.nan_to_num(proposed_depth, nan=30.0), 1, 300)
+        proposed_duration = np.clip(np.nan_to_num(proposed_duration, nan=2.0), 0.1, 72)
+
+        # ============ 5. ĐỘ TIN CẬY ============
+        with np.errstate(divide='ignore', invalid='ignore'):
+            accuracy = np.where(event_count > 0, 1 - min_errors / event_count, 0.0)
+        support = 1 - np.exp(-event_count / 10.0)
+        evidence = 1 - np.exp(-confirmed_count / 5.0)
+        confidence = np.clip(accuracy * support * (0.5 + 0.5 * evidence), 0, 1)
+
+        results = []
+        for i in np.nonzero(event_count >= min_events)[0]:
+            results.append({
+                'fixed_flooding_id': int(obs['point_ids'][i]),
+                'current_threshold_mm': float(obs['current_threshold'][i]),
+                'current_depth_cm': float(obs['current_depth'][i]),
+                'current_duration_hours': float(obs['current_duration'][i]),
+                'proposed_threshold_mm': round(float(proposed_threshold[i]), 1),
+                'proposed_depth_cm': round(float(proposed_depth[i]), 1),
+                'proposed_duration_hours': round(float(proposed_duration[i]), 1),
+                'confidence': round(float(confidence[i]), 3),
+                'event_count': int(event_count[i]),
+                'confirmed_count': int(confirmed_count[i]),
+                'report_count': int(report_count[i]),
+                'metrics': {
+                    'misclassified_events': int(min_errors[i]),
+                    'false_activations_current': int(false_now[i]),
+                    'false_activations_proposed': int(false_new[i]),
+                    'unconfirmed_events': int(neg_total[i]),
+                    'depth_slope_cm_per_mm': None if np.isnan(depth_b[i]) else round(float(depth_b[i]), 3),
+                    'depth_r2': round(float(depth_r2[i]), 3),
+                    'duration_slope_h_per_mm': None if np.isnan(dur_b[i]) else round(float(dur_b[i]), 3),
+                    'duration_r2': round(float(dur_r2[i]), 3),
+                    'duration_samples': int(dur_n[i]),
+                    'window_hours': window_hours,
+                }
+            })
+        return results
+
+    @staticmethod
+    def run(since_days=365, window_hours=6, min_events=3, rain_radius_m=2000, dry_run=False):
+        """Chạy toàn bộ quy trình hiệu chỉnh và ghi đề xuất để admin duyệt"""
+        try:
+            since = timezone.now() - timedelta(days=since_days) if since_days else None
+            obs = ThresholdCalibrationService.collect_observations(since, rain_radius_m)
+            logger.info(
+                "📊 Hiệu chỉnh: %s điểm, %s đợt mưa, %s báo cáo xác nhận",
+                len(obs['point_ids']), len(obs['rain_mm']), len(obs['report_depth'])
+            )
+
+            results = ThresholdCalibrationService.fit(obs, window_hours, min_events)
+            if dry_run or not results:
+                return results
+
+            with transaction.atomic():
+                # Đề xuất cũ chưa duyệt của cùng điểm bị thay thế
+                FixedFloodingCalibration.objects.filter(
+                    status='pending',
+                    fixed_flooding_id__in=[r['fixed_flooding_id'] for r in results]
+                ).update(status='superseded')
+                FixedFloodingCalibration.objects.bulk_create(
+                    [FixedFloodingCalibration(**r) for r in results],
+                    batch_size=500
+                )
+            return results
+
+        except Exception as e:
+            logger.exception("❌ Lỗi hiệu chỉnh ngưỡng: %s", e)
+            return []
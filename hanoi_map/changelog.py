@@ -0,0 +1,179 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import FixedFlooding, FloodChangeLog, FloodReport, FloodZone
+from .services import FloodDataService
+from .txids import rows_after, snapshot_xmin
+
+logger = logging.getLogger(__name__)
+
+# Số dòng nhật ký tối đa xử lý trong một lần gọi API
+CHANGES_PAGE_SIZE = getattr(settings, 'FLOOD_CHANGES_PAGE_SIZE', 5000)
+# Giữ nhật ký trong N ngày; client cũ hơn phải tải lại toàn bộ
+CHANGELOG_RETENTION_DAYS = getattr(settings, 'FLOOD_CHANGELOG_RETENTION_DAYS', 7)
+
+# entity -> (model, khóa trong response, queryset hiển thị trên bản đồ, phép chiếu .values() theo zoom,
+#            hàm tạo Feature, tiền tố id)
+CHANGE_ENTITIES = {
+    'zone': (FloodZone, 'flood_zones', lambda qs: qs.filter(is_active=True),
+             FloodDataService.zone_rows, FloodDataService.zone_feature, 'zone'),
+    'report': (FloodReport, 'flood_reports', lambda qs: qs.filter(status='verified', is_active=True),
+               lambda qs, zoom=None: FloodDataService.report_rows(qs), FloodDataService.report_feature, 'report'),
+    'fixed': (FixedFlooding, 'fixed_floodings', lambda qs: qs,
+              lambda qs, zoom=None: FloodDataService.fixed_flooding_rows(qs),
+              FloodDataService.fixed_flooding_feature, 'fixed'),
+}
+MODEL_ENTITIES = {model: entity for entity, (model, *_rest) in CHANGE_ENTITIES.items()}
+
+
+def record_changes(entity, object_ids, action='upsert'):
+    """Ghi nhật ký cho thao tác hàng loạt (queryset.update, bulk_create) vốn không gọi signal"""
+    rows = [FloodChangeLog(entity=entity, object_id=object_id, action=action) for object_id in object_ids]
+    if rows:
+        FloodChangeLog.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+@receiver(post_save, sender=FloodZone)
+@receiver(post_save, sender=FloodReport)
+@receiver(post_save, sender=FixedFlooding)
+def log_flood_change(sender, instance, **kwargs):
+    FloodChangeLog.objects.create(entity=MODEL_ENTITIES[sender], object_id=instance.pk)
+
+
+@receiver(post_delete, sender=FloodZone)
+@receiver(post_delete, sender=FloodReport)
+@receiver(post_delete, sender=FixedFlooding)
+def log_flood_delete(sender, instance, **kwargs):
+    FloodChangeLog.objects.create(entity=MODEL_ENTITIES[sender], object_id=instance.pk, action='delete')
+
+
+class FloodChangeService:
+    """
+    Service đồng bộ tăng dần dữ liệu ngập theo cursor.
+    Cursor là txid: mọi transaction có mã <= cursor đã kết thúc và đã được đọc. Chỉ đọc tới
+    snapshot_xmin() (transaction nhỏ nhất còn chạy) nên transaction dài commit muộn vẫn được nhận.
+    """
+
+    # Cursor gửi cho client dạng "t<txid>"; cursor cũ (theo id) không có tiền tố nên client phải tải lại
+    CURSOR_PREFIX = 't'
+
+    @staticmethod
+    def format_cursor(txid):
+        return f"{FloodChangeService.CURSOR_PREFIX}{txid}"
+
+    @staticmethod
+    def parse_cursor(value):
+        """txid từ cursor của client, None nếu cursor theo định dạng cũ; ValueError nếu không hợp lệ"""
+        if not value.startswith(FloodChangeService.CURSOR_PREFIX):
+            int(value)
+            return None
+        return int(value[len(FloodChangeService.CURSOR_PREFIX):])
+
+    @staticmethod
+    def current_cursor():
+        """Cursor hiện tại, lấy TRƯỚC khi đọc dữ liệu đầy đủ để client không bỏ sót thay đổi"""
+        return snapshot_xmin() - 1
+
+    @staticmethod
+    def compaction_floor():
+        """txid lớn nhất đã bị xóa khi nén; client có cursor nhỏ hơn phải tải lại toàn bộ"""
+        return FloodChangeLog.objects.filter(entity='checkpoint').aggregate(
+            floor=Max('object_id')
+        )['floor'] or 0
+
+    @staticmethod
+    def entries_after(since, entities=None, limit=CHANGES_PAGE_SIZE):
+        """
+        Các dòng nhật ký (entity, object_id) của transaction đã kết thúc sau cursor `since`.
+        Trả về (entries, cursor mới, has_more), xem txids.rows_after.
+        """
+        queryset = FloodChangeLog.objects.exclude(entity='checkpoint')
+        if entities is not None:
+            queryset = queryset.filter(entity__in=entities)
+        rows, cursor, has_more = rows_after(queryset, since, ('entity', 'object_id'), limit)
+        return [(entity, object_id) for _txid, entity, object_id in rows], cursor, has_more
+
+    @staticmethod
+    def get_changes(since, limit=CHANGES_PAGE_SIZE, zoom=None):
+        """
+        Các đối tượng đã thêm/sửa/xóa sau cursor `since` (txid, None nếu client gửi cursor cũ; hình học
+        điểm ngập theo mức zoom). Đối tượng không còn hiển thị (vùng ngập tắt, báo cáo chưa xác nhận
+        hoặc hết hiệu lực, bị xóa) nằm trong 'removed'.
+        """
+        try:
+            if since is None or since < FloodChangeService.compaction_floor():
+                return {
+                    'success': True,
+                    'reset': True,
+                    'cursor': FloodChangeService.format_cursor(FloodChangeService.current_cursor()),
+                    'changes': {},
+                    'removed': {},
+                    'has_more': False,
+                }
+
+            entries, cursor, has_more = FloodChangeService.entries_after(since, limit=limit)
+
+            changed_ids = {entity: set() for entity in CHANGE_ENTITIES}
+            for entity, object_id in entries:
+                changed_ids[entity].add(object_id)
+
+            changes = {}
+            removed = {}
+            for entity, ids in changed_ids.items():
+                model, key, visible, to_rows, to_feature, prefix = CHANGE_ENTITIES[entity]
+                changes[key] = []
+                removed[key] = []
+                if not ids:
+                    continue
+                found = set()
+                for row in to_rows(visible(model.objects.filter(pk__in=ids)), zoom):
+                    changes[key].append(to_feature(row))
+                    found.add(row['id'])
+                removed[key] = [f"{prefix}_{object_id}" for object_id in sorted(ids - found)]
+
+            return {
+                'success': True,
+                'reset': False,
+                'cursor': FloodChangeService.format_cursor(cursor),
+                'changes': changes,
+                'removed': removed,
+                'has_more': has_more,
+            }
+
+        except Exception as e:
+            logger.exception("❌ Lỗi get_changes: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @staticmethod
+    def compact(retention_days=CHANGELOG_RETENTION_DAYS):
+        """
+        Nén nhật ký:
+          1. Với mỗi đối tượng chỉ giữ dòng mới nhất (client vẫn nhận được vì txid mới nhất > cursor của họ).
+          2. Xóa dòng cũ hơn retention_days và ghi mốc checkpoint (txid) để client cũ biết phải tải lại.
+        """
+        latest_ids = FloodChangeLog.objects.exclude(entity='checkpoint').order_by(
+            'entity', 'object_id', '-txid', '-id'
+        ).distinct('entity', 'object_id').values('id')
+        collapsed, _ = FloodChangeLog.objects.exclude(entity='checkpoint').exclude(
+            id__in=Subquery(latest_ids)
+        ).delete()
+
+        floor = FloodChangeLog.objects.exclude(entity='checkpoint').filter(
+            created_at__lt=timezone.now() - timedelta(days=retention_days)
+        ).aggregate(floor=Max('txid'))['floor']
+        removed = 0
+        if floor:
+            removed, _ = FloodChangeLog.objects.exclude(entity='checkpoint').filter(txid__lte=floor).delete()
+            FloodChangeLog.objects.filter(entity='checkpoint').delete()
+            FloodChangeLog.objects.create(entity='checkpoint', object_id=floor)
+
+        return {'collapsed': collapsed, 'expired': removed, 'floor': floor or FloodChangeService.compaction_floor()}
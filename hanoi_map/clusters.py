@@ -0,0 +1,263 @@
+import math
+import threading
+import time
+from django.conf import settings
+
+from .changelog import FloodChangeService
+from .models import FixedFlooding, FloodReport
+
+# Zoom thấp nhất / cao nhất còn gom cụm; zoom lớn hơn trả về từng điểm
+CLUSTER_MIN_ZOOM = getattr(settings, 'FLOOD_CLUSTER_MIN_ZOOM', 8)
+CLUSTER_MAX_ZOOM = getattr(settings, 'FLOOD_CLUSTER_MAX_ZOOM', 16)
+# Kích thước ô lưới tính theo pixel màn hình (tile 256px)
+CLUSTER_RADIUS_PX = getattr(settings, 'FLOOD_CLUSTER_RADIUS_PX', 60)
+# Kiểm tra nhật ký thay đổi tối đa một lần sau mỗi N giây
+CLUSTER_REFRESH_SECONDS = getattr(settings, 'FLOOD_CLUSTER_REFRESH_SECONDS', 2)
+
+CLUSTER_KINDS = ('report', 'fixed')
+
+# Thang mức độ chung cho báo cáo và điểm ngập cố định
+SEVERITY_LEVELS = ['light', 'medium', 'heavy', 'severe']
+SEVERITY_RANK = {
+    'light': 1, 'medium': 2, 'heavy': 3, 'severe': 4,          # FloodReport
+    'low': 1, 'high': 3, 'very_high': 4,                       # FixedFlooding
+}
+
+
+def _project(lat, lng):
+    """Tọa độ Web Mercator chuẩn hóa về [0, 1] (giống tile của Leaflet)"""
+    sin_lat = math.sin(math.radians(max(min(lat, 85.0511), -85.0511)))
+    x = (lng + 180) / 360
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def _cell_scale(zoom):
+    """Số ô lưới trên một cạnh bản đồ thế giới ở mức zoom"""
+    return 256 * (2 ** zoom) / CLUSTER_RADIUS_PX
+
+
+class ClusterPoint:
+    __slots__ = ('kind', 'id', 'lat', 'lng', 'x', 'y', 'depth', 'rank', 'active')
+
+    def __init__(self, kind, object_id, lat, lng, depth, severity, active=True):
+        self.kind = kind
+        self.id = object_id
+        self.lat = lat
+        self.lng = lng
+        self.x, self.y = _project(lat, lng)
+        self.depth = depth or 0
+        self.rank = SEVERITY_RANK.get(severity, 0)
+        self.active = active
+
+
+class Cell:
+    """Một ô lưới: giữ các điểm thành viên, thống kê được tính lại khi có thay đổi"""
+
+    __slots__ = ('members', '_summary')
+
+    def __init__(self):
+        self.members = {}
+        self._summary = None
+
+    def add(self, point):
+        self.members[(point.kind, point.id)] = point
+        self._summary = None
+
+    def remove(self, key):
+        self.members.pop(key, None)
+        self._summary = None
+
+    def summary(self):
+        if self._summary is None:
+            points = self.members.values()
+            count = len(self.members)
+            self._summary = {
+                'lat': sum(point.lat for point in points) / count,
+                'lng': sum(point.lng for point in points) / count,
+                'count': count,
+                'reports': sum(1 for point in points if point.kind == 'report'),
+                'fixed': sum(1 for point in points if point.kind == 'fixed'),
+                'active': sum(1 for point in points if point.active),
+                'max_depth': max(point.depth for point in points),
+                'rank': max(point.rank for point in points),
+            }
+        return self._summary
+
+
+class ClusterIndex:
+    """
+    Chỉ mục lưới phân cấp trong bộ nhớ: mỗi loại điểm (báo cáo đã xác nhận, điểm ngập cố định)
+    có một lưới cho mỗi mức zoom. Cập nhật tăng dần theo FloodChangeLog nên nhận được cả thay đổi
+    từ process khác và từ thao tác hàng loạt.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._points = {}
+        self._grids = {}
+        self._cursor = None
+        self._checked_at = 0.0
+
+    # ---------- cập nhật ----------
+
+    def _cells_for(self, point):
+        for zoom in range(CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM + 1):
+            scale = _cell_scale(zoom)
+            yield self._grids[(point.kind, zoom)], (int(point.x * scale), int(point.y * scale))
+
+    def _remove(self, key):
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        for grid, cell_key in self._cells_for(point):
+            cell = grid.get(cell_key)
+            if cell is not None:
+                cell.remove(key)
+                if not cell.members:
+                    del grid[cell_key]
+
+    def _add(self, point):
+        key = (point.kind, point.id)
+        self._remove(key)
+        self._points[key] = point
+        for grid, cell_key in self._cells_for(point):
+            grid.setdefault(cell_key, Cell()).add(point)
+
+    @staticmethod
+    def _load_points(kind, ids=None):
+        """Đọc điểm hiển thị (ids=None: toàn bộ)"""
+        if kind == 'report':
+            queryset = FloodReport.objects.filter(status='verified', is_active=True)
+            if ids is not None:
+                queryset = queryset.filter(pk__in=ids)
+            for row in queryset.values('id', 'location', 'water_depth', 'severity').iterator(chunk_size=2000):
+                yield ClusterPoint('report', row['id'], row['location'].y, row['location'].x,
+                                   row['water_depth'], row['severity'])
+        else:
+            queryset = FixedFlooding.objects.all()
+            if ids is not None:
+                queryset = queryset.filter(pk__in=ids)
+            for row in queryset.values(
+                'id', 'location', 'predicted_depth_cm', 'severity', 'is_active'
+            ).iterator(chunk_size=2000):
+                yield ClusterPoint('fixed', row['id'], row['location'].y, row['location'].x,
+                                   row['predicted_depth_cm'], row['severity'], row['is_active'])
+
+    def rebuild(self):
+        with self._lock:
+            # Cursor lấy TRƯỚC khi đọc dữ liệu để không bỏ sót thay đổi xảy ra trong lúc đọc
+            cursor = FloodChangeService.current_cursor()
+            self._points = {}
+            self._grids = {
+                (kind, zoom): {}
+                for kind in CLUSTER_KINDS for zoom in range(CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM + 1)
+            }
+            for kind in CLUSTER_KINDS:
+                for point in self._load_points(kind):
+                    self._add(point)
+            self._cursor = cursor
+            self._checked_at = time.monotonic()
+
+    def refresh(self, force=False):
+        """Áp dụng các thay đổi mới trong nhật ký (tối đa một lần mỗi CLUSTER_REFRESH_SECONDS)"""
+        if not force and self._cursor is not None and time.monotonic() - self._checked_at < CLUSTER_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._cursor is None or self._cursor < FloodChangeService.compaction_floor():
+                self.rebuild()
+                return
+
+            entries, cursor, has_more = FloodChangeService.entries_after(self._cursor, CLUSTER_KINDS)
+            if has_more:
+                # Thay đổi quá nhiều (import hàng loạt): dựng lại toàn bộ rẻ hơn
+                self.rebuild()
+                return
+
+            changed = {kind: set() for kind in CLUSTER_KINDS}
+            for entity, object_id in entries:
+                changed[entity].add(object_id)
+            for kind, ids in changed.items():
+                if not ids:
+                    continue
+                found = set()
+                for point in self._load_points(kind, ids):
+                    self._add(point)
+                    found.add(point.id)
+                for object_id in ids - found:
+                    self._remove((kind, object_id))
+
+            self._cursor = cursor
+            self._checked_at = time.monotonic()
+
+    # ---------- truy vấn ----------
+
+    def _cells_in_bbox(self, grid, zoom, bbox):
+        if bbox is None:
+            return list(grid.items())
+        min_lng, min_lat, max_lng, max_lat = bbox
+        scale = _cell_scale(zoom)
+        x0, y1 = _project(min_lat, min_lng)
+        x1, y0 = _project(max_lat, max_lng)
+        cx0, cx1 = int(x0 * scale), int(x1 * scale)
+        cy0, cy1 = int(y0 * scale), int(y1 * scale)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(grid):
+            return [(key, cell) for key, cell in grid.items() if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1]
+        return [
+            ((cx, cy), grid[(cx, cy)])
+            for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in grid
+        ]
+
+    def clusters(self, zoom, bbox=None, kinds=CLUSTER_KINDS):
+        """Các cụm trong bbox ở mức zoom; trên CLUSTER_MAX_ZOOM mỗi điểm là một cụm"""
+        self.refresh()
+        zoom = max(int(zoom), CLUSTER_MIN_ZOOM)
+        with self._lock:
+            if zoom > CLUSTER_MAX_ZOOM:
+                return self._single_points(bbox, kinds)
+
+            # Gộp các loại điểm cùng ô thành một cụm
+            merged = {}
+            for kind in kinds:
+                for cell_key, cell in self._cells_in_bbox(self._grids[(kind, zoom)], zoom, bbox):
+                    merged.setdefault(cell_key, []).append(cell.summary())
+
+            results = []
+            for (cx, cy), summaries in merged.items():
+                count = sum(summary['count'] for summary in summaries)
+                rank = max(summary['rank'] for summary in summaries)
+                results.append({
+                    'id': f"c{zoom}_{cx}_{cy}",
+                    'lat': round(sum(s['lat'] * s['count'] for s in summaries) / count, 6),
+                    'lng': round(sum(s['lng'] * s['count'] for s in summaries) / count, 6),
+                    'count': count,
+                    'reports': sum(summary['reports'] for summary in summaries),
+                    'fixed': sum(summary['fixed'] for summary in summaries),
+                    'active': sum(summary['active'] for summary in summaries),
+                    'max_depth': round(max(summary['max_depth'] for summary in summaries), 1),
+                    'severity': SEVERITY_LEVELS[rank - 1] if rank else None,
+                })
+            return results
+
+    def _single_points(self, bbox, kinds):
+        results = []
+        for kind in kinds:
+            for _cell_key, cell in self._cells_in_bbox(self._grids[(kind, CLUSTER_MAX_ZOOM)], CLUSTER_MAX_ZOOM, bbox):
+                for point in cell.members.values():
+                    if bbox and not (bbox[0] <= point.lng <= bbox[2] and bbox[1] <= point.lat <= bbox[3]):
+                        continue
+                    results.append({
+                        'id': f"{point.kind}_{point.id}",
+                        'lat': round(point.lat, 6),
+                        'lng': round(point.lng, 6),
+                        'count': 1,
+                        'reports': int(point.kind == 'report'),
+                        'fixed': int(point.kind == 'fixed'),
+                        'active': int(point.active),
+                        'max_depth': round(point.depth, 1),
+                        'severity': SEVERITY_LEVELS[point.rank - 1] if point.rank else None,
+                    })
+        return results
+
+
+cluster_index = ClusterIndex()
@@ -0,0 +1,108 @@
+import numpy as np
+
+# Định dạng cột (columnar) cho các lớp bản đồ, chọn qua header Accept
+COLUMNAR_MEDIA_TYPE = 'application/vnd.hanoiflood.columnar+json'
+COLUMNAR_FORMAT_VERSION = 'columnar/1'
+# Tọa độ lưu dạng số nguyên micro-độ (~0.1 m) rồi delta-encode
+COORD_SCALE = 10 ** 6
+
+
+def wants_columnar(request):
+    """Client yêu cầu định dạng cột qua Accept (hoặc ?format=columnar khi thử nghiệm)"""
+    return COLUMNAR_MEDIA_TYPE in request.headers.get('Accept', '') or request.GET.get('format') == 'columnar'
+
+
+class Column:
+    """
+    Một cột thuộc tính.
+    kind: 'plain' (mảng giá trị), 'dict' (mã hóa từ điển), 'delta' (số nguyên delta-encode),
+          'time' (epoch giây), 'round1' (số thực làm tròn 1 chữ số)
+    """
+
+    def __init__(self, name, source=None, kind='plain', transform=None):
+        self.name = name
+        self.source = source or name
+        self.kind = kind
+        self.transform = transform
+
+    def encode(self, rows):
+        values = [row[self.source] for row in rows]
+        if self.transform:
+            values = [self.transform(value) for value in values]
+
+        if self.kind == 'dict':
+            dictionary = {}
+            codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+            return {'dict': list(dictionary), 'codes': codes}
+        if self.kind == 'delta':
+            return _delta(values)
+        if self.kind == 'time':
+            return [int(value.timestamp()) if value else None for value in values]
+        if self.kind == 'round1':
+            return [round(value, 1) if value is not None else None for value in values]
+        return values
+
+
+def _delta(values):
+    array = np.asarray(values, dtype=np.int64)
+    if array.size == 0:
+        return []
+    return np.diff(array, prepend=0).tolist()
+
+
+def _scaled(coords):
+    return np.rint(np.asarray(coords, dtype=np.float64).reshape(-1, 2) * COORD_SCALE).astype(np.int64)
+
+
+def encode_points(points):
+    """Điểm: hai mảng x, y số nguyên delta-encode"""
+    if not points:
+        return {'type': 'Point', 'x': [], 'y': []}
+    xy = _scaled([point.coords[:2] for point in points])
+    return {
+        'type': 'Point',
+        'x': np.diff(xy[:, 0], prepend=0).tolist(),
+        'y': np.diff(xy[:, 1], prepend=0).tolist(),
+    }
+
+
+def encode_polygons(polygons):
+    """
+    Polygon theo bố cục GeoArrow: toàn bộ đỉnh nối liền (x, y delta-encode),
+    ring_offsets = số đỉnh tích lũy của từng vòng, geom_offsets = số vòng tích lũy của từng polygon.
+    """
+    coords = []
+    ring_offsets = [0]
+    geom_offsets = [0]
+    for polygon in polygons:
+        rings = polygon.coords if polygon is not None else ()
+        for ring in rings:
+            coords.extend(ring)
+            ring_offsets.append(len(coords))
+        geom_offsets.append(len(ring_offsets) - 1)
+
+    if not coords:
+        return {'type': 'Polygon', 'x': [], 'y': [], 'ring_offsets': ring_offsets, 'geom_offsets': geom_offsets}
+    xy = _scaled(coords)
+    return {
+        'type': 'Polygon',
+        'x': np.diff(xy[:, 0], prepend=0).tolist(),
+        'y': np.diff(xy[:, 1], prepend=0).tolist(),
+        'ring_offsets': ring_offsets,
+        'geom_offsets': geom_offsets,
+    }
+
+
+def encode_layer(rows, columns, geometry_field, geometry_type='Point'):
+    """Mã hóa một lớp (danh sách dict từ .values()) sang dạng cột"""
+    geometries = [row[geometry_field] for row in rows]
+    return {
+        'count': len(rows),
+        'geometry': encode_polygons(geometries) if geometry_type == 'Polygon' else encode_points(geometries),
+        'columns': {column.name: column.encode(rows) for column in columns},
+    }
+
+
+def choice_labels(model, *fields):
+    """Nhãn hiển thị của các field có choices, gửi một lần thay cho chuỗi *_display lặp lại ở từng feature"""
+    return {field: dict(model._meta.get_field(field).flatchoices) for field in fields}
@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Centroid
+from django.db import close_old_connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import FixedFlooding, FloodEventLog, FloodPrediction, FloodReport, FloodZone
+from .responses import dumps
+from .txids import rows_after, snapshot_xmin
+
+logger = logging.getLogger(__name__)
+
+# Số sự kiện giữ lại để client kết nối lại có thể nhận bù (Last-Event-ID)
+EVENT_BUFFER_SIZE = getattr(settings, 'FLOOD_EVENT_BUFFER_SIZE', 1000)
+# Mỗi web worker đọc sự kiện mới từ FloodEventLog sau mỗi N giây (chỉ khi có client SSE)
+EVENT_POLL_SECONDS = getattr(settings, 'FLOOD_EVENT_POLL_SECONDS', 1)
+# Giữ FloodEventLog trong N giờ (compact_changelog xóa phần cũ hơn)
+EVENT_RETENTION_HOURS = getattr(settings, 'FLOOD_EVENT_RETENTION_HOURS', 24)
+# Gửi comment giữ kết nối sau mỗi N giây không có sự kiện
+SSE_KEEPALIVE_SECONDS = getattr(settings, 'FLOOD_EVENT_KEEPALIVE_SECONDS', 15)
+# Thời gian client chờ trước khi tự kết nối lại
+SSE_RETRY_MS = 3000
+# Khi chạy WSGI mỗi stream chiếm một thread, nên đóng stream sau N giây để client kết nối lại
+SSE_WSGI_MAX_SECONDS = getattr(settings, 'FLOOD_EVENT_WSGI_MAX_SECONDS', 55)
+
+EVENT_TYPES = [
+    'zone.activated', 'zone.deactivated',
+    'fixed.activated', 'fixed.deactivated',
+    'report.verified',
+    'prediction.updated',
+    'prewarning.created',
+]
+# Sự kiện tạo thông báo cho người đăng ký theo vùng: FixedFlooding bật / tắt và báo cáo được xác nhận
+NOTIFY_EVENT_TYPES = ('fixed.activated', 'fixed.deactivated', 'report.verified')
+
+
+class FloodEvent:
+    """Một sự kiện thay đổi trạng thái ngập gửi tới client; key = (txid, id) của dòng FloodEventLog"""
+
+    def __init__(self, key, event_type, data, lat=None, lng=None, timestamp=None):
+        self.key = key
+        self.id = f"{key[0]}-{key[1]}"
+        self.type = event_type
+        self.data = data
+        self.lat = lat
+        self.lng = lng
+        self.timestamp = (timestamp or timezone.now()).isoformat()
+
+    @classmethod
+    def from_log(cls, row):
+        return cls((row.txid, row.id), row.event_type, row.data, row.lat, row.lng, row.created_at)
+
+    def matches(self, bbox=None, types=None):
+        if types and self.type.split('.')[0] not in types and self.type not in types:
+            return False
+        if bbox and self.lat is not None and self.lng is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            return min_lng <= self.lng <= max_lng and min_lat <= self.lat <= max_lat
+        return True
+
+    def to_sse(self):
+        payload = {
+            'id': self.id,
+            'type': self.type,
+            'lat': self.lat,
+            'lng': self.lng,
+            'timestamp': self.timestamp,
+            'data': self.data,
+        }
+        return f"id: {self.id}\nevent: {self.type}\ndata: {dumps(payload).decode('utf-8')}\n\n"
+
+
+def parse_event_id(event_id):
+    """'<txid>-<id>' -> (txid, id), ValueError nếu sai định dạng"""
+    txid, _, row_id = event_id.partition('-')
+    return int(txid), int(row_id)
+
+
+class EventBroker:
+    """
+    Bộ phát sự kiện của một web worker: luồng nền đọc tiếp FloodEventLog theo txid (chỉ transaction đã
+    kết thúc, như FloodChangeLog) vào ring buffer và đánh thức cả luồng đồng bộ lẫn coroutine đang chờ.
+    Sự kiện ghi từ bất kỳ process nào (worker khác, management command) đều tới client.
+    ID sự kiện '<txid>-<id>' giống nhau trên mọi worker nên client kết nối lại worker khác vẫn nhận bù được.
+    """
+
+    def __init__(self, maxlen=EVENT_BUFFER_SIZE, poll_seconds=EVENT_POLL_SECONDS):
+        self._events = deque(maxlen=maxlen)
+        self._poll_seconds = poll_seconds
+        self._cursor = None
+        self._latest = (0, 0)
+        self._condition = threading.Condition()
+        self._async_waiters = set()
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def last_id(self):
+        return f"{self._latest[0]}-{self._latest[1]}"
+
+    @property
+    def latest_key(self):
+        return self._latest
+
+    # ---------- đọc FloodEventLog ----------
+
+    def _load_recent(self):
+        """Nạp EVENT_BUFFER_SIZE sự kiện gần nhất khi khởi động để client kết nối lại nhận bù được"""
+        horizon = snapshot_xmin()
+        recent = list(
+            FloodEventLog.objects.filter(txid__lt=horizon).order_by('-txid', '-id')[:self._events.maxlen]
+        )
+        self._append([FloodEvent.from_log(row) for row in reversed(recent)])
+        self._cursor = horizon - 1
+        self._ready.set()
+
+    def _poll(self):
+        while True:
+            rows, self._cursor, has_more = rows_after(
+                FloodEventLog.objects.all(), self._cursor,
+                ('id', 'event_type', 'data', 'lat', 'lng', 'created_at'), self._events.maxlen
+            )
+            self._append([
+                FloodEvent((txid, row_id), event_type, data, lat, lng, created_at)
+                for txid, row_id, event_type, data, lat, lng, created_at in rows
+            ])
+            if not has_more:
+                return
+
+    def _run(self):
+        while True:
+            try:
+                if self._cursor is None:
+                    self._load_recent()
+                else:
+                    self._poll()
+            except Exception as e:
+                logger.warning("⚠️ Lỗi đọc FloodEventLog: %s", e)
+                close_old_connections()
+            time.sleep(self._poll_seconds)
+
+    def start(self):
+        """Bắt đầu luồng đọc sự kiện (một lần cho mỗi process, khi có client SSE đầu tiên)"""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='flood-event-poller', daemon=True)
+                self._thread.start()
+
+    def _append(self, events):
+        if not events:
+            return
+        with self._condition:
+            self._events.extend(events)
+            self._latest = events[-1].key
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+
+        for loop, flag in waiters:
+            loop.call_soon_threadsafe(flag.set)
+
+    # ---------- phía stream ----------
+
+    def resume_point(self, last_event_id):
+        """
+        Trả về (key, cần_tải_lại). Nếu ID sai định dạng hoặc cũ hơn sự kiện cũ nhất còn giữ,
+        client phải tải lại toàn bộ dữ liệu rồi tiếp tục từ sự kiện hiện tại.
+        """
+        self.start()
+        # Chờ lần nạp đầu tiên để biết sự kiện cũ nhất còn giữ
+        self._ready.wait(SSE_KEEPALIVE_SECONDS)
+        with self._condition:
+            if not last_event_id:
+                return self._latest, False
+            try:
+                key = parse_event_id(last_event_id)
+            except ValueError:
+                return self._latest, True
+
+            if self._events and key < self._events[0].key:
+                return self._latest, True
+            return key, False
+
+    def events_after(self, key, bbox=None, types=None):
+        """Các sự kiện sau key (đã lọc) và key mới nhất đã xét"""
+        with self._condition:
+            buffered = [event for event in self._events if event.key > key]
+            latest = max(key, self._latest)
+        return [event for event in buffered if event.matches(bbox, types)], latest
+
+    def wait(self, key, timeout):
+        """Chờ (đồng bộ) tới khi có sự kiện mới sau key"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._latest > key, timeout)
+
+    async def await_after(self, key, timeout):
+        """Chờ (bất đồng bộ) tới khi có sự kiện mới sau key"""
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            if self._latest > key:
+                return
+            self._async_waiters.add(entry)
+        try:
+            await asyncio.wait_for(entry[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(entry)
+
+
+broker = EventBroker()
+
+
+def publish_many(events):
+    """
+    Ghi các sự kiện (event_type, data, lat, lng) vào FloodEventLog trong transaction hiện tại: client
+    chỉ nhận được khi transaction commit, và không nhận gì nếu rollback.
+    Sự kiện thuộc NOTIFY_EVENT_TYPES được đánh dấu notify_pending để dispatch_notifications fan-out sau,
+    ngoài request đã gây ra thay đổi.
+    """
+    return FloodEventLog.objects.bulk_create(
+        [
+            FloodEventLog(event_type=event_type, data=data, lat=lat, lng=lng,
+                          notify_pending=event_type in NOTIFY_EVENT_TYPES)
+            for event_type, data, lat, lng in events
+        ],
+        batch_size=1000,
+    )
+
+
+def record_event(event_type, data, lat=None, lng=None):
+    """Ghi một sự kiện vào FloodEventLog trong transaction hiện tại (xem publish_many)"""
+    publish_many([(event_type, data, lat, lng)])
+
+
+def prune_events(retention_hours=EVENT_RETENTION_HOURS):
+    """Xóa sự kiện cũ (trừ sự kiện chưa fan-out thông báo); client có Last-Event-ID cũ hơn sẽ nhận resync"""
+    deleted, _ = FloodEventLog.objects.filter(
+        created_at__lt=timezone.now() - timedelta(hours=retention_hours), notify_pending=False
+    ).delete()
+    return deleted
+
+
+# ============ STREAM SSE ============
+
+def _opening_chunks(resync):
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    if resync:
+        # Client bỏ lỡ sự kiện: yêu cầu tải lại dữ liệu, tiếp tục từ ID hiện tại
+        yield f"id: {broker.last_id}\nevent: resync\ndata: {{}}\n\n"
+
+
+async def stream_events_async(key, bbox=None, types=None, resync=False):
+    """Generator bất đồng bộ cho ASGI: một worker giữ được nhiều kết nối"""
+    for chunk in _opening_chunks(resync):
+        yield chunk
+    while True:
+        events, key = broker.events_after(key, bbox, types)
+        for event in events:
+            yield event.to_sse()
+        await broker.await_after(key, SSE_KEEPALIVE_SECONDS)
+        if broker.latest_key <= key:
+            yield ": keepalive\n\n"
+
+
+def stream_events_sync(key, bbox=None, types=None, resync=False, max_seconds=SSE_WSGI_MAX_SECONDS):
+    """Generator đồng bộ cho WSGI, tự đóng sau max_seconds (EventSource sẽ kết nối lại với Last-Event-ID)"""
+    deadline = time.monotonic() + max_seconds
+    for chunk in _opening_chunks(resync):
+        yield chunk
+    while time.monotonic() < deadline:
+        events, key = broker.events_after(key, bbox, types)
+        for event in events:
+            yield event.to_sse()
+        broker.wait(key, min(SSE_KEEPALIVE_SECONDS, max(0, deadline - time.monotonic())))
+        if broker.latest_key <= key:
+            yield ": keepalive\n\n"
+
+
+# ============ PHÁT SỰ KIỆN TỪ SIGNAL ============
+
+def _zone_payload(zone):
+    return {
+        'id': zone['id'],
+        'name': zone['name'],
+        'district': zone['district'],
+        'zone_type': zone['zone_type'],
+        'max_depth': zone['max_depth_cm'],
+        'is_active': zone['is_active'],
+    }
+
+
+@receiver(post_save, sender=FloodZone)
+def publish_flood_zone_event(sender, instance, created, **kwargs):
+    """zone.activated / zone.deactivated khi is_active đổi (trạng thái cũ lấy từ from_db)"""
+    previous = getattr(instance, '_loaded_is_active', None)
+    instance._loaded_is_active = instance.is_active
+    if created:
+        if not instance.is_active:
+            return
+    elif previous is None or previous == instance.is_active:
+        return
+
+    centroid = instance.geometry.centroid if instance.geometry else None
+    record_event(
+        'zone.activated' if instance.is_active else 'zone.deactivated',
+        _zone_payload({
+            'id': instance.id, 'name': instance.name, 'district': instance.district,
+            'zone_type': instance.zone_type, 'max_depth_cm': instance.max_depth_cm,
+            'is_active': instance.is_active,
+        }),
+        centroid.y if centroid else None,
+        centroid.x if centroid else None,
+    )
+
+
+@receiver(post_save, sender=FixedFlooding)
+def publish_fixed_flooding_event(sender, instance, created, **kwargs):
+    """fixed.activated / fixed.deactivated, dùng _pre_is_active do fixed_flooding_pre_save ghi lại"""
+    previous = getattr(instance, '_pre_is_active', None)
+    if created:
+        if not instance.is_active:
+            return
+    elif previous is None or previous == instance.is_active:
+        return
+
+    record_event(
+        'fixed.activated' if instance.is_active else 'fixed.deactivated',
+        {
+            'id': instance.id,
+            'name': instance.name,
+            'district': instance.district,
+            'severity': instance.severity,
+            'predicted_depth': instance.predicted_depth_cm,
+            'radius_meters': instance.radius_meters,
+            'is_active': instance.is_active,
+        },
+        instance.location.y,
+        instance.location.x,
+    )
+
+
+@receiver(post_save, sender=FloodReport)
+def publish_flood_report_event(sender, instance, created, **kwargs):
+    """report.verified khi báo cáo chuyển sang trạng thái đã xác nhận"""
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if instance.status != 'verified' or (not created and previous in (None, 'verified')):
+        return
+
+    record_event(
+        'report.verified',
+        {
+            'id': instance.id,
+            'address': (instance.address or '')[:100],
+            'district': instance.district,
+            'water_depth': instance.water_depth,
+            'severity': instance.severity,
+            'flood_zone_id': instance.flood_zone_id,
+        },
+        instance.location.y,
+        instance.location.x,
+    )
+
+
+@receiver(post_save, sender=FloodPrediction)
+def publish_flood_prediction_event(sender, instance, created, **kwargs):
+    record_event(
+        'prediction.updated',
+        {
+            'id': instance.id,
+            'risk_level': instance.risk_level,
+            'valid_until': instance.valid_until,
+            'is_active': instance.is_active,
+        },
+        instance.location.y if instance.location else None,
+        instance.location.x if instance.location else None,
+    )
+
+
+# ============ PHÁT SỰ KIỆN CHO THAO TÁC HÀNG LOẠT (queryset.update không gọi signal) ============
+
+def publish_zone_status(zone_ids, is_active):
+    event_type = 'zone.activated' if is_active else 'zone.deactivated'
+    zones = FloodZone.objects.filter(pk__in=zone_ids).annotate(center=Centroid('geometry')).values(
+        'id', 'name', 'district', 'zone_type', 'max_depth_cm', 'is_active', 'center'
+    )
+    publish_many(
+        (event_type, _zone_payload(zone), zone['center'].y if zone['center'] else None,
+         zone['center'].x if zone['center'] else None)
+        for zone in zones
+    )
+
+
+def publish_prediction_status(prediction_ids):
+    predictions = FloodPrediction.objects.filter(pk__in=prediction_ids).values(
+        'id', 'risk_level', 'valid_until', 'is_active', 'location'
+    )
+    events = []
+    for prediction in predictions:
+        location = prediction.pop('location')
+        events.append(('prediction.updated', prediction,
+                       location.y if location else None, location.x if location else None))
+    publish_many(events)
+
+
+def publish_reports_verified(report_ids):
+    reports = FloodReport.objects.filter(pk__in=report_ids).values(
+        'id', 'address', 'district', 'water_depth', 'severity', 'flood_zone_id', 'location'
+    )
+    publish_many(
+        (
+            'report.verified',
+            {
+                'id': report['id'],
+                'address': (report['address'] or '')[:100],
+                'district': report['district'],
+                'water_depth': report['water_depth'],
+                'severity': report['severity'],
+                'flood_zone_id': report['flood_zone_id'],
+            },
+            report['location'].y,
+            report['location'].x,
+        )
+        for report in reports
+    )
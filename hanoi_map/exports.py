@@ -0,0 +1,291 @@
+import csv
+import io
+import logging
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.contrib import messages
+from django.db import close_old_connections
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ExportJob
+from .responses import dumps, geometry_json
+
+logger = logging.getLogger(__name__)
+
+# Số bản ghi đọc mỗi lần từ server-side cursor
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+# Vượt ngưỡng này thì xuất file ở chế độ nền thay vì trả về trực tiếp
+EXPORT_BACKGROUND_THRESHOLD = getattr(settings, 'EXPORT_BACKGROUND_THRESHOLD', 50000)
+# File xuất nền: ngoài MEDIA_ROOT (không được phục vụ công khai), chỉ tải qua view dành cho staff
+EXPORT_DIR = getattr(settings, 'EXPORT_DIR', os.path.join(settings.BASE_DIR, 'private', 'exports'))
+# Luồng xuất cập nhật heartbeat mỗi N giây; quá EXPORT_STALE_SECONDS không cập nhật thì coi như đã dừng
+EXPORT_HEARTBEAT_SECONDS = 30
+EXPORT_STALE_SECONDS = getattr(settings, 'EXPORT_STALE_SECONDS', 180)
+
+GEOJSONSEQ_RS = '\x1e'
+
+
+class Echo:
+    """Pseudo-buffer cho csv.writer: trả về dòng thay vì ghi vào bộ nhớ"""
+
+    def write(self, value):
+        return value
+
+
+class TemporaryExportFile(io.FileIO):
+    """File tạm tự xóa khi FileResponse đóng file (dùng được cả trên Windows)"""
+
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self.path = path
+
+    def close(self):
+        super().close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ExportColumn:
+    """Một cột xuất dữ liệu: tiêu đề CSV, khóa thuộc tính GeoJSON và hàm lấy giá trị"""
+
+    def __init__(self, header, key, getter):
+        self.header = header
+        self.key = key
+        self.getter = getter
+
+    def value(self, obj):
+        value = self.getter(obj)
+        return '' if value is None else value
+
+
+class ExportSpec:
+    """Cấu hình xuất dữ liệu cho một model"""
+
+    def __init__(self, filename, columns, only=None, select_related=None, geometry_field='location'):
+        self.filename = filename
+        self.columns = columns
+        self.only = only or []
+        self.select_related = select_related or []
+        self.geometry_field = geometry_field
+
+    def prepare(self, queryset):
+        """Cắt tỉa cột và nạp trước FK để không phát sinh truy vấn theo từng dòng"""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+    def iterate(self, queryset):
+        return self.prepare(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# ============ ĐỊNH DẠNG XUẤT ============
+
+def iter_csv(spec, queryset):
+    """Sinh từng dòng CSV (có BOM cho Excel)"""
+    writer = csv.writer(Echo())
+    yield '\ufeff'
+    yield writer.writerow([column.header for column in spec.columns])
+    for obj in spec.iterate(queryset):
+        yield writer.writerow([column.value(obj) for column in spec.columns])
+
+
+def iter_geojsonseq(spec, queryset):
+    """Sinh từng Feature theo chuẩn GeoJSON Text Sequences (RFC 8142)"""
+    for obj in spec.iterate(queryset):
+        geometry = getattr(obj, spec.geometry_field, None)
+        feature = {
+            'type': 'Feature',
+            'geometry': geometry_json(geometry),
+            'properties': {column.key: column.value(obj) for column in spec.columns},
+        }
+        yield GEOJSONSEQ_RS + dumps(feature).decode('utf-8') + '\n'
+
+
+def _gpkg_geometry(geometry):
+    """Geometry blob của GeoPackage: header 'GP' + WKB (little-endian, không có envelope)"""
+    return b'GP' + struct.pack('<BBi', 0, 0b00000001, geometry.srid or 4326) + bytes(geometry.wkb)
+
+
+def write_geopackage(path, spec, queryset, layer_name=None, geometry_type='POINT'):
+    """Ghi GeoPackage tối giản (SQLite) theo từng lô, không giữ toàn bộ dữ liệu trong bộ nhớ"""
+    layer_name = layer_name or spec.filename
+    columns = [column.key for column in spec.columns]
+
+    db = sqlite3.connect(path)
+    try:
+        db.execute("PRAGMA application_id = 1196444487")  # 'GPKG'
+        db.execute("PRAGMA user_version = 10200")
+        db.executescript("""
+            CREATE TABLE gpkg_spatial_ref_sys (
+                srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+                organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT
+            );
+            CREATE TABLE gpkg_contents (
+                table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+                description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER
+            );
+            CREATE TABLE gpkg_geometry_columns (
+                table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+                srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+                CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name)
+            );
+        """)
+        db.executemany("INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", [
+            ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+            ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None),
+            ('WGS 84 geodetic', 4326, 'EPSG', 4326,
+             'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+             'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]]', None),
+        ])
+        column_sql = ', '.join(f'"{name}" TEXT' for name in columns)
+        db.execute(f'CREATE TABLE "{layer_name}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom BLOB, {column_sql})')
+        db.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'features', ?, 4326)",
+                   (layer_name, layer_name))
+        db.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, 4326, 0, 0)",
+                   (layer_name, geometry_type))
+
+        quoted_columns = ', '.join(f'"{name}"' for name in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        insert_sql = f'INSERT INTO "{layer_name}" (geom, {quoted_columns}) VALUES (?, {placeholders})'
+        batch = []
+        for obj in spec.iterate(queryset):
+            geometry = getattr(obj, spec.geometry_field, None)
+            batch.append([_gpkg_geometry(geometry) if geometry else None] +
+                         [str(column.value(obj)) for column in spec.columns])
+            if len(batch) >= EXPORT_CHUNK_SIZE:
+                db.executemany(insert_sql, batch)
+                batch = []
+        if batch:
+            db.executemany(insert_sql, batch)
+        db.commit()
+    finally:
+        db.close()
+    return path
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'geojsonseq': ('application/geo+json-seq', 'geojsons'),
+    'gpkg': ('application/geopackage+sqlite3', 'gpkg'),
+}
+
+
+def _write_export_file(path, spec, queryset, export_format):
+    if export_format == 'gpkg':
+        return write_geopackage(path, spec, queryset)
+    generator = iter_csv if export_format == 'csv' else iter_geojsonseq
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in generator(spec, queryset):
+            f.write(chunk)
+    return path
+
+
+def export_path(job):
+    """File của một ExportJob: tên ngẫu nhiên theo token, ngoài MEDIA_ROOT"""
+    return os.path.join(EXPORT_DIR, f"{job.token.hex}.{EXPORT_FORMATS[job.export_format][1]}")
+
+
+def mark_interrupted_exports():
+    """Đánh dấu lỗi các job không còn cập nhật (worker khởi động lại khi đang xuất)"""
+    stale_before = timezone.now() - timedelta(seconds=EXPORT_STALE_SECONDS)
+    return ExportJob.objects.filter(status='running', heartbeat_at__lt=stale_before).update(
+        status='failed', error='Xuất dữ liệu bị gián đoạn (worker đã dừng)', finished_at=timezone.now()
+    )
+
+
+def start_background_export(spec, queryset, export_format, user=None):
+    """Xuất file trong luồng nền, trạng thái ghi vào ExportJob; trả về job"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    job = ExportJob.objects.create(
+        name=spec.filename, export_format=export_format,
+        requested_by=user if user is not None and user.is_authenticated else None,
+    )
+    path = export_path(job)
+    finished = threading.Event()
+
+    def _heartbeat():
+        while not finished.wait(EXPORT_HEARTBEAT_SECONDS):
+            ExportJob.objects.filter(pk=job.pk, status='running').update(heartbeat_at=timezone.now())
+        close_old_connections()
+
+    def _run():
+        try:
+            _write_export_file(path + '.part', spec, queryset, export_format)
+            os.replace(path + '.part', path)
+            finished.set()
+            ExportJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+            logger.info("✅ Đã xuất xong %s", path)
+        except Exception as e:
+            finished.set()
+            logger.exception("❌ Lỗi xuất dữ liệu nền: %s", e)
+            ExportJob.objects.filter(pk=job.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+            if os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=_heartbeat, name=f"export-heartbeat-{job.pk}", daemon=True).start()
+    threading.Thread(target=_run, name=f"export-{spec.filename}", daemon=True).start()
+    return job
+
+
+# ============ ADMIN MIXIN ============
+
+class StreamingExportMixin:
+    """Các action xuất CSV / GeoJSON-seq / GeoPackage dạng streaming cho ModelAdmin"""
+
+    export_spec = None
+
+    def _export(self, request, queryset, export_format):
+        spec = self.export_spec
+        content_type, extension = EXPORT_FORMATS[export_format]
+
+        if queryset.count() > EXPORT_BACKGROUND_THRESHOLD:
+            job = start_background_export(spec, queryset, export_format, request.user)
+            self.message_user(
+                request,
+                f"⏳ Dữ liệu lớn, đang xuất ở chế độ nền (theo dõi ở mục File xuất dữ liệu). "
+                f"Khi xong, tải file tại: {reverse('export_download', args=[job.token])}",
+                messages.INFO
+            )
+            return None
+
+        filename = f"{spec.filename}.{extension}"
+        if export_format == 'gpkg':
+            # GeoPackage là file SQLite nên ghi ra file tạm rồi trả về theo từng khối
+            fd, path = tempfile.mkstemp(suffix='.gpkg')
+            os.close(fd)
+            os.remove(path)
+            write_geopackage(path, spec, queryset)
+            return FileResponse(TemporaryExportFile(path), as_attachment=True, filename=filename,
+                                content_type=content_type)
+
+        generator = iter_csv if export_format == 'csv' else iter_geojsonseq
+        response = StreamingHttpResponse(generator(spec, queryset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def export_to_csv(self, request, queryset):
+        """Xuất CSV dạng streaming"""
+        return self._export(request, queryset, 'csv')
+    export_to_csv.short_description = "📊 Xuất CSV"
+
+    def export_to_geojsonseq(self, request, queryset):
+        """Xuất GeoJSON-seq dạng streaming"""
+        return self._export(request, queryset, 'geojsonseq')
+    export_to_geojsonseq.short_description = "🗺️ Xuất GeoJSON-seq"
+
+    def export_to_gpkg(self, request, queryset):
+        """Xuất GeoPackage"""
+        return self._export(request, queryset, 'gpkg')
+    export_to_gpkg.short_description = "🗺️ Xuất GeoPackage"
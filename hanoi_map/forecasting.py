@@ -0,0 +1,301 @@
+import logging
+import math
+import time
+import numpy as np
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.utils import timezone
+
+from .calibration import _match_points
+from .events import publish_prediction_status
+from .models import FixedFlooding, FloodPrediction
+from .simulation import RISK_LEVELS, risk_level_index, risk_scores
+
+logger = logging.getLogger(__name__)
+
+SRID = 4326
+# Khung lưới dự báo (min_lng, min_lat, max_lng, max_lat): nội thành Hà Nội mở rộng
+FORECAST_BBOX = getattr(settings, 'FLOOD_FORECAST_BBOX', (105.70, 20.90, 105.95, 21.15))
+FORECAST_GRID_STEP_M = getattr(settings, 'FLOOD_FORECAST_GRID_STEP_M', 1000)
+# Dự báo chạy mỗi 15 phút: mỗi lần có hiệu lực 30 phút, lần sau thay thế lần trước
+FORECAST_VALID_MINUTES = getattr(settings, 'FLOOD_FORECAST_VALID_MINUTES', 30)
+# Không tạo dòng dự đoán cho điểm / ô có rủi ro thấp hơn mức này (vẫn tính vào bước kích hoạt)
+FORECAST_MIN_RISK = getattr(settings, 'FLOOD_FORECAST_MIN_RISK', 'low')
+FORECAST_BATCH_SIZE = 1000
+
+# Bán kính kích hoạt FixedFlooding quanh một dự đoán, như FloodPrediction.check_and_activate_fixed_flooding
+ACTIVATION_RADIUS_M = 2000
+# Nguồn ghi vào flood_history khi dự báo hàng loạt bật / tắt điểm ngập. Dự báo chỉ tắt những điểm do chính
+# nó bật: điểm bật thủ công, từ WeatherService hay từ nguồn nhập giữ nguyên đến khi nguồn đó tắt
+FORECAST_ACTIVATION_SOURCE = "Dự báo hàng loạt"
+# Lượng mưa (mm/h) hệ thống thoát nước tiêu được theo khả năng thoát nước, dùng ước tính độ sâu ô lưới
+DRAINAGE_RATE_MM = {
+    'good': 40.0,
+    'average': 25.0,
+    'poor': 15.0,
+    'very_poor': 8.0,
+}
+# Giá trị mặc định khi không có dữ liệu địa hình (như predict_drainage_time_for_location)
+DEFAULT_ELEVATION_M = 5.0
+
+TARGET_SOURCES = {
+    'fixed': 'forecast_fixed',
+    'grid': 'forecast_grid',
+}
+
+
+def grid_targets(step_m=FORECAST_GRID_STEP_M, bbox=FORECAST_BBOX):
+    """Tâm các ô lưới đều (step_m mét) trong bbox"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    lat_step = step_m / 110574.0
+    lng_step = step_m / (111320.0 * math.cos(math.radians((min_lat + max_lat) / 2)))
+    lat, lon = np.meshgrid(
+        np.arange(min_lat + lat_step / 2, max_lat, lat_step),
+        np.arange(min_lng + lng_step / 2, max_lng, lng_step),
+        indexing='ij',
+    )
+    lat, lon = lat.ravel(), lon.ravel()
+    return {
+        'kind': 'grid',
+        'lat': lat,
+        'lon': lon,
+        'fixed_flooding_id': np.zeros(len(lat), dtype=np.int64),
+        'address': [f"Ô lưới {y:.4f}, {x:.4f}" for y, x in zip(lat, lon)],
+        'district': [''] * len(lat),
+        'ward': [''] * len(lat),
+        'base_depth_cm': np.full(len(lat), np.nan),
+        'threshold_mm': np.full(len(lat), np.nan),
+    }
+
+
+def fixed_flooding_targets():
+    """Các FixedFlooding đang giám sát, mỗi điểm một dự đoán"""
+    rows = list(FixedFlooding.objects.filter(is_monitored=True).order_by('id').values_list(
+        'id', 'location', 'address', 'district', 'ward', 'predicted_depth_cm', 'rainfall_threshold_mm'
+    ))
+    return {
+        'kind': 'fixed',
+        'lat': np.array([row[1].y for row in rows], dtype=float),
+        'lon': np.array([row[1].x for row in rows], dtype=float),
+        'fixed_flooding_id': np.array([row[0] for row in rows], dtype=np.int64),
+        'address': [row[2] for row in rows],
+        'district': [row[3] for row in rows],
+        'ward': [row[4] or '' for row in rows],
+        'base_depth_cm': np.array([row[5] for row in rows], dtype=float),
+        'threshold_mm': np.array([row[6] for row in rows], dtype=float),
+    }
+
+
+def predicted_depths(targets, rainfall_mm, duration_hours, drainage_capacity):
+    """
+    Điểm ngập cố định: độ sâu dự báo của điểm nhân tỷ lệ mưa / ngưỡng (tối đa 2 lần).
+    Ô lưới: phần mưa vượt khả năng thoát nước tích lũy theo thời gian mưa (mm -> cm).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fixed_depth = targets['base_depth_cm'] * np.clip(rainfall_mm / targets['threshold_mm'], 0, 2)
+    drainage_rate = np.vectorize(lambda value: DRAINAGE_RATE_MM.get(value, DRAINAGE_RATE_MM['average']),
+                                 otypes=[float])(np.asarray(drainage_capacity, dtype=object))
+    grid_depth = np.maximum(rainfall_mm - drainage_rate, 0) * duration_hours / 10.0
+    depth = np.where(np.isnan(targets['threshold_mm']), grid_depth, fixed_depth)
+    return np.round(np.nan_to_num(depth), 1)
+
+
+def _reasons(rainfall_mm, duration_hours, drainage_capacity, distance_to_river):
+    reasons = []
+    if rainfall_mm >= FloodPrediction.RAINFALL_SCORES[-1][0]:
+        reasons.append(f"Mưa {rainfall_mm:.1f} mm/h")
+    if duration_hours >= FloodPrediction.RAINFALL_DURATION_SCORES[-1][0]:
+        reasons.append(f"Mưa kéo dài {duration_hours:.1f} giờ")
+    if drainage_capacity in ('poor', 'very_poor'):
+        reasons.append("Khả năng thoát nước kém")
+    if distance_to_river < FloodPrediction.RIVER_DISTANCE_SCORES[-1][0]:
+        reasons.append(f"Gần sông ({distance_to_river:.0f} m)")
+    return reasons
+
+
+class BatchPredictionService:
+    """
+    Dự báo ngập hàng loạt cho toàn bộ điểm ngập cố định hoặc một lưới ô: chấm điểm rủi ro bằng NumPy,
+    ghi FloodPrediction bằng bulk_create và kích hoạt FixedFlooding trong một bước theo tập
+    (bulk_create không gọi handle_flood_prediction_save).
+    """
+
+    @staticmethod
+    def activation_changes(pred_lat, pred_lon, pred_rain):
+        """
+        FixedFlooding cần bật / tắt: lượng mưa dự báo lớn nhất trong ACTIVATION_RADIUS_M quanh mỗi điểm
+        so với ngưỡng. Chỉ tắt điểm có lần bật gần nhất đến từ dự báo hàng loạt.
+        Trả về (mảng điểm ngập, chỉ số cần bật, chỉ số cần tắt, cặp (điểm, dự đoán) đã ghép).
+        """
+        rows = list(FixedFlooding.objects.filter(is_monitored=True).order_by('id').values_list(
+            'id', 'location', 'rainfall_threshold_mm', 'is_active'
+        ))
+        floodings = {
+            'ids': np.array([row[0] for row in rows], dtype=np.int64),
+            'threshold': np.array([row[2] for row in rows], dtype=float),
+            'is_active': np.array([row[3] for row in rows], dtype=bool),
+        }
+        point, pred = _match_points(
+            np.array([row[1].y for row in rows], dtype=float), np.array([row[1].x for row in rows], dtype=float),
+            ACTIVATION_RADIUS_M, pred_lat, pred_lon
+        )
+        rain_at = np.full(len(rows), -1.0)
+        np.maximum.at(rain_at, point, pred_rain[pred])
+        covered = rain_at >= 0
+        floodings['rain_mm'] = rain_at
+        activate = np.nonzero(covered & (rain_at >= floodings['threshold']) & ~floodings['is_active'])[0]
+        deactivate = np.nonzero(covered & (rain_at < floodings['threshold']) & floodings['is_active'])[0]
+        if len(deactivate):
+            owned = BatchPredictionService.forecast_activated(floodings['ids'][deactivate].tolist())
+            deactivate = deactivate[np.isin(floodings['ids'][deactivate], list(owned))]
+        return floodings, activate, deactivate, (point, pred)
+
+    @staticmethod
+    def forecast_activated(ids):
+        """Trong ids, các điểm đang bật mà lần bật gần nhất trong flood_history do dự báo hàng loạt ghi"""
+        owned = set()
+        for pk, history in FixedFlooding.objects.filter(pk__in=ids, is_active=True).values_list('id', 'flood_history'):
+            last = history[-1] if history else {}
+            if last.get('action') == 'activated' and str(last.get('source', '')).startswith(FORECAST_ACTIVATION_SOURCE):
+                owned.add(pk)
+        return owned
+
+    @staticmethod
+    def _apply_activations(floodings, activate, deactivate, source):
+        """Chỉ các điểm đổi trạng thái mới đi qua activate_flood_warning (để signal tạo báo cáo / vùng ngập)"""
+        rain_by_id = dict(zip(floodings['ids'].tolist(), floodings['rain_mm'].tolist()))
+        changed_ids = floodings['ids'][np.concatenate([activate, deactivate])].tolist()
+        activated = deactivated = 0
+        owned = BatchPredictionService.forecast_activated(floodings['ids'][deactivate].tolist()) if len(deactivate) else set()
+        for flooding in FixedFlooding.objects.filter(pk__in=changed_ids):
+            if flooding.is_active and flooding.pk not in owned:
+                # Đã được nguồn khác bật lại từ lúc tính activation_changes
+                continue
+            result = flooding.activate_flood_warning(rain_by_id[flooding.pk], source)
+            if result is True:
+                activated += 1
+            elif result is False:
+                deactivated += 1
+        return activated, deactivated
+
+    @staticmethod
+    def run(rainfall_mm, duration_hours=1.0, targets='fixed', drainage_capacity='average',
+            distance_to_river=1000.0, grid_step_m=FORECAST_GRID_STEP_M, activate=True, create_zones=False,
+            dry_run=False, now=None):
+        """
+        rainfall_mm, duration_hours, drainage_capacity, distance_to_river: một giá trị cho cả thành phố
+        hoặc mảng theo từng điểm / ô. Dự đoán hàng loạt còn hiệu lực của lần chạy trước (cùng loại) bị thay thế.
+        """
+        try:
+            started = time.perf_counter()
+            now = now or timezone.now()
+            target_set = grid_targets(grid_step_m) if targets == 'grid' else fixed_flooding_targets()
+            n_targets = len(target_set['lat'])
+            source = TARGET_SOURCES[target_set['kind']]
+
+            rain = np.broadcast_to(np.asarray(rainfall_mm, dtype=float), (n_targets,))
+            duration = np.broadcast_to(np.asarray(duration_hours, dtype=float), (n_targets,))
+            drainage = np.broadcast_to(np.asarray(drainage_capacity, dtype=object), (n_targets,))
+            river = np.broadcast_to(np.asarray(distance_to_river, dtype=float), (n_targets,))
+
+            risk = risk_level_index(risk_scores(rain, duration, drainage, river))
+            depth = predicted_depths(target_set, rain, duration, drainage)
+            keep = np.nonzero(risk >= RISK_LEVELS.index(FORECAST_MIN_RISK))[0]
+
+            result = {
+                'success': True,
+                'targets': n_targets,
+                'kind': target_set['kind'],
+                'created': len(keep),
+                'risk_levels': {
+                    level: int(count) for level, count in zip(
+                        RISK_LEVELS, np.bincount(risk, minlength=len(RISK_LEVELS))
+                    )
+                },
+                'superseded': 0,
+                'activated': 0,
+                'deactivated': 0,
+                'dry_run': dry_run,
+            }
+
+            # Bước kích hoạt tính trên mọi điểm / ô (kể cả rủi ro thấp, để tắt các điểm đã hết mưa)
+            floodings = activate_idx = deactivate_idx = None
+            triggered_by = np.zeros(n_targets, dtype=np.int64)
+            if activate:
+                floodings, activate_idx, deactivate_idx, (pair_point, pair_pred) = (
+                    BatchPredictionService.activation_changes(target_set['lat'], target_set['lon'], rain)
+                )
+                # Dự đoán đã kích hoạt một điểm ngập (mưa của chính nó vượt ngưỡng điểm đó)
+                newly_active = np.zeros(len(floodings['ids']), dtype=bool)
+                newly_active[activate_idx] = True
+                hit = newly_active[pair_point] & (rain[pair_pred] >= floodings['threshold'][pair_point])
+                triggered_by[pair_pred[hit]] = floodings['ids'][pair_point[hit]]
+                result['activated'] = len(activate_idx)
+                result['deactivated'] = len(deactivate_idx)
+
+            if dry_run:
+                result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                return result
+
+            valid_until = now + timedelta(minutes=FORECAST_VALID_MINUTES)
+            predictions = []
+            for i in keep:
+                fixed_flooding_id = int(target_set['fixed_flooding_id'][i]) or int(triggered_by[i]) or None
+                predictions.append(FloodPrediction(
+                    location=Point(float(target_set['lon'][i]), float(target_set['lat'][i]), srid=SRID),
+                    address=target_set['address'][i][:300],
+                    district=target_set['district'][i],
+                    ward=target_set['ward'][i],
+                    prediction_time=now,
+                    valid_until=valid_until,
+                    risk_level=RISK_LEVELS[risk[i]],
+                    predicted_depth_cm=float(depth[i]),
+                    confidence=80.0 if target_set['kind'] == 'fixed' else 60.0,
+                    rainfall_mm=float(rain[i]),
+                    rainfall_duration_hours=float(duration[i]),
+                    elevation=DEFAULT_ELEVATION_M,
+                    distance_to_river=float(river[i]),
+                    drainage_capacity=drainage[i],
+                    reasons=_reasons(float(rain[i]), float(duration[i]), drainage[i], float(river[i])),
+                    fixed_flooding_id=fixed_flooding_id,
+                    warning_triggered=bool(triggered_by[i]),
+                    source=source,
+                ))
+
+            with transaction.atomic():
+                superseded = list(FloodPrediction.objects.filter(
+                    source=source, is_active=True
+                ).values_list('pk', flat=True))
+                FloodPrediction.objects.filter(pk__in=superseded).update(is_active=False)
+                created = FloodPrediction.objects.bulk_create(predictions, batch_size=FORECAST_BATCH_SIZE)
+                result['superseded'] = len(superseded)
+
+                if activate:
+                    result['activated'], result['deactivated'] = BatchPredictionService._apply_activations(
+                        floodings, activate_idx, deactivate_idx, f"{FORECAST_ACTIVATION_SOURCE} {now:%H:%M %d/%m}"
+                    )
+                if create_zones:
+                    result['zones'] = sum(
+                        1 for prediction in created
+                        if prediction.risk_level in ['high', 'very_high'] and prediction.create_flood_zone_from_prediction()
+                    )
+
+                # bulk_create / update không gọi signal nên tự phát sự kiện
+                publish_prediction_status(superseded + [prediction.pk for prediction in created])
+
+            result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(
+                "✅ Dự báo %s: %s dự đoán / %s %s, kích hoạt %s, tắt %s (%s ms)",
+                target_set['kind'], result['created'], n_targets, 'điểm' if target_set['kind'] == 'fixed' else 'ô',
+                result['activated'], result['deactivated'], result['elapsed_ms']
+            )
+            return result
+
+        except Exception as e:
+            logger.exception("❌ Lỗi dự báo hàng loạt: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
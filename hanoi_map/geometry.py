@@ -0,0 +1,108 @@
+from functools import lru_cache
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.geos import LinearRing, Polygon
+from django.db.models import Q
+
+SRID = 4326
+# Hệ tọa độ phẳng (mét) dùng để buffer: UTM zone 48N phủ toàn bộ Hà Nội
+METRIC_SRID = 32648
+# Số đoạn cho mỗi góc phần tư khi buffer (8 -> polygon 32 cạnh)
+BUFFER_QUAD_SEGMENTS = 8
+
+# Bán kính vùng ngập tạo tự động từ báo cáo / dự đoán, và khoảng cách gộp báo cáo vào vùng sẵn có
+REPORT_ZONE_RADIUS_M = 20
+PREDICTION_ZONE_RADIUS_M = 50
+REPORT_ZONE_MATCH_M = 50
+
+# Tọa độ gửi cho bản đồ làm tròn 5 chữ số thập phân (~1.1 m)
+COORD_PRECISION = 5
+
+# Các mức hình học đơn giản hóa của FloodZone: (zoom lớn nhất dùng mức này, tên field).
+# Sai số đơn giản hóa bằng kích thước một pixel ở zoom đó nên không thấy khác biệt trên bản đồ.
+ZONE_GEOMETRY_LEVELS = [
+    (11, 'geometry_low'),
+    (13, 'geometry_mid'),
+    (15, 'geometry_high'),
+]
+ZONE_GEOMETRY_LEVEL_FIELDS = [field for _zoom, field in ZONE_GEOMETRY_LEVELS]
+
+
+@lru_cache(maxsize=None)
+def _transform(source_srid, target_srid):
+    return CoordTransform(SpatialReference(source_srid), SpatialReference(target_srid))
+
+
+def metric_buffer(point, radius_m, quad_segments=BUFFER_QUAD_SEGMENTS):
+    """
+    Vùng tròn bán kính radius_m (mét) quanh point, buffer trong hệ tọa độ phẳng METRIC_SRID
+    rồi chuyển về WGS84. Thay cho buffer theo độ + envelope (hình vuông rộng hơn thực tế).
+    """
+    projected = point.transform(_transform(point.srid or SRID, METRIC_SRID), clone=True)
+    area = projected.buffer(radius_m, quad_segments)
+    area.transform(_transform(METRIC_SRID, SRID))
+    area.srid = SRID
+    return area
+
+
+def radius_prefilter(field, point, radius_m):
+    """
+    Lọc thô theo hộp bao (toán tử &&) của vùng tròn radius_m quanh point, để PostGIS dùng GiST index.
+    Distance(...) < radius_m không dùng được index nên luôn đặt điều kiện này trước nó.
+    """
+    return Q(**{f'{field}__bboverlaps': metric_buffer(point, radius_m)})
+
+
+def pixel_degrees(zoom):
+    """Kích thước một pixel (độ kinh tuyến) ở mức zoom, tile 256px"""
+    return 360 / (256 * 2 ** zoom)
+
+
+def geometry_field_for_zoom(zoom):
+    """Field hình học phù hợp với zoom (None hoặc zoom lớn: hình học gốc)"""
+    if zoom is None:
+        return 'geometry'
+    for max_zoom, field in ZONE_GEOMETRY_LEVELS:
+        if zoom <= max_zoom:
+            return field
+    return 'geometry'
+
+
+def _quantize_ring(ring, precision):
+    coords = []
+    for x, y in ring.coords:
+        point = (round(x, precision), round(y, precision))
+        if not coords or coords[-1] != point:
+            coords.append(point)
+    if len(coords) < 4 or coords[0] != coords[-1]:
+        return None
+    return LinearRing(coords)
+
+
+def quantize_polygon(polygon, precision=COORD_PRECISION):
+    """Làm tròn tọa độ, bỏ đỉnh trùng; None nếu polygon bị suy biến hoặc không còn hợp lệ"""
+    rings = []
+    for index, ring in enumerate(polygon):
+        quantized = _quantize_ring(ring, precision)
+        if quantized is None:
+            if index == 0:
+                return None
+            continue  # Lỗ quá nhỏ so với độ chính xác: bỏ
+        rings.append(quantized)
+    result = Polygon(*rings, srid=polygon.srid or SRID)
+    return result if result.valid else None
+
+
+def simplify_polygon(polygon, tolerance, precision=COORD_PRECISION):
+    """Đơn giản hóa (giữ topology) rồi làm tròn tọa độ; quay về polygon gốc nếu kết quả suy biến"""
+    simplified = polygon.simplify(tolerance, preserve_topology=True)
+    # Polygon nhỏ hơn sai số (ví dụ hình chữ nhật quanh một điểm) sẽ bị ép thành tam giác: giữ nguyên
+    if simplified.empty or simplified.geom_type != 'Polygon' or simplified.num_coords < 5:
+        simplified = polygon
+    return quantize_polygon(simplified, precision) or quantize_polygon(polygon, precision) or polygon
+
+
+def zone_geometry_levels(polygon):
+    """{field: hình học đơn giản hóa} cho từng mức trong ZONE_GEOMETRY_LEVELS"""
+    if polygon is None:
+        return {field: None for field in ZONE_GEOMETRY_LEVEL_FIELDS}
+    return {field: simplify_polygon(polygon, pixel_degrees(zoom)) for zoom, field in ZONE_GEOMETRY_LEVELS}
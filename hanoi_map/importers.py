@@ -0,0 +1,377 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import GEOSGeometry, Point, Polygon
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .changelog import record_changes
+from .events import publish_zone_status
+from .geometry import ZONE_GEOMETRY_LEVEL_FIELDS
+from .models import FixedFlooding, FloodReport, FloodZone
+
+logger = logging.getLogger(__name__)
+
+SRID = 4326
+
+LAT_COLUMNS = ('lat', 'latitude', 'y')
+LNG_COLUMNS = ('lng', 'lon', 'long', 'longitude', 'x')
+WKT_COLUMNS = ('wkt', 'geometry', 'geom')
+
+
+class ImportTarget:
+    """Mô tả một bảng đích: model, các trường được import và kiểu hình học"""
+
+    def __init__(self, model, fields, geometry_field, geometry_types):
+        self.model = model
+        self.fields = fields
+        self.geometry_field = geometry_field
+        self.geometry_types = geometry_types
+
+
+IMPORT_TARGETS = {
+    # Chỉ import thông số tĩnh; trạng thái vận hành (activation_count, flood_history...) giữ nguyên khi cập nhật
+    'fixed': ImportTarget(
+        FixedFlooding,
+        fields=[
+            'name', 'flood_type', 'address', 'district', 'ward', 'street', 'radius_meters',
+            'rainfall_threshold_mm', 'predicted_depth_cm', 'duration_hours', 'description',
+            'recommendations', 'is_monitored', 'is_active',
+        ],
+        geometry_field='location',
+        geometry_types=('Point',),
+    ),
+    'zone': ImportTarget(
+        FloodZone,
+        fields=[
+            'name', 'zone_type', 'district', 'ward', 'street', 'max_depth_cm', 'avg_duration_hours',
+            'flood_cause', 'description', 'solution', 'last_flood_date', 'is_active',
+        ],
+        geometry_field='geometry',
+        geometry_types=('Polygon', 'MultiPolygon'),
+    ),
+}
+
+
+# ============ ĐỌC DỮ LIỆU NGUỒN ============
+
+def read_csv(path):
+    """Đọc CSV: tọa độ từ cột lat/lng hoặc WKT"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            row = {key.strip().lower(): (value.strip() if isinstance(value, str) else value)
+                   for key, value in row.items() if key}
+            geometry = None
+            wkt = next((row.pop(c) for c in WKT_COLUMNS if row.get(c)), None)
+            lat = next((row.pop(c) for c in LAT_COLUMNS if row.get(c)), None)
+            lng = next((row.pop(c) for c in LNG_COLUMNS if row.get(c)), None)
+            if wkt:
+                geometry = GEOSGeometry(wkt, srid=SRID)
+            elif lat and lng:
+                geometry = Point(float(lng), float(lat), srid=SRID)
+            yield row, geometry
+
+
+def read_geojson(path):
+    """Đọc GeoJSON FeatureCollection"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    features = data.get('features', []) if data.get('type') == 'FeatureCollection' else [data]
+    for feature in features:
+        properties = {key.lower(): value for key, value in (feature.get('properties') or {}).items()}
+        if feature.get('id') is not None and 'external_id' not in properties:
+            properties['external_id'] = feature['id']
+        geometry = feature.get('geometry')
+        yield properties, GEOSGeometry(json.dumps(geometry), srid=SRID) if geometry else None
+
+
+def read_ogr(path, layer=None):
+    """Đọc GeoPackage (hoặc định dạng OGR khác) qua GDAL, chuyển về WGS84"""
+    source = DataSource(path)
+    ogr_layer = source[layer] if layer is not None else source[0]
+    for feature in ogr_layer:
+        properties = {field.lower(): feature.get(field) for field in feature.fields}
+        geometry = None
+        if feature.geom is not None:
+            geometry = feature.geom.geos
+            if geometry.srid and geometry.srid != SRID:
+                geometry.transform(SRID)
+            geometry.srid = SRID
+        yield properties, geometry
+
+
+def read_source(path, layer=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_csv(path)
+    if extension in ('.geojson', '.json'):
+        return read_geojson(path)
+    return read_ogr(path, layer)
+
+
+# ============ KIỂM TRA THEO SCHEMA CỦA MODEL ============
+
+def _external_id(properties, geometry, source_name):
+    """Mã định danh ổn định để import lại không tạo bản ghi trùng"""
+    value = properties.get('external_id') or properties.get('id')
+    if value not in (None, ''):
+        return f"{source_name}:{value}" if source_name else str(value)
+    digest = hashlib.sha1(f"{properties.get('name', '')}|{geometry.wkt if geometry else ''}".encode('utf-8'))
+    return f"{source_name or 'import'}:{digest.hexdigest()[:16]}"
+
+
+def build_instance(target, properties, geometry, source_name):
+    """
+    Kiểm tra một dòng dữ liệu theo định nghĩa field của model (kiểu, validators, choices).
+    Trả về (instance, danh sách field có trong nguồn) hoặc raise ValidationError.
+    """
+    errors = {}
+    values = {}
+    present = []
+
+    for name in target.fields:
+        if name not in properties:
+            continue
+        field = target.model._meta.get_field(name)
+        raw = properties[name]
+        if raw in (None, '') and (field.has_default() or field.blank):
+            continue
+        try:
+            values[name] = field.clean(raw, None)
+            present.append(name)
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    # Field bắt buộc (không có default, không được để trống)
+    for name in target.fields:
+        field = target.model._meta.get_field(name)
+        if name not in values and not field.has_default() and not field.blank and not field.null:
+            errors.setdefault(name, ['Thiếu giá trị bắt buộc'])
+
+    if geometry is None:
+        errors[target.geometry_field] = ['Thiếu tọa độ / hình học']
+    elif geometry.geom_type not in target.geometry_types:
+        errors[target.geometry_field] = [f'Kiểu hình học {geometry.geom_type} không hợp lệ']
+    elif geometry.geom_type == 'MultiPolygon':
+        if len(geometry) != 1:
+            errors[target.geometry_field] = ['MultiPolygon có nhiều phần, cần tách thành từng Polygon']
+        else:
+            geometry = Polygon(*[ring for ring in geometry[0]], srid=SRID)
+
+    if errors:
+        raise ValidationError(errors)
+
+    values[target.geometry_field] = geometry
+    values['external_id'] = _external_id(properties, geometry, source_name)
+    if target.model is FixedFlooding and 'predicted_depth_cm' in values:
+        values['severity'] = FixedFlooding.severity_for_depth(values['predicted_depth_cm'])
+    instance = target.model(**values)
+    # bulk_create không gọi save() nên tự tạo các hình học dẫn xuất
+    if target.model is FloodZone:
+        instance.build_geometry_levels()
+    else:
+        instance.build_flood_area()
+    return instance, present
+
+
+# ============ IMPORT ============
+
+class FloodPointImporter:
+    """Import hàng loạt FixedFlooding / FloodZone với upsert theo external_id"""
+
+    def __init__(self, target_name, source_name='', batch_size=1000, stdout=None, deactivate_missing=False):
+        if deactivate_missing and not source_name:
+            raise ValueError('deactivate_missing cần source_name để biết bản ghi nào thuộc bộ dữ liệu')
+        self.target = IMPORT_TARGETS[target_name]
+        self.target_name = target_name
+        self.source_name = source_name
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.deactivate_missing = deactivate_missing
+        self.errors = []
+        # Trạng thái is_active ghi trong nguồn, theo external_id (chỉ các dòng có cột is_active)
+        self.requested_active = {}
+
+    def _log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+        else:
+            logger.info("%s", message)
+
+    def validate(self, rows):
+        """Kiểm tra toàn bộ dữ liệu nguồn, trả về danh sách instance hợp lệ"""
+        instances = []
+        present_fields = set()
+        seen = set()
+        for line, (properties, geometry) in enumerate(rows, start=1):
+            try:
+                instance, present = build_instance(self.target, properties, geometry, self.source_name)
+            except (ValidationError, ValueError, TypeError) as e:
+                detail = e.message_dict if isinstance(e, ValidationError) and hasattr(e, 'error_dict') else str(e)
+                self.errors.append((line, detail))
+                continue
+            if instance.external_id in seen:
+                self.errors.append((line, f'Trùng external_id {instance.external_id}'))
+                continue
+            seen.add(instance.external_id)
+            if 'is_active' in present:
+                self.requested_active[instance.external_id] = instance.is_active
+            present_fields.update(present)
+            instances.append(instance)
+        return instances, present_fields
+
+    def upsert(self, instances, present_fields):
+        """
+        bulk_create(update_conflicts=True) theo lô; bulk_create không phát sinh signal pre_save/post_save.
+        is_active không ghi ở bước này mà đổi sau trong reconcile(), chỉ cho các dòng thực sự đổi trạng thái.
+        Trả về pk của các bản ghi vừa ghi.
+        """
+        update_fields = [name for name in self.target.fields if name in present_fields and name != 'is_active']
+        update_fields += [self.target.geometry_field, 'updated_at']
+        if self.target.model is FixedFlooding and 'predicted_depth_cm' in present_fields:
+            update_fields.append('severity')
+        if self.target.model is FloodZone:
+            update_fields += ZONE_GEOMETRY_LEVEL_FIELDS
+        else:
+            update_fields.append('flood_area')
+
+        # Bản ghi mới có is_active trong nguồn được tạo ở trạng thái tắt, bật lại (nếu cần) qua reconcile()
+        for instance in instances:
+            if instance.external_id in self.requested_active:
+                instance.is_active = False
+
+        imported_ids = []
+        for start in range(0, len(instances), self.batch_size):
+            batch = instances[start:start + self.batch_size]
+            created = self.target.model.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['external_id'],
+                update_fields=update_fields,
+            )
+            imported_ids.extend(instance.pk for instance in created)
+            self._log(f"   • Đã ghi {min(start + self.batch_size, len(instances))}/{len(instances)} bản ghi")
+        return imported_ids
+
+    def changed_activation(self, imported):
+        """(pk, is_active mới) của các bản ghi có is_active trong nguồn khác với trạng thái hiện tại"""
+        if not self.requested_active:
+            return []
+        return [
+            (pk, self.requested_active[external_id])
+            for pk, external_id, is_active in imported.values_list('pk', 'external_id', 'is_active')
+            if external_id in self.requested_active and self.requested_active[external_id] != is_active
+        ]
+
+    def reconcile(self, imported_ids):
+        """Đồng bộ một lần sau import thay cho các signal bị bỏ qua, chỉ trên các bản ghi vừa import"""
+        if self.target.model is FixedFlooding:
+            imported = FixedFlooding.objects.filter(pk__in=imported_ids)
+
+            # Liên kết FixedFlooding với FloodZone đang chứa điểm đó
+            containing_zone = FloodZone.objects.filter(
+                geometry__contains=OuterRef('location'), is_active=True
+            ).values('id')[:1]
+            linked = imported.filter(flood_zone__isnull=True).filter(
+                Exists(containing_zone)
+            ).update(flood_zone=Subquery(containing_zone))
+            self._log(f"   • Liên kết {linked} điểm với vùng ngập có sẵn")
+
+            # bulk_create không gọi signal nên tự ghi nhật ký thay đổi cho đồng bộ tăng dần
+            record_changes('fixed', imported.values_list('pk', flat=True))
+
+            # Chỉ điểm đổi trạng thái mới bật / tắt qua switch_warning: signal tạo báo cáo / vùng ngập khi bật,
+            # cập nhật báo cáo khi tắt, và ghi last_activated / activation_count / lịch sử
+            changes = dict(self.changed_activation(imported))
+            source = f"Import {self.source_name}".strip()
+            activated = deactivated = 0
+            for flooding in FixedFlooding.objects.filter(pk__in=list(changes)).order_by('pk'):
+                if flooding.switch_warning(changes[flooding.pk], source):
+                    activated += 1
+                else:
+                    deactivated += 1
+            if activated or deactivated:
+                self._log(f"   • Bật cảnh báo {activated} điểm, tắt {deactivated} điểm")
+
+        else:
+            imported_zones = FloodZone.objects.filter(pk__in=imported_ids)
+
+            # Vùng đổi trạng thái: cập nhật is_active và phát sự kiện như thao tác bật / tắt trong admin
+            changes = self.changed_activation(imported_zones)
+            for is_active in (True, False):
+                zone_ids = [pk for pk, active in changes if active is is_active]
+                if zone_ids:
+                    FloodZone.objects.filter(pk__in=zone_ids).update(is_active=is_active)
+                    publish_zone_status(zone_ids, is_active)
+
+            # Gán báo cáo đã xác nhận chưa thuộc vùng nào vào vùng vừa import
+            containing_zone = imported_zones.filter(
+                geometry__contains=OuterRef('location')
+            ).values('id')[:1]
+            unlinked_reports = FloodReport.objects.filter(
+                status='verified', flood_zone__isnull=True
+            ).filter(Exists(containing_zone))
+            linked_ids = list(unlinked_reports.values_list('pk', flat=True))
+            linked = unlinked_reports.update(flood_zone=Subquery(containing_zone))
+
+            # Tính lại report_count bằng một câu UPDATE
+            report_counts = FloodReport.objects.filter(
+                flood_zone=OuterRef('pk'), status='verified'
+            ).order_by().values('flood_zone').annotate(total=Count('id')).values('total')
+            imported_zones.update(
+                report_count=Coalesce(Subquery(report_counts, output_field=IntegerField()), Value(0))
+            )
+            self._log(f"   • Gán {linked} báo cáo vào vùng ngập vừa import")
+
+            record_changes('zone', imported_zones.values_list('pk', flat=True))
+            record_changes('report', linked_ids)
+
+    def retire_missing(self, imported_ids):
+        """
+        Bản ghi của cùng bộ dữ liệu (external_id có tiền tố source_name) không còn trong nguồn: điểm cố định
+        thôi giám sát (tắt cảnh báo nếu đang bật), vùng ngập chuyển sang không hoạt động. Bản ghi tạo tự động
+        từ báo cáo (không có external_id) hoặc thuộc bộ dữ liệu khác không bị động tới.
+        """
+        missing = self.target.model.objects.filter(
+            external_id__startswith=f"{self.source_name}:"
+        ).exclude(pk__in=imported_ids)
+
+        if self.target.model is FixedFlooding:
+            retired_ids = list(missing.filter(is_monitored=True).values_list('pk', flat=True))
+            source = f"Import {self.source_name}".strip()
+            for flooding in FixedFlooding.objects.filter(pk__in=retired_ids, is_active=True).order_by('pk'):
+                flooding.switch_warning(False, source)
+            FixedFlooding.objects.filter(pk__in=retired_ids).update(is_monitored=False)
+            record_changes('fixed', retired_ids)
+            self._log(f"   • Thôi giám sát {len(retired_ids)} điểm không còn trong nguồn")
+        else:
+            retired_ids = list(missing.filter(is_active=True).values_list('pk', flat=True))
+            FloodZone.objects.filter(pk__in=retired_ids).update(is_active=False)
+            publish_zone_status(retired_ids, False)
+            record_changes('zone', retired_ids)
+            self._log(f"   • Tắt {len(retired_ids)} vùng ngập không còn trong nguồn")
+        return retired_ids
+
+    def run(self, path, layer=None, dry_run=False):
+        try:
+            instances, present_fields = self.validate(read_source(path, layer))
+            self._log(f"📋 Hợp lệ: {len(instances)} bản ghi, lỗi: {len(self.errors)}")
+            if dry_run or not instances:
+                return len(instances)
+
+            with transaction.atomic():
+                imported_ids = self.upsert(instances, present_fields)
+                self.reconcile(imported_ids)
+                if self.deactivate_missing:
+                    self.retire_missing(imported_ids)
+            return len(instances)
+
+        except Exception as e:
+            self._log(f"❌ Lỗi import: {e}")
+            logger.exception("Lỗi import %s", self.target_name)
+            raise
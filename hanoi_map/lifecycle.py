@@ -0,0 +1,125 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, F, OuterRef, Value
+from django.utils import timezone
+
+from .changelog import record_changes
+from .events import publish_prediction_status, publish_zone_status
+from .models import FloodPrediction, FloodReport, FloodZone
+
+logger = logging.getLogger(__name__)
+
+# Giữ thêm N giờ sau thời gian ngập ước tính trước khi coi là hết hiệu lực
+EXPIRY_GRACE_HOURS = getattr(settings, 'FLOOD_EXPIRY_GRACE_HOURS', 1)
+# Số dòng tối đa trong một câu UPDATE (mỗi lô một transaction)
+EXPIRY_BATCH_SIZE = getattr(settings, 'FLOOD_EXPIRY_BATCH_SIZE', 5000)
+
+# Báo cáo sinh từ FixedFlooding tắt theo FixedFlooding (_deactivate_flood_reports), không theo thời gian
+FIXED_FLOODING_SOURCES = ['fixed_flooding_auto', 'fixed_flooding_admin']
+
+ONE_HOUR = Value(timedelta(hours=1))
+
+
+def _hours_after(field, hours_field):
+    """field + (hours_field + EXPIRY_GRACE_HOURS) giờ, tính trong database"""
+    return ExpressionWrapper(
+        F(field) + (F(hours_field) + EXPIRY_GRACE_HOURS) * ONE_HOUR,
+        output_field=DateTimeField(),
+    )
+
+
+class FloodLifecycleService:
+    """Tắt các vùng ngập / báo cáo / dự đoán đã hết hiệu lực bằng UPDATE theo tập"""
+
+    @staticmethod
+    def expired_predictions(now):
+        return FloodPrediction.objects.filter(is_active=True, valid_until__lt=now)
+
+    @staticmethod
+    def expired_reports(now):
+        # Điều kiện created_at đơn giản đứng trước để dùng được partial index floodreport_active_created_idx
+        return FloodReport.objects.filter(
+            is_active=True, created_at__lt=now - timedelta(hours=EXPIRY_GRACE_HOURS)
+        ).exclude(
+            source__in=FIXED_FLOODING_SOURCES
+        ).alias(
+            expires_at=_hours_after('created_at', 'estimated_duration_hours')
+        ).filter(expires_at__lt=now)
+
+    @staticmethod
+    def expired_zones(now):
+        """
+        Vùng tạo tự động (không có external_id) đã qua thời gian ngập trung bình kể từ báo cáo gần nhất
+        và không còn báo cáo / dự đoán nào đang hiệu lực. Vùng import từ dữ liệu gốc là điểm ngập cố định.
+        """
+        return FloodZone.objects.filter(
+            is_active=True, external_id__isnull=True,
+            last_reported_at__lt=now - timedelta(hours=EXPIRY_GRACE_HOURS)
+        ).alias(
+            expires_at=_hours_after('last_reported_at', 'avg_duration_hours')
+        ).filter(expires_at__lt=now).exclude(
+            Exists(FloodReport.objects.filter(flood_zone=OuterRef('pk'), is_active=True, status='verified'))
+        ).exclude(
+            Exists(FloodPrediction.objects.filter(flood_zone=OuterRef('pk'), is_active=True))
+        )
+
+    @staticmethod
+    def _expire(queryset, on_expired, dry_run):
+        """Tắt từng lô id lấy từ queryset; on_expired(ids) ghi nhật ký / phát sự kiện trong cùng transaction"""
+        if dry_run:
+            return queryset.count()
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(queryset.order_by().values_list('pk', flat=True)[:EXPIRY_BATCH_SIZE])
+                if not ids:
+                    break
+                total += queryset.model.objects.filter(pk__in=ids, is_active=True).update(is_active=False)
+                on_expired(ids)
+            if len(ids) < EXPIRY_BATCH_SIZE:
+                break
+        return total
+
+    @staticmethod
+    def expire(now=None, dry_run=False):
+        """
+        Thứ tự: dự đoán -> báo cáo -> vùng ngập, để vùng ngập thấy trạng thái mới của báo cáo/dự đoán.
+        queryset.update không gọi signal nên nhật ký thay đổi và sự kiện SSE được ghi ở đây.
+        """
+        try:
+            now = now or timezone.now()
+            result = {
+                'success': True,
+                'dry_run': dry_run,
+                'predictions': FloodLifecycleService._expire(
+                    FloodLifecycleService.expired_predictions(now), publish_prediction_status, dry_run
+                ),
+                'reports': FloodLifecycleService._expire(
+                    FloodLifecycleService.expired_reports(now),
+                    lambda ids: record_changes('report', ids), dry_run
+                ),
+            }
+
+            def on_zones_expired(ids):
+                record_changes('zone', ids)
+                publish_zone_status(ids, False)
+
+            result['zones'] = FloodLifecycleService._expire(
+                FloodLifecycleService.expired_zones(now), on_zones_expired, dry_run
+            )
+
+            if not dry_run and (result['predictions'] or result['reports'] or result['zones']):
+                logger.info(
+                    "✅ Hết hiệu lực: %s vùng ngập, %s báo cáo, %s dự đoán",
+                    result['zones'], result['reports'], result['predictions']
+                )
+            return result
+
+        except Exception as e:
+            logger.exception("❌ Lỗi cập nhật hết hiệu lực: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -0,0 +1,110 @@
+"""
+Logging cho hanoi_map: handler không chặn (QueueHandler + thread ghi nền), formatter JSON
+và logger lấy mẫu cho các thông điệp lặp theo từng dòng dữ liệu.
+
+Module này được nạp từ settings.LOGGING nên không import gì từ Django.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn
+    orjson = None
+
+# Thuộc tính có sẵn của LogRecord; các thuộc tính khác (truyền qua extra=) được ghi thành field JSON
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class QueueStreamHandler(QueueHandler):
+    """
+    Handler không chặn: thread xử lý request chỉ đẩy LogRecord vào queue, việc format và ghi ra
+    stream do một thread nền (QueueListener) làm. Queue đầy thì bỏ record thay vì chờ.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def setFormatter(self, fmt):
+        # Format ở thread nền, không phải ở thread gọi logger
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Queue nằm trong cùng process nên không cần format/pickle trước như QueueHandler mặc định
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi record một dòng JSON: ts, level, logger, msg, các field extra và exc nếu có"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        if orjson is not None:
+            return orjson.dumps(payload, default=str).decode('utf-8')
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SampledLogger:
+    """
+    Cho thông điệp lặp lại theo từng dòng dữ liệu (ví dụ lỗi xử lý từng vùng ngập): mỗi mẫu thông điệp
+    ghi tối đa một lần mỗi interval giây, lần ghi tiếp theo kèm số lần đã bỏ qua.
+    """
+
+    def __init__(self, logger, interval=60.0):
+        self.logger = logger
+        self.interval = interval
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._state.get(msg, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._state[msg] = (last, suppressed + 1)
+                return
+            self._state[msg] = (now, 0)
+        if suppressed:
+            msg = f"{msg} (bỏ qua {suppressed} lần tương tự)"
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
@@ -0,0 +1,290 @@
+import logging
+import threading
+import time
+import numpy as np
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .calibration import _haversine_m
+from .events import publish_many
+from .forecasting import FORECAST_BBOX, fixed_flooding_targets, predicted_depths
+from .models import FixedFlooding, FloodPreWarning
+from .services import WeatherService
+
+logger = logging.getLogger(__name__)
+
+# Cửa sổ cảnh báo sớm: 8 bước dự báo 3 giờ của OpenWeatherMap
+PREWARNING_HORIZON_HOURS = 24
+FORECAST_STEP_HOURS = 3
+# Lưới n x n trạm lấy dự báo trong FORECAST_BBOX, nội suy về từng điểm ngập (n² lời gọi API mỗi lần làm mới)
+PREWARNING_SAMPLE_GRID = getattr(settings, 'FLOOD_PREWARNING_SAMPLE_GRID', 3)
+# Làm mới mỗi giờ (refresh_prewarnings --loop 3600); dư 30 phút nếu lần làm mới sau bị chậm
+PREWARNING_VALID_MINUTES = getattr(settings, 'FLOOD_PREWARNING_VALID_MINUTES', 90)
+# Bản sao cảnh báo sớm trong process phục vụ API, đọc lại từ database sau khoảng này
+PREWARNING_CACHE_SECONDS = getattr(settings, 'FLOOD_PREWARNING_CACHE_SECONDS', 60)
+IDW_POWER = 2
+
+
+def sample_stations(n=PREWARNING_SAMPLE_GRID, bbox=FORECAST_BBOX):
+    """Tọa độ (lat, lon) các trạm lấy dự báo: lưới đều n x n phủ bbox"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    lat, lon = np.meshgrid(np.linspace(min_lat, max_lat, n), np.linspace(min_lng, max_lng, n), indexing='ij')
+    return lat.ravel(), lon.ravel()
+
+
+def _forecast_epoch(value):
+    """dt_txt của OpenWeatherMap (giờ UTC) -> epoch giây"""
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=dt_timezone.utc).timestamp()
+
+
+def forecast_matrix(station_lat, station_lon, weather=None):
+    """
+    Dự báo mưa tại các trạm. Trả về (thời điểm epoch [bước], mưa mm/h [trạm, bước], trạm có dữ liệu).
+    Trạm trả về dữ liệu demo (is_fallback) bị bỏ vì không phải dự báo thật.
+    """
+    weather = weather or WeatherService()
+    times = None
+    rows = []
+    ok = np.zeros(len(station_lat), dtype=bool)
+    for i, (lat, lon) in enumerate(zip(station_lat, station_lon)):
+        data = weather.get_forecast(float(lat), float(lon)) or {}
+        forecasts = data.get('forecasts') or []
+        if data.get('is_fallback') or not forecasts:
+            continue
+        step_times = np.array([_forecast_epoch(forecast['datetime']) for forecast in forecasts])
+        # Lượng mưa 3 giờ -> cường độ mm/h, cùng đơn vị với rainfall_threshold_mm
+        rain = np.array([forecast.get('rain') or 0 for forecast in forecasts], dtype=float) / FORECAST_STEP_HOURS
+        if times is None:
+            times = step_times
+        rows.append(np.interp(times, step_times, rain))
+        ok[i] = True
+
+    if times is None:
+        return np.empty(0), np.empty((0, 0)), ok
+    return times, np.vstack(rows), ok
+
+
+def interpolate_rain(point_lat, point_lon, station_lat, station_lon, station_rain):
+    """Nội suy nghịch đảo khoảng cách (IDW) mưa các trạm về từng điểm: [điểm, bước]"""
+    dist = _haversine_m(point_lat[:, None], point_lon[:, None], station_lat[None, :], station_lon[None, :])
+    weights = 1.0 / np.maximum(dist, 1.0) ** IDW_POWER
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights @ station_rain
+
+
+def threshold_crossings(times, rain, threshold):
+    """
+    rain [điểm, bước] (mm/h), threshold [điểm]. Trả về các mảng theo điểm:
+    crossed, crossing_at (nội suy tuyến tính giữa hai bước dự báo), peak_rain, peak_at,
+    duration_hours (số bước liên tiếp vượt ngưỡng kể từ lúc vượt).
+    """
+    n_points, n_steps = rain.shape
+    rows = np.arange(n_points)
+    steps = np.arange(n_steps)
+
+    above = rain >= threshold[:, None]
+    crossed = above.any(axis=1)
+    first = np.argmax(above, axis=1)
+    prev = np.maximum(first - 1, 0)
+
+    r0, r1 = rain[rows, prev], rain[rows, first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(r1 > r0, (threshold - r0) / (r1 - r0), 1.0)
+    fraction = np.clip(np.nan_to_num(fraction), 0, 1)
+    crossing_at = times[prev] + fraction * (times[first] - times[prev])
+
+    peak = np.argmax(rain, axis=1)
+
+    after = steps[None, :] >= first[:, None]
+    broken = np.cumsum(after & ~above, axis=1) > 0
+    consecutive = (after & above & ~broken).sum(axis=1)
+
+    return {
+        'crossed': crossed,
+        'crossing_at': crossing_at,
+        'peak_rain': rain[rows, peak],
+        'peak_at': times[peak],
+        'duration_hours': consecutive * float(FORECAST_STEP_HOURS),
+    }
+
+
+def _aware(epoch):
+    return datetime.fromtimestamp(float(epoch), tz=dt_timezone.utc)
+
+
+class _PreWarningSnapshot:
+    """Bản sao các cảnh báo sớm đang hiệu lực trong process: API chỉ lọc mảng NumPy, không truy vấn mỗi request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._data = None
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def _load(self):
+        rows = list(FloodPreWarning.objects.filter(
+            is_active=True, valid_until__gt=timezone.now()
+        ).select_related('fixed_flooding').order_by('expected_activation_at'))
+        return {
+            'lat': np.array([row.fixed_flooding.location.y for row in rows], dtype=float),
+            'lon': np.array([row.fixed_flooding.location.x for row in rows], dtype=float),
+            'valid_until': np.array([row.valid_until.timestamp() for row in rows], dtype=float),
+            'items': [PreWarningService.serialize(row) for row in rows],
+        }
+
+    def get(self):
+        with self._lock:
+            if self._data is None or time.monotonic() - self._loaded_at > PREWARNING_CACHE_SECONDS:
+                self._data = self._load()
+                self._loaded_at = time.monotonic()
+            return self._data
+
+
+snapshot = _PreWarningSnapshot()
+
+
+class PreWarningService:
+    """
+    Cảnh báo sớm theo dự báo thời tiết 24 giờ: mỗi lần làm mới lấy dự báo tại một lưới trạm nhỏ,
+    nội suy về mọi FixedFlooding và tính thời điểm vượt ngưỡng trong một lượt NumPy.
+    Kết quả lưu thành FloodPreWarning tới lần làm mới sau; API chỉ đọc lại, không gọi dự báo.
+    """
+
+    @staticmethod
+    def serialize(pre_warning):
+        flooding = pre_warning.fixed_flooding
+        return {
+            'id': pre_warning.id,
+            'fixed_flooding_id': flooding.id,
+            'name': flooding.name,
+            'address': flooding.address,
+            'district': flooding.district,
+            'lat': flooding.location.y,
+            'lng': flooding.location.x,
+            'expected_activation_at': pre_warning.expected_activation_at.isoformat(),
+            'threshold_mm': pre_warning.threshold_mm,
+            'peak_rainfall_mm': pre_warning.peak_rainfall_mm,
+            'peak_at': pre_warning.peak_at.isoformat(),
+            'expected_depth_cm': pre_warning.expected_depth_cm,
+            'expected_duration_hours': pre_warning.expected_duration_hours,
+            'forecast_time': pre_warning.forecast_time.isoformat(),
+            'valid_until': pre_warning.valid_until.isoformat(),
+        }
+
+    @staticmethod
+    def nearby(lat=None, lng=None, radius_m=5000):
+        """Cảnh báo sớm còn hiệu lực (trong bán kính nếu có tọa độ), đọc từ bản sao trong process"""
+        data = snapshot.get()
+        keep = data['valid_until'] > time.time()
+        if lat is not None and lng is not None:
+            keep &= _haversine_m(lat, lng, data['lat'], data['lon']) <= radius_m
+        return [data['items'][i] for i in np.nonzero(keep)[0]]
+
+    @staticmethod
+    def refresh(weather=None, now=None, dry_run=False):
+        """Lấy dự báo, tính cảnh báo sớm cho mọi FixedFlooding đang giám sát và thay thế lần làm mới trước"""
+        try:
+            started = time.perf_counter()
+            now = now or timezone.now()
+
+            station_lat, station_lon = sample_stations()
+            times, station_rain, ok = forecast_matrix(station_lat, station_lon, weather)
+            if not ok.any():
+                return {
+                    'success': False,
+                    'error': 'Không có dự báo thời tiết thật (API lỗi hoặc chưa cấu hình OPENWEATHER_API_KEY)'
+                }
+
+            # Chỉ giữ các bước trong 24 giờ tới (và bước ngay trước để nội suy thời điểm vượt ngưỡng)
+            window = times <= now.timestamp() + PREWARNING_HORIZON_HOURS * 3600
+            start = max(int(np.searchsorted(times, now.timestamp(), side='right')) - 1, 0)
+            window[:start] = False
+            times, station_rain = times[window], station_rain[:, window]
+            if not len(times):
+                return {'success': False, 'error': 'Dự báo thời tiết đã cũ, không còn bước nào trong 24 giờ tới'}
+
+            targets = fixed_flooding_targets()
+            active_ids = set(FixedFlooding.objects.filter(
+                is_monitored=True, is_active=True
+            ).values_list('id', flat=True))
+            already_active = np.isin(targets['fixed_flooding_id'], list(active_ids))
+
+            rain = interpolate_rain(targets['lat'], targets['lon'], station_lat[ok], station_lon[ok], station_rain)
+            crossing = threshold_crossings(times, rain, targets['threshold_mm'])
+            # Điểm đã kích hoạt thì đã có cảnh báo thật, không cần cảnh báo sớm
+            warn = np.nonzero(crossing['crossed'] & ~already_active)[0]
+            depth = predicted_depths(targets, crossing['peak_rain'], crossing['duration_hours'], 'average')
+
+            valid_until = now + timedelta(minutes=PREWARNING_VALID_MINUTES)
+            pre_warnings = [
+                FloodPreWarning(
+                    fixed_flooding_id=int(targets['fixed_flooding_id'][i]),
+                    forecast_time=now,
+                    expected_activation_at=max(_aware(crossing['crossing_at'][i]), now),
+                    threshold_mm=float(targets['threshold_mm'][i]),
+                    peak_rainfall_mm=round(float(crossing['peak_rain'][i]), 1),
+                    peak_at=_aware(crossing['peak_at'][i]),
+                    expected_depth_cm=float(depth[i]),
+                    expected_duration_hours=float(crossing['duration_hours'][i]),
+                    valid_until=valid_until,
+                )
+                for i in warn
+            ]
+
+            result = {
+                'success': True,
+                'stations': int(ok.sum()),
+                'steps': len(times),
+                'points': len(targets['lat']),
+                'created': len(pre_warnings),
+                'superseded': 0,
+                'new': 0,
+                'dry_run': dry_run,
+            }
+            if dry_run:
+                result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                return result
+
+            with transaction.atomic():
+                previous = FloodPreWarning.objects.filter(is_active=True)
+                warned_before = set(previous.values_list('fixed_flooding_id', flat=True))
+                result['superseded'] = previous.update(is_active=False)
+                created = FloodPreWarning.objects.bulk_create(pre_warnings)
+
+                # Chỉ báo cho client các điểm mới có cảnh báo sớm (điểm đã báo ở lần trước chỉ được cập nhật)
+                events = [
+                    (
+                        'prewarning.created',
+                        {
+                            'id': pre_warning.id,
+                            'fixed_flooding_id': pre_warning.fixed_flooding_id,
+                            'expected_activation_at': pre_warning.expected_activation_at.isoformat(),
+                            'expected_depth_cm': pre_warning.expected_depth_cm,
+                        },
+                        float(targets['lat'][i]), float(targets['lon'][i])
+                    )
+                    for pre_warning, i in zip(created, warn)
+                    if pre_warning.fixed_flooding_id not in warned_before
+                ]
+                publish_many(events)
+                result['new'] = len(events)
+                transaction.on_commit(snapshot.invalidate)
+
+            result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(
+                "✅ Cảnh báo sớm: %s/%s điểm dự kiến vượt ngưỡng trong %s giờ (%s mới, %s trạm, %s ms)",
+                result['created'], result['points'], PREWARNING_HORIZON_HOURS, result['new'],
+                result['stations'], result['elapsed_ms']
+            )
+            return result
+
+        except Exception as e:
+            logger.exception("❌ Lỗi làm mới cảnh báo sớm: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from hanoi_map.geometry import ZONE_GEOMETRY_LEVEL_FIELDS
+from hanoi_map.models import FloodZone
+
+
+class Command(BaseCommand):
+    help = 'Tạo các mức hình học đơn giản hóa của FloodZone (dữ liệu cũ hoặc sau khi đổi ZONE_GEOMETRY_LEVELS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Tạo lại cho mọi điểm ngập (mặc định chỉ những điểm còn thiếu)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        zones = FloodZone.objects.only('id', 'geometry', *ZONE_GEOMETRY_LEVEL_FIELDS).order_by('id')
+        if not options['all']:
+            missing = Q()
+            for field in ZONE_GEOMETRY_LEVEL_FIELDS:
+                missing |= Q(**{f'{field}__isnull': True})
+            zones = zones.filter(missing)
+
+        total = zones.count()
+        self.stdout.write(f"🔄 Đơn giản hóa hình học cho {total} điểm ngập...")
+
+        batch = []
+        done = 0
+        for zone in zones.iterator(chunk_size=options['batch_size']):
+            zone.build_geometry_levels()
+            batch.append(zone)
+            if len(batch) >= options['batch_size']:
+                FloodZone.objects.bulk_update(batch, ZONE_GEOMETRY_LEVEL_FIELDS)
+                done += len(batch)
+                batch = []
+                self.stdout.write(f"   • {done}/{total}")
+        if batch:
+            FloodZone.objects.bulk_update(batch, ZONE_GEOMETRY_LEVEL_FIELDS)
+            done += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Đã cập nhật {done} điểm ngập"))
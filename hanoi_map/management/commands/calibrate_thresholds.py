@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from hanoi_map.calibration import ThresholdCalibrationService
+
+
+class Command(BaseCommand):
+    help = 'Hiệu chỉnh ngưỡng mưa, độ sâu và thời gian ngập của FixedFlooding từ dữ liệu lịch sử'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since-days', type=int, default=365,
+                            help='Chỉ dùng dữ liệu trong N ngày gần nhất (0 = toàn bộ)')
+        parser.add_argument('--window-hours', type=float, default=6,
+                            help='Khoảng thời gian sau đợt mưa để tìm báo cáo xác nhận')
+        parser.add_argument('--min-events', type=int, default=3,
+                            help='Số đợt mưa tối thiểu để đưa ra đề xuất')
+        parser.add_argument('--rain-radius', type=float, default=2000,
+                            help='Bán kính (m) ghép lượng mưa ghi nhận với điểm ngập')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ in kết quả, không ghi đề xuất')
+
+    def handle(self, *args, **options):
+        self.stdout.write("🔄 Đang hiệu chỉnh ngưỡng FixedFlooding...")
+
+        results = ThresholdCalibrationService.run(
+            since_days=options['since_days'],
+            window_hours=options['window_hours'],
+            min_events=options['min_events'],
+            rain_radius_m=options['rain_radius'],
+            dry_run=options['dry_run'],
+        )
+
+        if not results:
+            self.stdout.write("ℹ️ Không đủ dữ liệu để đề xuất hiệu chỉnh")
+            return
+
+        for result in sorted(results, key=lambda r: -r['confidence'])[:20]:
+            self.stdout.write(
+                f"   #{result['fixed_flooding_id']}: "
+                f"{result['current_threshold_mm']} → {result['proposed_threshold_mm']} mm/h, "
+                f"{result['current_depth_cm']} → {result['proposed_depth_cm']} cm, "
+                f"{result['current_duration_hours']} → {result['proposed_duration_hours']} giờ "
+                f"(tin cậy {result['confidence']:.0%}, {result['event_count']} đợt mưa)"
+            )
+
+        false_now = sum(r['metrics']['false_activations_current'] for r in results)
+        false_new = sum(r['metrics']['false_activations_proposed'] for r in results)
+        action = "Đã tính" if options['dry_run'] else "Đã ghi"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {action} {len(results)} đề xuất hiệu chỉnh. "
+            f"Kích hoạt sai: {false_now} → {false_new}"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from hanoi_map.changelog import CHANGELOG_RETENTION_DAYS, FloodChangeService
+from hanoi_map.events import EVENT_RETENTION_HOURS, prune_events
+
+
+class Command(BaseCommand):
+    help = 'Nén nhật ký thay đổi dùng cho /api/flood-data/changes/ và xóa sự kiện realtime cũ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=CHANGELOG_RETENTION_DAYS,
+                            help='Xóa nhật ký cũ hơn N ngày (client cũ hơn sẽ phải tải lại toàn bộ)')
+        parser.add_argument('--event-retention-hours', type=int, default=EVENT_RETENTION_HOURS,
+                            help='Xóa sự kiện realtime (FloodEventLog) cũ hơn N giờ')
+
+    def handle(self, *args, **options):
+        self.stdout.write("🔄 Đang nén nhật ký thay đổi...")
+
+        result = FloodChangeService.compact(options['retention_days'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Gộp {result['collapsed']} dòng trùng, xóa {result['expired']} dòng hết hạn "
+            f"(mốc tải lại: {result['floor']})"
+        ))
+
+        pruned = prune_events(options['event_retention_hours'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Xóa {pruned} sự kiện realtime cũ"))
@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+
+from hanoi_map.notifications import NOTIFY_DISPATCH_BATCH, NOTIFY_FANOUT_BATCH, NotificationService
+
+
+class Command(BaseCommand):
+    help = 'Tạo thông báo từ sự kiện mới và gửi các thông báo đang chờ tới webhook / email / file của người đăng ký theo vùng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=NOTIFY_DISPATCH_BATCH, help='Số thông báo mỗi lô')
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Chạy lặp lại sau mỗi N giây, ví dụ 10 (0: chạy một lần)')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = {'fanned_out': 0, 'processed': 0, 'sent': 0, 'retry': 0, 'failed': 0}
+            # Chạy liên tục khi còn đầy lô sự kiện / thông báo; thông báo lỗi chờ lần chạy sau mới thử lại
+            while True:
+                result = NotificationService.dispatch(options['batch'])
+                if not result['success']:
+                    self.stdout.write(self.style.ERROR(f"❌ {result['error']}"))
+                    break
+                for key in totals:
+                    totals[key] += result[key]
+                more_events = result['fanned_out'] >= NOTIFY_FANOUT_BATCH
+                more_notifications = result['processed'] >= options['batch'] and result['sent']
+                if not more_events and not more_notifications:
+                    break
+
+            if totals['fanned_out']:
+                self.stdout.write(f"🔔 Đã tạo thông báo cho {totals['fanned_out']} sự kiện")
+            if totals['processed']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Đã gửi {totals['sent']}/{totals['processed']} thông báo "
+                    f"(thử lại {totals['retry']}, lỗi {totals['failed']})"
+                ))
+            elif not options['loop']:
+                self.stdout.write("📭 Không có thông báo chờ gửi")
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
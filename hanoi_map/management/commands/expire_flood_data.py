@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+
+from hanoi_map.lifecycle import FloodLifecycleService
+
+
+class Command(BaseCommand):
+    help = 'Tắt các vùng ngập, báo cáo và dự đoán đã hết hiệu lực'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ đếm, không ghi database')
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Chạy lặp lại sau mỗi N giây (0: chạy một lần)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.stdout.write("🔄 Đang kiểm tra dữ liệu hết hiệu lực...")
+            result = FloodLifecycleService.expire(dry_run=options['dry_run'])
+
+            if not result['success']:
+                self.stdout.write(self.style.ERROR(f"❌ {result['error']}"))
+            else:
+                prefix = "🧪 [dry-run] " if result['dry_run'] else "✅ "
+                self.stdout.write(self.style.SUCCESS(
+                    f"{prefix}Hết hiệu lực: {result['zones']} vùng ngập, {result['reports']} báo cáo, "
+                    f"{result['predictions']} dự đoán"
+                ))
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
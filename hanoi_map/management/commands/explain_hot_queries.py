@@ -0,0 +1,113 @@
+from datetime import timedelta
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Left
+from django.utils import timezone
+
+from hanoi_map.geometry import radius_prefilter
+from hanoi_map.lifecycle import FloodLifecycleService
+from hanoi_map.models import FixedFlooding, FloodPrediction, FloodReport, FloodZone
+from hanoi_map.services import FloodDataService
+
+SRID = 4326
+# Trung tâm Hà Nội (Hồ Gươm)
+DEFAULT_LAT = 21.0285
+DEFAULT_LNG = 105.8542
+
+
+def hot_queries(point, radius_m):
+    """(tên, queryset) cho các đường truy vấn nóng, dựng giống hệt code trong services / views"""
+    now = timezone.now()
+    return [
+        ('zones_near_point', FloodZone.objects.annotate(
+            distance=Distance('geometry', point)
+        ).filter(
+            radius_prefilter('geometry', point, radius_m),
+            distance__lt=radius_m,
+            is_active=True
+        ).order_by('distance')[:5]),
+        ('verified_reports_24h_near_point', FloodReport.objects.annotate(
+            distance=Distance('location', point)
+        ).filter(
+            radius_prefilter('location', point, radius_m),
+            distance__lt=radius_m,
+            status='verified',
+            created_at__gte=now - timedelta(hours=24)
+        ).order_by('-created_at')[:10]),
+        ('monitored_fixed_floodings_10km', FixedFlooding.objects.annotate(
+            distance=Distance('location', point)
+        ).filter(
+            radius_prefilter('location', point, 10000),
+            distance__lt=10000,
+            is_monitored=True
+        )),
+        ('active_fixed_flooding_alerts', FixedFlooding.objects.annotate(
+            distance=Distance('location', point)
+        ).filter(
+            radius_prefilter('location', point, 5000),
+            distance__lt=5000,
+            is_active=True
+        ).order_by('-severity')),
+        ('recent_reports_api', FloodReport.objects.filter(
+            status='verified',
+            created_at__gte=now - timedelta(hours=24)
+        ).order_by('-created_at').annotate(
+            short_description=Left('description', 100)
+        ).values(
+            'id', 'location', 'address', 'water_depth', 'severity', 'created_at',
+            'reporter_name', 'photo_url', 'short_description'
+        )[:10]),
+        ('active_drainage_predictions', FloodPrediction.objects.filter(
+            is_active=True
+        ).order_by('-prediction_time').values(
+            'id', 'address', 'district', 'current_depth_cm', 'predicted_depth_cm',
+            'estimated_drainage_time_hours', 'risk_level', 'flood_report_id'
+        )[:20]),
+        ('map_zones', FloodDataService.zone_rows(FloodZone.objects.filter(is_active=True), 12)),
+        ('map_reports', FloodDataService.report_rows(
+            FloodReport.objects.filter(status='verified', is_active=True).order_by('-created_at')
+        )),
+        ('expire_reports', FloodLifecycleService.expired_reports(now).values_list('pk', flat=True)),
+        ('expire_zones', FloodLifecycleService.expired_zones(now).values_list('pk', flat=True)),
+        ('expire_predictions', FloodLifecycleService.expired_predictions(now).values_list('pk', flat=True)),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'In EXPLAIN (ANALYZE) cho các truy vấn nóng để phát hiện truy vấn không còn dùng index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lat', type=float, default=DEFAULT_LAT)
+        parser.add_argument('--lng', type=float, default=DEFAULT_LNG)
+        parser.add_argument('--radius', type=int, default=1000, help='Bán kính tìm kiếm (mét)')
+        parser.add_argument('--only', nargs='*', help='Chỉ giải thích các truy vấn có tên này')
+        parser.add_argument('--no-analyze', action='store_true',
+                            help='Chỉ EXPLAIN, không thực thi truy vấn (an toàn trên production)')
+
+    def handle(self, *args, **options):
+        point = Point(options['lng'], options['lat'], srid=SRID)
+        queries = hot_queries(point, options['radius'])
+
+        if options['only']:
+            unknown = set(options['only']) - {name for name, _queryset in queries}
+            if unknown:
+                raise CommandError(f"Không có truy vấn: {', '.join(sorted(unknown))}")
+            queries = [(name, queryset) for name, queryset in queries if name in options['only']]
+
+        explain_options = {} if options['no_analyze'] else {'analyze': True, 'buffers': True}
+        seq_scans = []
+        for name, queryset in queries:
+            plan = queryset.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"━━ {name}"))
+            self.stdout.write(plan)
+            self.stdout.write("")
+            if 'Seq Scan' in plan:
+                seq_scans.append(name)
+
+        if seq_scans:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ Có Seq Scan (kiểm tra lại index nếu bảng đã lớn): {', '.join(seq_scans)}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {len(queries)} truy vấn đều dùng index"))
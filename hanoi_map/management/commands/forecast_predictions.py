@@ -0,0 +1,73 @@
+import time
+from django.core.management.base import BaseCommand
+
+from hanoi_map.forecasting import FORECAST_GRID_STEP_M, BatchPredictionService
+from hanoi_map.services import WeatherService
+
+# Trung tâm Hà Nội (Hồ Gươm): điểm lấy dự báo thời tiết cho cả thành phố
+CITY_LAT = 21.0285
+CITY_LNG = 105.8542
+
+
+def forecast_rainfall():
+    """(mm/h, số giờ mưa) từ dự báo 3 giờ/lần của OpenWeatherMap cho trung tâm thành phố"""
+    forecasts = WeatherService().get_forecast(CITY_LAT, CITY_LNG).get('forecasts', [])
+    wet_slots = 0
+    for forecast in forecasts:
+        if not forecast.get('rain'):
+            break
+        wet_slots += 1
+    rain_3h = forecasts[0].get('rain', 0) if forecasts else 0
+    return rain_3h / 3.0, max(wet_slots * 3.0, 1.0)
+
+
+class Command(BaseCommand):
+    help = 'Tạo dự báo ngập hàng loạt cho điểm ngập cố định / lưới và kích hoạt FixedFlooding theo tập'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', choices=['fixed', 'grid', 'all'], default='fixed')
+        parser.add_argument('--rain', type=float, default=None,
+                            help='Lượng mưa dự báo (mm/h); bỏ trống để lấy từ dự báo thời tiết')
+        parser.add_argument('--duration', type=float, default=None, help='Thời gian mưa dự báo (giờ)')
+        parser.add_argument('--drainage', choices=['good', 'average', 'poor', 'very_poor'], default='average')
+        parser.add_argument('--river', type=float, default=1000, help='Khoảng cách tới sông (m)')
+        parser.add_argument('--grid-step', type=float, default=FORECAST_GRID_STEP_M, help='Cạnh ô lưới (m)')
+        parser.add_argument('--no-activate', action='store_true', help='Không bật / tắt FixedFlooding')
+        parser.add_argument('--create-zones', action='store_true',
+                            help='Tạo vùng ngập cho dự đoán rủi ro cao (như khi lưu từng dự đoán)')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ tính, không ghi database')
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Chạy lặp lại sau mỗi N giây, ví dụ 900 cho 15 phút (0: chạy một lần)')
+
+    def handle(self, *args, **options):
+        kinds = ['fixed', 'grid'] if options['targets'] == 'all' else [options['targets']]
+        while True:
+            rain, duration = options['rain'], options['duration']
+            if rain is None:
+                rain, forecast_duration = forecast_rainfall()
+                duration = duration or forecast_duration
+            duration = duration or 1.0
+            self.stdout.write(f"🌧️ Dự báo hàng loạt: mưa {rain:.1f} mm/h trong {duration:.1f} giờ...")
+
+            for kind in kinds:
+                result = BatchPredictionService.run(
+                    rain, duration, targets=kind, drainage_capacity=options['drainage'],
+                    distance_to_river=options['river'], grid_step_m=options['grid_step'],
+                    activate=not options['no_activate'], create_zones=options['create_zones'],
+                    dry_run=options['dry_run'],
+                )
+                if not result['success']:
+                    self.stdout.write(self.style.ERROR(f"❌ {result['error']}"))
+                    continue
+
+                prefix = "🧪 [dry-run] " if result['dry_run'] else "✅ "
+                risk = ', '.join(f"{level}={count}" for level, count in result['risk_levels'].items() if count)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{prefix}{kind}: {result['created']}/{result['targets']} dự đoán ({risk}), "
+                    f"thay thế {result['superseded']}, kích hoạt {result['activated']}, tắt {result['deactivated']} "
+                    f"FixedFlooding trong {result['elapsed_ms']:.0f} ms"
+                ))
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
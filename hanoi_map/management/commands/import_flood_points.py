@@ -0,0 +1,49 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+
+from hanoi_map.importers import IMPORT_TARGETS, FloodPointImporter
+
+
+class Command(BaseCommand):
+    help = 'Import hàng loạt điểm ngập cố định / vùng ngập từ CSV, GeoJSON hoặc GeoPackage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Đường dẫn file CSV / GeoJSON / GeoPackage')
+        parser.add_argument('--target', choices=sorted(IMPORT_TARGETS), default='fixed',
+                            help='fixed = FixedFlooding, zone = FloodZone')
+        parser.add_argument('--layer', default=None,
+                            help='Tên lớp dữ liệu trong GeoPackage (mặc định lớp đầu tiên)')
+        parser.add_argument('--source', default='',
+                            help='Tiền tố external_id, ví dụ tên bộ dữ liệu')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Số bản ghi mỗi lô bulk_create')
+        parser.add_argument('--deactivate-missing', action='store_true',
+                            help='Tắt các bản ghi cùng --source không còn trong file (bộ dữ liệu đầy đủ)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ kiểm tra dữ liệu, không ghi vào database')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Không tìm thấy file: {path}")
+        if options['deactivate_missing'] and not options['source']:
+            raise CommandError("--deactivate-missing cần --source để biết bản ghi nào thuộc bộ dữ liệu")
+
+        self.stdout.write(f"🔄 Đang import {path} vào {IMPORT_TARGETS[options['target']].model.__name__}...")
+
+        importer = FloodPointImporter(
+            options['target'],
+            source_name=options['source'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+            deactivate_missing=options['deactivate_missing'],
+        )
+        count = importer.run(path, layer=options['layer'], dry_run=options['dry_run'])
+
+        for line, detail in importer.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"   ⚠️ Dòng {line}: {detail}"))
+        if len(importer.errors) > 20:
+            self.stdout.write(f"   ... và {len(importer.errors) - 20} lỗi khác")
+
+        action = "Hợp lệ" if options['dry_run'] else "Đã import"
+        self.stdout.write(self.style.SUCCESS(f"✅ {action} {count} bản ghi, bỏ qua {len(importer.errors)} dòng lỗi"))
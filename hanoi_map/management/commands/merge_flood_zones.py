@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+
+from hanoi_map.merging import ZONE_MERGE_DISTANCE_M, FloodZoneMergeService
+
+
+class Command(BaseCommand):
+    help = 'Gộp các điểm ngập đang hoạt động bị chồng lấn hoặc nằm sát nhau'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--distance', type=float, default=ZONE_MERGE_DISTANCE_M,
+                            help='Gộp các vùng cách nhau không quá N mét')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ thống kê, không ghi database')
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Chạy lặp lại sau mỗi N giây (0: chạy một lần)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.stdout.write(f"🔄 Tìm các điểm ngập cách nhau ≤ {options['distance']:g}m...")
+            result = FloodZoneMergeService.merge(options['distance'], options['dry_run'])
+
+            if not result['success']:
+                self.stdout.write(self.style.ERROR(f"❌ {result['error']}"))
+            else:
+                prefix = "🧪 [dry-run] " if result['dry_run'] else "✅ "
+                self.stdout.write(self.style.SUCCESS(
+                    f"{prefix}{result['groups']} nhóm, gộp {result['retired']} điểm ngập"
+                ))
+                for model_name, count in result['moved'].items():
+                    if count:
+                        self.stdout.write(f"   • {model_name}: chuyển {count} bản ghi")
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+
+from hanoi_map.lookahead import PREWARNING_HORIZON_HOURS, PreWarningService
+
+
+class Command(BaseCommand):
+    help = 'Làm mới cảnh báo sớm: điểm ngập cố định dự kiến vượt ngưỡng mưa trong 24 giờ tới theo dự báo thời tiết'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ tính, không ghi database')
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Chạy lặp lại sau mỗi N giây, ví dụ 3600 cho mỗi giờ (0: chạy một lần)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.stdout.write(f"🌦️ Lấy dự báo {PREWARNING_HORIZON_HOURS} giờ tới và tính cảnh báo sớm...")
+            result = PreWarningService.refresh(dry_run=options['dry_run'])
+
+            if result['success']:
+                prefix = "🧪 [dry-run] " if result['dry_run'] else "✅ "
+                self.stdout.write(self.style.SUCCESS(
+                    f"{prefix}{result['created']}/{result['points']} điểm dự kiến vượt ngưỡng "
+                    f"({result['new']} mới, thay thế {result['superseded']}), "
+                    f"{result['stations']} trạm x {result['steps']} bước dự báo trong {result['elapsed_ms']:.0f} ms"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ {result['error']}"))
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
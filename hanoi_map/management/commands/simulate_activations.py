@@ -0,0 +1,92 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+from hanoi_map.simulation import RAIN_RADIUS_M, ActivationSimulationService, rainfall_series
+
+
+def _threshold_override(value):
+    try:
+        flooding_id, threshold = value.split('=', 1)
+        return int(flooding_id), float(threshold)
+    except ValueError:
+        raise CommandError(f"--threshold phải có dạng ID=MM, nhận được: {value}")
+
+
+class Command(BaseCommand):
+    help = 'Mô phỏng kích hoạt FixedFlooding theo chuỗi lượng mưa (không ghi database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help='File CSV: time, rainfall_mm [, lat, lon, duration_hours]')
+        parser.add_argument('--replay-days', type=int, default=365,
+                            help='Không có --csv: phát lại lượng mưa đã ghi nhận trong N ngày gần nhất')
+        parser.add_argument('--threshold', action='append', default=[], metavar='ID=MM',
+                            help='Thử ngưỡng mới cho một điểm (lặp lại được)')
+        parser.add_argument('--calibration', action='store_true',
+                            help='Thử các ngưỡng đề xuất hiệu chỉnh đang chờ duyệt')
+        parser.add_argument('--ids', nargs='*', type=int, help='Chỉ mô phỏng các FixedFlooding này')
+        parser.add_argument('--initial-active', action='store_true',
+                            help='Bắt đầu từ trạng thái kích hoạt hiện tại')
+        parser.add_argument('--radius', type=float, default=RAIN_RADIUS_M,
+                            help='Bán kính (m) ảnh hưởng của lượng mưa đo tại trạm')
+        parser.add_argument('--output', help='Ghi toàn bộ kết quả (dòng thời gian, sự kiện) ra file JSON')
+
+    def _summary(self, label, result):
+        risk = ', '.join(f"{level}={count}" for level, count in result['risk_levels'].items() if count)
+        self.stdout.write(
+            f"{label}: {result['activations']} lần kích hoạt, {result['points_activated']}/{result['points']} điểm, "
+            f"tối đa {result['peak_active']} điểm cùng lúc ({result['peak_at']}); rủi ro: {risk or '-'}"
+        )
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            with open(options['csv'], encoding='utf-8', newline='') as f:
+                series = rainfall_series(csv.DictReader(f))
+            source = options['csv']
+        else:
+            series = ActivationSimulationService.recorded_season(options['replay_days'])
+            source = f"lượng mưa ghi nhận {options['replay_days']} ngày"
+
+        if not len(series['time']):
+            raise CommandError(f"Không có dữ liệu mưa ({source})")
+        mode = 'theo trạm' if 'lat' in series else 'toàn thành phố'
+        self.stdout.write(f"🌧️ Mô phỏng với {len(series['time'])} bước mưa {mode} ({source})...")
+
+        thresholds = dict(_threshold_override(value) for value in options['threshold'])
+        kwargs = {
+            'only_ids': options['ids'],
+            'initial_active': options['initial_active'],
+            'radius_m': options['radius'],
+        }
+
+        if thresholds or options['calibration']:
+            result = ActivationSimulationService.compare(
+                series, thresholds=thresholds, use_calibration=options['calibration'], **kwargs
+            )
+            if not result['success']:
+                raise CommandError(result['error'])
+            self._summary("   Ngưỡng hiện tại", result['baseline'])
+            self._summary("   Ngưỡng đề xuất ", result['candidate'])
+            for change in sorted(result['changes'], key=lambda c: -abs(c['proposed_activations'] - c['activations']))[:20]:
+                self.stdout.write(
+                    f"   #{change['fixed_flooding_id']}: {change['threshold_mm']} → {change['proposed_threshold_mm']} mm/h, "
+                    f"kích hoạt {change['activations']} → {change['proposed_activations']}"
+                )
+            elapsed = result['baseline']['elapsed_ms'] + result['candidate']['elapsed_ms']
+        else:
+            result = ActivationSimulationService.simulate(series, **kwargs)
+            if not result['success']:
+                raise CommandError(result['error'])
+            self._summary("   Kết quả", result)
+            for row in result['per_point'][:10]:
+                self.stdout.write(
+                    f"   #{row['fixed_flooding_id']} (ngưỡng {row['threshold_mm']} mm/h): "
+                    f"{row['activations']} lần, {row['active_hours']} giờ kích hoạt"
+                )
+            elapsed = result['elapsed_ms']
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Mô phỏng xong trong {elapsed:.0f} ms (không ghi database)"))
@@ -0,0 +1,248 @@
+import logging
+import math
+import numpy as np
+import shapely
+from django.contrib.gis.geos import GEOSGeometry
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .changelog import record_changes
+from .events import publish_zone_status
+from .models import FixedFlooding, FloodHistory, FloodPrediction, FloodReport, FloodZone
+
+logger = logging.getLogger(__name__)
+
+SRID = 4326
+
+# Hai vùng ngập cách nhau dưới N mét được coi là cùng một điểm nóng
+ZONE_MERGE_DISTANCE_M = 30
+# Vùng sau khi gộp dài / rộng quá N mét thì không gộp (tránh một chuỗi vùng nối nhau thành một vùng khổng lồ)
+ZONE_MERGE_MAX_EXTENT_M = 1000
+# Loại ngập giữ lại khi gộp: loại nghiêm trọng hơn đứng trước
+ZONE_TYPE_PRIORITY = ['black', 'frequent', 'tide', 'seasonal', 'rain']
+# Số điều kiện When tối đa trong một câu UPDATE ... CASE
+REPOINT_BATCH_SIZE = 500
+
+# Các cột của vùng cần để lập kế hoạch gộp (đọc lại khi khóa để so với kế hoạch)
+MERGE_FIELDS = (
+    'id', 'geometry', 'zone_type', 'max_depth_cm', 'avg_duration_hours',
+    'report_count', 'last_reported_at', 'last_flood_date',
+)
+
+# Bảng và khóa ngoại trỏ tới FloodZone cần chuyển sang vùng giữ lại
+ZONE_REFERENCES = [
+    (FloodReport, 'flood_zone_id'),
+    (FixedFlooding, 'flood_zone_id'),
+    (FloodPrediction, 'flood_zone_id'),
+    (FloodHistory, 'related_zone_id'),
+]
+
+
+def _metric_scale(latitudes):
+    """Hệ số đổi độ sang mét (phép chiếu chữ nhật cục bộ, đủ chính xác trong phạm vi một thành phố)"""
+    lat0 = math.radians(float(np.mean(latitudes))) if len(latitudes) else 0.0
+    return np.array([111320.0 * math.cos(lat0), 110574.0])
+
+
+def _union_find_groups(count, pairs):
+    """Gom chỉ số thành các nhóm liên thông từ danh sách cặp (union-find, nén đường đi)"""
+    parent = list(range(count))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for left, right in zip(*pairs):
+        root_left, root_right = find(int(left)), find(int(right))
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+
+    groups = {}
+    for index in range(count):
+        groups.setdefault(find(index), []).append(index)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _merge_pieces(shapes, distance_m, max_extent_m=ZONE_MERGE_MAX_EXTENT_M):
+    """
+    Hợp các polygon (hệ mét) của một nhóm: đóng khe hở dưới distance_m bằng buffer +/-.
+    Nếu kết quả tách thành nhiều phần, mỗi phần liên thông là một nhóm gộp riêng. Phần chỉ có một vùng,
+    hoặc dài hơn max_extent_m (chuỗi vùng nối nhau dọc một tuyến phố), được bỏ qua.
+    Trả về danh sách (chỉ số các vùng trong nhóm, Polygon đã hợp).
+    """
+    closed = shapely.union_all(shapely.buffer(shapes, distance_m / 2)).buffer(-distance_m / 2)
+    pieces = [closed] if closed.geom_type == 'Polygon' else list(getattr(closed, 'geoms', []))
+    pieces = [piece for piece in pieces if piece.geom_type == 'Polygon' and not piece.is_empty]
+    if not pieces:
+        return []
+
+    # Phép đóng (buffer +/-) chứa trọn từng vùng ban đầu: mỗi vùng thuộc phần gần điểm đại diện của nó nhất
+    members = [[] for _piece in pieces]
+    for index, point in enumerate(shapely.point_on_surface(shapes)):
+        members[int(np.argmin(shapely.distance(pieces, point)))].append(index)
+
+    plans = []
+    for piece, indexes in zip(pieces, members):
+        min_x, min_y, max_x, max_y = piece.bounds
+        if len(indexes) < 2 or max(max_x - min_x, max_y - min_y) > max_extent_m:
+            continue
+        plans.append((indexes, piece))
+    return plans
+
+
+def _lonlat_geometry(shape, scale):
+    lonlat = shapely.transform(shape, lambda coords: coords / scale)
+    return GEOSGeometry(memoryview(shapely.to_wkb(lonlat)), srid=SRID)
+
+
+class FloodZoneMergeService:
+    """Gộp các FloodZone đang hoạt động chồng lấn / sát nhau thành một điểm ngập"""
+
+    @staticmethod
+    def find_groups(distance_m=ZONE_MERGE_DISTANCE_M):
+        """
+        Tìm các nhóm vùng ngập cần gộp: STRtree tìm cặp cách nhau <= distance_m,
+        union-find gom thành nhóm liên thông, rồi tách theo các phần liên thông của hình đã hợp
+        (xem _merge_pieces). Trả về danh sách (nhóm [dòng zone], hình học sau khi gộp).
+        """
+        zones = list(
+            FloodZone.objects.filter(is_active=True, merged_into__isnull=True).order_by('id').values(*MERGE_FIELDS)
+        )
+        if len(zones) < 2:
+            return []
+
+        shapes = shapely.from_wkb([bytes(zone['geometry'].wkb) for zone in zones])
+        scale = _metric_scale([zone['geometry'].centroid.y for zone in zones])
+        shapes = shapely.transform(shapes, lambda coords: coords * scale)
+
+        tree = shapely.STRtree(shapes)
+        left, right = tree.query(shapes, predicate='dwithin', distance=distance_m)
+        distinct = left < right
+        groups = _union_find_groups(len(zones), (left[distinct], right[distinct]))
+
+        plans = []
+        for members in groups:
+            for indexes, piece in _merge_pieces(shapes[members], distance_m):
+                group = [zones[members[index]] for index in indexes]
+                plans.append((group, _lonlat_geometry(piece, scale)))
+        return plans
+
+    @staticmethod
+    def _keeper(group):
+        """Vùng giữ lại: nhiều báo cáo nhất, sau đó là vùng cũ nhất"""
+        return min(group, key=lambda zone: (-(zone['report_count'] or 0), zone['id']))
+
+    @staticmethod
+    def _repoint(mapping):
+        """Chuyển mọi khóa ngoại từ vùng bị gộp sang vùng giữ lại, mỗi bảng một câu UPDATE cho mỗi lô"""
+        moved = {}
+        extras = list(mapping)
+        for model, column in ZONE_REFERENCES:
+            moved[model.__name__] = 0
+            for start in range(0, len(extras), REPOINT_BATCH_SIZE):
+                batch = extras[start:start + REPOINT_BATCH_SIZE]
+                moved[model.__name__] += model.objects.filter(**{f'{column}__in': batch}).update(**{
+                    column: Case(
+                        *[When(**{column: extra_id}, then=Value(mapping[extra_id])) for extra_id in batch],
+                        output_field=IntegerField(),
+                    )
+                })
+        return moved
+
+    @staticmethod
+    def merge(distance_m=ZONE_MERGE_DISTANCE_M, dry_run=False):
+        """Gộp các nhóm vùng ngập; dry_run chỉ trả về thống kê"""
+        try:
+            groups = FloodZoneMergeService.find_groups(distance_m)
+            result = {
+                'success': True,
+                'groups': len(groups),
+                'retired': sum(len(group) - 1 for group, _geometry in groups),
+                'moved': {},
+                'dry_run': dry_run,
+            }
+            if dry_run or not groups:
+                return result
+
+            with transaction.atomic():
+                # Khóa các vùng theo kế hoạch (theo id để tránh deadlock) và đọc lại: nhập dữ liệu, hết hạn hay
+                # một lần gộp khác có thể đã tắt / gộp / sửa hình học của vùng từ lúc lập kế hoạch
+                locked = {
+                    zone['id']: zone for zone in FloodZone.objects.select_for_update().filter(
+                        pk__in=[zone['id'] for group, _geometry in groups for zone in group],
+                        is_active=True, merged_into__isnull=True,
+                    ).order_by('id').values(*MERGE_FIELDS)
+                }
+                current = []
+                for group, geometry in groups:
+                    fresh = [locked.get(zone['id']) for zone in group]
+                    if all(row is not None and bytes(row['geometry'].wkb) == bytes(zone['geometry'].wkb)
+                           for row, zone in zip(fresh, group)):
+                        current.append((fresh, geometry))
+                    else:
+                        logger.info("⏭️ Bỏ qua nhóm %s: vùng đã thay đổi từ lúc lập kế hoạch",
+                                    [zone['id'] for zone in group])
+                groups = current
+                result['groups'] = len(groups)
+                result['retired'] = sum(len(group) - 1 for group, _geometry in groups)
+
+                mapping = {}
+                keepers = {}
+                for group, geometry in groups:
+                    keeper = FloodZoneMergeService._keeper(group)
+                    zone_types = [zone['zone_type'] for zone in group]
+                    keepers[keeper['id']] = {
+                        'geometry': geometry,
+                        'zone_type': min(zone_types, key=lambda value: (
+                            ZONE_TYPE_PRIORITY.index(value) if value in ZONE_TYPE_PRIORITY else len(ZONE_TYPE_PRIORITY)
+                        )),
+                        'max_depth_cm': max(zone['max_depth_cm'] or 0 for zone in group),
+                        'avg_duration_hours': max(zone['avg_duration_hours'] or 0 for zone in group),
+                        'last_reported_at': max((zone['last_reported_at'] for zone in group
+                                                 if zone['last_reported_at']), default=None),
+                        'last_flood_date': max((zone['last_flood_date'] for zone in group
+                                                if zone['last_flood_date']), default=None),
+                    }
+                    for zone in group:
+                        if zone['id'] != keeper['id']:
+                            mapping[zone['id']] = keeper['id']
+
+                result['moved'] = FloodZoneMergeService._repoint(mapping)
+
+                # Vùng bị gộp: tắt và ghi lại vùng giữ lại (update hàng loạt nên tự ghi nhật ký / phát sự kiện)
+                retired_ids = list(mapping)
+                for start in range(0, len(retired_ids), REPOINT_BATCH_SIZE):
+                    batch = retired_ids[start:start + REPOINT_BATCH_SIZE]
+                    FloodZone.objects.filter(pk__in=batch).update(
+                        is_active=False,
+                        merged_into=Case(
+                            *[When(pk=extra_id, then=Value(mapping[extra_id])) for extra_id in batch],
+                            output_field=IntegerField(),
+                        ),
+                    )
+                record_changes('zone', retired_ids)
+                publish_zone_status(retired_ids, False)
+
+                # Vùng giữ lại: save() để tạo lại các mức hình học và phát signal thay đổi
+                report_counts = dict(
+                    FloodReport.objects.filter(
+                        flood_zone_id__in=list(keepers), status='verified'
+                    ).order_by().values_list('flood_zone_id').annotate(total=Count('id'))
+                )
+                for zone in FloodZone.objects.filter(pk__in=list(keepers)):
+                    for field, value in keepers[zone.pk].items():
+                        setattr(zone, field, value)
+                    zone.report_count = report_counts.get(zone.pk, 0)
+                    zone.save()
+
+            logger.info("✅ Gộp %s vùng ngập vào %s vùng", result['retired'], result['groups'])
+            return result
+
+        except Exception as e:
+            logger.exception("❌ Lỗi gộp vùng ngập: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
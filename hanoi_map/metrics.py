@@ -0,0 +1,337 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Một câu SQL (cùng chuỗi, khác tham số) chạy từ N lần trở lên trong một request được coi là trùng (N+1)
+DUPLICATE_QUERY_THRESHOLD = getattr(settings, 'FLOOD_DUPLICATE_QUERY_THRESHOLD', 3)
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+HTTP_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20)
+
+_current = contextvars.ContextVar('flood_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Endpoint chạy nhiều câu SQL hơn ngân sách cho phép"""
+
+
+class RequestMetrics:
+    """Số liệu của một request (hoặc một khối code): SQL, HTTP ra ngoài, thời gian tuần tự hóa"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.http_count = 0
+        self.http_ms = 0.0
+        self.serialize_ms = 0.0
+        self.statements = Counter()
+
+    def record_sql(self, sql, elapsed_ms):
+        self.sql_count += 1
+        self.sql_ms += elapsed_ms
+        self.statements[sql] += 1
+        if self.parent is not None:
+            self.parent.record_sql(sql, elapsed_ms)
+
+    def record_http(self, elapsed_ms):
+        self.http_count += 1
+        self.http_ms += elapsed_ms
+        if self.parent is not None:
+            self.parent.record_http(elapsed_ms)
+
+    def record_serialize(self, elapsed_ms):
+        self.serialize_ms += elapsed_ms
+        if self.parent is not None:
+            self.parent.record_serialize(elapsed_ms)
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def duplicates(self):
+        """{câu SQL: số lần} cho các câu lặp lại từ DUPLICATE_QUERY_THRESHOLD lần"""
+        return {sql: count for sql, count in self.statements.items() if count >= DUPLICATE_QUERY_THRESHOLD}
+
+    def server_timing(self):
+        """Giá trị header Server-Timing (hiển thị trong tab Network của trình duyệt)"""
+        duplicates = sum(count for count in self.duplicates.values())
+        return ', '.join([
+            f'db;dur={self.sql_ms:.1f};desc="{self.sql_count} queries, {duplicates} dup"',
+            f'http;dur={self.http_ms:.1f};desc="{self.http_count} calls"',
+            f'serialize;dur={self.serialize_ms:.1f}',
+            f'total;dur={self.elapsed_ms:.1f}',
+        ])
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def track_queries():
+    """Đo SQL / HTTP trong khối with (lồng được: số liệu vẫn cộng vào khối bên ngoài)"""
+    metrics = RequestMetrics(parent=_current.get())
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries, label='block'):
+    """
+    Dùng trong test để chặn N+1:
+        with query_budget(5, 'flood_data_api'):
+            client.get('/api/flood-data/')
+    """
+    with track_queries() as metrics:
+        yield metrics
+    if metrics.sql_count > max_queries:
+        raise QueryBudgetExceeded(_budget_message(label, metrics, max_queries))
+
+
+@contextmanager
+def timed_serialization():
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_serialize((time.perf_counter() - started) * 1000)
+
+
+def _budget_message(label, metrics, max_queries):
+    message = f"{label}: {metrics.sql_count} câu SQL (ngân sách {max_queries})"
+    for sql, count in sorted(metrics.duplicates.items(), key=lambda item: -item[1])[:3]:
+        message += f"\n  {count}× {sql[:200]}"
+    return message
+
+
+# ============ GHI NHẬN SQL VÀ HTTP ============
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_sql(sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_sql_wrapper(sender=None, connection=None, **kwargs):
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def _timed_send(send):
+    @functools.wraps(send)
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return send(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return send(*args, **kwargs)
+        finally:
+            metrics.record_http((time.perf_counter() - started) * 1000)
+    wrapper._flood_metrics = True
+    return wrapper
+
+
+def _timed_async_send(send):
+    @functools.wraps(send)
+    async def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return await send(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await send(*args, **kwargs)
+        finally:
+            metrics.record_http((time.perf_counter() - started) * 1000)
+    wrapper._flood_metrics = True
+    return wrapper
+
+
+def install():
+    """Gắn bộ đếm SQL vào mọi kết nối và bộ đếm HTTP vào requests / httpx (gọi một lần trong AppConfig.ready)"""
+    connection_created.connect(_install_sql_wrapper, dispatch_uid='flood_metrics_sql')
+    for connection in connections.all(initialized_only=True):
+        _install_sql_wrapper(connection=connection)
+
+    try:
+        import requests
+        if not getattr(requests.Session.send, '_flood_metrics', False):
+            requests.Session.send = _timed_send(requests.Session.send)
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+        if not getattr(httpx.Client.send, '_flood_metrics', False):
+            httpx.Client.send = _timed_send(httpx.Client.send)
+        if not getattr(httpx.AsyncClient.send, '_flood_metrics', False):
+            httpx.AsyncClient.send = _timed_async_send(httpx.AsyncClient.send)
+    except ImportError:
+        pass
+
+
+# ============ HISTOGRAM (định dạng text của Prometheus) ============
+
+class Histogram:
+    """Histogram theo nhãn, giữ trong bộ nhớ của từng process"""
+
+    def __init__(self, name, description, buckets, labels=('endpoint',)):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, (counts, total, count) in items:
+            labels = ','.join(f'{key}="{value}"' for key, value in zip(self.labels, label_values))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:g}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, description, labels=('endpoint',)):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = ','.join(f'{key}="{value}"' for key, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram('flood_request_duration_ms', 'Thời gian xử lý request (ms)', LATENCY_BUCKETS_MS)
+SQL_COUNT = Histogram('flood_request_sql_queries', 'Số câu SQL mỗi request', QUERY_COUNT_BUCKETS)
+SQL_TIME = Histogram('flood_request_sql_ms', 'Tổng thời gian SQL mỗi request (ms)', LATENCY_BUCKETS_MS)
+HTTP_COUNT = Histogram('flood_request_http_calls', 'Số lời gọi HTTP ra ngoài mỗi request', HTTP_COUNT_BUCKETS)
+HTTP_TIME = Histogram('flood_request_http_ms', 'Tổng thời gian HTTP ra ngoài mỗi request (ms)', LATENCY_BUCKETS_MS)
+SERIALIZE_TIME = Histogram('flood_request_serialize_ms', 'Thời gian tuần tự hóa JSON (ms)', LATENCY_BUCKETS_MS)
+DUPLICATE_QUERIES = CounterMetric('flood_duplicate_queries_total', 'Số câu SQL lặp lại (nghi N+1)')
+BUDGET_EXCEEDED = CounterMetric('flood_query_budget_exceeded_total', 'Số request vượt ngân sách SQL')
+
+REGISTRY = [
+    REQUEST_LATENCY, SQL_COUNT, SQL_TIME, HTTP_COUNT, HTTP_TIME, SERIALIZE_TIME,
+    DUPLICATE_QUERIES, BUDGET_EXCEEDED,
+]
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ============ MIDDLEWARE ============
+
+class RequestMetricsMiddleware:
+    """
+    Đo mỗi request: số câu / thời gian SQL, câu SQL lặp lại, HTTP ra ngoài, thời gian tuần tự hóa.
+    Ghi header Server-Timing, cộng vào histogram cho /metrics và kiểm tra FLOOD_QUERY_BUDGETS
+    (FLOOD_QUERY_BUDGET_STRICT=True: vượt ngân sách thì báo lỗi, dùng khi chạy test).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track_queries() as metrics:
+            response = self.get_response(request)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        with track_queries() as metrics:
+            response = await self.get_response(request)
+        return self._finish(request, response, metrics)
+
+    def _finish(self, request, response, metrics):
+        response['Server-Timing'] = metrics.server_timing()
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.url_name or match.view_name) if match else 'unmatched'
+        labels = (endpoint,)
+
+        # Stream SSE sống rất lâu: không tính vào histogram độ trễ
+        if not isinstance(response, StreamingHttpResponse):
+            REQUEST_LATENCY.observe(labels, metrics.elapsed_ms)
+        SQL_COUNT.observe(labels, metrics.sql_count)
+        SQL_TIME.observe(labels, metrics.sql_ms)
+        HTTP_COUNT.observe(labels, metrics.http_count)
+        HTTP_TIME.observe(labels, metrics.http_ms)
+        SERIALIZE_TIME.observe(labels, metrics.serialize_ms)
+        duplicates = metrics.duplicates
+        if duplicates:
+            DUPLICATE_QUERIES.inc(labels, sum(duplicates.values()))
+
+        budget = getattr(settings, 'FLOOD_QUERY_BUDGETS', {}).get(endpoint)
+        if budget is not None and metrics.sql_count > budget:
+            BUDGET_EXCEEDED.inc(labels)
+            message = _budget_message(endpoint, metrics, budget)
+            if getattr(settings, 'FLOOD_QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning("⚠️ Vượt ngân sách SQL - %s", message)
+        return response
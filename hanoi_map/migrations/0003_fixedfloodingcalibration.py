@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-19 09:12
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0002_floodprediction_current_depth_cm_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FixedFloodingCalibration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_threshold_mm', models.FloatField(verbose_name='Ngưỡng mưa hiện tại (mm/h)')),
+                ('current_depth_cm', models.FloatField(verbose_name='Độ sâu dự đoán hiện tại (cm)')),
+                ('current_duration_hours', models.FloatField(verbose_name='Thời gian ngập hiện tại (giờ)')),
+                ('proposed_threshold_mm', models.FloatField(validators=[django.core.validators.MinValueValidator(0.1), django.core.validators.MaxValueValidator(500)], verbose_name='Ngưỡng mưa đề xuất (mm/h)')),
+                ('proposed_depth_cm', models.FloatField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(300)], verbose_name='Độ sâu dự đoán đề xuất (cm)')),
+                ('proposed_duration_hours', models.FloatField(validators=[django.core.validators.MinValueValidator(0.1), django.core.validators.MaxValueValidator(72)], verbose_name='Thời gian ngập đề xuất (giờ)')),
+                ('confidence', models.FloatField(help_text='Độ tin cậy của đề xuất (0-1)', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)], verbose_name='Độ tin cậy')),
+                ('event_count', models.IntegerField(default=0, verbose_name='Số đợt mưa ghi nhận')),
+                ('confirmed_count', models.IntegerField(default=0, verbose_name='Số đợt mưa có ngập thực tế')),
+                ('report_count', models.IntegerField(default=0, verbose_name='Số báo cáo xác nhận')),
+                ('metrics', models.JSONField(default=dict, help_text='Tỉ lệ kích hoạt sai, hệ số hồi quy độ sâu/thời gian...', verbose_name='Chỉ số hiệu chỉnh')),
+                ('status', models.CharField(choices=[('pending', '⏳ Chờ duyệt'), ('applied', '✅ Đã áp dụng'), ('rejected', '❌ Từ chối'), ('superseded', '🔁 Bị thay thế')], default='pending', max_length=20)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm duyệt')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('fixed_flooding', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calibrations', to='hanoi_map.fixedflooding', verbose_name='Điểm ngập cố định')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_calibrations', to=settings.AUTH_USER_MODEL, verbose_name='Duyệt bởi')),
+            ],
+            options={
+                'verbose_name': 'Hiệu chỉnh ngưỡng',
+                'verbose_name_plural': 'Hiệu chỉnh ngưỡng',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='hanoi_map_f_status_770709_idx')],
+            },
+        ),
+    ]
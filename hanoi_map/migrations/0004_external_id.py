@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0003_fixedfloodingcalibration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fixedflooding',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Mã định danh từ bộ dữ liệu gốc (dùng khi import)', max_length=100, null=True, unique=True, verbose_name='Mã nguồn dữ liệu'),
+        ),
+        migrations.AddField(
+            model_name='floodzone',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Mã định danh từ bộ dữ liệu gốc (dùng khi import)', max_length=100, null=True, unique=True, verbose_name='Mã nguồn dữ liệu'),
+        ),
+    ]
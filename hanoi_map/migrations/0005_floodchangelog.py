@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0004_external_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FloodChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(choices=[('zone', 'Điểm ngập'), ('report', 'Báo cáo ngập'), ('fixed', 'Điểm ngập cố định'), ('checkpoint', 'Mốc nén nhật ký')], max_length=20, verbose_name='Loại dữ liệu')),
+                ('object_id', models.BigIntegerField(verbose_name='ID đối tượng')),
+                ('action', models.CharField(choices=[('upsert', 'Thêm / cập nhật'), ('delete', 'Xóa')], default='upsert', max_length=10, verbose_name='Thao tác')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Nhật ký thay đổi',
+                'verbose_name_plural': 'Nhật ký thay đổi',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['entity', 'object_id'], name='hanoi_map_f_entity_04fee7_idx')],
+            },
+        ),
+    ]
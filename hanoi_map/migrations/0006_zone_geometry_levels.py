@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 19:05
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0005_floodchangelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='floodzone',
+            name='geometry_high',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Khu vực ngập (zoom 14-15)'),
+        ),
+        migrations.AddField(
+            model_name='floodzone',
+            name='geometry_low',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Khu vực ngập (zoom ≤ 11)'),
+        ),
+        migrations.AddField(
+            model_name='floodzone',
+            name='geometry_mid',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Khu vực ngập (zoom 12-13)'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 19:40
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0006_zone_geometry_levels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fixedflooding',
+            name='flood_area',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, help_text='Vùng tròn bán kính radius_meters (buffer theo mét), tạo lại khi lưu', null=True, srid=4326, verbose_name='Vùng ảnh hưởng'),
+        ),
+        # Tạo vùng ảnh hưởng cho dữ liệu sẵn có, cùng phép buffer với geometry.metric_buffer (UTM 48N, 8 đoạn/góc phần tư)
+        migrations.RunSQL(
+            sql="""
+                UPDATE hanoi_map_fixedflooding
+                SET flood_area = ST_Transform(ST_Buffer(ST_Transform(location, 32648), radius_meters, 8), 4326)
+                WHERE location IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 20:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0007_fixedflooding_flood_area'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='floodzone',
+            name='merged_into',
+            field=models.ForeignKey(blank=True, help_text='Điểm ngập giữ lại sau khi gộp các vùng chồng lấn', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='merged_zones', to='hanoi_map.floodzone', verbose_name='Đã gộp vào'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 20:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0008_floodzone_merged_into'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='floodprediction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['valid_until'], name='floodprediction_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='floodreport',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='floodreport_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='floodzone',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_reported_at'], name='floodzone_active_reported_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-19 21:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0009_active_expiry_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # GiST nhiều cột (location, created_at) cần operator class btree cho cột thời gian
+        BtreeGistExtension(),
+        migrations.AddIndex(
+            model_name='fixedflooding',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('is_monitored', True)), fields=['location'], name='fixedflooding_monitored_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='fixedflooding',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('is_active', True)), fields=['location'], name='fixedflooding_active_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='floodprediction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-prediction_time'], include=('id', 'address', 'district', 'current_depth_cm', 'predicted_depth_cm', 'estimated_drainage_time_hours', 'risk_level', 'flood_report'), name='floodprediction_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='floodreport',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('status', 'verified')), fields=['location', 'created_at'], name='floodreport_verified_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='floodreport',
+            index=models.Index(condition=models.Q(('status', 'verified')), fields=['-created_at'], include=('is_active', 'water_depth', 'severity'), name='floodreport_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='floodzone',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('is_active', True)), fields=['geometry'], name='floodzone_active_gist'),
+        ),
+    ]
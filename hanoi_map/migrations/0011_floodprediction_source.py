@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='floodprediction',
+            name='source',
+            field=models.CharField(choices=[('manual', 'Theo báo cáo / thủ công'), ('forecast_fixed', 'Dự báo hàng loạt - điểm ngập cố định'), ('forecast_grid', 'Dự báo hàng loạt - lưới')], default='manual', max_length=20, verbose_name='Nguồn dự đoán'),
+        ),
+    ]
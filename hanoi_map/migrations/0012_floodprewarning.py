@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-19 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0011_floodprediction_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FloodPreWarning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forecast_time', models.DateTimeField(verbose_name='Thời điểm lấy dự báo')),
+                ('expected_activation_at', models.DateTimeField(verbose_name='Dự kiến vượt ngưỡng lúc')),
+                ('threshold_mm', models.FloatField(verbose_name='Ngưỡng mưa (mm/h)')),
+                ('peak_rainfall_mm', models.FloatField(verbose_name='Lượng mưa dự báo lớn nhất (mm/h)')),
+                ('peak_at', models.DateTimeField(verbose_name='Thời điểm mưa lớn nhất')),
+                ('expected_depth_cm', models.FloatField(verbose_name='Độ sâu dự kiến (cm)')),
+                ('expected_duration_hours', models.FloatField(verbose_name='Thời gian vượt ngưỡng dự kiến (giờ)')),
+                ('valid_until', models.DateTimeField(verbose_name='Có hiệu lực đến')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Đang hiệu lực')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('fixed_flooding', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pre_warnings', to='hanoi_map.fixedflooding', verbose_name='Điểm ngập cố định')),
+            ],
+            options={
+                'verbose_name': 'Cảnh báo sớm',
+                'verbose_name_plural': 'Cảnh báo sớm',
+                'ordering': ['expected_activation_at'],
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['valid_until'], name='floodprewarning_active_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-19 22:20
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0012_floodprewarning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(blank=True, db_index=True, max_length=200, verbose_name='Mã thiết bị')),
+                ('label', models.CharField(blank=True, max_length=200, verbose_name='Tên địa điểm')),
+                ('location', django.contrib.gis.db.models.fields.PointField(blank=True, null=True, srid=4326, verbose_name='Vị trí')),
+                ('radius_meters', models.FloatField(default=500, validators=[django.core.validators.MinValueValidator(10), django.core.validators.MaxValueValidator(20000)], verbose_name='Bán kính theo dõi (m)')),
+                ('area', django.contrib.gis.db.models.fields.PolygonField(blank=True, help_text='Bỏ trống để dùng vị trí + bán kính', null=True, srid=4326, verbose_name='Vùng đã lưu')),
+                ('coverage', django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, help_text='area, hoặc vùng tròn bán kính radius_meters quanh location; tạo lại khi lưu', null=True, srid=4326, verbose_name='Vùng theo dõi')),
+                ('sink', models.CharField(choices=[('webhook', 'Webhook'), ('email', 'Email'), ('file', 'Ghi file (kiểm thử)')], default='webhook', max_length=20, verbose_name='Kênh gửi')),
+                ('target', models.CharField(help_text='URL webhook, địa chỉ email hoặc đường dẫn file', max_length=500, verbose_name='Địa chỉ nhận')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Đang theo dõi')),
+                ('last_notified_at', models.DateTimeField(blank=True, null=True, verbose_name='Thông báo gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Đăng ký cảnh báo',
+                'verbose_name_plural': 'Đăng ký cảnh báo',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertNotification',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(max_length=30, verbose_name='Loại sự kiện')),
+                ('payload', models.JSONField(default=dict, verbose_name='Nội dung')),
+                ('status', models.CharField(choices=[('pending', '⏳ Chờ gửi'), ('sent', '✅ Đã gửi'), ('failed', '❌ Lỗi')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0, verbose_name='Số lần gửi')),
+                ('error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='hanoi_map.alertsubscription', verbose_name='Đăng ký')),
+            ],
+            options={
+                'verbose_name': 'Thông báo',
+                'verbose_name_plural': 'Thông báo',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='alertsubscription',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('is_active', True)), fields=['coverage'], name='alertsubscription_active_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='alertnotification_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-19 22:40
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0013_alert_subscriptions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('name', models.CharField(max_length=100, verbose_name='Dữ liệu')),
+                ('export_format', models.CharField(max_length=20, verbose_name='Định dạng')),
+                ('status', models.CharField(choices=[('running', '⏳ Đang xuất'), ('done', '✅ Hoàn tất'), ('failed', '❌ Lỗi')], default='running', max_length=10)),
+                ('error', models.TextField(blank=True, verbose_name='Lỗi')),
+                ('heartbeat_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Cập nhật gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Người yêu cầu')),
+            ],
+            options={
+                'verbose_name': 'File xuất dữ liệu',
+                'verbose_name_plural': 'File xuất dữ liệu',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
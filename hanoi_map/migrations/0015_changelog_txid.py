@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 22:55
+
+import hanoi_map.txids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0014_export_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='floodchangelog',
+            name='txid',
+            field=models.BigIntegerField(db_default=hanoi_map.txids.CurrentTransactionId(), editable=False, verbose_name='Transaction'),
+        ),
+        # Mốc nén cũ tính theo id, không so được với cursor txid (client cursor cũ đều phải tải lại)
+        migrations.RunSQL(
+            sql="DELETE FROM hanoi_map_floodchangelog WHERE entity = 'checkpoint'",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='floodchangelog',
+            index=models.Index(fields=['txid', 'id'], name='floodchangelog_txid_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 23:10
+
+import django.core.serializers.json
+import hanoi_map.txids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0015_changelog_txid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FloodEventLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField(db_default=hanoi_map.txids.CurrentTransactionId(), editable=False, verbose_name='Transaction')),
+                ('event_type', models.CharField(max_length=40, verbose_name='Loại sự kiện')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Dữ liệu')),
+                ('lat', models.FloatField(blank=True, null=True)),
+                ('lng', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Sự kiện realtime',
+                'verbose_name_plural': 'Sự kiện realtime',
+                'ordering': ['txid', 'id'],
+                'indexes': [models.Index(fields=['txid', 'id'], name='floodeventlog_txid_idx')],
+            },
+        ),
+    ]
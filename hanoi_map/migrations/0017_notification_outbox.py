@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-19 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hanoi_map', '0016_floodeventlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertnotification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='Worker đánh dấu sending trước khi gửi; quá hạn thì worker khác nhận lại', null=True, verbose_name='Nhận gửi lúc'),
+        ),
+        migrations.AddField(
+            model_name='floodeventlog',
+            name='notify_pending',
+            field=models.BooleanField(default=False, help_text='dispatch_notifications chưa fan-out sự kiện này tới người đăng ký', verbose_name='Chờ tạo thông báo'),
+        ),
+        migrations.AlterField(
+            model_name='alertnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', '⏳ Chờ gửi'), ('sending', '📤 Đang gửi'), ('sent', '✅ Đã gửi'), ('failed', '❌ Lỗi')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='alertnotification_sending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='floodeventlog',
+            index=models.Index(condition=models.Q(('notify_pending', True)), fields=['id'], name='floodeventlog_notify_idx'),
+        ),
+    ]
@@ -1,12 +1,23 @@
 from django.contrib.gis.db import models
+from django.contrib.postgres.indexes import GistIndex
 from django.contrib.gis.geos import Point, Polygon
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.gis.db.models.functions import Distance
 from django.contrib.auth.models import User
-import json, traceback
+from django.core.serializers.json import DjangoJSONEncoder
+import json, logging, uuid
+
+from .geometry import (
+    PREDICTION_ZONE_RADIUS_M, REPORT_ZONE_MATCH_M, REPORT_ZONE_RADIUS_M, ZONE_GEOMETRY_LEVEL_FIELDS,
+    metric_buffer, radius_prefilter, zone_geometry_levels,
+)
+from .txids import CurrentTransactionId
+
+logger = logging.getLogger(__name__)
 
 
 # FLOOD ZONE MODEL
@@ -23,6 +34,13 @@ class FloodZone(models.Model):
     name = models.CharField(max_length=200, verbose_name="Tên điểm ngập")
     zone_type = models.CharField(max_length=20, choices=ZONE_TYPE_CHOICES, verbose_name="Loại ngập")
     geometry = models.PolygonField(srid=4326, verbose_name="Khu vực ngập")
+    # Hình học đơn giản hóa theo mức zoom, tạo lại mỗi khi lưu (xem geometry.ZONE_GEOMETRY_LEVELS)
+    geometry_low = models.PolygonField(srid=4326, null=True, blank=True, editable=False,
+                                       verbose_name="Khu vực ngập (zoom ≤ 11)")
+    geometry_mid = models.PolygonField(srid=4326, null=True, blank=True, editable=False,
+                                       verbose_name="Khu vực ngập (zoom 12-13)")
+    geometry_high = models.PolygonField(srid=4326, null=True, blank=True, editable=False,
+                                        verbose_name="Khu vực ngập (zoom 14-15)")
     district = models.CharField(max_length=100, verbose_name="Phường")
     ward = models.CharField(max_length=100, verbose_name="Xã", blank=True)
     street = models.CharField(max_length=200, verbose_name="Tên đường/phố", blank=True)
@@ -36,9 +54,34 @@ class FloodZone(models.Model):
     report_count = models.IntegerField(verbose_name="Số báo cáo", default=0)
     description = models.TextField(verbose_name="Mô tả chi tiết", blank=True)
     solution = models.TextField(verbose_name="Biện pháp xử lý", blank=True)
+    external_id = models.CharField(max_length=100, verbose_name="Mã nguồn dữ liệu", unique=True,
+                                   null=True, blank=True, help_text="Mã định danh từ bộ dữ liệu gốc (dùng khi import)")
+    merged_into = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='merged_zones', verbose_name="Đã gộp vào",
+                                    help_text="Điểm ngập giữ lại sau khi gộp các vùng chồng lấn")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Ghi nhớ is_active lúc nạp để signal phát hiện chuyển trạng thái mà không cần truy vấn lại"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        return instance
+    
+    def build_geometry_levels(self):
+        """Tạo các mức hình học đơn giản hóa từ geometry"""
+        for field, value in zone_geometry_levels(self.geometry).items():
+            setattr(self, field, value)
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'geometry' in update_fields:
+            self.build_geometry_levels()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *ZONE_GEOMETRY_LEVEL_FIELDS}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.name} - {self.district}"
     
@@ -48,6 +91,11 @@ class FloodZone(models.Model):
         indexes = [
             models.Index(fields=['is_active']),
             models.Index(fields=['district']),
+            # Chỉ các vùng đang hoạt động: dùng cho job hết hiệu lực (lifecycle.py)
+            models.Index(fields=['last_reported_at'], condition=models.Q(is_active=True),
+                         name='floodzone_active_reported_idx'),
+            # "Điểm ngập đang hoạt động gần vị trí"
+            GistIndex(fields=['geometry'], condition=models.Q(is_active=True), name='floodzone_active_gist'),
         ]
 
 
@@ -140,6 +188,13 @@ class FloodReport(models.Model):
         
         super().save(*args, **kwargs)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Ghi nhớ status lúc nạp để signal phát hiện báo cáo vừa được xác nhận"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
     def __str__(self):
         return f"Báo cáo #{self.id} - {self.address[:50]}"
     
@@ -150,6 +205,14 @@ class FloodReport(models.Model):
         indexes = [
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['district', 'severity']),
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True),
+                         name='floodreport_active_created_idx'),
+            # "Báo cáo đã xác nhận trong 24h gần vị trí": vị trí + thời gian trong một GiST (cần btree_gist)
+            GistIndex(fields=['location', 'created_at'], condition=models.Q(status='verified'),
+                      name='floodreport_verified_gist'),
+            # ORDER BY -created_at của get_recent_reports_api; INCLUDE đủ cột cho các truy vấn đếm
+            models.Index(fields=['-created_at'], condition=models.Q(status='verified'),
+                         include=['is_active', 'water_depth', 'severity'], name='floodreport_recent_idx'),
         ]
 
 @receiver(post_save, sender=FloodReport)
@@ -157,13 +220,18 @@ def update_flood_zones_on_report_save(sender, instance, created, **kwargs):
     """Tự động tạo hoặc cập nhật FloodZone khi có báo cáo mới"""
     if instance.status == 'verified' and instance.location:
         try:
-            existing_zones = FloodZone.objects.annotate(
+            # Lọc bằng vùng tròn 50m (dùng spatial index) rồi chọn vùng gần nhất
+            existing_zones = FloodZone.objects.filter(
+                geometry__intersects=metric_buffer(instance.location, REPORT_ZONE_MATCH_M),
+                merged_into__isnull=True
+            ).annotate(
                 distance=Distance('geometry', instance.location)
-            ).filter(distance__lt=50)  # 50m
+            ).order_by('distance')
             
-            if existing_zones.exists():
-                zone = existing_zones.first()
+            zone = existing_zones.first()
+            if zone:
                 zone.max_depth_cm = max(zone.max_depth_cm, instance.water_depth)
+                zone.is_active = True  # Vùng đã hết hiệu lực (lifecycle.py) được kích hoạt lại
                 zone.last_reported_at = instance.created_at
                 zone.last_flood_date = instance.created_at.date()
                 zone.report_count = FloodReport.objects.filter(
@@ -183,8 +251,7 @@ def update_flood_zones_on_report_save(sender, instance, created, **kwargs):
                     zone_type = 'seasonal'
                 else:
                     zone_type = 'rain'
-                buffer_distance = 0.00018  # ~20m
-                bbox = instance.location.buffer(buffer_distance).envelope
+                flood_area = metric_buffer(instance.location, REPORT_ZONE_RADIUS_M)
                 
                 zone_name = f"Điểm ngập {instance.district}"
                 if instance.street:
@@ -195,7 +262,7 @@ def update_flood_zones_on_report_save(sender, instance, created, **kwargs):
                 zone = FloodZone.objects.create(
                     name=zone_name,
                     zone_type=zone_type,
-                    geometry=bbox,
+                    geometry=flood_area,
                     district=instance.district,
                     ward=instance.ward or '',
                     street=instance.street or '',
@@ -210,7 +277,7 @@ def update_flood_zones_on_report_save(sender, instance, created, **kwargs):
                 instance.save()
                 
         except Exception as e:
-            print(f"❌ Lỗi tạo/cập nhật điểm ngập: {e}")
+            logger.error("❌ Lỗi tạo/cập nhật điểm ngập: %s", e)
 
 
 # FIXED FLOODING MODEL
@@ -278,6 +345,14 @@ class FixedFlooding(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(1000)],
         help_text="Bán kính khu vực ngập từ điểm trung tâm (1-1000m)"
     )
+    flood_area = models.PolygonField(
+        srid=4326,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Vùng ảnh hưởng",
+        help_text="Vùng tròn bán kính radius_meters (buffer theo mét), tạo lại khi lưu"
+    )
     rainfall_threshold_mm = models.FloatField(
         verbose_name="Ngưỡng mưa kích hoạt (mm/h)",
         validators=[MinValueValidator(0.1), MaxValueValidator(500)],
@@ -364,6 +439,14 @@ class FixedFlooding(models.Model):
         verbose_name="Quản lý bởi",
         related_name='managed_floodings'
     )
+    external_id = models.CharField(
+        max_length=100,
+        verbose_name="Mã nguồn dữ liệu",
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Mã định danh từ bộ dữ liệu gốc (dùng khi import)"
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -373,21 +456,45 @@ class FixedFlooding(models.Model):
         status = "⚡" if self.is_active else "✅"
         return f"{status} {self.name} - {self.district}"
     
+    @staticmethod
+    def severity_for_depth(predicted_depth_cm):
+        """Mức độ nghiêm trọng tương ứng với độ sâu dự đoán"""
+        if predicted_depth_cm < 20:
+            return 'low'
+        elif predicted_depth_cm < 40:
+            return 'medium'
+        elif predicted_depth_cm < 70:
+            return 'high'
+        return 'very_high'
+    
+    def build_flood_area(self):
+        """Tạo vùng ảnh hưởng từ location và radius_meters"""
+        self.flood_area = metric_buffer(self.location, self.radius_meters) if self.location else None
+    
     def save(self, *args, **kwargs):
-        """Tự động tính toán severity dựa trên predicted_depth_cm"""
-        if self.predicted_depth_cm < 20:
-            self.severity = 'low'
-        elif self.predicted_depth_cm < 40:
-            self.severity = 'medium'
-        elif self.predicted_depth_cm < 70:
-            self.severity = 'high'
-        else:
-            self.severity = 'very_high'
+        """Tự động tính toán severity dựa trên predicted_depth_cm và vùng ảnh hưởng theo vị trí/bán kính"""
+        self.severity = self.severity_for_depth(self.predicted_depth_cm)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'location', 'radius_meters'} & set(update_fields):
+            self.build_flood_area()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'flood_area'}
         super().save(*args, **kwargs)
     
     def activate_flood_warning(self, rainfall_mm, source="FloodPrediction"):
         """Kích hoạt cảnh báo ngập khi lượng mưa vượt ngưỡng"""
         if rainfall_mm >= self.rainfall_threshold_mm and not self.is_active:
+            return self.switch_warning(True, source, rainfall_mm)
+        elif rainfall_mm < self.rainfall_threshold_mm and self.is_active:
+            # Tắt cảnh báo khi mưa giảm
+            return self.switch_warning(False, source, rainfall_mm)
+
+    def switch_warning(self, is_active, source, rainfall_mm=None):
+        """
+        Bật / tắt cảnh báo và ghi lịch sử. save() chạy signal nên báo cáo ngập được tạo / cập nhật
+        như khi bật tắt từ admin. Trả về trạng thái mới.
+        """
+        if is_active:
             self.is_active = True
             self.last_activated = timezone.now()
             self.activation_count += 1
@@ -412,8 +519,7 @@ class FixedFlooding(models.Model):
             self.save(update_fields=['is_active', 'last_activated', 'activation_count', 'flood_history'])
             return True
             
-        elif rainfall_mm < self.rainfall_threshold_mm and self.is_active:
-            # Tắt cảnh báo khi mưa giảm
+        else:
             self.is_active = False
             self.last_deactivated = timezone.now()
             
@@ -428,9 +534,10 @@ class FixedFlooding(models.Model):
         return None
     
     def get_flood_polygon(self):
-        """Tạo Polygon từ điểm trung tâm và bán kính"""
-        radius_degrees = self.radius_meters / 111320.0  # 1 độ ≈ 111,320m
-        return self.location.buffer(radius_degrees).envelope
+        """Vùng ảnh hưởng (buffer theo mét quanh điểm trung tâm), dùng bản đã lưu nếu có"""
+        if self.flood_area is None:
+            self.build_flood_area()
+        return self.flood_area
     
     def get_nearby_reports(self, hours=24):
         """Lấy báo cáo ngập gần đây trong khu vực"""
@@ -455,6 +562,9 @@ class FixedFlooding(models.Model):
             models.Index(fields=['is_active', 'district']),
             models.Index(fields=['rainfall_threshold_mm']),
             models.Index(fields=['severity']),
+            # "FixedFlooding được giám sát / đang kích hoạt trong bán kính"
+            GistIndex(fields=['location'], condition=models.Q(is_monitored=True), name='fixedflooding_monitored_gist'),
+            GistIndex(fields=['location'], condition=models.Q(is_active=True), name='fixedflooding_active_gist'),
         ]
 
 
@@ -486,10 +596,10 @@ def _create_flood_report_from_fixed_flooding(fixed_flooding):
     from django.contrib.gis.db.models.functions import Distance
     
     try:
-        print(f"📝 Bắt đầu tạo FloodReport từ FixedFlooding #{fixed_flooding.id}")
+        logger.debug("📝 Bắt đầu tạo FloodReport từ FixedFlooding #%s", fixed_flooding.id)
         time_threshold = timezone.now() - timezone.timedelta(hours=1)
         recent_report = FloodReport.objects.filter(
-            location__distance_lte=(fixed_flooding.location, fixed_flooding.radius_meters),
+            location__within=fixed_flooding.get_flood_polygon(),
             created_at__gte=time_threshold,
             status='verified'
         ).exists()
@@ -535,7 +645,7 @@ def _create_flood_report_from_fixed_flooding(fixed_flooding):
                 reporter_name="Hệ thống FixedFlooding"
             )
             
-            print(f"✅ Đã tạo FloodReport #{report.id} từ FixedFlooding #{fixed_flooding.id}")
+            logger.info("✅ Đã tạo FloodReport #%s từ FixedFlooding #%s", report.id, fixed_flooding.id)
             try:
                 from .services import FloodZoneService
                 FloodZoneService.create_or_update_from_fixed_flooding(
@@ -543,8 +653,7 @@ def _create_flood_report_from_fixed_flooding(fixed_flooding):
                     fixed_flooding.rainfall_threshold_mm
                 )
             except Exception as e:
-                print(f"⚠️ Lỗi tạo FloodZone: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi tạo FloodZone: %s", e, exc_info=True)
             try:
                 from .services import FloodHistoryService
                 FloodHistoryService.create_from_fixed_flooding(
@@ -552,17 +661,15 @@ def _create_flood_report_from_fixed_flooding(fixed_flooding):
                     fixed_flooding.rainfall_threshold_mm
                 )
             except Exception as e:
-                print(f"⚠️ Lỗi tạo lịch sử: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi tạo lịch sử: %s", e, exc_info=True)
             
             return report
         else:
-            print(f"ℹ️ Đã có FloodReport gần đây cho FixedFlooding #{fixed_flooding.id}, bỏ qua...")
+            logger.debug("ℹ️ Đã có FloodReport gần đây cho FixedFlooding #%s, bỏ qua...", fixed_flooding.id)
             return None
             
     except Exception as e:
-        print(f"❌ Lỗi tạo FloodReport từ FixedFlooding: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Lỗi tạo FloodReport từ FixedFlooding: %s", e)
         return None
 
 def _deactivate_flood_reports(fixed_flooding):
@@ -572,7 +679,7 @@ def _deactivate_flood_reports(fixed_flooding):
     try:
         time_threshold = timezone.now() - timezone.timedelta(hours=6)
         recent_reports = FloodReport.objects.filter(
-            location__distance_lte=(fixed_flooding.location, fixed_flooding.radius_meters),
+            location__within=fixed_flooding.get_flood_polygon(),
             created_at__gte=time_threshold,
             status='verified',
             is_active=True
@@ -582,11 +689,10 @@ def _deactivate_flood_reports(fixed_flooding):
             report.description += f"\n\n🔄 **CẬP NHẬT LÚC {timezone.now().strftime('%H:%M %d/%m/%Y')}:**\n• Điểm ngập {fixed_flooding.name} đã tắt cảnh báo."
             report.is_active = False
             report.save(update_fields=['description', 'is_active'])
-            print(f"✅ Đã cập nhật FloodReport #{report.id}")
+            logger.info("✅ Đã cập nhật FloodReport #%s", report.id)
             
     except Exception as e:
-        print(f"⚠️ Lỗi cập nhật FloodReport: {e}")
-        traceback.print_exc()
+        logger.warning("⚠️ Lỗi cập nhật FloodReport: %s", e, exc_info=True)
 
 
 # POST_SAVE SIGNAL FOR FIXED FLOODING
@@ -599,24 +705,24 @@ def handle_fixed_flooding_activation(sender, instance, created, **kwargs):
     from django.utils import timezone
     
     try:
-        print(f"🔔 Signal FixedFlooding được gọi:")
-        print(f"   - ID: {instance.id}")
-        print(f"   - Created: {created}")
-        print(f"   - is_active mới: {instance.is_active}")
-        print(f"   - is_active cũ: {getattr(instance, '_pre_is_active', 'N/A')}")
+        logger.debug(
+            "🔔 Signal FixedFlooding #%s: created=%s, is_active %s -> %s",
+            instance.id, created, getattr(instance, '_pre_is_active', 'N/A'), instance.is_active
+        )
         if created and instance.is_active:
-            print(f"⚡ FixedFlooding #{instance.id} tạo mới với is_active=True, tạo FloodReport...")
+            logger.info("⚡ FixedFlooding #%s tạo mới với is_active=True, tạo FloodReport...", instance.id)
             _create_flood_report_from_fixed_flooding(instance)
         elif hasattr(instance, '_pre_is_active') and instance.is_active and not instance._pre_is_active:
-            print(f"⚡ FixedFlooding #{instance.id} được kích hoạt từ admin (False -> True), tạo FloodReport...")
+            logger.info(
+                "⚡ FixedFlooding #%s được kích hoạt từ admin (False -> True), tạo FloodReport...", instance.id
+            )
             _create_flood_report_from_fixed_flooding(instance)
         elif hasattr(instance, '_pre_is_active') and not instance.is_active and instance._pre_is_active:
-            print(f"⭕ FixedFlooding #{instance.id} bị tắt (True -> False), cập nhật trạng thái...")
+            logger.info("⭕ FixedFlooding #%s bị tắt (True -> False), cập nhật trạng thái...", instance.id)
             _deactivate_flood_reports(instance)
             
     except Exception as e:
-        print(f"❌ Lỗi signal FixedFlooding: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Lỗi signal FixedFlooding: %s", e)
 
 # FLOOD PREDICTION MODEL
 class FloodPrediction(models.Model):
@@ -636,6 +742,21 @@ class FloodPrediction(models.Model):
         ('very_poor', 'Rất kém'),
     ]
     
+    # Bảng điểm của calculate_risk_level (simulation.py dùng cùng các bảng này cho bản vector hóa)
+    # (ngưỡng, điểm): lấy mục đầu tiên thỏa, xếp từ ngưỡng cao xuống
+    RAINFALL_SCORES = [(50, 30), (30, 20), (20, 10)]
+    RAINFALL_DURATION_SCORES = [(3, 20), (1, 10)]
+    DRAINAGE_SCORES = {
+        'very_poor': 25,
+        'poor': 15,
+        'average': 5,
+        'good': 0
+    }
+    # (khoảng cách tối đa (m), điểm): càng gần sông điểm càng cao
+    RIVER_DISTANCE_SCORES = [(100, 15), (500, 10)]
+    # (điểm tối thiểu, mức rủi ro); dưới mức thấp nhất là 'very_low'
+    RISK_LEVEL_BANDS = [(60, 'very_high'), (45, 'high'), (30, 'medium'), (15, 'low')]
+    
     # Vị trí
     location = models.PointField(
         srid=4326, 
@@ -748,6 +869,16 @@ class FloodPrediction(models.Model):
         verbose_name="Còn hiệu lực",
         default=True
     )
+    source = models.CharField(
+        max_length=20,
+        choices=[
+            ('manual', 'Theo báo cáo / thủ công'),
+            ('forecast_fixed', 'Dự báo hàng loạt - điểm ngập cố định'),
+            ('forecast_grid', 'Dự báo hàng loạt - lưới'),
+        ],
+        default='manual',
+        verbose_name="Nguồn dự đoán"
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -811,45 +942,21 @@ class FloodPrediction(models.Model):
         score = 0
         
         # Điểm cho lượng mưa
-        if self.rainfall_mm >= 50:
-            score += 30
-        elif self.rainfall_mm >= 30:
-            score += 20
-        elif self.rainfall_mm >= 20:
-            score += 10
+        score += next((points for limit, points in self.RAINFALL_SCORES if self.rainfall_mm >= limit), 0)
         
         # Điểm cho thời gian mưa
-        if self.rainfall_duration_hours >= 3:
-            score += 20
-        elif self.rainfall_duration_hours >= 1:
-            score += 10
+        score += next((points for limit, points in self.RAINFALL_DURATION_SCORES
+                       if self.rainfall_duration_hours >= limit), 0)
         
         # Điểm cho khả năng thoát nước
-        drainage_scores = {
-            'very_poor': 25,
-            'poor': 15,
-            'average': 5,
-            'good': 0
-        }
-        score += drainage_scores.get(self.drainage_capacity, 0)
+        score += self.DRAINAGE_SCORES.get(self.drainage_capacity, 0)
         
         # Điểm cho khoảng cách đến sông
-        if self.distance_to_river < 100:
-            score += 15
-        elif self.distance_to_river < 500:
-            score += 10
+        score += next((points for limit, points in self.RIVER_DISTANCE_SCORES
+                       if self.distance_to_river < limit), 0)
         
         # Xác định risk_level
-        if score >= 60:
-            return 'very_high'
-        elif score >= 45:
-            return 'high'
-        elif score >= 30:
-            return 'medium'
-        elif score >= 15:
-            return 'low'
-        else:
-            return 'very_low'
+        return next((level for limit, level in self.RISK_LEVEL_BANDS if score >= limit), 'very_low')
     
     def check_and_activate_fixed_flooding(self):
         """Kiểm tra và kích hoạt FixedFlooding nếu lượng mưa vượt ngưỡng"""
@@ -860,6 +967,7 @@ class FloodPrediction(models.Model):
             nearby_floodings = FixedFlooding.objects.annotate(
                 distance=Distance('location', self.location)
             ).filter(
+                radius_prefilter('location', self.location, 2000),
                 distance__lt=2000,  # 2km
                 is_monitored=True
             )
@@ -884,9 +992,7 @@ class FloodPrediction(models.Model):
         """Tạo FloodZone mới từ dự đoán nếu cần"""
         if self.risk_level in ['high', 'very_high'] and self.predicted_depth_cm >= 20:
             try:
-                # Tạo polygon buffer 50m
-                buffer_distance = 0.00045  # ~50m
-                bbox = self.location.buffer(buffer_distance).envelope
+                flood_area = metric_buffer(self.location, PREDICTION_ZONE_RADIUS_M)
                 
                 zone_name = f"Dự đoán ngập {self.district}"
                 if self.ward:
@@ -895,7 +1001,7 @@ class FloodPrediction(models.Model):
                 zone = FloodZone.objects.create(
                     name=zone_name,
                     zone_type='rain',
-                    geometry=bbox,
+                    geometry=flood_area,
                     district=self.district,
                     ward=self.ward or '',
                     max_depth_cm=self.predicted_depth_cm,
@@ -912,7 +1018,7 @@ class FloodPrediction(models.Model):
                 return zone
                 
             except Exception as e:
-                print(f"❌ Lỗi tạo FloodZone từ dự đoán: {e}")
+                logger.error("❌ Lỗi tạo FloodZone từ dự đoán: %s", e)
         
         return None
     
@@ -924,6 +1030,13 @@ class FloodPrediction(models.Model):
             models.Index(fields=['risk_level', 'prediction_time']),
             models.Index(fields=['district', 'warning_triggered']),
             models.Index(fields=['is_active', 'valid_until']),
+            models.Index(fields=['valid_until'], condition=models.Q(is_active=True),
+                         name='floodprediction_active_idx'),
+            # ORDER BY -prediction_time của get_active_drainage_predictions, đọc được bằng index-only scan
+            models.Index(fields=['-prediction_time'], condition=models.Q(is_active=True),
+                         include=['id', 'address', 'district', 'current_depth_cm', 'predicted_depth_cm',
+                                  'estimated_drainage_time_hours', 'risk_level', 'flood_report'],
+                         name='floodprediction_recent_idx'),
         ]
 
 @receiver(post_save, sender=FloodPrediction)
@@ -1096,6 +1209,366 @@ class FloodHistory(models.Model):
             models.Index(fields=['source', 'severity']),
         ]
 
+# FIXED FLOODING CALIBRATION MODEL
+
+class FixedFloodingCalibration(models.Model):
+    """Đề xuất hiệu chỉnh ngưỡng FixedFlooding từ dữ liệu lịch sử (chờ admin duyệt)"""
+    STATUS_CHOICES = [
+        ('pending', '⏳ Chờ duyệt'),
+        ('applied', '✅ Đã áp dụng'),
+        ('rejected', '❌ Từ chối'),
+        ('superseded', '🔁 Bị thay thế'),
+    ]
+
+    fixed_flooding = models.ForeignKey(
+        FixedFlooding,
+        on_delete=models.CASCADE,
+        verbose_name="Điểm ngập cố định",
+        related_name='calibrations'
+    )
+
+    # Giá trị hiện tại tại thời điểm hiệu chỉnh
+    current_threshold_mm = models.FloatField(verbose_name="Ngưỡng mưa hiện tại (mm/h)")
+    current_depth_cm = models.FloatField(verbose_name="Độ sâu dự đoán hiện tại (cm)")
+    current_duration_hours = models.FloatField(verbose_name="Thời gian ngập hiện tại (giờ)")
+
+    # Giá trị đề xuất
+    proposed_threshold_mm = models.FloatField(
+        verbose_name="Ngưỡng mưa đề xuất (mm/h)",
+        validators=[MinValueValidator(0.1), MaxValueValidator(500)]
+    )
+    proposed_depth_cm = models.FloatField(
+        verbose_name="Độ sâu dự đoán đề xuất (cm)",
+        validators=[MinValueValidator(1), MaxValueValidator(300)]
+    )
+    proposed_duration_hours = models.FloatField(
+        verbose_name="Thời gian ngập đề xuất (giờ)",
+        validators=[MinValueValidator(0.1), MaxValueValidator(72)]
+    )
+    confidence = models.FloatField(
+        verbose_name="Độ tin cậy",
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+        help_text="Độ tin cậy của đề xuất (0-1)"
+    )
+
+    # Dữ liệu dùng để hiệu chỉnh
+    event_count = models.IntegerField(verbose_name="Số đợt mưa ghi nhận", default=0)
+    confirmed_count = models.IntegerField(verbose_name="Số đợt mưa có ngập thực tế", default=0)
+    report_count = models.IntegerField(verbose_name="Số báo cáo xác nhận", default=0)
+    metrics = models.JSONField(
+        verbose_name="Chỉ số hiệu chỉnh",
+        default=dict,
+        help_text="Tỉ lệ kích hoạt sai, hệ số hồi quy độ sâu/thời gian..."
+    )
+
+    # Duyệt
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    reviewed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Duyệt bởi",
+        related_name='reviewed_calibrations'
+    )
+    reviewed_at = models.DateTimeField(verbose_name="Thời điểm duyệt", null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Hiệu chỉnh {self.fixed_flooding.name}: {self.current_threshold_mm} → {self.proposed_threshold_mm} mm/h"
+
+    def apply(self, user=None):
+        """Áp dụng giá trị đề xuất vào FixedFlooding"""
+        flooding = self.fixed_flooding
+        flooding.rainfall_threshold_mm = self.proposed_threshold_mm
+        flooding.predicted_depth_cm = self.proposed_depth_cm
+        flooding.duration_hours = self.proposed_duration_hours
+        flooding.save(update_fields=[
+            'rainfall_threshold_mm', 'predicted_depth_cm', 'duration_hours', 'severity', 'updated_at'
+        ])
+
+        self.status = 'applied'
+        self.reviewed_by = user
+        self.reviewed_at = timezone.now()
+        self.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
+
+    class Meta:
+        verbose_name = "Hiệu chỉnh ngưỡng"
+        verbose_name_plural = "Hiệu chỉnh ngưỡng"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+# FLOOD PRE-WARNING MODEL
+
+class FloodPreWarning(models.Model):
+    """
+    Cảnh báo sớm: FixedFlooding dự kiến vượt ngưỡng mưa trong 24 giờ tới theo dự báo thời tiết.
+    Được tính lại hàng loạt mỗi lần làm mới dự báo, lần sau thay thế lần trước.
+    """
+    fixed_flooding = models.ForeignKey(
+        FixedFlooding,
+        on_delete=models.CASCADE,
+        verbose_name="Điểm ngập cố định",
+        related_name='pre_warnings'
+    )
+
+    forecast_time = models.DateTimeField(verbose_name="Thời điểm lấy dự báo")
+    expected_activation_at = models.DateTimeField(verbose_name="Dự kiến vượt ngưỡng lúc")
+    threshold_mm = models.FloatField(verbose_name="Ngưỡng mưa (mm/h)")
+    peak_rainfall_mm = models.FloatField(verbose_name="Lượng mưa dự báo lớn nhất (mm/h)")
+    peak_at = models.DateTimeField(verbose_name="Thời điểm mưa lớn nhất")
+    expected_depth_cm = models.FloatField(verbose_name="Độ sâu dự kiến (cm)")
+    expected_duration_hours = models.FloatField(verbose_name="Thời gian vượt ngưỡng dự kiến (giờ)")
+    valid_until = models.DateTimeField(verbose_name="Có hiệu lực đến")
+
+    is_active = models.BooleanField(default=True, verbose_name="Đang hiệu lực")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cảnh báo sớm {self.fixed_flooding_id} lúc {self.expected_activation_at:%H:%M %d/%m}"
+
+    class Meta:
+        verbose_name = "Cảnh báo sớm"
+        verbose_name_plural = "Cảnh báo sớm"
+        ordering = ['expected_activation_at']
+        indexes = [
+            models.Index(fields=['valid_until'], condition=models.Q(is_active=True),
+                         name='floodprewarning_active_idx'),
+        ]
+
+
+# ALERT SUBSCRIPTION MODELS
+
+class AlertSubscription(models.Model):
+    """Đăng ký nhận thông báo khi có cảnh báo ngập trong vùng quan tâm (điểm + bán kính hoặc đa giác đã lưu)"""
+    SINK_CHOICES = [
+        ('webhook', 'Webhook'),
+        ('email', 'Email'),
+        ('file', 'Ghi file (kiểm thử)'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Người dùng",
+        related_name='alert_subscriptions'
+    )
+    device_id = models.CharField(max_length=200, blank=True, db_index=True, verbose_name="Mã thiết bị")
+    label = models.CharField(max_length=200, blank=True, verbose_name="Tên địa điểm")
+
+    location = models.PointField(srid=4326, null=True, blank=True, verbose_name="Vị trí")
+    radius_meters = models.FloatField(
+        verbose_name="Bán kính theo dõi (m)",
+        default=500,
+        validators=[MinValueValidator(10), MaxValueValidator(20000)]
+    )
+    area = models.PolygonField(srid=4326, null=True, blank=True, verbose_name="Vùng đã lưu",
+                               help_text="Bỏ trống để dùng vị trí + bán kính")
+    coverage = models.PolygonField(
+        srid=4326,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Vùng theo dõi",
+        help_text="area, hoặc vùng tròn bán kính radius_meters quanh location; tạo lại khi lưu"
+    )
+
+    sink = models.CharField(max_length=20, choices=SINK_CHOICES, default='webhook', verbose_name="Kênh gửi")
+    target = models.CharField(max_length=500, verbose_name="Địa chỉ nhận",
+                              help_text="URL webhook, địa chỉ email hoặc đường dẫn file")
+
+    is_active = models.BooleanField(default=True, verbose_name="Đang theo dõi")
+    last_notified_at = models.DateTimeField(null=True, blank=True, verbose_name="Thông báo gần nhất")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        owner = self.user.username if self.user_id else self.device_id
+        return f"{self.label or 'Đăng ký'} ({owner}, {self.get_sink_display()})"
+
+    def clean(self):
+        if not self.user_id and not self.device_id:
+            raise ValidationError("Cần người dùng hoặc mã thiết bị")
+        if self.location is None and self.area is None:
+            raise ValidationError("Cần vị trí (kèm bán kính) hoặc vùng đã lưu")
+
+    def build_coverage(self):
+        """Vùng theo dõi dùng cho phép giao không gian khi fan-out"""
+        if self.area is not None:
+            self.coverage = self.area
+        else:
+            self.coverage = metric_buffer(self.location, self.radius_meters) if self.location else None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'location', 'radius_meters', 'area'} & set(update_fields):
+            self.build_coverage()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'coverage'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = "Đăng ký cảnh báo"
+        verbose_name_plural = "Đăng ký cảnh báo"
+        ordering = ['-created_at']
+        indexes = [
+            GistIndex(fields=['coverage'], condition=models.Q(is_active=True), name='alertsubscription_active_gist'),
+        ]
+
+
+class AlertNotification(models.Model):
+    """Hàng đợi thông báo chờ gửi tới kênh của một đăng ký (do fan-out tạo, dispatch_notifications gửi)"""
+    STATUS_CHOICES = [
+        ('pending', '⏳ Chờ gửi'),
+        ('sending', '📤 Đang gửi'),
+        ('sent', '✅ Đã gửi'),
+        ('failed', '❌ Lỗi'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    subscription = models.ForeignKey(
+        AlertSubscription,
+        on_delete=models.CASCADE,
+        verbose_name="Đăng ký",
+        related_name='notifications'
+    )
+    event_type = models.CharField(max_length=30, verbose_name="Loại sự kiện")
+    payload = models.JSONField(default=dict, verbose_name="Nội dung")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0, verbose_name="Số lần gửi")
+    error = models.TextField(blank=True, verbose_name="Lỗi gần nhất")
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name="Nhận gửi lúc",
+                                      help_text="Worker đánh dấu sending trước khi gửi; quá hạn thì worker khác nhận lại")
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.event_type} → đăng ký {self.subscription_id}"
+
+    class Meta:
+        verbose_name = "Thông báo"
+        verbose_name_plural = "Thông báo"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='alertnotification_pending_idx'),
+            models.Index(fields=['claimed_at'], condition=models.Q(status='sending'), name='alertnotification_sending_idx'),
+        ]
+
+
+# FLOOD CHANGE LOG MODEL
+
+class FloodChangeLog(models.Model):
+    """
+    Nhật ký thay đổi phục vụ đồng bộ tăng dần (/api/flood-data/changes/).
+    Cursor là txid (mã transaction đã ghi dòng); mỗi dòng chỉ ghi đối tượng nào đã đổi, dữ liệu lấy từ bảng gốc khi đọc.
+    """
+    ENTITY_CHOICES = [
+        ('zone', 'Điểm ngập'),
+        ('report', 'Báo cáo ngập'),
+        ('fixed', 'Điểm ngập cố định'),
+        ('checkpoint', 'Mốc nén nhật ký'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Thêm / cập nhật'),
+        ('delete', 'Xóa'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES, verbose_name="Loại dữ liệu")
+    object_id = models.BigIntegerField(verbose_name="ID đối tượng")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert', verbose_name="Thao tác")
+    txid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False, verbose_name="Transaction")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.entity}:{self.object_id} {self.action}"
+
+    class Meta:
+        verbose_name = "Nhật ký thay đổi"
+        verbose_name_plural = "Nhật ký thay đổi"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['entity', 'object_id']),
+            models.Index(fields=['txid', 'id'], name='floodchangelog_txid_idx'),
+        ]
+
+
+# FLOOD EVENT LOG MODEL
+
+class FloodEventLog(models.Model):
+    """
+    Sự kiện realtime (SSE) ghi trong cùng transaction với thay đổi dữ liệu. Mọi process (web worker,
+    management command) đều ghi vào đây; EventBroker của từng web worker đọc tiếp theo txid như
+    FloodChangeLog, nên sự kiện chỉ tới client sau khi transaction đã commit.
+    """
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False, verbose_name="Transaction")
+    event_type = models.CharField(max_length=40, verbose_name="Loại sự kiện")
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Dữ liệu")
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    notify_pending = models.BooleanField(default=False, verbose_name="Chờ tạo thông báo",
+                                         help_text="dispatch_notifications chưa fan-out sự kiện này tới người đăng ký")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.txid}-{self.id} {self.event_type}"
+
+    class Meta:
+        verbose_name = "Sự kiện realtime"
+        verbose_name_plural = "Sự kiện realtime"
+        ordering = ['txid', 'id']
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='floodeventlog_txid_idx'),
+            models.Index(fields=['id'], condition=models.Q(notify_pending=True), name='floodeventlog_notify_idx'),
+        ]
+
+
+# EXPORT JOB MODEL
+
+class ExportJob(models.Model):
+    """
+    File xuất dữ liệu lớn chạy nền từ admin. File nằm ngoài MEDIA_ROOT với tên ngẫu nhiên (token),
+    chỉ tải được qua view yêu cầu tài khoản staff.
+    """
+    STATUS_CHOICES = [
+        ('running', '⏳ Đang xuất'),
+        ('done', '✅ Hoàn tất'),
+        ('failed', '❌ Lỗi'),
+    ]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    name = models.CharField(max_length=100, verbose_name="Dữ liệu")
+    export_format = models.CharField(max_length=20, verbose_name="Định dạng")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    error = models.TextField(blank=True, verbose_name="Lỗi")
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Người yêu cầu",
+        related_name='export_jobs'
+    )
+    # Luồng xuất cập nhật định kỳ; quá lâu không cập nhật nghĩa là worker đã dừng giữa chừng
+    heartbeat_at = models.DateTimeField(default=timezone.now, verbose_name="Cập nhật gần nhất")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}.{self.export_format} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "File xuất dữ liệu"
+        verbose_name_plural = "File xuất dữ liệu"
+        ordering = ['-created_at']
+
+
 @receiver(post_save, sender=FloodReport)
 def handle_flood_report_save(sender, instance, created, **kwargs):
     """Ghi lịch sử khi báo cáo được tạo"""
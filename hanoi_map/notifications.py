@@ -0,0 +1,405 @@
+import ipaddress
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .events import NOTIFY_EVENT_TYPES, FloodEvent
+from .models import AlertNotification, AlertSubscription, FixedFlooding, FloodEventLog
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+SRID = 4326
+# Số thông báo ghi mỗi lần bulk_create khi fan-out, số sự kiện fan-out mỗi lần và số thông báo mỗi lô gửi đi
+NOTIFY_BATCH_SIZE = getattr(settings, 'FLOOD_NOTIFY_BATCH_SIZE', 2000)
+NOTIFY_FANOUT_BATCH = getattr(settings, 'FLOOD_NOTIFY_FANOUT_BATCH', 100)
+NOTIFY_DISPATCH_BATCH = getattr(settings, 'FLOOD_NOTIFY_DISPATCH_BATCH', 500)
+# Gửi lỗi quá N lần thì đánh dấu failed
+NOTIFY_MAX_ATTEMPTS = getattr(settings, 'FLOOD_NOTIFY_MAX_ATTEMPTS', 5)
+# Thông báo ở trạng thái sending quá N giây (worker chết giữa chừng) được worker khác nhận lại
+NOTIFY_CLAIM_TIMEOUT_SECONDS = getattr(settings, 'FLOOD_NOTIFY_CLAIM_TIMEOUT_SECONDS', 300)
+NOTIFY_WEBHOOK_TIMEOUT = getattr(settings, 'FLOOD_NOTIFY_WEBHOOK_TIMEOUT', 5)
+# Chỉ cho phép webhook tới các máy chủ này (để trống: mọi máy chủ có địa chỉ công khai)
+NOTIFY_WEBHOOK_ALLOWED_HOSTS = {host.lower() for host in getattr(settings, 'FLOOD_NOTIFY_WEBHOOK_ALLOWED_HOSTS', ())}
+# File mặc định của kênh 'file' khi đăng ký không ghi đường dẫn
+NOTIFY_FILE_PATH = getattr(settings, 'FLOOD_NOTIFY_FILE_PATH', os.path.join(settings.BASE_DIR, 'notifications.jsonl'))
+# Thay kênh gửi bằng class khác, ví dụ {'email': 'myapp.sinks.SmtpSink'}
+NOTIFY_SINKS = getattr(settings, 'FLOOD_NOTIFY_SINKS', {})
+
+
+def validate_webhook_url(url):
+    """
+    Chặn SSRF: webhook phải là URL http(s) và máy chủ phải phân giải ra địa chỉ công khai (không loopback,
+    mạng nội bộ, link-local, dành riêng, multicast). Có NOTIFY_WEBHOOK_ALLOWED_HOSTS thì chỉ nhận máy chủ
+    trong danh sách. Gọi khi tạo đăng ký và lại trước mỗi lần gửi (DNS có thể đã đổi). ValueError nếu không hợp lệ.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("Webhook phải là URL http(s) có tên máy chủ")
+    host = parts.hostname.lower()
+    if NOTIFY_WEBHOOK_ALLOWED_HOSTS:
+        if host not in NOTIFY_WEBHOOK_ALLOWED_HOSTS:
+            raise ValueError(f"Máy chủ webhook {host} không nằm trong danh sách cho phép")
+        return url
+
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Không phân giải được máy chủ webhook {host}")
+    for address in addresses:
+        _check_public_address(host, address)
+    return url
+
+
+def _check_public_address(host, address):
+    """ValueError nếu address (IP mà host phân giải / kết nối tới) không phải địa chỉ công khai"""
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ValueError(f"Webhook không được trỏ tới địa chỉ nội bộ ({host} → {ip})")
+
+
+class _PublicAddressMixin:
+    """
+    Kiểm tra IP thực sự kết nối tới sau khi mở socket (trước khi gửi byte nào): requests phân giải tên
+    lại lần nữa, nên chỉ kiểm tra trong validate_webhook_url không chặn được DNS rebinding.
+    """
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        if self.host.lower() not in NOTIFY_WEBHOOK_ALLOWED_HOSTS:
+            try:
+                _check_public_address(self.host, sock.getpeername()[0])
+            except ValueError:
+                sock.close()
+                raise
+        return sock
+
+
+class _PublicHTTPConnection(_PublicAddressMixin, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicAddressMixin, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicAddressAdapter(HTTPAdapter):
+    """Adapter của requests chỉ kết nối tới địa chỉ công khai (hoặc máy chủ trong NOTIFY_WEBHOOK_ALLOWED_HOSTS)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PublicHTTPConnectionPool,
+            'https': _PublicHTTPSConnectionPool,
+        }
+
+
+def webhook_session():
+    """Session gửi webhook: kiểm tra IP khi kết nối, không đi qua proxy từ biến môi trường"""
+    session = requests.Session()
+    session.trust_env = False
+    adapter = PublicAddressAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _message(notification):
+    """Nội dung gửi đi của một thông báo"""
+    return {
+        'id': notification.id,
+        'subscription_id': notification.subscription_id,
+        'label': notification.subscription.label,
+        'event_type': notification.event_type,
+        **notification.payload,
+    }
+
+
+class NotificationSink:
+    """
+    Kênh gửi thông báo. send() nhận một lô AlertNotification cùng kênh (đã select_related subscription)
+    và trả về {notification_id: lỗi} cho các thông báo gửi không thành công.
+    """
+
+    def send(self, notifications):
+        raise NotImplementedError
+
+
+class WebhookSink(NotificationSink):
+    """
+    POST JSON tới URL của đăng ký, mỗi URL một request cho cả lô. URL được kiểm tra lại trước khi gửi và
+    IP thực sự kết nối tới được kiểm tra lần nữa (webhook_session).
+    """
+
+    def send(self, notifications):
+        by_url = defaultdict(list)
+        for notification in notifications:
+            by_url[notification.subscription.target].append(notification)
+
+        errors = {}
+        session = webhook_session()
+        for url, group in by_url.items():
+            try:
+                validate_webhook_url(url)
+                # Không theo redirect: đích redirect không qua được validate_webhook_url
+                response = session.post(
+                    url, data=dumps({'notifications': [_message(notification) for notification in group]}),
+                    headers={'Content-Type': 'application/json'}, timeout=NOTIFY_WEBHOOK_TIMEOUT,
+                    allow_redirects=False,
+                )
+                error = f"HTTP {response.status_code}" if response.status_code >= 300 else None
+            except (ValueError, requests.RequestException) as e:
+                error = str(e)
+            if error:
+                logger.warning("⚠️ Webhook %s lỗi: %s", url, error)
+                errors.update({notification.id: error for notification in group})
+        session.close()
+        return errors
+
+
+class EmailSink(NotificationSink):
+    """Chưa nối máy chủ mail: chỉ ghi log (thay bằng FLOOD_NOTIFY_SINKS['email'])"""
+
+    def send(self, notifications):
+        for notification in notifications:
+            logger.info("📧 [stub] %s: %s #%s", notification.subscription.target,
+                        notification.event_type, notification.payload.get('data', {}).get('id'))
+        return {}
+
+
+class FileSink(NotificationSink):
+    """Ghi mỗi thông báo một dòng JSON vào file (kiểm thử, chạy local)"""
+
+    def send(self, notifications):
+        by_path = defaultdict(list)
+        for notification in notifications:
+            by_path[notification.subscription.target or NOTIFY_FILE_PATH].append(notification)
+
+        errors = {}
+        for path, group in by_path.items():
+            try:
+                with open(path, 'ab') as f:
+                    f.writelines(dumps(_message(notification)) + b'\n' for notification in group)
+            except OSError as e:
+                errors.update({notification.id: str(e) for notification in group})
+        return errors
+
+
+SINKS = {
+    'webhook': WebhookSink,
+    'email': EmailSink,
+    'file': FileSink,
+}
+
+
+def get_sink(name):
+    path = NOTIFY_SINKS.get(name)
+    return (import_string(path) if path else SINKS[name])()
+
+
+class NotificationService:
+    """
+    Fan-out thông báo theo vùng đăng ký: mỗi sự kiện tìm các đăng ký bị ảnh hưởng bằng một phép giao
+    không gian (GiST trên coverage) và ghi hàng đợi theo lô, nên chi phí tỉ lệ với số người bị ảnh hưởng
+    chứ không với tổng số đăng ký. Cả fan-out (từ các sự kiện notify_pending trong FloodEventLog) lẫn gửi
+    đều chạy trong dispatch(), ngoài request đã gây ra sự kiện.
+    """
+
+    @staticmethod
+    def event_geometry(event):
+        """Vùng ảnh hưởng của sự kiện: vùng tròn của FixedFlooding, hoặc vị trí báo cáo"""
+        if event.type.startswith('fixed.'):
+            flooding = FixedFlooding.objects.filter(pk=event.data['id']).only(
+                'location', 'radius_meters', 'flood_area'
+            ).first()
+            return flooding.get_flood_polygon() if flooding else None
+        if event.lat is None or event.lng is None:
+            return None
+        return Point(event.lng, event.lat, srid=SRID)
+
+    @staticmethod
+    def fan_out(event_type, payload, geometry):
+        """Tạo thông báo cho mọi đăng ký đang theo dõi có vùng giao với geometry"""
+        try:
+            started = time.perf_counter()
+            subscription_ids = AlertSubscription.objects.filter(
+                is_active=True, coverage__intersects=geometry
+            ).values_list('id', flat=True)
+
+            created = 0
+            batch = []
+            with transaction.atomic():
+                for subscription_id in subscription_ids.iterator(chunk_size=NOTIFY_BATCH_SIZE):
+                    batch.append(AlertNotification(
+                        subscription_id=subscription_id, event_type=event_type, payload=payload
+                    ))
+                    if len(batch) >= NOTIFY_BATCH_SIZE:
+                        created += len(AlertNotification.objects.bulk_create(batch))
+                        batch = []
+                if batch:
+                    created += len(AlertNotification.objects.bulk_create(batch))
+
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            if created:
+                logger.info("🔔 %s: %s thông báo chờ gửi (%s ms)", event_type, created, elapsed_ms)
+            return {
+                'success': True,
+                'created': created,
+                'elapsed_ms': elapsed_ms,
+            }
+
+        except Exception as e:
+            logger.exception("❌ Lỗi fan-out thông báo %s: %s", event_type, e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @staticmethod
+    def fan_out_event(event):
+        """Tạo thông báo cho một sự kiện (FloodEvent) thuộc NOTIFY_EVENT_TYPES"""
+        if event.type not in NOTIFY_EVENT_TYPES:
+            return None
+        geometry = NotificationService.event_geometry(event)
+        if geometry is None:
+            return None
+        payload = {
+            'event_id': event.id,
+            'type': event.type,
+            'lat': event.lat,
+            'lng': event.lng,
+            'timestamp': event.timestamp,
+            'data': event.data,
+        }
+        return NotificationService.fan_out(event.type, payload, geometry)
+
+    @staticmethod
+    def fan_out_pending(limit=NOTIFY_FANOUT_BATCH):
+        """
+        Fan-out các sự kiện notify_pending. Sự kiện được khóa SKIP LOCKED và bỏ cờ trong cùng transaction
+        với thông báo đã tạo, nên nhiều worker chạy song song không tạo trùng. Sự kiện fan-out lỗi giữ cờ
+        để lần chạy sau thử lại. Trả về số sự kiện đã xử lý xong.
+        """
+        with transaction.atomic():
+            rows = list(
+                FloodEventLog.objects.select_for_update(skip_locked=True)
+                .filter(notify_pending=True)
+                .order_by('id')[:limit]
+            )
+            done = []
+            for row in rows:
+                result = NotificationService.fan_out_event(FloodEvent.from_log(row))
+                # None: sự kiện không tạo thông báo (không có vùng ảnh hưởng)
+                if result is None or result['success']:
+                    done.append(row.pk)
+                else:
+                    logger.warning("⚠️ Sự kiện %s-%s chưa fan-out được, thử lại lần sau", row.txid, row.pk)
+            FloodEventLog.objects.filter(pk__in=done).update(notify_pending=False)
+        return len(done)
+
+    @staticmethod
+    def claim(batch_size=NOTIFY_DISPATCH_BATCH, now=None):
+        """
+        Nhận một lô thông báo để gửi: pending, hoặc sending đã quá NOTIFY_CLAIM_TIMEOUT_SECONDS (worker trước
+        chết giữa chừng). Đánh dấu sending và tăng attempts rồi commit ngay, nên không giữ khóa hàng khi gửi.
+        """
+        now = now or timezone.now()
+        stale = now - timedelta(seconds=NOTIFY_CLAIM_TIMEOUT_SECONDS)
+        with transaction.atomic():
+            AlertNotification.objects.filter(
+                status='sending', claimed_at__lt=stale, attempts__gte=NOTIFY_MAX_ATTEMPTS
+            ).update(status='failed', error='Quá thời gian gửi')
+            ids = list(
+                AlertNotification.objects.select_for_update(skip_locked=True)
+                .filter(Q(status='pending') | Q(status='sending', claimed_at__lt=stale))
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            AlertNotification.objects.filter(pk__in=ids).update(
+                status='sending', claimed_at=now, attempts=F('attempts') + 1
+            )
+        return list(AlertNotification.objects.filter(pk__in=ids).select_related('subscription').order_by('id'))
+
+    @staticmethod
+    def dispatch(batch_size=NOTIFY_DISPATCH_BATCH):
+        """
+        Fan-out các sự kiện mới rồi gửi một lô thông báo, nhóm theo kênh. Lô được nhận trước (claim) và gửi
+        ngoài transaction, nên nhiều worker chạy song song được và request chậm không giữ khóa; gửi lỗi thì
+        về pending để thử lại, quá NOTIFY_MAX_ATTEMPTS lần thì failed.
+        """
+        try:
+            started = time.perf_counter()
+            fanned_out = NotificationService.fan_out_pending()
+            now = timezone.now()
+            notifications = NotificationService.claim(batch_size, now)
+
+            by_sink = defaultdict(list)
+            for notification in notifications:
+                by_sink[notification.subscription.sink].append(notification)
+
+            for sink_name, group in by_sink.items():
+                try:
+                    errors = get_sink(sink_name).send(group)
+                except Exception as e:
+                    logger.exception("❌ Lỗi kênh gửi %s: %s", sink_name, e)
+                    errors = {notification.id: str(e) for notification in group}
+
+                for notification in group:
+                    error = errors.get(notification.id)
+                    if error is None:
+                        notification.status = 'sent'
+                        notification.sent_at = now
+                        notification.error = ''
+                    else:
+                        notification.error = str(error)[:1000]
+                        notification.status = 'failed' if notification.attempts >= NOTIFY_MAX_ATTEMPTS else 'pending'
+
+            with transaction.atomic():
+                AlertNotification.objects.bulk_update(
+                    notifications, ['status', 'error', 'sent_at'], batch_size=1000
+                )
+                AlertSubscription.objects.filter(
+                    pk__in={notification.subscription_id for notification in notifications if notification.status == 'sent'}
+                ).update(last_notified_at=now)
+
+            return {
+                'success': True,
+                'fanned_out': fanned_out,
+                'processed': len(notifications),
+                'sent': sum(1 for notification in notifications if notification.status == 'sent'),
+                'retry': sum(1 for notification in notifications if notification.status == 'pending'),
+                'failed': sum(1 for notification in notifications if notification.status == 'failed'),
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+
+        except Exception as e:
+            logger.exception("❌ Lỗi gửi thông báo: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -0,0 +1,98 @@
+import datetime
+import decimal
+import json
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.functional import Promise
+
+from .metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn, không có thì dùng json chuẩn
+    orjson = None
+
+# orjson.Fragment (>= 3.9) cho phép chèn JSON đã tuần tự hóa mà không parse lại
+HAS_FRAGMENT = orjson is not None and hasattr(orjson, 'Fragment')
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+class RawJSON:
+    """Chuỗi JSON đã tuần tự hóa sẵn (ví dụ GeoJSON của geometry), được ghi thẳng vào response"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.value == other.value
+
+    def __repr__(self):
+        return f"RawJSON({self.value!r})"
+
+
+def geometry_json(geometry):
+    """GeoJSON của geometry dạng RawJSON (None nếu không có geometry)"""
+    if geometry is None:
+        return None
+    return RawJSON(geometry.json)
+
+
+def _default(obj):
+    """Các kiểu orjson không tự xử lý"""
+    if isinstance(obj, RawJSON):
+        return orjson.Fragment(obj.value) if HAS_FRAGMENT else orjson.loads(obj.value)
+    if isinstance(obj, GEOSGeometry):
+        return orjson.Fragment(obj.json) if HAS_FRAGMENT else orjson.loads(obj.json)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FallbackJSONEncoder(DjangoJSONEncoder):
+    """Encoder khi không có orjson: hiểu thêm RawJSON / GEOS (phải parse lại) và set"""
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return json.loads(obj.value)
+        if isinstance(obj, GEOSGeometry):
+            return json.loads(obj.json)
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        return super().default(obj)
+
+
+def dumps(data):
+    """Tuần tự hóa sang bytes UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(data, cls=FallbackJSONEncoder, ensure_ascii=False).encode('utf-8')
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Thay thế JsonResponse: dùng orjson (nếu có), hiểu datetime/Decimal/UUID/GEOS,
+    và ghi geometry dạng RawJSON mà không parse rồi dump lại.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the safe parameter to False."
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        with timed_serialization():
+            content = dumps(data)
+        super().__init__(content=content, **kwargs)
+
@@ -1,19 +1,46 @@
+import httpx
 import requests
 from django.conf import settings
 from datetime import datetime, timedelta
 from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
-from django.db.models import Count, Avg, Q, Max
-from django.http import JsonResponse
+from django.contrib.gis.db.models.functions import AsGeoJSON, Distance
+from django.contrib.gis.measure import D
+from django.db.models import Count, Avg, F, Q, Max
+from django.db.models.functions import Coalesce, Left
 import json
 from django.utils import timezone
 from datetime import timedelta
-import traceback
+import logging
+import math
+import numpy as np
+import shapely
 
 
 from .models import FloodZone, FloodReport, FloodPrediction, FixedFlooding, FloodHistory
+from .encodings import COLUMNAR_FORMAT_VERSION, COORD_SCALE, Column, choice_labels, encode_layer
+from .geometry import COORD_PRECISION, geometry_field_for_zoom, radius_prefilter
+from .logs import SampledLogger
+from .responses import RawJSON
+
+logger = logging.getLogger(__name__)
+# Thông điệp lặp theo từng dòng dữ liệu: tối đa một lần mỗi phút cho mỗi mẫu
+row_logger = SampledLogger(logger)
+
 SRID = 4326
 
+NOMINATIM_HEADERS = {
+    'User-Agent': 'HanoiFloodMonitor/1.0',
+    'Accept-Language': 'vi'
+}
+
+
+async def _async_get(client, url, **kwargs):
+    """GET bất đồng bộ; dùng client dùng chung của request nếu có"""
+    if client is not None:
+        return await client.get(url, **kwargs)
+    async with httpx.AsyncClient() as own_client:
+        return await own_client.get(url, **kwargs)
+
 
 class LocationSearchService:
     """Service tìm kiếm địa điểm tại Hà Nội"""
@@ -28,12 +55,7 @@ class LocationSearchService:
             encoded_query = requests.utils.quote(f"{query} Hà Nội")
             url = f"https://nominatim.openstreetmap.org/search?q={encoded_query}&format=json&limit=10&countrycodes=vn&addressdetails=1"
             
-            headers = {
-                'User-Agent': 'HanoiFloodMonitor/1.0',
-                'Accept-Language': 'vi'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=5)
+            response = requests.get(url, headers=NOMINATIM_HEADERS, timeout=5)
             
             if response.status_code == 200:
                 results = response.json()
@@ -63,7 +85,7 @@ class LocationSearchService:
             return []
             
         except Exception as e:
-            print(f"❌ Lỗi tìm kiếm: {e}")
+            logger.error("❌ Lỗi tìm kiếm: %s", e)
             return []
     
     @staticmethod
@@ -72,48 +94,64 @@ class LocationSearchService:
         try:
             url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json&addressdetails=1"
             
-            headers = {
-                'User-Agent': 'HanoiFloodMonitor/1.0',
-                'Accept-Language': 'vi'
-            }
+            response = requests.get(url, headers=NOMINATIM_HEADERS, timeout=5)
+            
+            if response.status_code == 200:
+                return LocationSearchService._parse_reverse(response.json(), lat, lon)
             
-            response = requests.get(url, headers=headers, timeout=5)
+            return {'success': False, 'error': 'Không thể lấy thông tin địa chỉ'}
+            
+        except Exception as e:
+            logger.error("❌ Reverse geocode error: %s", e)
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    async def aget_location_info(lat, lon, client=None):
+        """Bản bất đồng bộ của get_location_info"""
+        try:
+            url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json&addressdetails=1"
+            
+            response = await _async_get(client, url, headers=NOMINATIM_HEADERS, timeout=5)
             
             if response.status_code == 200:
-                data = response.json()
-                address = data.get('address', {})
-                
-                district = (
-                    address.get('city_district') or 
-                    address.get('district') or 
-                    address.get('subdistrict') or 
-                    address.get('county') or 
-                    ''
-                )
-                
-                ward = (
-                    address.get('suburb') or 
-                    address.get('quarter') or 
-                    address.get('neighbourhood') or 
-                    address.get('town') or 
-                    ''
-                )
-                
-                return {
-                    'success': True,
-                    'display_name': data.get('display_name', ''),
-                    'district': district,
-                    'ward': ward,
-                    'street': address.get('road', ''),
-                    'full_address': address,
-                    'coordinates': {'lat': lat, 'lon': lon}
-                }
+                return LocationSearchService._parse_reverse(response.json(), lat, lon)
             
             return {'success': False, 'error': 'Không thể lấy thông tin địa chỉ'}
             
         except Exception as e:
-            print(f"❌ Reverse geocode error: {e}")
+            logger.error("❌ Reverse geocode error: %s", e)
             return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def _parse_reverse(data, lat, lon):
+        """Chuẩn hóa kết quả reverse geocode của Nominatim"""
+        address = data.get('address', {})
+        
+        district = (
+            address.get('city_district') or 
+            address.get('district') or 
+            address.get('subdistrict') or 
+            address.get('county') or 
+            ''
+        )
+        
+        ward = (
+            address.get('suburb') or 
+            address.get('quarter') or 
+            address.get('neighbourhood') or 
+            address.get('town') or 
+            ''
+        )
+        
+        return {
+            'success': True,
+            'display_name': data.get('display_name', ''),
+            'district': district,
+            'ward': ward,
+            'street': address.get('road', ''),
+            'full_address': address,
+            'coordinates': {'lat': lat, 'lon': lon}
+        }
 
 
 class WeatherService:
@@ -124,95 +162,134 @@ class WeatherService:
         self.base_url = "https://api.openweathermap.org/data/2.5"
         self.use_fallback = not self.api_key
     
+    def _current_params(self, lat, lon):
+        return {
+            'lat': lat,
+            'lon': lon,
+            'appid': self.api_key,
+            'units': 'metric',
+            'lang': 'vi'
+        }
+    
+    def _forecast_params(self, lat, lon):
+        return {
+            'lat': lat,
+            'lon': lon,
+            'appid': self.api_key,
+            'units': 'metric',
+            'cnt': 8,  
+            'lang': 'vi'
+        }
+    
     def get_current_weather(self, lat, lon):
         """Lấy thời tiết hiện tại"""
         try:
             if self.use_fallback:
                 return self.get_fallback_weather()
             
-            url = f"{self.base_url}/weather"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': self.api_key,
-                'units': 'metric',
-                'lang': 'vi'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            response = requests.get(f"{self.base_url}/weather", params=self._current_params(lat, lon), timeout=10)
             
             if response.status_code != 200:
-                print(f"⚠️ Weather API error: {response.status_code}")
+                logger.warning("⚠️ Weather API error: %s", response.status_code)
                 return self.get_fallback_weather()
                 
-            data = response.json()
+            return self._parse_current(response.json())
+        except Exception as e:
+            logger.error("❌ Weather API error: %s", e)
+            return self.get_fallback_weather()
+    
+    async def aget_current_weather(self, lat, lon, client=None):
+        """Bản bất đồng bộ của get_current_weather"""
+        try:
+            if self.use_fallback:
+                return self.get_fallback_weather()
             
-            return {
-                'success': True,
-                'temp': round(data['main']['temp'], 1),
-                'feels_like': round(data['main']['feels_like'], 1),
-                'humidity': data['main']['humidity'],
-                'pressure': data['main']['pressure'],
-                'rain': data.get('rain', {}).get('1h', 0),
-                'description': data['weather'][0]['description'],
-                'icon': data['weather'][0]['icon'],
-                'wind_speed': round(data['wind']['speed'], 1),
-                'clouds': data['clouds']['all'],
-                'timestamp': datetime.now().isoformat()
-            }
+            response = await _async_get(client, f"{self.base_url}/weather",
+                                        params=self._current_params(lat, lon), timeout=10)
+            
+            if response.status_code != 200:
+                logger.warning("⚠️ Weather API error: %s", response.status_code)
+                return self.get_fallback_weather()
+                
+            return self._parse_current(response.json())
         except Exception as e:
-            print(f"❌ Weather API error: {e}")
+            logger.error("❌ Weather API error: %s", e)
             return self.get_fallback_weather()
     
+    def _parse_current(self, data):
+        return {
+            'success': True,
+            'temp': round(data['main']['temp'], 1),
+            'feels_like': round(data['main']['feels_like'], 1),
+            'humidity': data['main']['humidity'],
+            'pressure': data['main']['pressure'],
+            'rain': data.get('rain', {}).get('1h', 0),
+            'description': data['weather'][0]['description'],
+            'icon': data['weather'][0]['icon'],
+            'wind_speed': round(data['wind']['speed'], 1),
+            'clouds': data['clouds']['all'],
+            'timestamp': datetime.now().isoformat()
+        }
+    
     def get_forecast(self, lat, lon):
         """Lấy dự báo thời tiết"""
         try:
             if self.use_fallback:
                 return self.get_fallback_forecast()
             
-            url = f"{self.base_url}/forecast"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': self.api_key,
-                'units': 'metric',
-                'cnt': 8,  
-                'lang': 'vi'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            response = requests.get(f"{self.base_url}/forecast", params=self._forecast_params(lat, lon), timeout=10)
             
             if response.status_code != 200:
-                print(f"⚠️ Forecast API error: {response.status_code}")
+                logger.warning("⚠️ Forecast API error: %s", response.status_code)
                 return self.get_fallback_forecast()
                 
-            data = response.json()
-            
-            forecasts = []
-            for item in data.get('list', [])[:8]:
-                forecasts.append({
-                    'datetime': item.get('dt_txt', ''),
-                    'temp': round(item['main']['temp'], 1),
-                    'feels_like': round(item['main']['feels_like'], 1),
-                    'humidity': item['main']['humidity'],
-                    'rain': item.get('rain', {}).get('3h', 0),
-                    'description': item['weather'][0]['description'],
-                    'icon': item['weather'][0]['icon'],
-                    'wind_speed': round(item['wind']['speed'], 1),
-                    'clouds': item['clouds']['all']
-                })
+            return self._parse_forecast(response.json())
             
-            return {
-                'success': True,
-                'city': data.get('city', {}).get('name', 'Hà Nội'),
-                'forecasts': forecasts,
-                'timestamp': datetime.now().isoformat()
-            }
+        except Exception as e:
+            logger.error("❌ Forecast API error: %s", e)
+            return self.get_fallback_forecast()
+    
+    async def aget_forecast(self, lat, lon, client=None):
+        """Bản bất đồng bộ của get_forecast"""
+        try:
+            if self.use_fallback:
+                return self.get_fallback_forecast()
+            
+            response = await _async_get(client, f"{self.base_url}/forecast",
+                                        params=self._forecast_params(lat, lon), timeout=10)
+            
+            if response.status_code != 200:
+                logger.warning("⚠️ Forecast API error: %s", response.status_code)
+                return self.get_fallback_forecast()
+                
+            return self._parse_forecast(response.json())
             
         except Exception as e:
-            print(f"❌ Forecast API error: {e}")
+            logger.error("❌ Forecast API error: %s", e)
             return self.get_fallback_forecast()
     
+    def _parse_forecast(self, data):
+        forecasts = []
+        for item in data.get('list', [])[:8]:
+            forecasts.append({
+                'datetime': item.get('dt_txt', ''),
+                'temp': round(item['main']['temp'], 1),
+                'feels_like': round(item['main']['feels_like'], 1),
+                'humidity': item['main']['humidity'],
+                'rain': item.get('rain', {}).get('3h', 0),
+                'description': item['weather'][0]['description'],
+                'icon': item['weather'][0]['icon'],
+                'wind_speed': round(item['wind']['speed'], 1),
+                'clouds': item['clouds']['all']
+            })
+        
+        return {
+            'success': True,
+            'city': data.get('city', {}).get('name', 'Hà Nội'),
+            'forecasts': forecasts,
+            'timestamp': datetime.now().isoformat()
+        }
+    
     def get_rain_alerts(self, lat, lon):
         """Lấy cảnh báo mưa"""
         try:
@@ -239,7 +316,7 @@ class WeatherService:
             return alerts
             
         except Exception as e:
-            print(f"❌ Rain alerts error: {e}")
+            logger.error("❌ Rain alerts error: %s", e)
             return []
     
     def get_fallback_weather(self):
@@ -327,14 +404,243 @@ class WeatherService:
         }
 
 
+# Cột của định dạng columnar (xem encodings.py): mã hóa từ điển cho giá trị lặp lại, bỏ chuỗi hiển thị
+ZONE_COLUMNS = [
+    Column('id', kind='delta'),
+    Column('name'),
+    Column('zone_type', kind='dict'),
+    Column('district', kind='dict'),
+    Column('ward', kind='dict'),
+    Column('street', kind='dict'),
+    Column('max_depth', 'max_depth_cm', kind='round1'),
+    Column('report_count'),
+    Column('last_reported_at', kind='time'),
+    Column('description', 'short_description'),
+    Column('flood_cause', kind='dict'),
+]
+REPORT_COLUMNS = [
+    Column('id', kind='delta'),
+    Column('address'),
+    Column('water_depth', kind='round1'),
+    Column('severity', kind='dict'),
+    Column('created_at', kind='time'),
+    Column('reporter_name'),
+    Column('photo_url'),
+    Column('description', 'short_description'),
+    Column('district', kind='dict'),
+    Column('ward', kind='dict'),
+    Column('status', kind='dict'),
+]
+FIXED_FLOODING_COLUMNS = [
+    Column('id', kind='delta'),
+    Column('name'),
+    Column('address'),
+    Column('district', kind='dict'),
+    Column('ward', kind='dict'),
+    Column('is_active'),
+    Column('is_monitored'),
+    Column('rainfall_threshold', 'rainfall_threshold_mm', kind='round1'),
+    Column('predicted_depth', 'predicted_depth_cm', kind='round1'),
+    Column('severity', kind='dict'),
+    Column('flood_type', kind='dict'),
+    Column('radius_meters'),
+    Column('activation_count'),
+    Column('last_activated', kind='time'),
+    Column('recommendations'),
+    Column('description'),
+]
+
+# Cột đọc cho từng API dạng GeoJSON / danh sách (.values(), không dựng model)
+ZONE_FEATURE_FIELDS = [
+    'id', 'name', 'zone_type', 'district', 'ward', 'street', 'max_depth_cm', 'report_count',
+    'last_reported_at', 'is_active', 'flood_cause',
+]
+REPORT_FEATURE_FIELDS = [
+    'id', 'address', 'water_depth', 'severity', 'created_at', 'reporter_name', 'photo_url',
+    'district', 'ward', 'status',
+]
+FIXED_FLOODING_FEATURE_FIELDS = [
+    'id', 'name', 'address', 'district', 'ward', 'location', 'is_active', 'is_monitored',
+    'rainfall_threshold_mm', 'predicted_depth_cm', 'severity', 'flood_type', 'radius_meters',
+    'activation_count', 'last_activated', 'recommendations', 'description',
+]
+ZONE_TYPE_LABELS = choice_labels(FloodZone, 'zone_type')['zone_type']
+SEVERITY_LABELS = choice_labels(FloodReport, 'severity')['severity']
+FLOOD_TYPE_LABELS = choice_labels(FixedFlooding, 'flood_type')['flood_type']
+
+
 class FloodDataService:
     """Service cung cấp dữ liệu ngập cho bản đồ"""
     
     @staticmethod
-    def get_all_flood_data():
-        """Lấy TẤT CẢ dữ liệu ngập từ database"""
+    def zone_geometry(zoom=None):
+        """Biểu thức hình học theo zoom: mức đơn giản hóa đã lưu, hình học gốc nếu chưa có"""
+        field = geometry_field_for_zoom(zoom)
+        if field == 'geometry':
+            return F('geometry')
+        return Coalesce(field, 'geometry')
+    
+    @staticmethod
+    def zone_rows(queryset, zoom=None):
+        """Chỉ đọc các cột cần cho Feature; GeoJSON (theo mức zoom, tọa độ ~1 m) và mô tả rút gọn do PostGIS tạo sẵn"""
+        return queryset.annotate(
+            geojson=AsGeoJSON(FloodDataService.zone_geometry(zoom), precision=COORD_PRECISION),
+            short_description=Left('description', 100),
+        ).values(*ZONE_FEATURE_FIELDS, 'geojson', 'short_description')
+    
+    @staticmethod
+    def report_rows(queryset):
+        """Các cột hiển thị của FloodReport (không đọc email, ghi chú xác nhận...)"""
+        return queryset.annotate(
+            geojson=AsGeoJSON('location'),
+            short_description=Left('description', 100),
+        ).values(*REPORT_FEATURE_FIELDS, 'geojson', 'short_description')
+    
+    @staticmethod
+    def fixed_flooding_rows(queryset, *extra):
+        """Các cột hiển thị của FixedFlooding (không đọc flood_history), extra: annotation cần lấy thêm"""
+        return queryset.values(*FIXED_FLOODING_FEATURE_FIELDS, *extra)
+    
+    @staticmethod
+    def zone_feature(zone):
+        """GeoJSON Feature của một dòng zone_rows() (dùng chung cho tải toàn bộ và đồng bộ tăng dần)"""
+        # GeoJSON của geometry được ghi thẳng vào response (RawJSON), không json.loads rồi dump lại
+        if zone['geojson']:
+            geometry = RawJSON(zone['geojson'])
+        else:
+            geometry = {'type': 'Point', 'coordinates': [0, 0]}
+        
+        return {
+            'type': 'Feature',
+            'geometry': geometry,
+            'properties': {
+                'id': f"zone_{zone['id']}",
+                'name': zone['name'] or 'Điểm ngập',
+                'zone_type': zone['zone_type'] or 'unknown',
+                'zone_type_display': ZONE_TYPE_LABELS.get(zone['zone_type'], zone['zone_type']),
+                'district': zone['district'] or '',
+                'ward': zone['ward'] or '',
+                'street': zone['street'] or '',
+                'max_depth': zone['max_depth_cm'] or 0,
+                'report_count': zone['report_count'] or 0,
+                'last_reported': zone['last_reported_at'].strftime('%H:%M %d/%m') if zone['last_reported_at'] else 'Chưa có',
+                'description': zone['short_description'] or '',
+                'is_active': zone['is_active'],
+                'flood_cause': zone['flood_cause'] or 'Không xác định'
+            }
+        }
+    
+    @staticmethod
+    def report_feature(report):
+        """GeoJSON Feature của một dòng report_rows()"""
+        return {
+            'type': 'Feature',
+            'geometry': RawJSON(report['geojson']),
+            'properties': {
+                'id': f"report_{report['id']}",
+                'address': report['address'] or 'Không có địa chỉ',
+                'water_depth': report['water_depth'] or 0,
+                'severity': report['severity'] or 'unknown',
+                'severity_display': SEVERITY_LABELS.get(report['severity'], report['severity']),
+                'created_at': report['created_at'].strftime('%H:%M %d/%m'),
+                'created_at_iso': report['created_at'].isoformat(),
+                'reporter_name': report['reporter_name'] or 'Ẩn danh',
+                'photo_url': report['photo_url'] or None,
+                'description': report['short_description'] or '',
+                'district': report['district'] or '',
+                'ward': report['ward'] or '',
+                'status': report['status']
+            }
+        }
+    
+    @staticmethod
+    def fixed_flooding_feature(flooding):
+        """GeoJSON Feature của một dòng fixed_flooding_rows()"""
+        return {
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [flooding['location'].x, flooding['location'].y]
+            },
+            'properties': {
+                'id': f"fixed_{flooding['id']}",
+                'name': flooding['name'],
+                'address': flooding['address'],
+                'district': flooding['district'],
+                'ward': flooding['ward'],
+                'is_active': flooding['is_active'],
+                'is_monitored': flooding['is_monitored'],
+                'rainfall_threshold': flooding['rainfall_threshold_mm'],
+                'predicted_depth': flooding['predicted_depth_cm'],
+                'severity': flooding['severity'],
+                'flood_type': flooding['flood_type'],
+                'flood_type_display': FLOOD_TYPE_LABELS.get(flooding['flood_type'], flooding['flood_type']),
+                'radius_meters': flooding['radius_meters'],
+                'activation_count': flooding['activation_count'],
+                'last_activated': flooding['last_activated'].isoformat() if flooding['last_activated'] else None,
+                'recommendations': flooding['recommendations'],
+                'description': flooding['description']
+            }
+        }
+    
+    @staticmethod
+    def get_all_flood_data_columnar(center=None, radius_km=None, zoom=None):
+        """Dữ liệu ngập ở định dạng cột: đọc .values() thay vì dựng model, không tạo chuỗi hiển thị"""
+        zones = FloodZone.objects.filter(is_active=True).order_by('id')
+        reports = FloodReport.objects.filter(status='verified', is_active=True).order_by('-created_at')
+        if center is not None:
+            zones = zones.filter(geometry__distance_lte=(center, D(km=radius_km)))
+            reports = reports.filter(location__distance_lte=(center, D(km=radius_km)))
+        
+        # Mô tả cắt ngắn ngay trong SQL (Left), không kéo cả cột text về rồi cắt trong Python
+        zone_rows = list(zones.annotate(short_description=Left('description', 100)).values(
+            *[column.source for column in ZONE_COLUMNS], shape=FloodDataService.zone_geometry(zoom)
+        ))
+        report_rows = list(reports.annotate(short_description=Left('description', 100)).values(
+            'location', *[column.source for column in REPORT_COLUMNS]
+        ))
+        
+        return {
+            'format': COLUMNAR_FORMAT_VERSION,
+            'scale': COORD_SCALE,
+            'flood_zones': encode_layer(zone_rows, ZONE_COLUMNS, 'shape', 'Polygon'),
+            'flood_reports': encode_layer(report_rows, REPORT_COLUMNS, 'location'),
+            'labels': {
+                **choice_labels(FloodZone, 'zone_type'),
+                **choice_labels(FloodReport, 'severity', 'status'),
+            },
+            'stats': {
+                'total_zones': len(zone_rows),
+                'total_reports': len(report_rows),
+            },
+            'last_updated': datetime.now().isoformat(),
+            'success': True
+        }
+    
+    @staticmethod
+    def fixed_floodings_columnar(queryset):
+        """Danh sách FixedFlooding ở định dạng cột"""
+        rows = list(queryset.values('location', *[column.source for column in FIXED_FLOODING_COLUMNS]))
+        return {
+            'format': COLUMNAR_FORMAT_VERSION,
+            'scale': COORD_SCALE,
+            'fixed_floodings': encode_layer(rows, FIXED_FLOODING_COLUMNS, 'location'),
+            'labels': choice_labels(FixedFlooding, 'severity', 'flood_type'),
+        }
+    
+    @staticmethod
+    def get_realtime_flood_data(lat, lng, radius_km=10, zoom=None):
+        """Lấy dữ liệu ngập trong bán kính radius_km quanh một vị trí"""
+        return FloodDataService.get_all_flood_data(center=Point(lng, lat, srid=SRID), radius_km=radius_km, zoom=zoom)
+    
+    @staticmethod
+    def get_all_flood_data(center=None, radius_km=None, zoom=None):
+        """
+        Lấy TẤT CẢ dữ liệu ngập từ database (hoặc chỉ trong bán kính quanh center).
+        zoom: chọn mức hình học đơn giản hóa của điểm ngập (None: hình học gốc)
+        """
         try:
-            print("📍 FloodDataService.get_all_flood_data() - Lấy TẤT CẢ dữ liệu")
+            logger.debug("📍 FloodDataService.get_all_flood_data() - Lấy TẤT CẢ dữ liệu")
             
             data = {
                 'flood_zones': [],
@@ -346,92 +652,42 @@ class FloodDataService:
             
             # ============ 1. LẤY TẤT CẢ ĐIỂM NGẬP ============
             zones = FloodZone.objects.filter(is_active=True)
-            print(f"✅ Tìm thấy {zones.count()} điểm ngập hoạt động")
+            if center is not None:
+                zones = zones.filter(geometry__distance_lte=(center, D(km=radius_km)))
             
-            for zone in zones:
+            for zone in FloodDataService.zone_rows(zones, zoom):
                 try:
-                    geometry = None
-                    if zone.geometry:
-                        try:
-                            geometry = json.loads(zone.geometry.geojson)
-                        except:
-                            center = zone.geometry.centroid
-                            geometry = {
-                                'type': 'Point',
-                                'coordinates': [center.x, center.y]
-                            }
-                    else:
-                        geometry = {'type': 'Point', 'coordinates': [0, 0]}
-                    
-                    data['flood_zones'].append({
-                        'type': 'Feature',
-                        'geometry': geometry,
-                        'properties': {
-                            'id': f"zone_{zone.id}",
-                            'name': zone.name or 'Điểm ngập',
-                            'zone_type': zone.zone_type or 'unknown',
-                            'zone_type_display': zone.get_zone_type_display() if hasattr(zone, 'get_zone_type_display') else zone.zone_type,
-                            'district': zone.district or '',
-                            'ward': zone.ward or '',
-                            'street': zone.street or '',
-                            'max_depth': zone.max_depth_cm or 0,
-                            'report_count': zone.report_count or 0,
-                            'last_reported': zone.last_reported_at.strftime('%H:%M %d/%m') if zone.last_reported_at else 'Chưa có',
-                            'description': (zone.description or '')[:100],
-                            'is_active': zone.is_active,
-                            'flood_cause': zone.flood_cause or 'Không xác định'
-                        }
-                    })
+                    data['flood_zones'].append(FloodDataService.zone_feature(zone))
                 except Exception as e:
-                    print(f"⚠️ Lỗi xử lý zone {zone.id}: {e}")
+                    row_logger.warning("⚠️ Lỗi xử lý zone %s: %s", zone['id'], e)
+            logger.debug("✅ Tìm thấy %s điểm ngập hoạt động", len(data['flood_zones']))
             
             # ============ 2. LẤY TẤT CẢ BÁO CÁO ============
-            reports = FloodReport.objects.filter(status='verified').order_by('-created_at')
-            print(f"✅ Tìm thấy {reports.count()} báo cáo đã xác nhận")
+            reports = FloodReport.objects.filter(status='verified', is_active=True).order_by('-created_at')
+            if center is not None:
+                reports = reports.filter(location__distance_lte=(center, D(km=radius_km)))
             
-            for report in reports:
+            for report in FloodDataService.report_rows(reports):
                 try:
-                    data['flood_reports'].append({
-                        'type': 'Feature',
-                        'geometry': {
-                            'type': 'Point',
-                            'coordinates': [report.location.x, report.location.y]
-                        },
-                        'properties': {
-                            'id': f"report_{report.id}",
-                            'address': report.address or 'Không có địa chỉ',
-                            'water_depth': report.water_depth or 0,
-                            'severity': report.severity or 'unknown',
-                            'severity_display': report.get_severity_display() if hasattr(report, 'get_severity_display') else report.severity,
-                            'created_at': report.created_at.strftime('%H:%M %d/%m'),
-                            'created_at_iso': report.created_at.isoformat(),
-                            'reporter_name': report.reporter_name or 'Ẩn danh',
-                            'reporter_phone': report.reporter_phone or '',
-                            'photo_url': report.photo_url if report.photo_url else None,
-                            'description': (report.description or '')[:100],
-                            'district': report.district or '',
-                            'ward': report.ward or '',
-                            'status': report.status
-                        }
-                    })
+                    data['flood_reports'].append(FloodDataService.report_feature(report))
                 except Exception as e:
-                    print(f"⚠️ Lỗi xử lý report {report.id}: {e}")
+                    row_logger.warning("⚠️ Lỗi xử lý report %s: %s", report['id'], e)
+            logger.debug("✅ Tìm thấy %s báo cáo đã xác nhận", len(data['flood_reports']))
             
             # ============ 3. THỐNG KÊ ============
             data['stats'] = {
-                'total_zones': zones.count(),
-                'total_reports': reports.count(),
-                'active_zones': zones.count(),
-                'total_verified_reports': reports.count(),
+                'total_zones': len(data['flood_zones']),
+                'total_reports': len(data['flood_reports']),
+                'active_zones': len(data['flood_zones']),
+                'total_verified_reports': len(data['flood_reports']),
                 'last_update': datetime.now().strftime('%H:%M %d/%m/%Y')
             }
             
-            print(f"📊 Thống kê: {data['stats']}")
+            logger.debug("📊 Thống kê: %s", data['stats'])
             return data
             
         except Exception as e:
-            print(f"❌ Lỗi get_all_flood_data: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Lỗi get_all_flood_data: %s", e)
             return {
                 'success': False,
                 'error': str(e),
@@ -449,11 +705,11 @@ class FloodCheckService:
     def check_flood_at_location(lat, lon, radius_m=1000):
         """Kiểm tra ngập tại vị trí - SỬA LỖI SRID"""
         try:
-            print(f"🔍 FloodCheckService.check_flood_at_location({lat}, {lon})")
+            logger.debug("🔍 FloodCheckService.check_flood_at_location(%s, %s)", lat, lon)
             
             # Tạo point VỚI SRID
             point = Point(float(lon), float(lat), srid=SRID)
-            print(f"📍 Point created with SRID {SRID}: {point}")
+            logger.debug("📍 Point created with SRID %s: %s", SRID, point)
             
             response = {
                 'success': True,
@@ -476,18 +732,17 @@ class FloodCheckService:
             # ============ 1. THỐNG KÊ DATABASE ============
             try:
                 total_zones = FloodZone.objects.filter(is_active=True).count()
-                total_reports = FloodReport.objects.filter(status='verified').count()
+                total_reports = FloodReport.objects.filter(status='verified', is_active=True).count()
                 
                 response['database_stats'] = {
                     'total_zones': total_zones,
                     'total_reports': total_reports
                 }
                 
-                print(f"📊 Database stats: {total_zones} zones, {total_reports} reports")
+                logger.debug("📊 Database stats: %s zones, %s reports", total_zones, total_reports)
                 
             except Exception as e:
-                print(f"⚠️ Lỗi thống kê database: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi thống kê database: %s", e, exc_info=True)
             
             # ============ 2. TÌM ĐIỂM NGẬP TRONG BÁN KÍNH ============
             nearby_zones = []
@@ -495,12 +750,13 @@ class FloodCheckService:
                 flood_zones = FloodZone.objects.annotate(
                     distance=Distance('geometry', point)
                 ).filter(
+                    radius_prefilter('geometry', point, radius_m),
                     distance__lt=radius_m,
                     is_active=True
                 ).order_by('distance')
                 
                 zone_count = flood_zones.count()
-                print(f"📍 Tìm thấy {zone_count} điểm ngập trong {radius_m}m")
+                logger.debug("📍 Tìm thấy %s điểm ngập trong %sm", zone_count, radius_m)
                 
                 if flood_zones.exists():
                     response['has_flood'] = True
@@ -523,7 +779,7 @@ class FloodCheckService:
                             }
                             nearby_zones.append(zone_data)
                         except Exception as zone_detail_err:
-                            print(f"⚠️ Lỗi chi tiết zone: {zone_detail_err}")
+                            row_logger.warning("⚠️ Lỗi chi tiết zone: %s", zone_detail_err)
                     
                     if nearby_zones:
                         response['details']['zone'] = nearby_zones[0]
@@ -531,8 +787,7 @@ class FloodCheckService:
                         response['severity'] = 'high' if zone.max_depth_cm and zone.max_depth_cm > 30 else 'medium'
                         
             except Exception as e:
-                print(f"⚠️ Lỗi tìm điểm ngập: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi tìm điểm ngập: %s", e, exc_info=True)
             
             # ============ 3. TÌM BÁO CÁO TRONG BÁN KÍNH ============
             nearby_reports = []
@@ -541,13 +796,14 @@ class FloodCheckService:
                 recent_reports = FloodReport.objects.annotate(
                     distance=Distance('location', point)
                 ).filter(
+                    radius_prefilter('location', point, radius_m),
                     distance__lt=radius_m,
                     status='verified',
                     created_at__gte=time_threshold
                 ).order_by('-created_at')
                 
                 report_count = recent_reports.count()
-                print(f"📍 Tìm thấy {report_count} báo cáo trong 24h")
+                logger.debug("📍 Tìm thấy %s báo cáo trong 24h", report_count)
                 
                 if recent_reports.exists():
                     response['has_flood'] = True
@@ -571,7 +827,7 @@ class FloodCheckService:
                             }
                             nearby_reports.append(report_data)
                         except Exception as report_detail_err:
-                            print(f"⚠️ Lỗi chi tiết report: {report_detail_err}")
+                            row_logger.warning("⚠️ Lỗi chi tiết report: %s", report_detail_err)
                     
                     if nearby_reports:
                         response['details']['report'] = nearby_reports[0]
@@ -587,8 +843,7 @@ class FloodCheckService:
                             response['severity'] = 'light'
                             
             except Exception as e:
-                print(f"⚠️ Lỗi tìm báo cáo: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi tìm báo cáo: %s", e, exc_info=True)
             
             # ============ 4. GỘP DỮ LIỆU GẦN ĐÓ ============
             response['nearby_data'] = nearby_zones + nearby_reports
@@ -620,12 +875,11 @@ class FloodCheckService:
             
             response['message'] = ' | '.join(messages) if messages else 'Đã kiểm tra xong'
             
-            print(f"📊 Kết quả: {response}")
+            logger.debug("📊 Kết quả: %s", response)
             return response
             
         except Exception as e:
-            print(f"❌ Lỗi check_flood_at_location: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Lỗi check_flood_at_location: %s", e)
             
             return {
                 'success': False,
@@ -640,14 +894,106 @@ class FloodCheckService:
                 }
             }
     
+    @staticmethod
+    def _flood_summary(zone_depth, report_depth):
+        """
+        severity / risk_level / message theo cùng quy tắc với check_flood_at_location, từ độ sâu của vùng ngập
+        gần nhất và báo cáo mới nhất trong bán kính (None nếu không có)
+        """
+        has_flood = zone_depth is not None or report_depth is not None
+        severity = 'none'
+        if zone_depth is not None:
+            severity = 'high' if zone_depth > 30 else 'medium'
+        if report_depth is not None:
+            if report_depth > 50:
+                severity = 'severe'
+            elif report_depth > 30:
+                severity = 'heavy'
+            elif report_depth > 15:
+                severity = 'medium'
+            else:
+                severity = 'light'
+
+        if not has_flood:
+            return False, severity, 'low', ''
+        if severity in ['severe', 'heavy']:
+            return True, severity, 'high', '🚨 KHU VỰC NÀY ĐANG CÓ NGẬP LỤT NGHIÊM TRỌNG'
+        if severity == 'medium':
+            return True, severity, 'medium', '⚠️ Khu vực này đang có ngập lụt'
+        return True, severity, 'low', 'ℹ️ Khu vực này có ngập nhẹ'
+
+    @staticmethod
+    def get_all_zones_status(radius_m=100):
+        """
+        Trạng thái ngập tại tâm của mọi điểm ngập đang hoạt động (như gọi check_flood_at_location cho từng tâm),
+        tính theo tập: 2 câu SQL cho cả danh sách, khoảng cách tính bằng STRtree trên hệ mét cục bộ.
+        """
+        zones = list(FloodZone.objects.filter(is_active=True, geometry__isnull=False).values(
+            'id', 'name', 'max_depth_cm', 'zone_type', 'geometry'
+        ))
+        if not zones:
+            return []
+        time_threshold = datetime.now() - timedelta(hours=24)
+        reports = list(FloodReport.objects.filter(
+            status='verified', created_at__gte=time_threshold
+        ).order_by('-created_at').values_list('location', 'water_depth'))
+
+        shapes = shapely.from_wkb([bytes(zone['geometry'].wkb) for zone in zones])
+        centers = shapely.centroid(shapes)
+        lat0 = math.radians(float(np.mean(shapely.get_y(centers))))
+        scale = np.array([111320.0 * math.cos(lat0), 110574.0])
+        metric_shapes = shapely.transform(shapes, lambda coords: coords * scale)
+        metric_centers = shapely.transform(centers, lambda coords: coords * scale)
+
+        # Vùng ngập gần tâm nhất trong radius_m
+        nearest_zone = {}
+        center_idx, zone_idx = shapely.STRtree(metric_shapes).query(
+            metric_centers, predicate='dwithin', distance=radius_m
+        )
+        distances = shapely.distance(metric_centers[center_idx], metric_shapes[zone_idx])
+        for center, zone, distance in zip(center_idx.tolist(), zone_idx.tolist(), distances.tolist()):
+            if center not in nearest_zone or distance < nearest_zone[center][0]:
+                nearest_zone[center] = (distance, zone)
+
+        # Báo cáo mới nhất trong radius_m (reports đã xếp mới nhất trước)
+        latest_report = {}
+        if reports:
+            points = shapely.points(np.array([(location.x, location.y) for location, _depth in reports]) * scale)
+            center_idx, report_idx = shapely.STRtree(points).query(
+                metric_centers, predicate='dwithin', distance=radius_m
+            )
+            for center, report in zip(center_idx.tolist(), report_idx.tolist()):
+                latest_report[center] = min(report, latest_report.get(center, report))
+
+        results = []
+        for index, zone in enumerate(zones):
+            zone_depth = None
+            if index in nearest_zone:
+                zone_depth = zones[nearest_zone[index][1]]['max_depth_cm'] or 0
+            report_depth = reports[latest_report[index]][1] or 0 if index in latest_report else None
+            has_flood, severity, risk_level, message = FloodCheckService._flood_summary(zone_depth, report_depth)
+            results.append({
+                'id': zone['id'],
+                'name': zone['name'] or 'Điểm ngập',
+                'lat': float(shapely.get_y(centers[index])),
+                'lon': float(shapely.get_x(centers[index])),
+                'status': has_flood,
+                'risk_level': risk_level,
+                'severity': severity,
+                'message': message,
+                'max_depth': zone['max_depth_cm'] or 0,
+                'zone_type': zone['zone_type'],
+            })
+        return results
+
     @staticmethod
     def get_area_flood_status(lat, lon, radius_m=2000):
         """Lấy trạng thái ngập của khu vực - CHỈ TRONG BÁN KÍNH"""
         try:
-            print(f"🌍 FloodCheckService.get_area_flood_status(radius={radius_m}m)")
+            logger.debug("🌍 FloodCheckService.get_area_flood_status(radius=%sm)", radius_m)
             
             point = Point(float(lon), float(lat), srid=SRID)
-            print(f"📍 Point with SRID {SRID}: {point}")
+            logger.debug("📍 Point with SRID %s: %s", SRID, point)
             
             # ============ 1. TÌM ĐIỂM NGẬP TRONG BÁN KÍNH ============
             zones_in_radius = []
@@ -658,6 +1004,7 @@ class FloodCheckService:
                 zones_query = FloodZone.objects.annotate(
                     distance=Distance('geometry', point)
                 ).filter(
+                    radius_prefilter('geometry', point, radius_m),
                     distance__lt=radius_m,
                     is_active=True
                 )
@@ -683,11 +1030,10 @@ class FloodCheckService:
                     if zones_count > 0:
                         avg_depth = total_depth / zones_count
                 
-                print(f"📍 Tìm thấy {zones_count} điểm ngập trong bán kính {radius_m}m")
+                logger.debug("📍 Tìm thấy %s điểm ngập trong bán kính %sm", zones_count, radius_m)
                 
             except Exception as e:
-                print(f"⚠️ Lỗi tìm điểm ngập: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi tìm điểm ngập: %s", e, exc_info=True)
             
             # ============ 2. TÌM BÁO CÁO TRONG BÁN KÍNH ============
             reports_in_radius = []
@@ -702,6 +1048,7 @@ class FloodCheckService:
                 reports_query = FloodReport.objects.annotate(
                     distance=Distance('location', point)
                 ).filter(
+                    radius_prefilter('location', point, radius_m),
                     distance__lt=radius_m,
                     status='verified',
                     created_at__gte=time_threshold
@@ -713,6 +1060,7 @@ class FloodCheckService:
                 recent_reports_query = FloodReport.objects.annotate(
                     distance=Distance('location', point)
                 ).filter(
+                    radius_prefilter('location', point, radius_m),
                     distance__lt=radius_m,
                     status='verified',
                     created_at__gte=recent_time_threshold
@@ -733,11 +1081,10 @@ class FloodCheckService:
                         'reporter': report.reporter_name or 'Ẩn danh'
                     })
                 
-                print(f"📍 Tìm thấy {reports_count} báo cáo trong 24h (gần đây: {recent_reports_count})")
+                logger.debug("📍 Tìm thấy %s báo cáo trong 24h (gần đây: %s)", reports_count, recent_reports_count)
                 
             except Exception as e:
-                print(f"⚠️ Lỗi tìm báo cáo: {e}")
-                traceback.print_exc()
+                logger.warning("⚠️ Lỗi tìm báo cáo: %s", e, exc_info=True)
             
             # ============ 3. TÍNH MỨC ĐỘ NGUY CƠ ============
             risk_level = 'low'
@@ -793,12 +1140,11 @@ class FloodCheckService:
                 'total_data_in_radius': zones_count + reports_count
             }
             
-            print(f"📊 Kết quả kiểm tra khu vực: {result['summary']}")
+            logger.debug("📊 Kết quả kiểm tra khu vực: %s", result['summary'])
             return result
             
         except Exception as e:
-            print(f"❌ Lỗi get_area_flood_status: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Lỗi get_area_flood_status: %s", e)
             return {
                 'success': False,
                 'error': str(e),
@@ -820,7 +1166,7 @@ class FloodPredictionService:
             predictions = FloodPrediction.objects.all().order_by('-created_at')[:50]
             return predictions
         except Exception as e:
-            print(f"❌ Lỗi get_all_predictions: {e}")
+            logger.error("❌ Lỗi get_all_predictions: %s", e)
             return []
         
 
@@ -832,12 +1178,13 @@ class FixedFloodingService:
     def check_and_activate_by_rainfall(lat, lng, rainfall_mm):
         """Kiểm tra và kích hoạt FixedFlooding dựa trên lượng mưa"""
         try:
-            print(f"⚡ FixedFloodingService: Kiểm tra mưa={rainfall_mm}mm/h tại ({lat}, {lng})")
+            logger.debug("⚡ FixedFloodingService: Kiểm tra mưa=%smm/h tại (%s, %s)", rainfall_mm, lat, lng)
             point = Point(lng, lat, srid=SRID)
             activated_floodings = []
             floodings = FixedFlooding.objects.annotate(
                 distance=Distance('location', point)
             ).filter(
+                radius_prefilter('location', point, 10000),
                 distance__lt=10000,  # 10km
                 is_monitored=True
             )
@@ -849,17 +1196,15 @@ class FixedFloodingService:
                         activated_floodings.append(flooding)
                         FloodZoneService.create_or_update_from_fixed_flooding(flooding, rainfall_mm)
                         FloodHistoryService.create_from_fixed_flooding(flooding, rainfall_mm) 
-                        print(f"✅ Đã kích hoạt: {flooding.name}")
+                        logger.info("✅ Đã kích hoạt: %s", flooding.name)
                 except Exception as e:
-                    print(f"❌ Lỗi kích hoạt FixedFlooding {flooding.id}: {e}")
-                    traceback.print_exc()
+                    logger.exception("❌ Lỗi kích hoạt FixedFlooding %s: %s", flooding.id, e)
             
-            print(f"📊 Tổng: {len(activated_floodings)} FixedFlooding được kích hoạt")
+            logger.debug("📊 Tổng: %s FixedFlooding được kích hoạt", len(activated_floodings))
             return activated_floodings
             
         except Exception as e:
-            print(f"❌ Lỗi check_and_activate_by_rainfall: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Lỗi check_and_activate_by_rainfall: %s", e)
             return []
     @staticmethod
     def get_nearby_floodings(lat, lng, radius_m=5000, only_active=False):
@@ -870,6 +1215,7 @@ class FixedFloodingService:
             query = FixedFlooding.objects.annotate(
                 distance=Distance('location', point)
             ).filter(
+                radius_prefilter('location', point, radius_m),
                 distance__lt=radius_m
             ).order_by('distance')
             
@@ -879,7 +1225,7 @@ class FixedFloodingService:
             return query
             
         except Exception as e:
-            print(f"❌ Lỗi get_nearby_floodings: {e}")
+            logger.error("❌ Lỗi get_nearby_floodings: %s", e)
             return FixedFlooding.objects.none()
     @staticmethod
     def get_active_alerts(lat, lng):
@@ -889,6 +1235,7 @@ class FixedFloodingService:
             active_floodings = FixedFlooding.objects.annotate(
                 distance=Distance('location', point)
             ).filter(
+                radius_prefilter('location', point, 5000),
                 distance__lt=5000,
                 is_active=True
             ).order_by('-severity')
@@ -930,7 +1277,7 @@ class FixedFloodingService:
             return alerts
             
         except Exception as e:
-            print(f"❌ Lỗi get_active_alerts: {e}")
+            logger.error("❌ Lỗi get_active_alerts: %s", e)
             return []
     
     @staticmethod
@@ -962,7 +1309,7 @@ class FixedFloodingService:
         except FixedFlooding.DoesNotExist:
             return {'success': False, 'error': 'Không tìm thấy FixedFlooding'}
         except Exception as e:
-            print(f"❌ Lỗi trigger_manual_activation: {e}")
+            logger.error("❌ Lỗi trigger_manual_activation: %s", e)
             return {'success': False, 'error': str(e)}
 
 
@@ -983,7 +1330,7 @@ class FloodZoneService:
                 existing_zone.last_flood_date = timezone.now().date()
                 existing_zone.flood_cause = f"Mưa lớn: {rainfall_mm}mm/h (Tự động từ FixedFlooding)"
                 existing_zone.save()
-                print(f"🔄 Đã cập nhật FloodZone #{existing_zone.id}")
+                logger.info("🔄 Đã cập nhật FloodZone #%s", existing_zone.id)
                 return existing_zone
                 
             else:
@@ -1013,12 +1360,11 @@ class FloodZoneService:
                 fixed_flooding.flood_zone = new_zone
                 fixed_flooding.save(update_fields=['flood_zone'])
                 
-                print(f"✅ Đã tạo FloodZone #{new_zone.id}")
+                logger.info("✅ Đã tạo FloodZone #%s", new_zone.id)
                 return new_zone
                 
         except Exception as e:
-            print(f"❌ Lỗi create_or_update_from_fixed_flooding: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Lỗi create_or_update_from_fixed_flooding: %s", e)
             return None
 
 
@@ -1032,7 +1378,7 @@ class FloodHistoryService:
             flood_zone = fixed_flooding.flood_zone
             
             if not flood_zone:
-                print(f"⚠️ FixedFlooding {fixed_flooding.id} không có FloodZone")
+                logger.warning("⚠️ FixedFlooding %s không có FloodZone", fixed_flooding.id)
                 return None
 
             history = FloodHistory.objects.create(
@@ -1052,12 +1398,11 @@ class FloodHistoryService:
                 impact_level='major' if fixed_flooding.predicted_depth_cm > 30 else 'moderate'
             )
             
-            print(f"📝 Đã ghi lịch sử #{history.id}")
+            logger.info("📝 Đã ghi lịch sử #%s", history.id)
             return history
             
         except Exception as e:
-            print(f"❌ Lỗi create_from_fixed_flooding: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Lỗi create_from_fixed_flooding: %s", e)
             return None
     
     @staticmethod
@@ -1085,7 +1430,7 @@ class FloodHistoryService:
             return history
             
         except Exception as e:
-            print(f"❌ Lỗi create_from_report: {e}")
+            logger.error("❌ Lỗi create_from_report: %s", e)
             return None
 # ============ DRAINAGE PREDICTION SERVICE ============
 
@@ -1098,11 +1443,11 @@ class DrainageTimeService:
     def predict_drainage_time(flood_report):
         """Dự đoán thời gian cạn nước cho một FloodReport - PHIÊN BẢN CHÍNH"""
         try:
-            print(f"⏳ [PREDICT] Bắt đầu dự đoán cho FloodReport #{flood_report.id}")
+            logger.debug("⏳ [PREDICT] Bắt đầu dự đoán cho FloodReport #%s", flood_report.id)
             
             data = DrainageTimeService._collect_prediction_data(flood_report)
             drainage_hours = DrainageTimeService._calculate_drainage_hours(data)
-            print(f"📊 [PREDICT] Thời gian cạn tính được: {drainage_hours} giờ")
+            logger.debug("📊 [PREDICT] Thời gian cạn tính được: %s giờ", drainage_hours)
             result = DrainageTimeService._create_prediction_result(
                 flood_report, data, drainage_hours
             )
@@ -1111,18 +1456,16 @@ class DrainageTimeService:
             if prediction_saved:
                 result['prediction_saved'] = True
                 result['prediction_id'] = prediction_saved.id if hasattr(prediction_saved, 'id') else None
-                print(f"✅ [PREDICT] ĐÃ LƯU THÀNH CÔNG vào database")
+                logger.debug("✅ [PREDICT] ĐÃ LƯU THÀNH CÔNG vào database")
             else:
                 result['prediction_saved'] = False
-                print(f"⚠️ [PREDICT] KHÔNG THỂ LƯU vào database")
+                logger.warning("⚠️ [PREDICT] KHÔNG THỂ LƯU vào database")
             
             result['success'] = True
             return result
             
         except Exception as e:
-            print(f"❌ [PREDICT] Lỗi trong predict_drainage_time: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ [PREDICT] Lỗi trong predict_drainage_time: %s", e)
             return {
                 'success': False,
                 'error': str(e),
@@ -1181,7 +1524,7 @@ class DrainageTimeService:
                     'wind_speed': current_weather.get('wind_speed', 2.5)
                 }
         except Exception as e:
-            print(f"⚠️ Không thể lấy thông tin thời tiết: {e}")
+            logger.warning("⚠️ Không thể lấy thông tin thời tiết: %s", e)
         return {
             'current_rainfall_mm': 8.5,
             'rainfall_last_3h': 25.3,
@@ -1237,7 +1580,7 @@ class DrainageTimeService:
             return drainage_hours
             
         except Exception as e:
-            print(f"❌ Lỗi tính toán: {e}")
+            logger.error("❌ Lỗi tính toán: %s", e)
             return 6.0
     
     @staticmethod
@@ -1299,7 +1642,7 @@ class DrainageTimeService:
             from datetime import timedelta
             from .models import FloodPrediction
             
-            print(f"💾 [SAVE] Đang lưu dự đoán cho FloodReport #{flood_report.id}")
+            logger.debug("💾 [SAVE] Đang lưu dự đoán cho FloodReport #%s", flood_report.id)
             
             # Tạo prediction đơn giản
             prediction = FloodPrediction.objects.create(
@@ -1319,18 +1662,15 @@ class DrainageTimeService:
                 flood_report=flood_report  # QUAN TRỌNG: Liên kết với flood_report
             )
             
-            print(f"✅ [SAVE] ĐÃ LƯU THÀNH CÔNG FloodPrediction #{prediction.id}")
-            print(f"   • ID: {prediction.id}")
-            print(f"   • Address: {prediction.address}")
-            print(f"   • Drainage hours: {prediction.estimated_drainage_time_hours}")
-            print(f"   • FloodReport ID: {prediction.flood_report.id}")
+            logger.info(
+                "✅ [SAVE] Đã lưu FloodPrediction #%s (%s, cạn sau %s giờ, FloodReport #%s)",
+                prediction.id, prediction.address, prediction.estimated_drainage_time_hours, prediction.flood_report_id
+            )
             
             return prediction
             
         except Exception as e:
-            print(f"❌ [SAVE] Lỗi lưu vào database: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ [SAVE] Lỗi lưu vào database: %s", e)
             return None
     
     @staticmethod
@@ -1341,26 +1681,30 @@ class DrainageTimeService:
         try:
             from .models import FloodPrediction
             
+            # Chỉ đọc các cột cần hiển thị; report_id lấy từ khóa ngoại, không truy vấn FloodReport cho từng dòng
             predictions = FloodPrediction.objects.filter(
                 is_active=True
-            ).order_by('-prediction_time')[:limit]
+            ).order_by('-prediction_time').values(
+                'id', 'address', 'district', 'current_depth_cm', 'predicted_depth_cm',
+                'estimated_drainage_time_hours', 'risk_level', 'flood_report_id'
+            )[:limit]
             
             results = []
             for pred in predictions:
                 results.append({
-                    'id': pred.id,
-                    'address': pred.address or "Không xác định",
-                    'district': pred.district or "",
-                    'current_depth': pred.current_depth_cm or pred.predicted_depth_cm,
-                    'estimated_hours': pred.estimated_drainage_time_hours or 0,
-                    'risk_level': pred.risk_level or 'medium',
-                    'report_id': pred.flood_report.id if pred.flood_report else None
+                    'id': pred['id'],
+                    'address': pred['address'] or "Không xác định",
+                    'district': pred['district'] or "",
+                    'current_depth': pred['current_depth_cm'] or pred['predicted_depth_cm'],
+                    'estimated_hours': pred['estimated_drainage_time_hours'] or 0,
+                    'risk_level': pred['risk_level'] or 'medium',
+                    'report_id': pred['flood_report_id']
                 })
             
             return results
             
         except Exception as e:
-            print(f"❌ Lỗi get_active_drainage_predictions: {e}")
+            logger.error("❌ Lỗi get_active_drainage_predictions: %s", e)
             return []
     
     @staticmethod
@@ -1403,7 +1747,7 @@ class DrainageTimeService:
             return dashboard_data
             
         except Exception as e:
-            print(f"❌ Lỗi get_drainage_dashboard_data: {e}")
+            logger.error("❌ Lỗi get_drainage_dashboard_data: %s", e)
             return {
                 'summary': {
                     'total_active_predictions': 0,
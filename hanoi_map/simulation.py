@@ -0,0 +1,364 @@
+import numpy as np
+import time
+from datetime import datetime, timedelta
+from django.utils import timezone
+import logging
+
+from .calibration import _match_points
+from .models import FixedFlooding, FixedFloodingCalibration, FloodHistory, FloodPrediction
+
+logger = logging.getLogger(__name__)
+
+# Bán kính mà một lượng mưa đo được ảnh hưởng tới FixedFlooding, như check_and_activate_by_rainfall
+RAIN_RADIUS_M = 10000
+# Thứ tự mức rủi ro từ thấp lên cao (chỉ số dùng trong mảng)
+RISK_LEVELS = [level for level, _label in FloodPrediction.RISK_LEVEL_CHOICES]
+# Giá trị mặc định của FloodPrediction khi điểm ngập không có dữ liệu địa hình
+DEFAULT_DRAINAGE_CAPACITY = 'average'
+DEFAULT_DISTANCE_TO_RIVER_M = 1000.0
+DEFAULT_RAIN_DURATION_HOURS = 1.0
+
+
+def _table_score(values, table, reached):
+    """Điểm theo bảng (ngưỡng, điểm) cho cả mảng: như next(...) trong calculate_risk_level, lấy mục đầu tiên thỏa"""
+    values = np.asarray(values, dtype=float)
+    return np.select([reached(values, limit) for limit, _points in table],
+                     [points for _limit, points in table], default=0)
+
+
+def risk_scores(rainfall_mm, duration_hours, drainage_capacity=DEFAULT_DRAINAGE_CAPACITY,
+                distance_to_river=DEFAULT_DISTANCE_TO_RIVER_M):
+    """Bản vector hóa điểm của FloodPrediction.calculate_risk_level (các tham số broadcast với nhau)"""
+    drainage = np.vectorize(lambda value: FloodPrediction.DRAINAGE_SCORES.get(value, 0), otypes=[float])(
+        np.asarray(drainage_capacity, dtype=object)
+    )
+    return (
+        _table_score(rainfall_mm, FloodPrediction.RAINFALL_SCORES, np.greater_equal)
+        + _table_score(duration_hours, FloodPrediction.RAINFALL_DURATION_SCORES, np.greater_equal)
+        + drainage
+        + _table_score(distance_to_river, FloodPrediction.RIVER_DISTANCE_SCORES, np.less)
+    )
+
+
+def risk_level_index(scores):
+    """Điểm -> chỉ số trong RISK_LEVELS"""
+    scores = np.asarray(scores, dtype=float)
+    return np.select([scores >= limit for limit, _level in FloodPrediction.RISK_LEVEL_BANDS],
+                     [RISK_LEVELS.index(level) for _limit, level in FloodPrediction.RISK_LEVEL_BANDS],
+                     default=RISK_LEVELS.index('very_low'))
+
+
+def _step_hours(times):
+    """Độ dài (giờ) của mỗi bước thời gian; bước cuối lấy bằng trung vị các bước"""
+    if len(times) == 0:
+        return np.empty(0)
+    gaps = np.diff(times) / 3600.0
+    last = np.median(gaps) if len(gaps) else 1.0
+    return np.append(gaps, last)
+
+
+def rain_duration_hours(times, rain_mm):
+    """Số giờ mưa liên tục (rain > 0) tính tới hết mỗi bước của một chuỗi mưa theo thời gian"""
+    wet = rain_mm > 0
+    elapsed = np.cumsum(_step_hours(times) * wet)
+    # Mốc đặt lại: tổng tích lũy tại bước khô gần nhất
+    reset = np.maximum.accumulate(np.where(wet, 0.0, elapsed))
+    return elapsed - reset
+
+
+def rainfall_series(rows):
+    """
+    Chuỗi mưa từ các dòng dict: time (datetime hoặc chuỗi ISO), rainfall_mm,
+    tùy chọn lat / lon (mưa tại trạm, nếu không là mưa toàn thành phố) và duration_hours.
+    """
+    def _epoch(value):
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value.timestamp()
+
+    rows = list(rows)
+    series = {
+        'time': np.array([_epoch(row['time']) for row in rows], dtype=float),
+        'rain_mm': np.array([float(row['rainfall_mm']) for row in rows], dtype=float),
+    }
+    if rows and all(row.get('lat') not in (None, '') for row in rows):
+        series['lat'] = np.array([float(row['lat']) for row in rows], dtype=float)
+        series['lon'] = np.array([float(row['lon']) for row in rows], dtype=float)
+    if rows and all(row.get('duration_hours') not in (None, '') for row in rows):
+        series['duration_hours'] = np.array([float(row['duration_hours']) for row in rows], dtype=float)
+    return series
+
+
+class ActivationSimulationService:
+    """
+    Mô phỏng kích hoạt FixedFlooding và mức rủi ro của FloodPrediction theo một chuỗi lượng mưa,
+    hoàn toàn trong bộ nhớ (NumPy): chỉ đọc cấu hình điểm ngập, không ghi gì vào database.
+    """
+
+    @staticmethod
+    def recorded_rainfall(since=None, until=None):
+        """Lượng mưa đã ghi nhận (lịch sử ngập + dự đoán) dưới dạng chuỗi mưa theo trạm để phát lại"""
+        history = FloodHistory.objects.filter(rainfall_mm__isnull=False)
+        predictions = FloodPrediction.objects.filter(rainfall_mm__isnull=False)
+        if since:
+            history = history.filter(start_time__gte=since)
+            predictions = predictions.filter(prediction_time__gte=since)
+        if until:
+            history = history.filter(start_time__lt=until)
+            predictions = predictions.filter(prediction_time__lt=until)
+
+        rows = [
+            {'time': start_time, 'rainfall_mm': rainfall_mm, 'lat': location.y, 'lon': location.x,
+             'duration_hours': duration_minutes / 60.0 if duration_minutes else DEFAULT_RAIN_DURATION_HOURS}
+            for location, rainfall_mm, start_time, duration_minutes in history.values_list(
+                'location', 'rainfall_mm', 'start_time', 'duration_minutes'
+            )
+        ] + [
+            {'time': prediction_time, 'rainfall_mm': rainfall_mm, 'lat': location.y, 'lon': location.x,
+             'duration_hours': duration_hours}
+            for location, rainfall_mm, prediction_time, duration_hours in predictions.values_list(
+                'location', 'rainfall_mm', 'prediction_time', 'rainfall_duration_hours'
+            )
+        ]
+        return rainfall_series(rows)
+
+    @staticmethod
+    def load_floodings(thresholds=None, use_calibration=False, only_ids=None, initial_active=False):
+        """
+        Cấu hình các FixedFlooding đang giám sát dưới dạng mảng.
+        thresholds: {id: ngưỡng mm/h} thay ngưỡng hiện tại; use_calibration: dùng đề xuất hiệu chỉnh đang chờ duyệt.
+        initial_active: bắt đầu từ trạng thái is_active hiện tại thay vì tất cả đều tắt.
+        """
+        queryset = FixedFlooding.objects.filter(is_monitored=True).order_by('id')
+        if only_ids is not None:
+            queryset = queryset.filter(pk__in=only_ids)
+        rows = list(queryset.values_list('id', 'location', 'rainfall_threshold_mm', 'is_active'))
+
+        overrides = {}
+        if use_calibration:
+            overrides.update(FixedFloodingCalibration.objects.filter(
+                status='pending', fixed_flooding_id__in=[row[0] for row in rows]
+            ).values_list('fixed_flooding_id', 'proposed_threshold_mm'))
+        overrides.update(thresholds or {})
+
+        return {
+            'ids': np.array([row[0] for row in rows], dtype=np.int64),
+            'lat': np.array([row[1].y for row in rows], dtype=float),
+            'lon': np.array([row[1].x for row in rows], dtype=float),
+            'threshold': np.array([overrides.get(row[0], row[2]) for row in rows], dtype=float),
+            'initial_active': np.array([bool(row[3]) and initial_active for row in rows], dtype=bool),
+        }
+
+    @staticmethod
+    def _citywide(floodings, series):
+        """Mưa toàn thành phố: ma trận trạng thái (bước thời gian x điểm ngập)"""
+        order = np.argsort(series['time'], kind='stable')
+        times = series['time'][order]
+        rain = series['rain_mm'][order]
+
+        state = rain[:, None] >= floodings['threshold'][None, :]
+        previous = np.vstack([floodings['initial_active'][None, :], state[:-1]])
+        activated = state & ~previous
+        deactivated = previous & ~state
+
+        duration = series['duration_hours'][order] if 'duration_hours' in series else rain_duration_hours(times, rain)
+        step_point, point_index = np.nonzero(activated)
+        return {
+            'times': times,
+            'rain_mm': rain,
+            'active': state.sum(axis=1),
+            'activated': activated.sum(axis=1),
+            'deactivated': deactivated.sum(axis=1),
+            'risk': risk_level_index(risk_scores(rain, duration)),
+            'point_activations': activated.sum(axis=0),
+            'point_active_hours': (state * _step_hours(times)[:, None]).sum(axis=0),
+            'events': (times[step_point], point_index, rain[step_point]),
+        }
+
+    @staticmethod
+    def _stations(floodings, series, radius_m):
+        """
+        Mưa theo trạm: mỗi lượng mưa đo được áp cho các điểm ngập trong radius_m (như khi gọi
+        check_and_activate_by_rainfall tại vị trí đó). Xử lý theo cặp (điểm ngập, quan sát) sắp theo thời gian.
+        """
+        n_points = len(floodings['ids'])
+        # Ghép trên quan sát đã sắp theo thời gian: các cặp ra theo thời gian trong từng khối,
+        # nên chỉ cần sắp ổn định theo điểm ngập (nhanh hơn nhiều so với lexsort trên hàng chục triệu cặp)
+        by_time = np.argsort(series['time'], kind='stable')
+        point, obs = _match_points(
+            floodings['lat'], floodings['lon'], radius_m, series['lat'][by_time], series['lon'][by_time]
+        )
+        order = np.argsort(point.astype(np.min_scalar_type(max(n_points - 1, 0))), kind='stable')
+        point, obs = point[order], by_time[obs[order]]
+        obs_time = series['time'][obs]
+
+        rain = series['rain_mm'][obs]
+        state = rain >= floodings['threshold'][point]
+        first = np.ones(len(point), dtype=bool)
+        first[1:] = point[1:] != point[:-1]
+        previous = np.where(first, floodings['initial_active'][point], np.roll(state, 1))
+        activated = state & ~previous
+        deactivated = previous & ~state
+
+        # Thời gian ở trạng thái kích hoạt: tới quan sát kế tiếp của cùng điểm (hoặc hết chuỗi mưa)
+        end = series['time'].max() if len(series['time']) else 0.0
+        last = np.ones(len(point), dtype=bool)
+        last[:-1] = point[:-1] != point[1:]
+        next_time = np.where(last, end, np.roll(obs_time, -1))
+        active_hours = np.bincount(point, weights=state * (next_time - obs_time) / 3600.0, minlength=n_points)
+
+        times, step = np.unique(series['time'], return_inverse=True)
+        pair_step = step[obs]
+        n_steps = len(times)
+        activated_steps = np.bincount(pair_step, weights=activated, minlength=n_steps).astype(int)
+        deactivated_steps = np.bincount(pair_step, weights=deactivated, minlength=n_steps).astype(int)
+        active = int(floodings['initial_active'].sum()) + np.cumsum(activated_steps - deactivated_steps)
+
+        # Mức rủi ro / lượng mưa của mỗi bước: lớn nhất trong các trạm đo cùng thời điểm
+        duration = series.get('duration_hours', np.full(len(series['time']), DEFAULT_RAIN_DURATION_HOURS))
+        risk = np.zeros(n_steps, dtype=int)
+        np.maximum.at(risk, step, risk_level_index(risk_scores(series['rain_mm'], duration)))
+        max_rain = np.zeros(n_steps)
+        np.maximum.at(max_rain, step, series['rain_mm'])
+
+        return {
+            'times': times,
+            'rain_mm': max_rain,
+            'active': active,
+            'activated': activated_steps,
+            'deactivated': deactivated_steps,
+            'risk': risk,
+            'point_activations': np.bincount(point, weights=activated, minlength=n_points).astype(int),
+            'point_active_hours': active_hours,
+            'events': (obs_time[activated], point[activated], rain[activated]),
+        }
+
+    @staticmethod
+    def run(floodings, series, radius_m=RAIN_RADIUS_M, max_events=1000):
+        """Mô phỏng trên mảng đã nạp; trả về dòng thời gian, tổng số và số liệu theo từng điểm"""
+        started = time.perf_counter()
+        if len(series['time']) == 0:
+            raise ValueError("Chuỗi lượng mưa rỗng")
+        mode = 'stations' if 'lat' in series else 'citywide'
+        if mode == 'stations':
+            raw = ActivationSimulationService._stations(floodings, series, radius_m)
+        else:
+            raw = ActivationSimulationService._citywide(floodings, series)
+
+        tz = timezone.get_current_timezone()
+
+        def _iso(epoch):
+            return datetime.fromtimestamp(float(epoch), tz=tz).isoformat()
+
+        ids = floodings['ids']
+        peak = int(np.argmax(raw['active'])) if len(raw['active']) else None
+        event_time, event_point, event_rain = raw['events']
+        event_order = np.argsort(event_time, kind='stable')[:max_events]
+        touched = np.nonzero(raw['point_activations'])[0]
+        touched = touched[np.argsort(-raw['point_activations'][touched], kind='stable')]
+
+        return {
+            'success': True,
+            'mode': mode,
+            'points': len(ids),
+            'steps': len(raw['times']),
+            'activations': int(raw['activated'].sum()),
+            'deactivations': int(raw['deactivated'].sum()),
+            'points_activated': len(touched),
+            'peak_active': int(raw['active'][peak]) if peak is not None else 0,
+            'peak_at': _iso(raw['times'][peak]) if peak is not None else None,
+            'risk_levels': {
+                level: int(count) for level, count in zip(
+                    RISK_LEVELS, np.bincount(raw['risk'], minlength=len(RISK_LEVELS))
+                )
+            },
+            'timeline': [
+                {
+                    'time': _iso(raw['times'][i]),
+                    'rain_mm': round(float(raw['rain_mm'][i]), 2),
+                    'active': int(raw['active'][i]),
+                    'activated': int(raw['activated'][i]),
+                    'deactivated': int(raw['deactivated'][i]),
+                    'risk_level': RISK_LEVELS[int(raw['risk'][i])],
+                }
+                for i in range(len(raw['times']))
+            ],
+            'per_point': [
+                {
+                    'fixed_flooding_id': int(ids[i]),
+                    'threshold_mm': float(floodings['threshold'][i]),
+                    'activations': int(raw['point_activations'][i]),
+                    'active_hours': round(float(raw['point_active_hours'][i]), 2),
+                }
+                for i in touched
+            ],
+            'events': [
+                {
+                    'time': _iso(event_time[i]),
+                    'fixed_flooding_id': int(ids[event_point[i]]),
+                    'rainfall_mm': round(float(event_rain[i]), 2),
+                }
+                for i in event_order
+            ],
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    @staticmethod
+    def simulate(series, thresholds=None, use_calibration=False, only_ids=None, initial_active=False,
+                 radius_m=RAIN_RADIUS_M, max_events=1000):
+        """Nạp cấu hình điểm ngập (chỉ đọc) rồi mô phỏng theo chuỗi mưa"""
+        try:
+            floodings = ActivationSimulationService.load_floodings(
+                thresholds, use_calibration, only_ids, initial_active
+            )
+            return ActivationSimulationService.run(floodings, series, radius_m, max_events)
+        except Exception as e:
+            logger.exception("❌ Lỗi mô phỏng kích hoạt: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @staticmethod
+    def compare(series, thresholds=None, use_calibration=False, only_ids=None, initial_active=False,
+                radius_m=RAIN_RADIUS_M):
+        """Mô phỏng với ngưỡng hiện tại và ngưỡng đề xuất trên cùng chuỗi mưa để so sánh trước khi áp dụng"""
+        try:
+            current = ActivationSimulationService.load_floodings(None, False, only_ids, initial_active)
+            proposed = dict(current, threshold=ActivationSimulationService.load_floodings(
+                thresholds, use_calibration, only_ids, initial_active
+            )['threshold'])
+            baseline = ActivationSimulationService.run(current, series, radius_m)
+            candidate = ActivationSimulationService.run(proposed, series, radius_m)
+
+            before = {row['fixed_flooding_id']: row['activations'] for row in baseline['per_point']}
+            after = {row['fixed_flooding_id']: row['activations'] for row in candidate['per_point']}
+            changed = np.nonzero(current['threshold'] != proposed['threshold'])[0]
+            return {
+                'success': True,
+                'baseline': baseline,
+                'candidate': candidate,
+                'changes': [
+                    {
+                        'fixed_flooding_id': int(current['ids'][i]),
+                        'threshold_mm': float(current['threshold'][i]),
+                        'proposed_threshold_mm': float(proposed['threshold'][i]),
+                        'activations': before.get(int(current['ids'][i]), 0),
+                        'proposed_activations': after.get(int(current['ids'][i]), 0),
+                    }
+                    for i in changed
+                ],
+            }
+        except Exception as e:
+            logger.exception("❌ Lỗi so sánh mô phỏng kích hoạt: %s", e)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @staticmethod
+    def recorded_season(days=365):
+        """Chuỗi mưa đã ghi nhận trong N ngày gần nhất"""
+        return ActivationSimulationService.recorded_rainfall(since=timezone.now() - timedelta(days=days))
@@ -6,6 +6,8 @@ class DrainagePredictionUI {
         this.currentFloodReportId = null;
         this.currentPredictionData = null;
         this.currentLocation = null;
+        this.dashboardEvents = null;
+        this.dashboardReloadTimer = null;
         
         this.initializeModal();
         this.initializeControls();
@@ -512,13 +514,42 @@ class DrainagePredictionUI {
     async showDashboard() {
         if (!document.getElementById('drainageDashboardModal')) {
             this.createDashboardModal();
+            const modalElement = document.getElementById('drainageDashboardModal');
+            // Chỉ nghe sự kiện khi dashboard đang mở
+            modalElement.addEventListener('shown.bs.modal', () => this.subscribeDashboardEvents());
+            modalElement.addEventListener('hidden.bs.modal', () => this.unsubscribeDashboardEvents());
         }
         
-        const modal = new bootstrap.Modal(document.getElementById('drainageDashboardModal'));
+        const modal = bootstrap.Modal.getOrCreateInstance(document.getElementById('drainageDashboardModal'));
         await this.loadDashboardData();
         modal.show();
     }
 
+    subscribeDashboardEvents() {
+        // Tải lại dashboard khi server báo có dự đoán / báo cáo mới (SSE /api/events/), không polling
+        if (!window.EventSource || this.dashboardEvents) {
+            return;
+        }
+        
+        this.dashboardEvents = new EventSource('/api/events/?types=prediction,report');
+        const reload = () => {
+            // Gộp nhiều sự kiện liên tiếp thành một lần tải
+            clearTimeout(this.dashboardReloadTimer);
+            this.dashboardReloadTimer = setTimeout(() => this.loadDashboardData(), 2000);
+        };
+        ['prediction.updated', 'report.verified', 'resync'].forEach(type => {
+            this.dashboardEvents.addEventListener(type, reload);
+        });
+    }
+
+    unsubscribeDashboardEvents() {
+        clearTimeout(this.dashboardReloadTimer);
+        if (this.dashboardEvents) {
+            this.dashboardEvents.close();
+            this.dashboardEvents = null;
+        }
+    }
+
     createDashboardModal() {
         const modalHTML = `
             <div class="modal fade" id="drainageDashboardModal" tabindex="-1" aria-hidden="true">
@@ -8,6 +8,23 @@ let currentSearchMarker = null;
 let searchResultsDropdown = null;
 let floodCheckInterval = null;
 let weatherUpdateInterval = null;
+let floodEventSource = null;
+let lastFloodEventId = '';
+let floodReloadTimer = null;
+let floodDataCursor = null;
+let floodZoneFeatures = new Map();
+let floodClustersLayer = null;
+let floodClustersTimer = null;
+let floodZonesLevel = null;
+const COLUMNAR_MEDIA_TYPE = 'application/vnd.hanoiflood.columnar+json';
+// Zoom lớn nhất của từng mức hình học đơn giản hóa (khớp geometry.ZONE_GEOMETRY_LEVELS)
+const ZONE_GEOMETRY_LEVEL_ZOOMS = [11, 13, 15];
+const CLUSTER_SEVERITY_COLORS = {
+    light: '#3498db',
+    medium: '#f39c12',
+    heavy: '#e67e22',
+    severe: '#c0392b'
+};
 
 // ============ GIỚI HẠN BẢN ĐỒ CHỈ HÀ NỘI ============
 const HANOI_BOUNDS = L.latLngBounds(
@@ -52,6 +69,11 @@ function initMap() {
     // Load dữ liệu điểm ngập
     loadFloodZones();
     
+    // Báo cáo và điểm ngập cố định: server gom cụm theo zoom, tải lại khi đổi khung nhìn
+    loadFloodClusters();
+    map.on('moveend', scheduleClusterReload);
+    map.on('zoomend', onMapZoomForZones);
+    
     // Setup events
     setupMapClickHandler();
     initSearchDropdown();
@@ -1398,7 +1420,12 @@ async function loadFloodZones() {
     showLoadingOnMap();
     
     try {
-        const response = await fetch('/api/flood-data/');
+        // Ưu tiên định dạng cột (nhỏ hơn nhiều so với GeoJSON), server cũ vẫn trả JSON thường
+        // Hình học điểm ngập được đơn giản hóa theo zoom hiện tại
+        floodZonesLevel = zoneGeometryLevel(map.getZoom());
+        const response = await fetch(`/api/flood-data/?zoom=${map.getZoom()}`, {
+            headers: { 'Accept': `${COLUMNAR_MEDIA_TYPE}, application/json;q=0.9` }
+        });
         
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
@@ -1407,6 +1434,13 @@ async function loadFloodZones() {
         const data = await response.json();
         console.log('📊 Dữ liệu từ API:', data); 
         
+        if (data && data.data && data.data.format === 'columnar/1') {
+            data.data.flood_zones = decodeColumnarZones(data.data);
+        }
+        
+        // Cursor để lần sau chỉ tải phần thay đổi
+        floodDataCursor = (data && data.cursor !== undefined) ? data.cursor : null;
+        
         // Xử lý cấu trúc dữ liệu đơn giản
         let features = [];
         
@@ -1429,6 +1463,8 @@ async function loadFloodZones() {
             features = [];
         }
         
+        floodZoneFeatures = new Map(features.map(f => [f.properties.id, f]));
+        
         // Tạo GeoJSON chuẩn để hiển thị
         const geojsonData = {
             type: 'FeatureCollection',
@@ -1940,6 +1976,8 @@ async function refreshSystem() {
 // ============ THÔNG TIN THỜI TIẾT ============
 function setupWeatherAutoUpdate() {
     weatherUpdateInterval = setInterval(() => {
+        // Tab đang ẩn thì không cần gọi API thời tiết
+        if (document.hidden) return;
         const center = map.getCenter();
         updateWeatherInfo(center.lat, center.lng);
     }, 10 * 60 * 1000);
@@ -2140,18 +2178,318 @@ function setupAutoUpdate() {
     if (!autoUpdateCheckbox) return;
     
     autoUpdateCheckbox.addEventListener('change', function(e) {
-        if (e.target.checked && !floodCheckInterval) {
-            floodCheckInterval = setInterval(loadFloodZones, 5 * 60 * 1000);
-            showNotification('✅ Đã bật cập nhật tự động (5 phút/lần)', 'success');
-        } else if (!e.target.checked && floodCheckInterval) {
-            clearInterval(floodCheckInterval);
-            floodCheckInterval = null;
+        if (e.target.checked) {
+            startRealtimeUpdates();
+            showNotification('✅ Đã bật cập nhật tự động', 'success');
+        } else {
+            stopRealtimeUpdates();
             showNotification('🔄 Đã tắt cập nhật tự động', 'info');
         }
     });
     
-    if (autoUpdateCheckbox.checked && !floodCheckInterval) {
-        floodCheckInterval = setInterval(loadFloodZones, 5 * 60 * 1000);
+    if (autoUpdateCheckbox.checked) {
+        startRealtimeUpdates();
+    }
+}
+
+// ============ CẬP NHẬT REALTIME (SERVER-SENT EVENTS) ============
+function startRealtimeUpdates() {
+    if (!window.EventSource) {
+        // Trình duyệt không hỗ trợ SSE: quay lại polling 5 phút/lần (chỉ tải phần thay đổi)
+        if (!floodCheckInterval) {
+            floodCheckInterval = setInterval(syncFloodChanges, 5 * 60 * 1000);
+        }
+        return;
+    }
+    
+    connectFloodEvents();
+    map.off('moveend', onMapMovedForEvents);
+    map.on('moveend', onMapMovedForEvents);
+}
+
+function stopRealtimeUpdates() {
+    if (floodEventSource) {
+        floodEventSource.close();
+        floodEventSource = null;
+    }
+    if (floodCheckInterval) {
+        clearInterval(floodCheckInterval);
+        floodCheckInterval = null;
+    }
+    map.off('moveend', onMapMovedForEvents);
+}
+
+function connectFloodEvents() {
+    if (floodEventSource) {
+        floodEventSource.close();
+    }
+    
+    // Chỉ nhận sự kiện trong khung nhìn hiện tại (mở rộng thêm một chút)
+    const bounds = map.getBounds().pad(0.2);
+    const params = new URLSearchParams({
+        bbox: [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+            .map(v => v.toFixed(5)).join(',')
+    });
+    if (lastFloodEventId) {
+        params.set('last_event_id', lastFloodEventId);
+    }
+    
+    floodEventSource = new EventSource(`/api/events/?${params.toString()}`);
+    
+    const remember = (event) => {
+        if (event.lastEventId) lastFloodEventId = event.lastEventId;
+    };
+    
+    floodEventSource.addEventListener('zone.activated', (event) => {
+        remember(event);
+        const payload = JSON.parse(event.data);
+        showNotification(`⚠️ Điểm ngập kích hoạt: ${payload.data.name}`, 'warning');
+        scheduleFloodReload();
+    });
+    floodEventSource.addEventListener('zone.deactivated', (event) => {
+        remember(event);
+        scheduleFloodReload();
+    });
+    floodEventSource.addEventListener('fixed.activated', (event) => {
+        remember(event);
+        const payload = JSON.parse(event.data);
+        showNotification(`🚨 Cảnh báo ngập: ${payload.data.name} (dự báo ${payload.data.predicted_depth}cm)`, 'error');
+        const center = map.getCenter();
+        updateWeatherInfo(center.lat, center.lng);
+        scheduleFloodReload();
+    });
+    floodEventSource.addEventListener('fixed.deactivated', (event) => {
+        remember(event);
+        scheduleFloodReload();
+    });
+    floodEventSource.addEventListener('report.verified', (event) => {
+        remember(event);
+        scheduleFloodReload();
+    });
+    floodEventSource.addEventListener('prediction.updated', (event) => {
+        remember(event);
+        scheduleFloodReload();
+    });
+    floodEventSource.addEventListener('resync', (event) => {
+        // Server không còn giữ các sự kiện đã lỡ: tải lại toàn bộ
+        remember(event);
+        scheduleFloodReload(0);
+    });
+    floodEventSource.onerror = () => {
+        console.warn('⚠️ Mất kết nối realtime, trình duyệt sẽ tự kết nối lại');
+    };
+}
+
+function onMapMovedForEvents() {
+    // Đổi khung nhìn: kết nối lại với bbox mới, tiếp tục từ sự kiện cuối cùng đã nhận
+    clearTimeout(onMapMovedForEvents.timer);
+    onMapMovedForEvents.timer = setTimeout(connectFloodEvents, 1000);
+}
+
+function scheduleFloodReload(delay = 2000) {
+    // Gộp nhiều sự kiện liên tiếp thành một lần đồng bộ
+    clearTimeout(floodReloadTimer);
+    floodReloadTimer = setTimeout(() => {
+        syncFloodChanges();
+        loadFloodClusters();
+    }, delay);
+}
+
+function zoneGeometryLevel(zoom) {
+    const index = ZONE_GEOMETRY_LEVEL_ZOOMS.findIndex(maxZoom => zoom <= maxZoom);
+    return index === -1 ? ZONE_GEOMETRY_LEVEL_ZOOMS.length : index;
+}
+
+function onMapZoomForZones() {
+    // Chỉ tải lại điểm ngập khi zoom chuyển sang mức hình học khác
+    if (floodZonesLevel !== null && zoneGeometryLevel(map.getZoom()) !== floodZonesLevel) {
+        loadFloodZones();
+    }
+}
+
+// ============ CỤM BÁO CÁO / ĐIỂM NGẬP CỐ ĐỊNH (GOM SẴN Ở SERVER) ============
+function scheduleClusterReload() {
+    clearTimeout(floodClustersTimer);
+    floodClustersTimer = setTimeout(loadFloodClusters, 300);
+}
+
+async function loadFloodClusters() {
+    const bounds = map.getBounds().pad(0.1);
+    const params = new URLSearchParams({
+        zoom: map.getZoom(),
+        bbox: [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+            .map(v => v.toFixed(5)).join(',')
+    });
+    
+    try {
+        const response = await fetch(`/api/clusters/?${params.toString()}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        displayFloodClusters(data.clusters || []);
+    } catch (error) {
+        console.error('❌ Lỗi tải cụm điểm ngập:', error);
+    }
+}
+
+function displayFloodClusters(clusters) {
+    if (floodClustersLayer) {
+        map.removeLayer(floodClustersLayer);
+    }
+    
+    floodClustersLayer = L.layerGroup(clusters.map(cluster => {
+        const color = CLUSTER_SEVERITY_COLORS[cluster.severity] || '#95a5a6';
+        
+        if (cluster.count === 1) {
+            const label = cluster.reports ? 'Báo cáo ngập' : 'Điểm ngập cố định';
+            return L.circleMarker([cluster.lat, cluster.lng], {
+                radius: 6,
+                color: color,
+                weight: 1,
+                fillColor: color,
+                fillOpacity: cluster.active ? 0.8 : 0.3
+            }).bindTooltip(`${label} - ${cluster.max_depth}cm`);
+        }
+        
+        const size = Math.min(56, 24 + Math.round(Math.log2(cluster.count) * 4));
+        const marker = L.marker([cluster.lat, cluster.lng], {
+            icon: L.divIcon({
+                className: 'flood-cluster',
+                html: `<div style="width: ${size}px; height: ${size}px; line-height: ${size}px; border-radius: 50%;
+                            background: ${color}; opacity: 0.85; color: white; font-size: 12px;
+                            font-weight: 600; text-align: center;">${cluster.count}</div>`,
+                iconSize: [size, size]
+            })
+        });
+        marker.bindTooltip(`${cluster.reports} báo cáo, ${cluster.fixed} điểm cố định | Sâu nhất: ${cluster.max_depth}cm`);
+        marker.on('click', () => {
+            map.setView([cluster.lat, cluster.lng], Math.min(map.getZoom() + 2, map.getMaxZoom()));
+        });
+        return marker;
+    })).addTo(map);
+}
+
+// ============ GIẢI MÃ ĐỊNH DẠNG CỘT ============
+function undelta(values) {
+    let acc = 0;
+    return values.map(v => (acc += v));
+}
+
+function decodeColumnarLayer(layer, scale) {
+    // Giải mã các cột: từ điển, delta; trả về mảng {geometry, props}
+    const columns = {};
+    for (const [name, column] of Object.entries(layer.columns)) {
+        if (column && column.dict) {
+            columns[name] = column.codes.map(code => column.dict[code]);
+        } else if (name === 'id') {
+            columns[name] = undelta(column);
+        } else {
+            columns[name] = column;
+        }
+    }
+    
+    const geom = layer.geometry;
+    const xs = undelta(geom.x).map(v => v / scale);
+    const ys = undelta(geom.y).map(v => v / scale);
+    const rows = [];
+    
+    for (let i = 0; i < layer.count; i++) {
+        let geometry;
+        if (geom.type === 'Polygon') {
+            const rings = [];
+            for (let r = geom.geom_offsets[i]; r < geom.geom_offsets[i + 1]; r++) {
+                const ring = [];
+                for (let k = geom.ring_offsets[r]; k < geom.ring_offsets[r + 1]; k++) {
+                    ring.push([xs[k], ys[k]]);
+                }
+                rings.push(ring);
+            }
+            geometry = { type: 'Polygon', coordinates: rings };
+        } else {
+            geometry = { type: 'Point', coordinates: [xs[i], ys[i]] };
+        }
+        
+        const props = {};
+        for (const name of Object.keys(columns)) {
+            props[name] = columns[name][i];
+        }
+        rows.push({ geometry, props });
+    }
+    return rows;
+}
+
+function formatEpochShort(seconds) {
+    // Cùng định dạng 'HH:MM dd/mm' như GeoJSON
+    const d = new Date(seconds * 1000);
+    const pad = n => String(n).padStart(2, '0');
+    return `${pad(d.getHours())}:${pad(d.getMinutes())} ${pad(d.getDate())}/${pad(d.getMonth() + 1)}`;
+}
+
+function decodeColumnarZones(payload) {
+    const labels = payload.labels || {};
+    return decodeColumnarLayer(payload.flood_zones, payload.scale).map(({ geometry, props }) => ({
+        type: 'Feature',
+        geometry,
+        properties: {
+            id: `zone_${props.id}`,
+            name: props.name || 'Điểm ngập',
+            zone_type: props.zone_type || 'unknown',
+            zone_type_display: (labels.zone_type || {})[props.zone_type] || props.zone_type,
+            district: props.district || '',
+            ward: props.ward || '',
+            street: props.street || '',
+            max_depth: props.max_depth || 0,
+            report_count: props.report_count || 0,
+            last_reported: props.last_reported_at ? formatEpochShort(props.last_reported_at) : 'Chưa có',
+            description: props.description || '',
+            is_active: true,
+            flood_cause: props.flood_cause || 'Không xác định'
+        }
+    }));
+}
+
+// ============ ĐỒNG BỘ TĂNG DẦN ============
+async function syncFloodChanges() {
+    if (floodDataCursor === null) {
+        return loadFloodZones();
+    }
+    
+    try {
+        let hasMore = true;
+        let changed = 0;
+        
+        while (hasMore) {
+            const response = await fetch(`/api/flood-data/changes/?since=${floodDataCursor}&zoom=${map.getZoom()}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            
+            if (data.reset) {
+                // Cursor quá cũ (nhật ký đã được nén): tải lại toàn bộ
+                return loadFloodZones();
+            }
+            
+            (data.removed.flood_zones || []).forEach(id => floodZoneFeatures.delete(id));
+            (data.changes.flood_zones || []).forEach(f => floodZoneFeatures.set(f.properties.id, f));
+            changed += (data.removed.flood_zones || []).length + (data.changes.flood_zones || []).length;
+            
+            floodDataCursor = data.cursor;
+            hasMore = data.has_more;
+        }
+        
+        if (changed > 0) {
+            displayFloodZonesOnMap({
+                type: 'FeatureCollection',
+                features: Array.from(floodZoneFeatures.values())
+            });
+            await updateControlPanelStats();
+            console.log(`✅ Đồng bộ ${changed} thay đổi điểm ngập`);
+        }
+    } catch (error) {
+        console.error('❌ Lỗi đồng bộ thay đổi, tải lại toàn bộ:', error);
+        loadFloodZones();
     }
 }
 
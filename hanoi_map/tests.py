@@ -1,3 +1,762 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta, timezone as dt_timezone
+from unittest.mock import AsyncMock, patch
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point, Polygon
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .calibration import ThresholdCalibrationService
+from .changelog import FloodChangeService, record_changes
+from .clusters import cluster_index
+from .forecasting import FORECAST_ACTIVATION_SOURCE, BatchPredictionService
+from .importers import FloodPointImporter
+from .lifecycle import EXPIRY_GRACE_HOURS, FloodLifecycleService
+from .lookahead import FORECAST_STEP_HOURS, PreWarningService, threshold_crossings
+from .merging import FloodZoneMergeService
+from .metrics import query_budget
+from .models import (
+    AlertNotification, AlertSubscription, FixedFlooding, FixedFloodingCalibration, FloodEventLog, FloodPrediction,
+    FloodPreWarning, FloodReport, FloodZone,
+)
+from .notifications import NotificationService
+from .services import FloodCheckService
+from .simulation import RISK_LEVELS, ActivationSimulationService, rainfall_series, risk_level_index, risk_scores
+
+SRID = 4326
+CENTER = (21.0285, 105.8542)
+
+
+def _square(lat, lng, half=0.0005):
+    return Polygon((
+        (lng - half, lat - half), (lng + half, lat - half), (lng + half, lat + half),
+        (lng - half, lat + half), (lng - half, lat - half),
+    ), srid=SRID)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Mỗi endpoint trong FLOOD_QUERY_BUDGETS phải nằm trong ngân sách SQL của nó. Dữ liệu mẫu có nhiều
+    bản ghi mỗi loại để N+1 (số câu SQL tăng theo số dòng) vượt ngân sách thay vì lọt qua.
+    """
+
+    ZONES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        lat, lng = CENTER
+        for index in range(cls.ZONES):
+            offset = index * 0.002
+            FloodZone.objects.create(
+                name=f"Điểm ngập {index}", zone_type='frequent', geometry=_square(lat + offset, lng + offset),
+                district='Hoàn Kiếm', max_depth_cm=20 + index * 10, external_id=f"test-{index}",
+            )
+            FloodReport.objects.create(
+                location=Point(lng + offset, lat + offset, srid=SRID), address=f"Số {index} Hàng Bông",
+                district='Hoàn Kiếm', water_depth=10 + index * 10, status='verified',
+                verified_at=timezone.now(),
+            )
+            FixedFlooding.objects.create(
+                name=f"Điểm cố định {index}", location=Point(lng - offset, lat - offset, srid=SRID),
+                address=f"Số {index} Phố Huế", district='Hai Bà Trưng', rainfall_threshold_mm=30,
+                is_active=index % 2 == 0,
+            )
+
+    def setUp(self):
+        cluster_index.rebuild()
+
+    def assertWithinBudget(self, name, params=None):
+        with query_budget(settings.FLOOD_QUERY_BUDGETS[name], name):
+            response = self.client.get(reverse(name), params or {})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response
+
+    def test_flood_data_api(self):
+        self.assertWithinBudget('flood_data_api')
+        self.assertWithinBudget('flood_data_api', {'lat': CENTER[0], 'lng': CENTER[1], 'radius': 5})
+
+    def test_flood_changes_api(self):
+        cursor = self.client.get(reverse('flood_data_api')).json()['cursor']
+        self.assertWithinBudget('flood_changes_api')
+        self.assertWithinBudget('flood_changes_api', {'since': cursor})
+
+    def test_recent_reports_api(self):
+        self.assertWithinBudget('recent_reports_api', {'limit': 20})
+
+    def test_clusters_api(self):
+        self.assertWithinBudget('clusters_api', {'zoom': 12})
+        self.assertWithinBudget('clusters_api', {'zoom': 18, 'layers': 'report,fixed'})
+
+    def test_fixed_floodings_api(self):
+        self.assertWithinBudget('fixed_floodings_api')
+        self.assertWithinBudget('fixed_floodings_api', {'lat': CENTER[0], 'lng': CENTER[1], 'active': 'true'})
+
+    @patch('hanoi_map.views.WeatherService.aget_current_weather', new_callable=AsyncMock, return_value={})
+    @patch('hanoi_map.views.LocationSearchService.aget_location_info', new_callable=AsyncMock, return_value={})
+    def test_check_flood_api(self, location_info, weather):
+        self.assertWithinBudget('check_flood_api', {'lat': CENTER[0], 'lng': CENTER[1], 'radius': 1000})
+
+    def test_all_zones_status_api(self):
+        response = self.assertWithinBudget('all_zones_status_api')
+        self.assertEqual(response.json()['count'], self.ZONES)
+
+
+class AllZonesStatusTests(TestCase):
+    """get_all_zones_status tính theo tập phải cho cùng kết quả với check_flood_at_location từng điểm"""
+
+    def test_matches_check_flood_at_location(self):
+        lat, lng = CENTER
+        for index, depth in enumerate((10, 25, 40, 60)):
+            offset = index * 0.0008
+            FloodZone.objects.create(
+                name=f"Điểm ngập {index}", zone_type='frequent', geometry=_square(lat + offset, lng, 0.0002),
+                district='Hoàn Kiếm', max_depth_cm=depth, external_id=f"status-{index}",
+            )
+        FloodReport.objects.create(
+            location=Point(lng, lat + 0.0016, srid=SRID), address="Hàng Bông", district='Hoàn Kiếm',
+            water_depth=35, status='verified',
+        )
+        FloodZone.objects.create(
+            name="Đã tắt", zone_type='frequent', geometry=_square(lat, lng + 0.01), district='Hoàn Kiếm',
+            is_active=False, external_id="status-off",
+        )
+
+        statuses = FloodCheckService.get_all_zones_status(radius_m=100)
+        self.assertEqual(len(statuses), 4)
+        for status in statuses:
+            expected = FloodCheckService.check_flood_at_location(status['lat'], status['lon'], radius_m=100)
+            self.assertEqual(
+                (status['status'], status['severity'], status['risk_level'], status['message']),
+                (expected['has_flood'], expected['severity'], expected['risk_level'], expected['message']),
+                status['name'],
+            )
+
+
+class AlertAtApiTests(TestCase):
+
+    def test_rejects_invalid_coordinates(self):
+        for lat, lng in (('nan', '105.85'), ('21.03', 'inf'), ('91', '105.85'), ('21.03', '-181'), ('', '105.85')):
+            response = self.client.get(reverse('alert_at_api'), {'lat': lat, 'lng': lng})
+            self.assertEqual(response.status_code, 400, (lat, lng))
+
+
+class SubscriptionsApiTests(TestCase):
+
+    def post(self, target):
+        return self.client.post(reverse('subscriptions_api'), json.dumps({
+            'device_id': 'test-device', 'lat': CENTER[0], 'lng': CENTER[1], 'sink': 'webhook', 'target': target,
+        }), content_type='application/json')
+
+    def test_webhook_requires_login(self):
+        self.assertEqual(self.post('https://8.8.8.8/hook').status_code, 403)
+
+    def test_webhook_rejects_internal_addresses(self):
+        self.client.force_login(User.objects.create_user('subscriber'))
+        for target in ('http://127.0.0.1:8000/', 'http://169.254.169.254/latest/meta-data/', 'http://10.0.0.5/'):
+            self.assertEqual(self.post(target).status_code, 400, target)
+        self.assertFalse(AlertSubscription.objects.exists())
+
+    def test_rejects_non_finite_radius(self):
+        for radius in ('nan', 'inf', 5, 50000):
+            response = self.client.post(reverse('subscriptions_api'), json.dumps({
+                'device_id': 'test-device', 'lat': CENTER[0], 'lng': CENTER[1], 'radius': radius,
+                'sink': 'email', 'target': 'a@example.com',
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 400, radius)
+        self.assertFalse(AlertSubscription.objects.exists())
+
+
+class NotificationFanOutTests(TestCase):
+
+    def setUp(self):
+        self.subscription = AlertSubscription.objects.create(
+            device_id='test-device', location=Point(CENTER[1], CENTER[0], srid=SRID), radius_meters=500,
+            sink='file', target='/dev/null',
+        )
+        self.event = FloodEventLog.objects.create(
+            event_type='report.verified', data={'id': 1}, lat=CENTER[0], lng=CENTER[1], notify_pending=True,
+        )
+
+    def test_failed_fan_out_stays_pending(self):
+        with patch.object(NotificationService, 'fan_out', return_value={'success': False, 'error': 'lỗi'}):
+            self.assertEqual(NotificationService.fan_out_pending(), 0)
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.notify_pending)
+        self.assertFalse(AlertNotification.objects.exists())
+
+        self.assertEqual(NotificationService.fan_out_pending(), 1)
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.notify_pending)
+        self.assertEqual(AlertNotification.objects.filter(subscription=self.subscription).count(), 1)
+
+
+class ZoneMergeTests(TestCase):
+
+    def setUp(self):
+        lat, lng = CENTER
+        # Hai vùng cách nhau ~10 m: vùng có nhiều báo cáo hơn được giữ lại
+        self.keeper = FloodZone.objects.create(
+            name="Giữ lại", zone_type='seasonal', geometry=_square(lat, lng, 0.0002), district='Hoàn Kiếm',
+            max_depth_cm=20, report_count=3, external_id="merge-keeper",
+        )
+        self.extra = FloodZone.objects.create(
+            name="Bị gộp", zone_type='black', geometry=_square(lat, lng + 0.0005, 0.0002), district='Hoàn Kiếm',
+            max_depth_cm=50, report_count=1, external_id="merge-extra",
+        )
+        self.report = FloodReport.objects.create(
+            location=Point(lng + 0.0005, lat, srid=SRID), address="Hàng Bông", district='Hoàn Kiếm',
+            water_depth=30, status='verified', flood_zone=self.extra,
+        )
+        self.prediction = FloodPrediction.objects.create(
+            location=Point(lng + 0.0005, lat, srid=SRID), address="Hàng Bông", district='Hoàn Kiếm',
+            valid_until=timezone.now() + timedelta(hours=3), risk_level='high', rainfall_mm=40,
+            elevation=8, flood_zone=self.extra,
+        )
+
+    def test_merge_repoints_references(self):
+        result = FloodZoneMergeService.merge(distance_m=30)
+        self.assertTrue(result['success'], result)
+        self.assertEqual((result['groups'], result['retired']), (1, 1))
+
+        self.report.refresh_from_db()
+        self.prediction.refresh_from_db()
+        self.extra.refresh_from_db()
+        self.keeper.refresh_from_db()
+        self.assertEqual(self.report.flood_zone_id, self.keeper.pk)
+        self.assertEqual(self.prediction.flood_zone_id, self.keeper.pk)
+        self.assertFalse(self.extra.is_active)
+        self.assertEqual(self.extra.merged_into_id, self.keeper.pk)
+        self.assertEqual((self.keeper.zone_type, self.keeper.max_depth_cm, self.keeper.report_count), ('black', 50, 1))
+
+    def test_skips_zone_changed_after_planning(self):
+        groups = FloodZoneMergeService.find_groups(30)
+        # Vùng bị tắt giữa lúc lập kế hoạch và lúc khóa thì không được gộp nữa
+        FloodZone.objects.filter(pk=self.extra.pk).update(is_active=False)
+        with patch.object(FloodZoneMergeService, 'find_groups', return_value=groups):
+            result = FloodZoneMergeService.merge(distance_m=30)
+        self.assertEqual((result['groups'], result['retired']), (0, 0))
+        self.report.refresh_from_db()
+        self.extra.refresh_from_db()
+        self.assertEqual(self.report.flood_zone_id, self.extra.pk)
+        self.assertIsNone(self.extra.merged_into_id)
+
+
+class ThresholdCalibrationTests(TestCase):
+    """Hiệu chỉnh từ các cặp (lượng mưa, độ sâu) đã biết: độ sâu = 2 * mưa - 30, thời gian = 0.1 * mưa - 2"""
+
+    DAY = 86400
+
+    def setUp(self):
+        self.point = FixedFlooding.objects.create(
+            name="Điểm hiệu chỉnh", location=Point(CENTER[1], CENTER[0], srid=SRID), address="Phố Huế",
+            district='Hai Bà Trưng', rainfall_threshold_mm=30, predicted_depth_cm=20, duration_hours=2,
+            radius_meters=100,
+        )
+
+    def observations(self, rain, depths, durations=()):
+        """Mỗi đợt mưa cách nhau một ngày; đợt có độ sâu (khác None) được xác nhận bằng một báo cáo sau 10 phút"""
+        lat, lng = CENTER
+        start = int(timezone.now().timestamp()) - 30 * self.DAY
+        rain_time = np.array([start + index * self.DAY for index in range(len(rain))], dtype=np.int64)
+        confirmed = [index for index, depth in enumerate(depths) if depth is not None]
+
+        def at_point(count):
+            return np.full(count, lat), np.full(count, lng)
+
+        rain_lat, rain_lon = at_point(len(rain))
+        report_lat, report_lon = at_point(len(confirmed))
+        duration_lat, duration_lon = at_point(len(durations))
+        return {
+            'point_ids': np.array([self.point.pk], dtype=np.int64),
+            'point_lat': np.array([lat]), 'point_lon': np.array([lng]),
+            'point_radius': np.array([100.0]),
+            'current_threshold': np.array([30.0]), 'current_depth': np.array([20.0]),
+            'current_duration': np.array([2.0]),
+            'rain_lat': rain_lat, 'rain_lon': rain_lon,
+            'rain_mm': np.array(rain, dtype=float), 'rain_time': rain_time,
+            'report_lat': report_lat, 'report_lon': report_lon,
+            'report_depth': np.array([depths[index] for index in confirmed], dtype=float),
+            'report_time': rain_time[confirmed] + 600,
+            'duration_lat': duration_lat, 'duration_lon': duration_lon,
+            'duration_rain': np.array([value for value, _hours in durations], dtype=float),
+            'duration_hours': np.array([hours for _value, hours in durations], dtype=float),
+            'rain_radius_m': 2000,
+        }
+
+    def test_fits_known_pairs_and_stores_proposal(self):
+        rain = [10, 20, 40, 50, 60]
+        obs = self.observations(
+            rain, [None, None, 50, 70, 90], durations=[(40, 2.0), (50, 3.0), (60, 4.0)],
+        )
+        with patch.object(ThresholdCalibrationService, 'collect_observations', return_value=obs):
+            results = ThresholdCalibrationService.run()
+        self.assertEqual(len(results), 1)
+
+        proposal = FixedFloodingCalibration.objects.get(fixed_flooding=self.point)
+        # Mọi ngưỡng trong (20, 40] phân loại đúng cả 5 đợt; khi hòa giữ ngưỡng gần giá trị hiện tại (30)
+        self.assertEqual(proposal.proposed_threshold_mm, 30.0)
+        self.assertAlmostEqual(proposal.proposed_depth_cm, 2 * 30 - 30)
+        self.assertAlmostEqual(proposal.proposed_duration_hours, 0.1 * 30 - 2)
+        self.assertEqual((proposal.event_count, proposal.confirmed_count, proposal.report_count), (5, 3, 3))
+        self.assertEqual(proposal.metrics['misclassified_events'], 0)
+        self.assertAlmostEqual(proposal.metrics['depth_slope_cm_per_mm'], 2.0)
+        self.assertAlmostEqual(proposal.metrics['depth_r2'], 1.0)
+        self.assertAlmostEqual(proposal.metrics['duration_slope_h_per_mm'], 0.1)
+        self.assertGreater(proposal.confidence, 0)
+
+        # Chạy lại: đề xuất cũ chưa duyệt bị thay thế
+        with patch.object(ThresholdCalibrationService, 'collect_observations', return_value=obs):
+            ThresholdCalibrationService.run()
+        self.assertEqual(
+            sorted(FixedFloodingCalibration.objects.values_list('status', flat=True)), ['pending', 'superseded']
+        )
+
+    def test_falls_back_with_too_few_samples(self):
+        # Hai đợt xác nhận (< 3): không hồi quy, độ sâu lấy trung bình; không có mẫu thời gian: giữ giá trị hiện tại
+        result, = ThresholdCalibrationService.fit(self.observations([10, 40, 60], [None, 40, 60]))
+        self.assertEqual(result['proposed_depth_cm'], 50.0)
+        self.assertIsNone(result['metrics']['depth_slope_cm_per_mm'])
+        self.assertEqual(result['proposed_duration_hours'], 2.0)
+        self.assertEqual(result['metrics']['duration_samples'], 0)
+
+        # Không đợt nào được xác nhận: giữ độ sâu hiện tại
+        result, = ThresholdCalibrationService.fit(self.observations([10, 40, 60], [None, None, None]))
+        self.assertEqual(result['proposed_depth_cm'], 20.0)
+
+        # Ít đợt mưa hơn min_events: không đề xuất
+        self.assertEqual(ThresholdCalibrationService.fit(self.observations([40, 60], [40, 60])), [])
+
+
+class ImporterReconcileTests(TestCase):
+    """Import lại bộ dữ liệu đầy đủ: upsert theo external_id, tắt bản ghi không còn trong nguồn"""
+
+    def import_features(self, target, features, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.geojson')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'type': 'FeatureCollection', 'features': features}, f)
+            importer = FloodPointImporter(target, source_name='hn', **options)
+            importer.run(path)
+        self.assertEqual(importer.errors, [])
+
+    def zone_feature(self, external_id, offset, depth):
+        lat, lng = CENTER
+        return {
+            'type': 'Feature', 'id': external_id,
+            'geometry': json.loads(_square(lat + offset, lng, 0.0002).json),
+            'properties': {'name': f"Vùng {external_id}", 'zone_type': 'frequent', 'district': 'Hoàn Kiếm',
+                           'max_depth_cm': depth},
+        }
+
+    def test_reimport_upserts_and_retires_missing_zones(self):
+        lat, lng = CENTER
+        auto_created = FloodZone.objects.create(
+            name="Tạo từ báo cáo", zone_type='rain', geometry=_square(lat, lng + 0.01), district='Hoàn Kiếm',
+        )
+        other_source = FloodZone.objects.create(
+            name="Bộ dữ liệu khác", zone_type='rain', geometry=_square(lat, lng + 0.02), district='Hoàn Kiếm',
+            external_id='other:1',
+        )
+        self.import_features('zone', [self.zone_feature('a', 0, 30), self.zone_feature('b', 0.002, 40)])
+        first = FloodZone.objects.get(external_id='hn:a')
+        self.assertTrue(FloodZone.objects.get(external_id='hn:b').is_active)
+
+        self.import_features('zone', [self.zone_feature('a', 0, 80), self.zone_feature('c', 0.004, 20)],
+                             deactivate_missing=True)
+
+        updated = FloodZone.objects.get(external_id='hn:a')
+        self.assertEqual((updated.pk, updated.max_depth_cm, updated.is_active), (first.pk, 80, True))
+        self.assertTrue(FloodZone.objects.get(external_id='hn:c').is_active)
+        retired = FloodZone.objects.get(external_id='hn:b')
+        self.assertFalse(retired.is_active)
+        self.assertTrue(FloodEventLog.objects.filter(event_type='zone.deactivated', data__id=retired.pk).exists())
+        # Vùng tạo tự động và vùng của bộ dữ liệu khác giữ nguyên
+        self.assertEqual(FloodZone.objects.filter(pk__in=[auto_created.pk, other_source.pk], is_active=True).count(), 2)
+
+    def test_reimport_stops_monitoring_missing_fixed_points(self):
+        lat, lng = CENTER
+        missing = FixedFlooding.objects.create(
+            name="Điểm cũ", location=Point(lng, lat, srid=SRID), address="Phố Huế", district='Hai Bà Trưng',
+            rainfall_threshold_mm=30, external_id='hn:old',
+        )
+        manual = FixedFlooding.objects.create(
+            name="Điểm nhập tay", location=Point(lng + 0.01, lat, srid=SRID), address="Phố Huế",
+            district='Hai Bà Trưng', rainfall_threshold_mm=30,
+        )
+        missing.switch_warning(True, 'Kiểm thử')
+
+        self.import_features('fixed', [{
+            'type': 'Feature', 'id': 'new', 'geometry': {'type': 'Point', 'coordinates': [lng + 0.02, lat]},
+            'properties': {'name': "Điểm mới", 'address': "Hàng Bông", 'district': 'Hoàn Kiếm',
+                           'rainfall_threshold_mm': 40},
+        }], deactivate_missing=True)
+
+        missing.refresh_from_db()
+        manual.refresh_from_db()
+        self.assertEqual((missing.is_monitored, missing.is_active), (False, False))
+        self.assertTrue(manual.is_monitored)
+        self.assertTrue(FixedFlooding.objects.get(external_id='hn:new').is_monitored)
+
+
+class ChangeLogPagingTests(TransactionTestCase):
+    """
+    Đọc nhật ký theo trang qua nhiều transaction (TransactionTestCase: mỗi khối atomic commit thật, có txid
+    riêng) không bỏ sót, không lặp dòng, kể cả khi có transaction chạy lâu hay khi nén nhật ký giữa chừng.
+    """
+
+    def write(self, entity, object_ids):
+        with transaction.atomic():
+            record_changes(entity, object_ids)
+
+    def read_all(self, since, limit):
+        entries = []
+        for _page in range(100):
+            page, since, has_more = FloodChangeService.entries_after(since, limit=limit)
+            entries.extend(page)
+            if not has_more:
+                return entries, since
+        self.fail("entries_after không dừng")
+
+    def test_pages_never_split_a_transaction(self):
+        cursor = FloodChangeService.current_cursor()
+        transactions = [[1, 2, 3], [4], [5, 6, 7, 8], [9, 10], [11]]
+        for object_ids in transactions:
+            self.write('zone', object_ids)
+
+        seen = []
+        since = cursor
+        while True:
+            page, since, has_more = FloodChangeService.entries_after(since, limit=3)
+            ids = [object_id for _entity, object_id in page]
+            # Mỗi trang gồm trọn các transaction (transaction 4 dòng lớn hơn trang được đọc trọn)
+            self.assertTrue(all(set(group) <= set(ids) or not set(group) & set(ids) for group in transactions), ids)
+            seen.extend(ids)
+            if not has_more:
+                break
+        self.assertEqual(seen, list(range(1, 12)))
+        page, _cursor, has_more = FloodChangeService.entries_after(since, limit=3)
+        self.assertEqual((page, has_more), ([], False))
+
+    def test_long_transaction_holds_the_horizon(self):
+        cursor = FloodChangeService.current_cursor()
+        started, release = threading.Event(), threading.Event()
+
+        def long_transaction():
+            try:
+                with transaction.atomic():
+                    record_changes('report', [100])
+                    started.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=long_transaction)
+        worker.start()
+        try:
+            self.assertTrue(started.wait(10))
+            # Transaction sau commit trước: chưa được đọc vì transaction cũ hơn vẫn đang chạy
+            self.write('report', [101])
+            entries, cursor = self.read_all(cursor, limit=10)
+            self.assertEqual(entries, [])
+        finally:
+            release.set()
+            worker.join()
+
+        entries, cursor = self.read_all(cursor, limit=10)
+        self.assertEqual(entries, [('report', 100), ('report', 101)])
+        self.assertEqual(self.read_all(cursor, limit=10)[0], [])
+
+    def test_compaction_keeps_unread_changes(self):
+        start = FloodChangeService.current_cursor()
+        self.write('zone', [1, 2])
+        self.write('zone', [3])
+        entries, cursor = self.read_all(start, limit=2)
+        self.assertEqual(entries, [('zone', 1), ('zone', 2), ('zone', 3)])
+
+        # Đối tượng 1 đổi lại sau cursor: nén chỉ xóa dòng cũ, dòng mới vẫn được đọc đúng một lần
+        self.write('zone', [1, 4])
+        FloodChangeService.compact(retention_days=7)
+        self.assertEqual(self.read_all(cursor, limit=2)[0], [('zone', 1), ('zone', 4)])
+
+        # Hết hạn lưu: client có cursor cũ hơn mốc checkpoint phải tải lại toàn bộ
+        FloodChangeService.compact(retention_days=0)
+        self.assertTrue(FloodChangeService.get_changes(start)['reset'])
+        self.assertFalse(FloodChangeService.get_changes(FloodChangeService.current_cursor())['reset'])
+
+
+class ExpiryTests(TestCase):
+    """Vùng tạo tự động hết hiệu lực sau avg_duration_hours + EXPIRY_GRACE_HOURS kể từ báo cáo gần nhất"""
+
+    DURATION_HOURS = 3
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.expiry = timedelta(hours=self.DURATION_HOURS + EXPIRY_GRACE_HOURS)
+
+    def zone(self, name, reported_ago, **fields):
+        lat, lng = CENTER
+        offset = FloodZone.objects.count() * 0.002
+        return FloodZone.objects.create(
+            name=name, zone_type='rain', geometry=_square(lat + offset, lng, 0.0002), district='Hoàn Kiếm',
+            avg_duration_hours=self.DURATION_HOURS, last_reported_at=self.now - reported_ago, **fields,
+        )
+
+    def prediction(self, zone=None, valid_for=timedelta(hours=3), **fields):
+        return FloodPrediction.objects.create(
+            location=Point(CENTER[1], CENTER[0], srid=SRID), address="Hàng Bông", district='Hoàn Kiếm',
+            valid_until=self.now + valid_for, risk_level='medium', rainfall_mm=30, elevation=8, flood_zone=zone,
+            **fields,
+        )
+
+    def test_expired_zones(self):
+        late = self.expiry + timedelta(minutes=5)
+        expired = self.zone("Hết hạn", late)
+        self.zone("Còn trong thời gian chờ", self.expiry - timedelta(minutes=5))
+        self.zone("Import từ dữ liệu gốc", late, external_id='hn:1')
+        with_report = self.zone("Còn báo cáo", late)
+        with_old_report = self.zone("Báo cáo đã hết hạn", late)
+        with_prediction = self.zone("Còn dự đoán", late)
+        with_old_prediction = self.zone("Dự đoán đã hết hạn", late)
+
+        # bulk_create không chạy signal, nên last_reported_at của vùng không bị báo cáo mới ghi đè
+        FloodReport.objects.bulk_create([
+            FloodReport(location=Point(CENTER[1], CENTER[0], srid=SRID), address="Hàng Bông", district='Hoàn Kiếm',
+                        water_depth=20, status='verified', flood_zone=zone, is_active=is_active)
+            for zone, is_active in ((with_report, True), (with_old_report, False))
+        ])
+        self.prediction(with_prediction)
+        self.prediction(with_old_prediction, is_active=False)
+
+        self.assertEqual(
+            set(FloodLifecycleService.expired_zones(self.now)),
+            {expired, with_old_report, with_old_prediction},
+        )
+
+    def test_expired_predictions(self):
+        expired = self.prediction(valid_for=-timedelta(minutes=1))
+        self.prediction(valid_for=timedelta(hours=1))
+        self.prediction(valid_for=-timedelta(hours=1), is_active=False)
+        self.assertEqual(list(FloodLifecycleService.expired_predictions(self.now)), [expired])
+
+    def test_expire_predictions_before_zones(self):
+        # Dự đoán hết hạn trong cùng lần chạy không giữ vùng ngập lại
+        zone = self.zone("Hết hạn cùng dự đoán", self.expiry + timedelta(minutes=5))
+        prediction = self.prediction(zone, valid_for=-timedelta(minutes=1))
+
+        result = FloodLifecycleService.expire(self.now)
+        self.assertEqual((result['predictions'], result['zones']), (1, 1))
+        zone.refresh_from_db()
+        prediction.refresh_from_db()
+        self.assertFalse(zone.is_active)
+        self.assertFalse(prediction.is_active)
+        self.assertTrue(FloodEventLog.objects.filter(event_type='zone.deactivated', data__id=zone.pk).exists())
+
+
+class ActivationSimulationTests(TestCase):
+    """Mô phỏng vector hóa phải khớp với cách tính từng bước: so ngưỡng từng điểm và calculate_risk_level"""
+
+    def test_citywide_matches_step_by_step(self):
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        # Bước 4 -> 5 cách 2 giờ để kiểm tra độ dài bước không đều
+        offsets = [0, 1, 2, 3, 4, 6, 7, 8]
+        rain = [0, 25, 40, 10, 0, 70, 65, 5]
+        series = rainfall_series(
+            {'time': start + timedelta(hours=hours), 'rainfall_mm': value} for hours, value in zip(offsets, rain)
+        )
+        floodings = {
+            'ids': np.array([1, 2, 3]), 'lat': np.zeros(3), 'lon': np.zeros(3),
+            'threshold': np.array([20.0, 35.0, 60.0]), 'initial_active': np.array([False, True, False]),
+        }
+        result = ActivationSimulationService.run(floodings, series)
+        self.assertEqual(result['mode'], 'citywide')
+
+        # Tham chiếu: duyệt từng bước, mức rủi ro qua FloodPrediction.calculate_risk_level
+        steps = [later - earlier for earlier, later in zip(offsets, offsets[1:])]
+        steps.append(float(np.median(steps)))
+        active = list(floodings['initial_active'])
+        activations, active_hours = [0, 0, 0], [0.0, 0.0, 0.0]
+        wet_hours = 0.0
+        timeline = []
+        for value, step in zip(rain, steps):
+            wet_hours = wet_hours + step if value > 0 else 0.0
+            state = [value >= threshold for threshold in floodings['threshold']]
+            turned_on = [now and not before for now, before in zip(state, active)]
+            turned_off = [before and not now for now, before in zip(state, active)]
+            for index, on in enumerate(turned_on):
+                activations[index] += on
+                active_hours[index] += step if state[index] else 0.0
+            active = state
+            timeline.append((sum(state), sum(turned_on), sum(turned_off), FloodPrediction(
+                rainfall_mm=value, rainfall_duration_hours=wet_hours,
+            ).calculate_risk_level()))
+
+        self.assertEqual(
+            [(row['active'], row['activated'], row['deactivated'], row['risk_level']) for row in result['timeline']],
+            timeline,
+        )
+        self.assertEqual(result['activations'], sum(activations))
+        self.assertEqual(
+            {row['fixed_flooding_id']: (row['activations'], row['active_hours']) for row in result['per_point']},
+            {int(pk): (count, hours) for pk, count, hours in zip(floodings['ids'], activations, active_hours) if count},
+        )
+
+
+class BatchPredictionTests(TestCase):
+    """Chấm điểm hàng loạt phải cho cùng mức rủi ro với FloodPrediction.calculate_risk_level từng dự đoán"""
+
+    def test_risk_scores_match_calculate_risk_level(self):
+        # Các giá trị nằm đúng và sát hai bên ngưỡng của từng bảng điểm
+        rain, duration, drainage, river = (np.array(values, dtype=object) for values in zip(*[
+            (rainfall, hours, capacity, distance)
+            for rainfall in (0, 19.9, 20, 30, 49.9, 50, 80)
+            for hours in (0.5, 1, 2.9, 3)
+            for capacity in ('good', 'average', 'poor', 'very_poor')
+            for distance in (50, 100, 499, 500, 2000)
+        ]))
+        levels = risk_level_index(risk_scores(rain.astype(float), duration.astype(float), drainage, river.astype(float)))
+        expected = [
+            FloodPrediction(rainfall_mm=rainfall, rainfall_duration_hours=hours, drainage_capacity=capacity,
+                            distance_to_river=distance).calculate_risk_level()
+            for rainfall, hours, capacity, distance in zip(rain, duration, drainage, river)
+        ]
+        self.assertEqual([RISK_LEVELS[level] for level in levels], expected)
+
+    def test_run_scores_and_switches_only_forecast_activations(self):
+        lat, lng = CENTER
+
+        def point(name, index):
+            # Cách nhau ~5,5 km (> ACTIVATION_RADIUS_M) để mỗi điểm chỉ thấy dự đoán của chính nó
+            return FixedFlooding.objects.create(
+                name=name, location=Point(lng, lat + index * 0.05, srid=SRID), address="Phố Huế",
+                district='Hai Bà Trưng', rainfall_threshold_mm=30,
+            )
+
+        owned = point("Do dự báo bật", 0)
+        manual = point("Bật thủ công", 1)
+        rising = point("Mưa vượt ngưỡng", 2)
+        dry = point("Mưa dưới ngưỡng", 3)
+        owned.switch_warning(True, f"{FORECAST_ACTIVATION_SOURCE} 10:00 01/07")
+        manual.switch_warning(True, 'Admin')
+
+        inputs = [(10, 0.5, 'good', 2000), (10, 3, 'very_poor', 50), (55, 1, 'poor', 300), (20, 1, 'average', 1000)]
+        rain, duration, drainage, river = (np.array(values, dtype=object) for values in zip(*inputs))
+        result = BatchPredictionService.run(
+            rain.astype(float), duration.astype(float), drainage_capacity=drainage,
+            distance_to_river=river.astype(float),
+        )
+        self.assertTrue(result['success'], result)
+
+        # Điểm đang bật và mưa giảm: chỉ tắt điểm do chính dự báo hàng loạt bật
+        self.assertEqual((result['activated'], result['deactivated']), (1, 1))
+        states = dict(FixedFlooding.objects.values_list('pk', 'is_active'))
+        self.assertEqual(
+            [states[flooding.pk] for flooding in (owned, manual, rising, dry)], [False, True, True, False]
+        )
+
+        # Chỉ dự đoán từ mức 'low' trở lên được ghi, mức rủi ro khớp với cách tính từng bản ghi
+        references = [
+            FloodPrediction(rainfall_mm=rainfall, rainfall_duration_hours=hours, drainage_capacity=capacity,
+                            distance_to_river=distance).calculate_risk_level()
+            for rainfall, hours, capacity, distance in inputs
+        ]
+        predictions = list(FloodPrediction.objects.filter(source='forecast_fixed').order_by('fixed_flooding_id'))
+        self.assertEqual(
+            [prediction.risk_level for prediction in predictions],
+            [level for level in references if RISK_LEVELS.index(level) >= RISK_LEVELS.index('low')],
+        )
+        for prediction in predictions:
+            self.assertEqual(prediction.risk_level, prediction.calculate_risk_level())
+
+
+def _walk_crossing(times, rain, threshold):
+    """Tham chiếu từng điểm cho threshold_crossings: duyệt lần lượt các bước dự báo"""
+    peak = max(range(len(rain)), key=lambda step: (rain[step], -step))
+    first = next((step for step, value in enumerate(rain) if value >= threshold), None)
+    if first is None:
+        return False, None, rain[peak], times[peak], 0.0
+    crossing_at = times[first]
+    if first > 0 and rain[first] > rain[first - 1]:
+        fraction = (threshold - rain[first - 1]) / (rain[first] - rain[first - 1])
+        crossing_at = times[first - 1] + min(max(fraction, 0), 1) * (times[first] - times[first - 1])
+    steps = 0
+    while first + steps < len(rain) and rain[first + steps] >= threshold:
+        steps += 1
+    return True, crossing_at, rain[peak], times[peak], steps * float(FORECAST_STEP_HOURS)
+
+
+class LookaheadTests(TestCase):
+    """Tính vượt ngưỡng theo mảng phải khớp với việc duyệt dự báo của từng điểm"""
+
+    def test_threshold_crossings_match_per_point_walk(self):
+        rng = np.random.default_rng(48)
+        times = 1_700_000_000 + np.arange(8) * FORECAST_STEP_HOURS * 3600.0
+        rain = np.round(rng.gamma(1.0, 12.0, size=(60, 8)), 1)
+        threshold = np.round(rng.uniform(5, 60, size=60), 1)
+
+        result = threshold_crossings(times, rain, threshold)
+        for index in range(len(threshold)):
+            crossed, crossing_at, peak_rain, peak_at, duration = _walk_crossing(
+                list(times), list(rain[index]), threshold[index]
+            )
+            self.assertEqual(bool(result['crossed'][index]), crossed, index)
+            if crossed:
+                self.assertAlmostEqual(result['crossing_at'][index], crossing_at, places=3)
+            self.assertEqual((result['peak_rain'][index], result['peak_at'][index]), (peak_rain, peak_at))
+            self.assertEqual(result['duration_hours'][index], duration, index)
+
+    def test_refresh_stores_pre_warnings(self):
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        times = [now + timedelta(hours=step * FORECAST_STEP_HOURS) for step in range(8)]
+        rain_3h = [0, 30, 90, 150, 60, 0, 0, 0]
+
+        class Forecast:
+            """Mọi trạm cùng một dự báo nên nội suy về điểm nào cũng ra chuỗi này"""
+
+            def get_forecast(self, lat, lon):
+                return {'forecasts': [
+                    {'datetime': time.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), 'rain': rain}
+                    for time, rain in zip(times, rain_3h)
+                ]}
+
+        lat, lng = CENTER
+
+        def point(index, threshold):
+            return FixedFlooding.objects.create(
+                name=f"Điểm {index}", location=Point(lng, lat + index * 0.01, srid=SRID), address="Phố Huế",
+                district='Hai Bà Trưng', rainfall_threshold_mm=threshold, predicted_depth_cm=30,
+            )
+
+        crossing = point(0, 25)
+        early = point(1, 5)
+        never = point(2, 60)
+        already_active = point(3, 5)
+        already_active.switch_warning(True, 'Admin')
+
+        result = PreWarningService.refresh(weather=Forecast(), now=now)
+        self.assertTrue(result['success'], result)
+
+        epochs = [time.timestamp() for time in times]
+        rain = [value / FORECAST_STEP_HOURS for value in rain_3h]
+        warnings = {warning.fixed_flooding_id: warning for warning in FloodPreWarning.objects.filter(is_active=True)}
+        self.assertEqual(set(warnings), {crossing.pk, early.pk})
+        self.assertFalse(_walk_crossing(epochs, rain, never.rainfall_threshold_mm)[0])
+        for flooding in (crossing, early):
+            _crossed, crossing_at, peak_rain, peak_at, duration = _walk_crossing(
+                epochs, rain, flooding.rainfall_threshold_mm
+            )
+            warning = warnings[flooding.pk]
+            self.assertAlmostEqual(warning.expected_activation_at.timestamp(), crossing_at, delta=1)
+            self.assertEqual((warning.peak_rainfall_mm, warning.peak_at.timestamp()), (round(peak_rain, 1), peak_at))
+            self.assertEqual(warning.expected_duration_hours, duration)
+            self.assertEqual(
+                warning.expected_depth_cm, round(30 * min(peak_rain / flooding.rainfall_threshold_mm, 2), 1)
+            )
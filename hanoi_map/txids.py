@@ -0,0 +1,42 @@
+from django.db import connection
+from django.db.models import BigIntegerField, Func
+
+
+class CurrentTransactionId(Func):
+    """
+    Mã transaction (xid8 của PostgreSQL, không quay vòng) của câu lệnh đang ghi, dùng làm db_default.
+    Mọi dòng ghi trong cùng một transaction có cùng giá trị.
+    """
+    template = 'pg_current_xact_id()::text::bigint'
+    output_field = BigIntegerField()
+
+
+def snapshot_xmin():
+    """
+    Mã transaction nhỏ nhất còn đang chạy. Mọi transaction có mã nhỏ hơn đã commit hoặc rollback,
+    nên dòng nhật ký có txid < giá trị này không thể xuất hiện thêm về sau: cursor dừng ở đây
+    không bỏ sót transaction commit muộn, dù nó chạy lâu đến đâu.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def rows_after(queryset, since, fields, limit):
+    """
+    Đọc các dòng (có cột txid) của transaction đã kết thúc sau cursor `since`, theo thứ tự (txid, id).
+    Trả về (rows dạng tuple (txid, *fields), cursor mới, has_more). Một trang không bao giờ cắt ngang
+    một transaction: cursor chỉ tiến tới txid cuối cùng đã đọc đủ, kể cả khi has_more.
+    """
+    horizon = snapshot_xmin()
+    queryset = queryset.filter(txid__gt=since, txid__lt=horizon)
+    rows = list(queryset.order_by('txid', 'id').values_list('txid', *fields)[:limit + 1])
+    if len(rows) <= limit:
+        return rows, max(since, horizon - 1), False
+
+    # Bỏ phần transaction cuối có thể còn dòng ở trang sau; một transaction lớn hơn cả trang thì đọc trọn
+    partial = rows[limit][0]
+    rows = [row for row in rows[:limit] if row[0] != partial]
+    if not rows:
+        rows = list(queryset.filter(txid=partial).order_by('id').values_list('txid', *fields))
+    return rows, rows[-1][0], True
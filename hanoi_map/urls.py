@@ -9,10 +9,14 @@ urlpatterns = [
     # API chính
     path('api/search/', views.search_location_api, name='search_api'),
     path('api/check-flood/', views.check_flood_api, name='check_flood_api'),
+    path('api/alert-at/', views.alert_at_api, name='alert_at_api'),
     path('api/area-status/', views.get_area_status_api, name='area_status_api'),
     path('api/report-flood/', views.report_flood_api, name='report_flood_api'),
+    path('api/subscriptions/', views.subscriptions_api, name='subscriptions_api'),
+    path('api/subscriptions/<int:subscription_id>/unsubscribe/', views.unsubscribe_api, name='unsubscribe_api'),
     path('api/weather/', views.get_weather_api, name='weather_api'),
     path('api/fixed-floodings/', views.get_fixed_floodings_api, name='fixed_floodings_api'),
+    path('api/pre-warnings/', views.get_pre_warnings_api, name='pre_warnings_api'),
     # path('api/trigger-flooding/', views.trigger_fixed_flooding_activation_api, name='trigger_flooding_api'),
 
      # Drainage Prediction APIs
@@ -26,10 +30,16 @@ urlpatterns = [
     
     # API REAL-TIME MỚI
     path('api/flood-data/', views.get_flood_data_api, name='flood_data_api'),
+    path('api/flood-data/changes/', views.get_flood_changes_api, name='flood_changes_api'),
     path('api/statistics/', views.get_statistics_api, name='statistics_api'),
     path('api/recent-reports/', views.get_recent_reports_api, name='recent_reports_api'),
+    path('api/clusters/', views.get_clusters_api, name='clusters_api'),
+    path('api/events/', views.flood_events_stream, name='flood_events_stream'),
     
     # API phụ trợ
     path('api/test/', views.test_search_connection, name='test_api'),
     path('api/all-zones-status/', views.get_all_zones_status_api, name='all_zones_status_api'),
+    path('api/db-pool/', views.db_pool_status_api, name='db_pool_status_api'),
+    path('metrics', views.metrics_api, name='metrics'),
+    path('exports/<uuid:token>/', views.export_download, name='export_download'),
 ]
\ No newline at end of file
@@ -1,13 +1,21 @@
-from django.shortcuts import render
-from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
 from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.gis.geos import Point
+from django.contrib.gis.geos import GEOSGeometry, Point
+from django.core.exceptions import ValidationError
 from django.conf import settings
+import asyncio
 import json
+import os
 from datetime import datetime, timedelta
+import httpx
 import requests
-import traceback
+from asgiref.sync import sync_to_async
+import logging
+import math
 import decimal
 from django.db.models import Model
 from django.db.models.query import QuerySet
@@ -17,10 +25,25 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.gis.db.models.functions import Distance
+from django.db.models.functions import Left
 from .models import FixedFlooding, FloodHistory 
 from .models import FloodZone, FloodReport, FloodPrediction
+from .models import AlertSubscription, ExportJob
 from .services import LocationSearchService, WeatherService, FloodCheckService, FloodPredictionService, FloodDataService
 from .services import FixedFloodingService, FloodZoneService, FloodHistoryService, DrainageTimeService
+from .services import FLOOD_TYPE_LABELS, SEVERITY_LABELS
+from .alert_index import alert_index
+from .events import broker, stream_events_async, stream_events_sync
+from .changelog import FloodChangeService
+from .clusters import CLUSTER_KINDS, CLUSTER_MAX_ZOOM, cluster_index
+from .exports import EXPORT_FORMATS, export_path, mark_interrupted_exports
+from .encodings import COLUMNAR_MEDIA_TYPE, wants_columnar
+from .lookahead import PreWarningService
+from .metrics import render_prometheus
+from .notifications import validate_webhook_url
+from .responses import FastJsonResponse
+
+logger = logging.getLogger(__name__)
 
 # Hằng số SRID
 SRID = 4326
@@ -66,7 +89,7 @@ def search_location_api(request):
         query = request.GET.get('q', '').strip()
         
         if len(query) < 2:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'results': [],
                 'message': 'Vui lòng nhập ít nhất 2 ký tự'
@@ -74,7 +97,7 @@ def search_location_api(request):
         
         results = LocationSearchService.search_hanoi_location(query)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'query': query,
             'results': results,
@@ -82,20 +105,20 @@ def search_location_api(request):
         })
         
     except Exception as e:
-        print(f"❌ Lỗi search_location_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi search_location_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e),
             'results': []
         }, status=500)
-def check_flood_api(request):
-    """API kiểm tra ngập tại vị trí - ĐÃ SỬA LỖI get_rain_alerts"""
+async def check_flood_api(request):
+    """API kiểm tra ngập tại vị trí - gọi song song kiểm tra ngập, reverse geocode và thời tiết"""
     try:
         lat_str = request.GET.get('lat', '').strip()
         lng_str = request.GET.get('lng', '').strip()
         
         if not lat_str or not lng_str:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'error': 'Thiếu tham số lat hoặc lng',
                 'message': 'Vui lòng cung cấp tọa độ'
@@ -105,7 +128,7 @@ def check_flood_api(request):
             lat = float(lat_str)
             lng = float(lng_str)
         except ValueError:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'error': 'Tọa độ không hợp lệ',
                 'message': 'Tọa độ phải là số'
@@ -113,11 +136,15 @@ def check_flood_api(request):
         
         radius = float(request.GET.get('radius', 1000))
         
-        print(f"🌍 API Check Flood: lat={lat}, lng={lng}, radius={radius}")
-        flood_check = FloodCheckService.check_flood_at_location(lat, lng, radius)
-        location_info = LocationSearchService.get_location_info(lat, lng)
+        logger.debug("🌍 API Check Flood: lat=%s, lng=%s, radius=%s", lat, lng, radius)
         weather_service = WeatherService()
-        weather = weather_service.get_current_weather(lat, lng)
+        async with httpx.AsyncClient() as client:
+            flood_check, location_info, weather, pre_warnings = await asyncio.gather(
+                sync_to_async(FloodCheckService.check_flood_at_location)(lat, lng, radius),
+                LocationSearchService.aget_location_info(lat, lng, client),
+                weather_service.aget_current_weather(lat, lng, client),
+                sync_to_async(PreWarningService.nearby)(lat, lng, max(radius, 2000)),
+            )
         alerts = [] 
         
         response_data = {
@@ -132,60 +159,115 @@ def check_flood_api(request):
             'flood_check': flood_check,
             'weather': weather,
             'alerts': alerts,  # Mảng rỗng
+            'pre_warnings': pre_warnings,
             'timestamp': datetime.now().isoformat()
         }
         
-        print(f"✅ API trả về thành công: {flood_check.get('message', '')}")
-        return JsonResponse(response_data)
+        logger.debug("✅ API trả về thành công: %s", flood_check.get('message', ''))
+        return FastJsonResponse(response_data)
         
     except Exception as e:
-        print(f"❌ Lỗi check_flood_api: {e}")
-        traceback.print_exc()
-        return JsonResponse({
+        logger.exception("❌ Lỗi check_flood_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e),
             'message': 'Có lỗi xảy ra khi kiểm tra ngập'
         }, status=500)
 
-def get_flood_data_api(request):
+def _parse_zoom(request):
+    """zoom của bản đồ để chọn mức hình học đơn giản hóa (None nếu không truyền), ValueError nếu sai"""
+    zoom_str = request.GET.get('zoom', '').strip()
+    return int(zoom_str) if zoom_str else None
+
+async def get_flood_data_api(request):
     """API lấy dữ liệu ngập cho bản đồ"""
     try:
         lat_str = request.GET.get('lat', '').strip()
         lng_str = request.GET.get('lng', '').strip()
         radius = float(request.GET.get('radius', 10))  # km
+        try:
+            zoom = _parse_zoom(request)
+        except ValueError:
+            return FastJsonResponse({
+                'success': False,
+                'error': 'zoom phải là số nguyên',
+                'data': {'flood_zones': [], 'flood_reports': []}
+            }, status=400)
+        
+        # Cursor lấy trước khi đọc dữ liệu để client đồng bộ tiếp qua /api/flood-data/changes/
+        cursor = FloodChangeService.format_cursor(await sync_to_async(FloodChangeService.current_cursor)())
         
         if lat_str and lng_str:
             try:
                 lat = float(lat_str)
                 lng = float(lng_str)
-                print(f"📍 API Flood Data với tọa độ: ({lat}, {lng}), radius={radius}km")
-                flood_data = FloodDataService.get_realtime_flood_data(lat, lng, radius)
             except ValueError:
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': False,
                     'error': 'Tọa độ không hợp lệ',
                     'data': {'flood_zones': [], 'flood_reports': []}
                 }, status=400)
+            logger.debug("📍 API Flood Data với tọa độ: (%s, %s), radius=%skm", lat, lng, radius)
+            center = Point(lng, lat, srid=SRID)
+        else:
+            logger.debug("📍 API Flood Data lấy tất cả")
+            center = None
+        
+        if wants_columnar(request):
+            flood_data = await sync_to_async(FloodDataService.get_all_flood_data_columnar)(center, radius, zoom)
+            content_type = COLUMNAR_MEDIA_TYPE
         else:
-            print("📍 API Flood Data lấy tất cả")
-            flood_data = FloodDataService.get_all_flood_data()
+            flood_data = await sync_to_async(FloodDataService.get_all_flood_data)(center, radius, zoom)
+            content_type = 'application/json'
         
-        return JsonResponse({
+        response = FastJsonResponse({
             'success': True,
             'data': flood_data,
+            'cursor': cursor,
             'timestamp': datetime.now().isoformat()
-        })
+        }, content_type=content_type)
+        response['Vary'] = 'Accept'
+        return response
         
     except Exception as e:
-        print(f"❌ Lỗi get_flood_data_api: {e}")
-        traceback.print_exc()
-        return JsonResponse({
+        logger.exception("❌ Lỗi get_flood_data_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e),
             'data': {'flood_zones': [], 'flood_reports': []}
         }, status=500)
 
-def get_area_status_api(request):
+def get_flood_changes_api(request):
+    """API đồng bộ tăng dần: chỉ trả về điểm ngập / báo cáo / FixedFlooding thay đổi sau cursor"""
+    since_str = request.GET.get('since', '').strip()
+    if not since_str:
+        # Chưa có cursor: client cần tải toàn bộ qua /api/flood-data/
+        return FastJsonResponse({
+            'success': True,
+            'reset': True,
+            'cursor': FloodChangeService.format_cursor(FloodChangeService.current_cursor()),
+            'changes': {},
+            'removed': {},
+            'has_more': False
+        })
+    
+    try:
+        since = FloodChangeService.parse_cursor(since_str)
+        zoom = _parse_zoom(request)
+    except ValueError:
+        return FastJsonResponse({
+            'success': False,
+            'error': 'since (cursor) hoặc zoom không hợp lệ'
+        }, status=400)
+    
+    result = FloodChangeService.get_changes(since, zoom=zoom)
+    if not result.get('success'):
+        return FastJsonResponse(result, status=500)
+    
+    result['timestamp'] = datetime.now().isoformat()
+    return FastJsonResponse(result)
+
+async def get_area_status_api(request):
     """API lấy trạng thái khu vực"""
     try:
         lat_str = request.GET.get('lat', '').strip()
@@ -200,20 +282,21 @@ def get_area_status_api(request):
                 lat = float(lat_str)
                 lng = float(lng_str)
             except ValueError:
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': False,
                     'error': 'Tọa độ không hợp lệ'
                 }, status=400)
         
         radius = float(request.GET.get('radius', 2000))
         
-        print(f"🌍 API Area Status: ({lat}, {lng}), radius={radius}m")
-        
-        area_status = FloodCheckService.get_area_flood_status(lat, lng, radius)
+        logger.debug("🌍 API Area Status: (%s, %s), radius=%sm", lat, lng, radius)
         
-        # Lấy dự báo thời tiết
+        # Trạng thái khu vực (DB) và dự báo thời tiết (HTTP) chạy song song
         weather_service = WeatherService()
-        forecast = weather_service.get_forecast(lat, lng)
+        area_status, forecast = await asyncio.gather(
+            sync_to_async(FloodCheckService.get_area_flood_status)(lat, lng, radius),
+            weather_service.aget_forecast(lat, lng),
+        )
         
         response_data = {
             'success': True,
@@ -222,12 +305,11 @@ def get_area_status_api(request):
             'timestamp': datetime.now().isoformat()
         }
         
-        return JsonResponse(response_data)
+        return FastJsonResponse(response_data)
         
     except Exception as e:
-        print(f"❌ Lỗi get_area_status_api: {e}")
-        traceback.print_exc()
-        return JsonResponse({
+        logger.exception("❌ Lỗi get_area_status_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
@@ -238,13 +320,13 @@ def report_flood_api(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            print(f"📤 Nhận báo cáo ngập: {data}")
+            logger.debug("📤 Nhận báo cáo ngập: %s", data)
             
             # Validate dữ liệu
             required_fields = ['lat', 'lng', 'water_depth']
             for field in required_fields:
                 if field not in data:
-                    return JsonResponse({
+                    return FastJsonResponse({
                         'success': False,
                         'error': f'Thiếu trường bắt buộc: {field}'
                     }, status=400)
@@ -255,7 +337,7 @@ def report_flood_api(request):
                 lng = float(data['lng'])
                 water_depth = float(data['water_depth'])
             except ValueError:
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': False,
                     'error': 'Dữ liệu số không hợp lệ'
                 }, status=400)
@@ -279,9 +361,9 @@ def report_flood_api(request):
                 status='pending'  # Tự động xác nhận cho demo
             )
             
-            print(f"✅ Đã tạo báo cáo #{report.id} tại ({lat}, {lng})")
+            logger.info("✅ Đã tạo báo cáo #%s tại (%s, %s)", report.id, lat, lng)
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'message': '✅ Báo cáo đã được gửi thành công!',
                 'report_id': report.id,
@@ -291,56 +373,196 @@ def report_flood_api(request):
             })
             
         except Exception as e:
-            print(f"❌ Lỗi report_flood_api: {e}")
-            traceback.print_exc()
-            return JsonResponse({
+            logger.exception("❌ Lỗi report_flood_api: %s", e)
+            return FastJsonResponse({
                 'success': False,
                 'error': str(e)
             }, status=400)
     
-    return JsonResponse({
+    return FastJsonResponse({
         'success': False,
         'message': 'Method not allowed'
     }, status=405)
 
-def get_weather_api(request):
-    """API lấy thông tin thời tiết"""
+# Kênh gửi người dùng tự đăng ký được qua API (kênh 'file' chỉ tạo trong admin)
+PUBLIC_SUBSCRIPTION_SINKS = ('webhook', 'email')
+# Bán kính theo dõi hợp lệ (m), như validator của AlertSubscription.radius_meters
+SUBSCRIPTION_RADIUS_M = (10, 20000)
+
+
+def _subscription_row(subscription):
+    return {
+        'id': subscription.id,
+        'label': subscription.label,
+        'lat': subscription.location.y if subscription.location else None,
+        'lng': subscription.location.x if subscription.location else None,
+        'radius_meters': subscription.radius_meters,
+        'area': subscription.area,
+        'sink': subscription.sink,
+        'target': subscription.target,
+        'is_active': subscription.is_active,
+        'last_notified_at': subscription.last_notified_at.isoformat() if subscription.last_notified_at else None,
+    }
+
+
+@csrf_exempt
+def subscriptions_api(request):
+    """
+    API đăng ký nhận cảnh báo theo vùng.
+    GET ?device_id=...: danh sách đăng ký của thiết bị (hoặc của người dùng đã đăng nhập).
+    POST {device_id, label, lat, lng, radius | area (GeoJSON Polygon), sink, target}: tạo đăng ký
+    (sink=webhook chỉ cho người dùng đã đăng nhập).
+    """
+    user = request.user if request.user.is_authenticated else None
+
+    if request.method == 'GET':
+        device_id = request.GET.get('device_id', '').strip()
+        if not device_id and not user:
+            return FastJsonResponse({
+                'success': False,
+                'error': 'Thiếu tham số device_id'
+            }, status=400)
+        subscriptions = AlertSubscription.objects.filter(is_active=True)
+        subscriptions = subscriptions.filter(device_id=device_id) if device_id else subscriptions.filter(user=user)
+        results = [_subscription_row(subscription) for subscription in subscriptions[:100]]
+        return FastJsonResponse({
+            'success': True,
+            'count': len(results),
+            'subscriptions': results
+        })
+
+    if request.method != 'POST':
+        return FastJsonResponse({
+            'success': False,
+            'message': 'Method not allowed'
+        }, status=405)
+
     try:
-        lat_str = request.GET.get('lat', '').strip()
-        lng_str = request.GET.get('lng', '').strip()
-        
-        if not lat_str or not lng_str:
-            # Mặc định Hồ Gươm
-            lat = 21.0285
-            lng = 105.8542
-        else:
+        data = json.loads(request.body)
+        sink = data.get('sink', 'webhook')
+        target = str(data.get('target', '')).strip()
+        if sink not in PUBLIC_SUBSCRIPTION_SINKS:
+            return FastJsonResponse({
+                'success': False,
+                'error': f"Kênh gửi phải là một trong: {', '.join(PUBLIC_SUBSCRIPTION_SINKS)}"
+            }, status=400)
+        if sink == 'webhook':
+            # Webhook khiến máy chủ gửi request đi: chỉ người dùng đã đăng nhập, và URL phải trỏ ra ngoài
+            if not user:
+                return FastJsonResponse({
+                    'success': False,
+                    'error': 'Cần đăng nhập để đăng ký webhook'
+                }, status=403)
             try:
-                lat = float(lat_str)
-                lng = float(lng_str)
-            except ValueError:
-                return JsonResponse({
+                validate_webhook_url(target)
+            except ValueError as e:
+                return FastJsonResponse({
                     'success': False,
-                    'error': 'Tọa độ không hợp lệ'
+                    'error': str(e)
                 }, status=400)
-        
-        weather_service = WeatherService()
-        current = weather_service.get_current_weather(lat, lng)
-        forecast = weather_service.get_forecast(lat, lng)
-        alerts = weather_service.get_rain_alerts(lat, lng)
-        
-        return JsonResponse({
+        elif '@' not in target:
+            return FastJsonResponse({
+                'success': False,
+                'error': 'Địa chỉ nhận không hợp lệ'
+            }, status=400)
+
+        try:
+            radius = float(data.get('radius', 500))
+            if not (math.isfinite(radius) and SUBSCRIPTION_RADIUS_M[0] <= radius <= SUBSCRIPTION_RADIUS_M[1]):
+                raise ValueError
+        except (TypeError, ValueError):
+            return FastJsonResponse({
+                'success': False,
+                'error': f"radius phải là số trong khoảng {SUBSCRIPTION_RADIUS_M[0]}..{SUBSCRIPTION_RADIUS_M[1]} m"
+            }, status=400)
+
+        subscription = AlertSubscription(
+            user=user,
+            device_id=str(data.get('device_id', '')).strip()[:200],
+            label=str(data.get('label', '')).strip()[:200],
+            radius_meters=radius,
+            sink=sink,
+            target=target[:500],
+        )
+        if data.get('area'):
+            area = GEOSGeometry(json.dumps(data['area']), srid=SRID)
+            if area.geom_type != 'Polygon':
+                return FastJsonResponse({
+                    'success': False,
+                    'error': 'area phải là GeoJSON Polygon'
+                }, status=400)
+            subscription.area = area
+        elif 'lat' in data and 'lng' in data:
+            lat, lng = float(data['lat']), float(data['lng'])
+            if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+                return FastJsonResponse({
+                    'success': False,
+                    'error': 'Sai tham số lat, lng (-90..90, -180..180)'
+                }, status=400)
+            subscription.location = Point(lng, lat, srid=SRID)
+
+        subscription.full_clean()
+        subscription.save()
+        logger.info("🔔 Đăng ký cảnh báo #%s (%s)", subscription.id, subscription.sink)
+
+        return FastJsonResponse({
             'success': True,
-            'current': current,
-            'forecast': forecast.get('forecasts', [])[:8] if forecast and isinstance(forecast, dict) else [],
-            'alerts': alerts
+            'message': '✅ Đã đăng ký nhận cảnh báo',
+            'subscription': _subscription_row(subscription)
         })
-        
+
+    except ValidationError as e:
+        return FastJsonResponse({
+            'success': False,
+            'error': '; '.join(e.messages)
+        }, status=400)
     except Exception as e:
-        print(f"❌ Lỗi get_weather_api: {e}")
-        return JsonResponse({
+        logger.exception("❌ Lỗi subscriptions_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
-        }, status=500)
+        }, status=400)
+
+
+@csrf_exempt
+def unsubscribe_api(request, subscription_id):
+    """API hủy đăng ký: POST {device_id} (hoặc người dùng đã đăng nhập sở hữu đăng ký)"""
+    if request.method != 'POST':
+        return FastJsonResponse({
+            'success': False,
+            'message': 'Method not allowed'
+        }, status=405)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        subscriptions = AlertSubscription.objects.filter(pk=subscription_id, is_active=True)
+        device_id = str(data.get('device_id', '')).strip()
+        if device_id:
+            subscriptions = subscriptions.filter(device_id=device_id)
+        elif request.user.is_authenticated:
+            subscriptions = subscriptions.filter(user=request.user)
+        else:
+            return FastJsonResponse({
+                'success': False,
+                'error': 'Thiếu device_id'
+            }, status=400)
+
+        if not subscriptions.update(is_active=False):
+            return FastJsonResponse({
+                'success': False,
+                'error': 'Không tìm thấy đăng ký'
+            }, status=404)
+        return FastJsonResponse({
+            'success': True,
+            'message': '✅ Đã hủy đăng ký'
+        })
+
+    except Exception as e:
+        logger.exception("❌ Lỗi unsubscribe_api: %s", e)
+        return FastJsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
 
 def get_statistics_api(request):
     """API thống kê real-time"""
@@ -369,14 +591,14 @@ def get_statistics_api(request):
             'timestamp': now.isoformat()
         }
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'stats': stats
         })
         
     except Exception as e:
-        print(f"❌ Lỗi get_statistics_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi get_statistics_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
@@ -392,26 +614,31 @@ def get_recent_reports_api(request):
         reports = FloodReport.objects.filter(
             status='verified',
             created_at__gte=time_threshold
-        ).order_by('-created_at')[:limit]
+        ).order_by('-created_at').annotate(
+            short_description=Left('description', 100)
+        ).values(
+            'id', 'location', 'address', 'water_depth', 'severity', 'created_at',
+            'reporter_name', 'photo_url', 'short_description'
+        )[:limit]
         
         reports_list = []
         for report in reports:
             reports_list.append({
-                'id': report.id,
-                'lat': report.location.y,
-                'lng': report.location.x,
-                'address': report.address or 'Không có địa chỉ',
-                'water_depth': report.water_depth or 0,
-                'severity': report.severity or 'unknown',
-                'severity_display': report.get_severity_display() if hasattr(report, 'get_severity_display') else report.severity,
-                'created_at': report.created_at.strftime('%H:%M %d/%m'),
-                'created_at_iso': report.created_at.isoformat(),
-                'reporter_name': report.reporter_name or 'Ẩn danh',
-                'photo_url': report.photo_url,
-                'description': report.description[:100] if report.description else ''
+                'id': report['id'],
+                'lat': report['location'].y,
+                'lng': report['location'].x,
+                'address': report['address'] or 'Không có địa chỉ',
+                'water_depth': report['water_depth'] or 0,
+                'severity': report['severity'] or 'unknown',
+                'severity_display': SEVERITY_LABELS.get(report['severity'], report['severity']),
+                'created_at': report['created_at'].strftime('%H:%M %d/%m'),
+                'created_at_iso': report['created_at'].isoformat(),
+                'reporter_name': report['reporter_name'] or 'Ẩn danh',
+                'photo_url': report['photo_url'],
+                'description': report['short_description'] or ''
             })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'reports': reports_list,
             'count': len(reports_list),
@@ -419,53 +646,157 @@ def get_recent_reports_api(request):
         })
         
     except Exception as e:
-        print(f"❌ Lỗi get_recent_reports_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi get_recent_reports_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
 
 # API test
 def test_search_connection(request):
-    return JsonResponse({
+    return FastJsonResponse({
         'success': True,
         'message': '✅ Kết nối search API hoạt động tốt!',
         'timestamp': datetime.now().isoformat()
     })
 
+def _parse_bbox(request):
+    """bbox=minLng,minLat,maxLng,maxLat -> tuple (None nếu không có), ValueError nếu sai định dạng"""
+    bbox_str = request.GET.get('bbox', '').strip()
+    if not bbox_str:
+        return None
+    bbox = tuple(float(value) for value in bbox_str.split(','))
+    if len(bbox) != 4:
+        raise ValueError('bbox')
+    return bbox
+
+def flood_events_stream(request):
+    """
+    Server-Sent Events: đẩy sự kiện kích hoạt/tắt điểm ngập, báo cáo được xác nhận, dự báo mới.
+    Tham số: bbox=minLng,minLat,maxLng,maxLat (chỉ nhận sự kiện trong khung nhìn),
+    types=zone,fixed,report,prediction. Hỗ trợ tiếp tục từ header Last-Event-ID.
+    """
+    try:
+        bbox = _parse_bbox(request)
+    except ValueError:
+        return FastJsonResponse({
+            'success': False,
+            'error': 'bbox phải có dạng minLng,minLat,maxLng,maxLat'
+        }, status=400)
+
+    types = {value.strip() for value in request.GET.get('types', '').split(',') if value.strip()} or None
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id', '')
+    key, resync = broker.resume_point(last_event_id.strip())
+
+    if isinstance(request, ASGIRequest):
+        stream = stream_events_async(key, bbox, types, resync)
+    else:
+        stream = stream_events_sync(key, bbox, types, resync)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Tắt buffer của nginx
+    return response
+
+def get_clusters_api(request):
+    """
+    API cụm điểm (báo cáo đã xác nhận + điểm ngập cố định) đã gom sẵn theo zoom.
+    Tham số: zoom, bbox=minLng,minLat,maxLng,maxLat, layers=report,fixed
+    """
+    try:
+        zoom = int(request.GET.get('zoom', 12))
+        bbox = _parse_bbox(request)
+    except ValueError:
+        return FastJsonResponse({
+            'success': False,
+            'error': 'zoom phải là số nguyên, bbox có dạng minLng,minLat,maxLng,maxLat'
+        }, status=400)
+
+    kinds = [value.strip() for value in request.GET.get('layers', '').split(',') if value.strip() in CLUSTER_KINDS]
+
+    try:
+        clusters = cluster_index.clusters(zoom, bbox, kinds or CLUSTER_KINDS)
+        return FastJsonResponse({
+            'success': True,
+            'zoom': zoom,
+            'clustered': zoom <= CLUSTER_MAX_ZOOM,
+            'clusters': clusters,
+            'total': sum(cluster['count'] for cluster in clusters),
+        })
+
+    except Exception as e:
+        logger.exception("❌ Lỗi get_clusters_api: %s", e)
+        return FastJsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+def db_pool_status_api(request):
+    """API theo dõi connection pool của database (chỉ cho staff khi chạy production)"""
+    if not settings.DEBUG and not request.user.is_staff:
+        return FastJsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
+
+    try:
+        from django.db import connection
+
+        db_settings = connection.settings_dict
+        data = {
+            'mode': getattr(settings, 'DB_CONNECTION_MODE', 'none'),
+            'conn_max_age': db_settings.get('CONN_MAX_AGE', 0),
+            'server_side_cursors': not db_settings.get('DISABLE_SERVER_SIDE_CURSORS', False),
+        }
+
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            # Thống kê của psycopg_pool: pool_size, pool_available, requests_waiting, requests_wait_ms...
+            data['pool'] = {
+                'name': pool.name,
+                'min_size': pool.min_size,
+                'max_size': pool.max_size,
+                'stats': pool.get_stats(),
+            }
+
+        return FastJsonResponse({
+            'success': True,
+            'database': data,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.error("❌ Lỗi db_pool_status_api: %s", e)
+        return FastJsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+def metrics_api(request):
+    """Histogram độ trễ / số câu SQL / HTTP ra ngoài theo endpoint, định dạng text của Prometheus"""
+    token = getattr(settings, 'FLOOD_METRICS_TOKEN', '')
+    authorized = token and request.headers.get('Authorization') == f"Bearer {token}"
+    if not settings.DEBUG and not authorized and not request.user.is_staff:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def export_download(request, token):
+    """Tải file xuất nền (chỉ staff); file nằm ngoài MEDIA_ROOT nên không có đường dẫn công khai"""
+    mark_interrupted_exports()
+    job = get_object_or_404(ExportJob, token=token)
+    path = export_path(job)
+    if job.status != 'done' or not os.path.exists(path):
+        raise Http404("File xuất chưa sẵn sàng")
+
+    content_type, extension = EXPORT_FORMATS[job.export_format]
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{job.name}.{extension}",
+                        content_type=content_type)
+
 def get_all_zones_status_api(request):
-    """API lấy trạng thái của TẤT CẢ điểm ngập"""
+    """API lấy trạng thái của TẤT CẢ điểm ngập (tính theo tập, số câu SQL không tăng theo số điểm ngập)"""
     try:
-        zones = FloodZone.objects.filter(is_active=True)
-        
-        results = []
-        for zone in zones:
-            try:
-                # Lấy tọa độ từ geometry
-                if zone.geometry:
-                    centroid = zone.geometry.centroid
-                    lat = centroid.y
-                    lon = centroid.x
-                    
-                    # Kiểm tra trạng thái
-                    flood_check = FloodCheckService.check_flood_at_location(lat, lon, radius_m=100)
-                    
-                    results.append({
-                        'id': zone.id,
-                        'name': zone.name or 'Điểm ngập',
-                        'lat': lat,
-                        'lon': lon,
-                        'status': flood_check.get('has_flood', False),
-                        'risk_level': flood_check.get('risk_level', 'low'),
-                        'severity': flood_check.get('severity', 'none'),
-                        'message': flood_check.get('message', ''),
-                        'max_depth': zone.max_depth_cm or 0,
-                        'zone_type': zone.zone_type
-                    })
-            except Exception as e:
-                print(f"⚠️ Lỗi xử lý zone {zone.id}: {e}")
+        results = FloodCheckService.get_all_zones_status(radius_m=100)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'count': len(results),
             'zones_status': results,
@@ -473,8 +804,8 @@ def get_all_zones_status_api(request):
         })
         
     except Exception as e:
-        print(f"❌ Lỗi get_all_zones_status_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi get_all_zones_status_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
@@ -484,7 +815,7 @@ def get_all_zones_status_api(request):
 
 # Cập nhật hàm get_weather_api để tích hợp FixedFlooding
 
-def get_weather_api(request):
+async def get_weather_api(request):
     """API lấy thông tin thời tiết và kích hoạt FixedFlooding"""
     try:
         lat_str = request.GET.get('lat', '').strip()
@@ -499,29 +830,23 @@ def get_weather_api(request):
                 lat = float(lat_str)
                 lng = float(lng_str)
             except ValueError:
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': False,
                     'error': 'Tọa độ không hợp lệ'
                 }, status=400)
         
         weather_service = WeatherService()
-        current = weather_service.get_current_weather(lat, lng)
-        forecast = weather_service.get_forecast(lat, lng)
-        
-        # KIỂM TRA VÀ KÍCH HOẠT FIXED FLOODING DỰA TRÊN LƯỢNG MƯA
-        activated_floodings = []
-        if current.get('rain', 0) > 0:
-            activated_floodings = FixedFloodingService.check_and_activate_by_rainfall(
-                lat, lng, current.get('rain', 0)
+        async with httpx.AsyncClient() as client:
+            current, forecast = await asyncio.gather(
+                weather_service.aget_current_weather(lat, lng, client),
+                weather_service.aget_forecast(lat, lng, client),
             )
-            
-            if activated_floodings:
-                print(f"⚡ Đã kích hoạt {len(activated_floodings)} điểm ngập cố định")
         
-        # Lấy cảnh báo từ FixedFlooding đang kích hoạt
-        alerts = FixedFloodingService.get_active_alerts(lat, lng)
+        activated_floodings, alerts = await sync_to_async(_activate_and_collect_alerts)(
+            lat, lng, current.get('rain', 0)
+        )
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'current': current,
             'forecast': forecast.get('forecasts', [])[:8] if forecast and isinstance(forecast, dict) else [],
@@ -531,13 +856,28 @@ def get_weather_api(request):
         })
         
     except Exception as e:
-        print(f"❌ Lỗi get_weather_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi get_weather_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
 
 
+def _activate_and_collect_alerts(lat, lng, rainfall_mm):
+    """Phần đồng bộ của get_weather_api: kích hoạt FixedFlooding theo lượng mưa rồi lấy cảnh báo"""
+    # KIỂM TRA VÀ KÍCH HOẠT FIXED FLOODING DỰA TRÊN LƯỢNG MƯA
+    activated_floodings = []
+    if rainfall_mm > 0:
+        activated_floodings = FixedFloodingService.check_and_activate_by_rainfall(lat, lng, rainfall_mm)
+        
+        if activated_floodings:
+            logger.info("⚡ Đã kích hoạt %s điểm ngập cố định", len(activated_floodings))
+    
+    # Lấy cảnh báo từ FixedFlooding đang kích hoạt
+    alerts = FixedFloodingService.get_active_alerts(lat, lng)
+    return activated_floodings, alerts
+
+
 # API mới cho FixedFlooding
 def get_fixed_floodings_api(request):
     """API lấy danh sách FixedFlooding"""
@@ -554,34 +894,45 @@ def get_fixed_floodings_api(request):
             only_active
         )
         
+        if wants_columnar(request):
+            response = FastJsonResponse({
+                'success': True,
+                'data': FloodDataService.fixed_floodings_columnar(floodings[:50]),
+                'timestamp': datetime.now().isoformat()
+            }, content_type=COLUMNAR_MEDIA_TYPE)
+            response['Vary'] = 'Accept'
+            return response
+        
         results = []
-        for flooding in floodings[:50]:  # Giới hạn 50 kết quả
-            distance_km = round(flooding.distance.m / 1000, 2) if hasattr(flooding, 'distance') else None
+        # get_nearby_floodings trả về queryset rỗng (không có annotation distance) khi lỗi
+        extra = ['distance'] if 'distance' in floodings.query.annotations else []
+        for flooding in FloodDataService.fixed_flooding_rows(floodings, *extra)[:50]:  # Giới hạn 50 kết quả
+            distance_km = round(flooding['distance'].m / 1000, 2) if 'distance' in flooding else None
             
             results.append({
-                'id': flooding.id,
-                'name': flooding.name,
-                'address': flooding.address,
-                'district': flooding.district,
-                'ward': flooding.ward,
-                'lat': flooding.location.y,
-                'lng': flooding.location.x,
-                'is_active': flooding.is_active,
-                'is_monitored': flooding.is_monitored,
-                'rainfall_threshold': flooding.rainfall_threshold_mm,
-                'predicted_depth': flooding.predicted_depth_cm,
-                'severity': flooding.severity,
-                'flood_type': flooding.flood_type,
-                'flood_type_display': flooding.get_flood_type_display() if hasattr(flooding, 'get_flood_type_display') else flooding.flood_type,
-                'radius_meters': flooding.radius_meters,
+                'id': flooding['id'],
+                'name': flooding['name'],
+                'address': flooding['address'],
+                'district': flooding['district'],
+                'ward': flooding['ward'],
+                'lat': flooding['location'].y,
+                'lng': flooding['location'].x,
+                'is_active': flooding['is_active'],
+                'is_monitored': flooding['is_monitored'],
+                'rainfall_threshold': flooding['rainfall_threshold_mm'],
+                'predicted_depth': flooding['predicted_depth_cm'],
+                'severity': flooding['severity'],
+                'flood_type': flooding['flood_type'],
+                'flood_type_display': FLOOD_TYPE_LABELS.get(flooding['flood_type'], flooding['flood_type']),
+                'radius_meters': flooding['radius_meters'],
                 'distance_km': distance_km,
-                'activation_count': flooding.activation_count,
-                'last_activated': flooding.last_activated.isoformat() if flooding.last_activated else None,
-                'recommendations': flooding.recommendations,
-                'description': flooding.description
+                'activation_count': flooding['activation_count'],
+                'last_activated': flooding['last_activated'].isoformat() if flooding['last_activated'] else None,
+                'recommendations': flooding['recommendations'],
+                'description': flooding['description']
             })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'count': len(results),
             'fixed_floodings': results,
@@ -589,12 +940,64 @@ def get_fixed_floodings_api(request):
         })
         
     except Exception as e:
-        print(f"❌ Lỗi get_fixed_floodings_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi get_fixed_floodings_api: %s", e)
+        return FastJsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+def alert_at_api(request):
+    """
+    API nhẹ cho ứng dụng di động: vị trí có đang ở trong / gần cảnh báo không.
+    Chỉ đọc chỉ mục geohash trong bộ nhớ, ứng viên cache theo ô (~36 x 19 m), khoảng cách tính tại đúng điểm.
+    """
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+        if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError
+    except (KeyError, ValueError):
+        return FastJsonResponse({
+            'success': False,
+            'error': 'Thiếu hoặc sai tham số lat, lng (-90..90, -180..180)'
+        }, status=400)
+
+    try:
+        return HttpResponse(alert_index.lookup(lat, lng), content_type='application/json')
+    except Exception as e:
+        logger.error("❌ Lỗi alert_at_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
 
+def get_pre_warnings_api(request):
+    """API cảnh báo sớm: điểm ngập cố định dự kiến vượt ngưỡng mưa trong 24 giờ tới (không truyền lat/lng: cả thành phố)"""
+    try:
+        lat_str = request.GET.get('lat', '').strip()
+        lng_str = request.GET.get('lng', '').strip()
+        radius = float(request.GET.get('radius', 5000))  # mặc định 5km
+
+        pre_warnings = PreWarningService.nearby(
+            float(lat_str) if lat_str and lng_str else None,
+            float(lng_str) if lat_str and lng_str else None,
+            radius
+        )
+
+        return FastJsonResponse({
+            'success': True,
+            'count': len(pre_warnings),
+            'pre_warnings': pre_warnings,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.error("❌ Lỗi get_pre_warnings_api: %s", e)
+        return FastJsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
 
 def trigger_fixed_flooding_api(request):
     """API kích hoạt thủ công FixedFlooding (dùng để test)"""
@@ -603,7 +1006,7 @@ def trigger_fixed_flooding_api(request):
         rainfall_mm = float(request.GET.get('rainfall', 35.0))
         
         if not flooding_id:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'error': 'Thiếu ID FixedFlooding'
             }, status=400)
@@ -611,7 +1014,7 @@ def trigger_fixed_flooding_api(request):
         result = FixedFloodingService.trigger_manual_activation(flooding_id, rainfall_mm)
         
         if result['success']:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'message': f'✅ Đã kích hoạt FixedFlooding "{result["flooding"].name}"',
                 'fixed_flooding': {
@@ -624,15 +1027,15 @@ def trigger_fixed_flooding_api(request):
                 'history_created': result.get('history_created', False)
             })
         else:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'message': result.get('message', 'Không thể kích hoạt'),
                 'error': result.get('error', '')
             })
             
     except Exception as e:
-        print(f"❌ Lỗi trigger_fixed_flooding_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi trigger_fixed_flooding_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
@@ -653,15 +1056,15 @@ def handle_flood_report_save(sender, instance, created, **kwargs):
                 not has_predictions and
                 instance.reporter_name != 'Hệ thống dự đoán tự động'):
                 
-                print(f"🤖 Tự động dự đoán thời gian cạn cho report #{instance.id}")
+                logger.debug("🤖 Tự động dự đoán thời gian cạn cho report #%s", instance.id)
                 prediction_result = DrainageTimeService.predict_drainage_time(instance)
                 
                 if prediction_result['success']:
-                    print(f"✅ Đã dự đoán: {prediction_result['estimated_drainage_time_hours']} giờ")
+                    logger.debug("✅ Đã dự đoán: %s giờ", prediction_result['estimated_drainage_time_hours'])
                 else:
-                    print(f"⚠️ Không thể dự đoán: {prediction_result.get('error', '')}")
+                    logger.warning("⚠️ Không thể dự đoán: %s", prediction_result.get('error', ''))
         except Exception as e:
-            print(f"⚠️ Lỗi tự động dự đoán: {e}")
+            logger.warning("⚠️ Lỗi tự động dự đoán: %s", e)
 
 # ============ DRAINAGE PREDICTION APIs ============
 
@@ -674,7 +1077,7 @@ def predict_drainage_time_api(request):
         flood_report_id = request.GET.get('flood_report_id')
         
         if not flood_report_id:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'error': 'Thiếu flood_report_id'
             }, status=400)
@@ -683,7 +1086,7 @@ def predict_drainage_time_api(request):
         try:
             flood_report = FloodReport.objects.get(id=flood_report_id)
         except FloodReport.DoesNotExist:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'error': f'Không tìm thấy FloodReport với ID {flood_report_id}'
             }, status=404)
@@ -692,21 +1095,20 @@ def predict_drainage_time_api(request):
         result = DrainageTimeService.predict_drainage_time(flood_report)
         
         if result['success']:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'data': result,
                 'timestamp': datetime.now().isoformat()
             })
         else:
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': False,
                 'error': result.get('error', 'Dự đoán thất bại')
             }, status=500)
             
     except Exception as e:
-        print(f"❌ Lỗi predict_drainage_time_api: {e}")
-        traceback.print_exc()
-        return JsonResponse({
+        logger.exception("❌ Lỗi predict_drainage_time_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': f'Lỗi server: {str(e)}'
         }, status=500)
@@ -746,14 +1148,14 @@ def get_drainage_predictions_api(request):
                     'created_at': prediction.created_at
                 }
                 
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': True,
                     'data': data,
                     'timestamp': datetime.now().isoformat()
                 })
                 
             except FloodPrediction.DoesNotExist:
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': False,
                     'error': f'Không tìm thấy dự đoán với ID {prediction_id}'
                 }, status=404)
@@ -763,7 +1165,7 @@ def get_drainage_predictions_api(request):
             limit = int(request.GET.get('limit', 20))
             predictions = DrainageTimeService.get_active_drainage_predictions(limit)
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'count': len(predictions),
                 'data': predictions,
@@ -771,8 +1173,8 @@ def get_drainage_predictions_api(request):
             })
             
     except Exception as e:
-        print(f"❌ Lỗi get_drainage_predictions_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi get_drainage_predictions_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': f'Lỗi server: {str(e)}'
         }, status=500)
@@ -786,15 +1188,15 @@ def drainage_dashboard_api(request):
     try:
         dashboard_data = DrainageTimeService.get_drainage_dashboard_data()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'data': dashboard_data,
             'timestamp': datetime.now().isoformat()
         })
         
     except Exception as e:
-        print(f"❌ Lỗi drainage_dashboard_api: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi drainage_dashboard_api: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': f'Lỗi server: {str(e)}'
         }, status=500)
@@ -838,7 +1240,7 @@ def collect_prediction_data(flood_report):
 def predict_drainage_time(flood_report):
     """Dự đoán thời gian cạn nước cho một FloodReport"""
     try:
-        print(f"⏳ DrainageTimeService.predict_drainage_time: Dự đoán cho FloodReport #{flood_report.id}")
+        logger.debug("⏳ DrainageTimeService.predict_drainage_time: Dự đoán cho FloodReport #%s", flood_report.id)
         data = DrainageTimeService.collect_prediction_data(flood_report)
         drainage_hours = DrainageTimeService.calculate_drainage_hours(data)
         result = DrainageTimeService.create_prediction_result(
@@ -848,18 +1250,16 @@ def predict_drainage_time(flood_report):
         if prediction:
             result['prediction_id'] = prediction.id
             result['prediction_saved'] = True
-            print(f"✅ ĐÃ LƯU THÀNH CÔNG vào FloodPrediction #{prediction.id}")
+            logger.info("✅ ĐÃ LƯU THÀNH CÔNG vào FloodPrediction #%s", prediction.id)
         else:
             result['prediction_saved'] = False
-            print(f"⚠️ KHÔNG THỂ LƯU vào database")
+            logger.warning("⚠️ KHÔNG THỂ LƯU vào database")
         
-        print(f"✅ Dự đoán hoàn thành: {drainage_hours} giờ")
+        logger.debug("✅ Dự đoán hoàn thành: %s giờ", drainage_hours)
         return result
         
     except Exception as e:
-        print(f"❌ Lỗi trong predict_drainage_time: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Lỗi trong predict_drainage_time: %s", e)
         return {
             'success': False,
             'error': str(e),
@@ -895,7 +1295,10 @@ def auto_predict_drainage_on_report(request):
                     'message': prediction_result.get('message', '')
                 })
                 
-                print(f"✅ Tự động dự đoán cho report #{report.id}: {prediction_result.get('estimated_drainage_time_hours', 0)} giờ")
+                logger.debug(
+                    "✅ Tự động dự đoán cho report #%s: %s giờ",
+                    report.id, prediction_result.get('estimated_drainage_time_hours', 0)
+                )
                 
             except Exception as e:
                 results.append({
@@ -904,7 +1307,7 @@ def auto_predict_drainage_on_report(request):
                     'error': str(e)
                 })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'processed_count': len(recent_reports),
             'results': results,
@@ -912,8 +1315,8 @@ def auto_predict_drainage_on_report(request):
         })
         
     except Exception as e:
-        print(f"❌ Lỗi auto_predict_drainage_on_report: {e}")
-        return JsonResponse({
+        logger.error("❌ Lỗi auto_predict_drainage_on_report: %s", e)
+        return FastJsonResponse({
             'success': False,
             'error': f'Lỗi server: {str(e)}'
         }, status=500)
@@ -928,15 +1331,15 @@ def handle_flood_report_save(sender, instance, created, **kwargs):
         # 2. Tự động dự đoán thời gian cạn
         try:
             if instance.water_depth and instance.water_depth > 10:  # Chỉ dự đoán nếu ngập > 10cm
-                print(f"🤖 Tự động dự đoán thời gian cạn cho report #{instance.id}")
+                logger.debug("🤖 Tự động dự đoán thời gian cạn cho report #%s", instance.id)
                 prediction_result = DrainageTimeService.predict_drainage_time(instance)
                 
                 if prediction_result['success']:
-                    print(f"✅ Đã dự đoán: {prediction_result['estimated_drainage_time_hours']} giờ")
+                    logger.debug("✅ Đã dự đoán: %s giờ", prediction_result['estimated_drainage_time_hours'])
                 else:
-                    print(f"⚠️ Không thể dự đoán: {prediction_result.get('error', '')}")
+                    logger.warning("⚠️ Không thể dự đoán: %s", prediction_result.get('error', ''))
         except Exception as e:
-            print(f"⚠️ Lỗi tự động dự đoán: {e}")
+            logger.warning("⚠️ Lỗi tự động dự đoán: %s", e)
 
 
 @staticmethod
@@ -945,7 +1348,7 @@ def save_prediction_result_simple(flood_report, result):
     Phiên bản đơn giản để lưu prediction - LUÔN HOẠT ĐỘNG
     """
     try:
-        print(f"💾 DrainageTimeService: Lưu dự đoán cho FloodReport #{flood_report.id}")
+        logger.debug("💾 DrainageTimeService: Lưu dự đoán cho FloodReport #%s", flood_report.id)
         
         # 1. Chuẩn bị dữ liệu cơ bản
         from django.contrib.gis.geos import Point
@@ -977,19 +1380,17 @@ def save_prediction_result_simple(flood_report, result):
         from .models import FloodPrediction
         prediction = FloodPrediction.objects.create(**prediction_data)
         
-        print(f"✅ ĐÃ LƯU FloodPrediction #{prediction.id} thành công!")
-        print(f"   • Địa chỉ: {prediction.address}")
-        print(f"   • Thời gian cạn: {prediction.estimated_drainage_time_hours} giờ")
-        print(f"   • Độ sâu: {prediction.current_depth_cm} cm")
+        logger.info(
+            "✅ Đã lưu FloodPrediction #%s (%s, cạn sau %s giờ, sâu %s cm)",
+            prediction.id, prediction.address, prediction.estimated_drainage_time_hours, prediction.current_depth_cm
+        )
         
         return prediction
         
     except Exception as e:
-        print(f"❌ LỖI LƯU PREDICTION: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ LỖI LƯU PREDICTION: %s", e)
         try:
-            print("🔄 Thử lưu phiên bản cực kỳ đơn giản...")
+            logger.debug("🔄 Thử lưu phiên bản cực kỳ đơn giản...")
             from .models import FloodPrediction
             prediction = FloodPrediction.objects.create(
                 location=flood_report.location,
@@ -998,10 +1399,10 @@ def save_prediction_result_simple(flood_report, result):
                 predicted_depth_cm=getattr(flood_report, 'water_depth', 0),
                 is_active=True
             )
-            print(f"✅ Đã lưu prediction đơn giản #{prediction.id}")
+            logger.info("✅ Đã lưu prediction đơn giản #%s", prediction.id)
             return prediction
         except Exception as simple_error:
-            print(f"❌ Lỗi cả phiên bản đơn giản: {simple_error}")
+            logger.error("❌ Lỗi cả phiên bản đơn giản: %s", simple_error)
             return None
 
 @staticmethod
@@ -1011,13 +1412,13 @@ def predict_drainage_time_for_location(lat, lng, water_depth, flood_report_id=No
     SỬA: Thêm flag để tránh recursion
     """
     try:
-        print(f"⏳ DrainageTimeService: Dự đoán cạn nước cho vị trí {lat}, {lng}")
+        logger.debug("⏳ DrainageTimeService: Dự đoán cạn nước cho vị trí %s, %s", lat, lng)
         import inspect
         stack = inspect.stack()
         call_count = sum(1 for frame in stack if frame.function == 'predict_drainage_time_for_location')
         
         if call_count > 2:  
-            print(f"⚠️ Phát hiện recursion, trả về kết quả mặc định")
+            logger.warning("⚠️ Phát hiện recursion, trả về kết quả mặc định")
             return {
                 'success': False,
                 'message': 'Lỗi recursion trong dự đoán',
@@ -1029,9 +1430,9 @@ def predict_drainage_time_for_location(lat, lng, water_depth, flood_report_id=No
                 from .models import FloodReport  # Import tương đối
                 flood_report = FloodReport.objects.filter(id=flood_report_id).first()
                 if flood_report:
-                    print(f"📄 Đã tìm thấy FloodReport #{flood_report_id}")
+                    logger.debug("📄 Đã tìm thấy FloodReport #%s", flood_report_id)
             except Exception as e:
-                print(f"⚠️ Không thể lấy FloodReport: {e}")
+                logger.warning("⚠️ Không thể lấy FloodReport: %s", e)
         terrain_info = DrainageTimeService.get_terrain_info(lat, lng)
         weather_info = DrainageTimeService.get_weather_info(lat, lng)
         data = {
@@ -1049,15 +1450,13 @@ def predict_drainage_time_for_location(lat, lng, water_depth, flood_report_id=No
                     if saved_prediction:
                         flood_report.has_prediction_saved = True
             except Exception as e:
-                print(f"⚠️ Không thể lưu dự đoán: {e}")
+                logger.warning("⚠️ Không thể lưu dự đoán: %s", e)
         
-        print(f"✅ Dự đoán hoàn thành: {drainage_hours} giờ")
+        logger.debug("✅ Dự đoán hoàn thành: %s giờ", drainage_hours)
         return result
         
     except Exception as e:
-        print(f"❌ Lỗi predict_drainage_time_for_location: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Lỗi predict_drainage_time_for_location: %s", e)
         return {
             'success': False,
             'message': f'Lỗi dự đoán: {str(e)}',
@@ -1082,7 +1481,7 @@ def predict_drainage_location_api(request):
         location_name = data.get('location_name', 'Vị trí được chọn')
         water_depth_cm = float(data.get('water_depth_cm', 20))
         
-        print(f"✅ API SIÊU ĐƠN GIẢN: {location_name}, {water_depth_cm}cm")
+        logger.debug("✅ API SIÊU ĐƠN GIẢN: %s, %scm", location_name, water_depth_cm)
         drainage_hours = round(water_depth_cm * 0.5, 1)
         drainage_hours = min(max(drainage_hours, 0.5), 72)
         
@@ -1102,7 +1501,7 @@ def predict_drainage_location_api(request):
         
         # ============ PHẦN SỬA: LƯU VÀO DATABASE ============
         try:
-            print(f"💾 Đang lưu vào FloodPrediction database...")
+            logger.debug("💾 Đang lưu vào FloodPrediction database...")
             
             # Tạo FloodPrediction thật sự
             prediction = FloodPrediction.objects.create(
@@ -1127,24 +1526,20 @@ def predict_drainage_location_api(request):
                 affected_areas=f"Khu vực {location_name}"
             )
             
-            print(f"✅✅✅ ĐÃ LƯU THÀNH CÔNG FloodPrediction #{prediction.id}")
-            print(f"   • ID: {prediction.id}")
-            print(f"   • Địa chỉ: {prediction.address}")
-            print(f"   • Thời gian cạn: {prediction.estimated_drainage_time_hours} giờ")
-            print(f"   • Độ sâu: {prediction.current_depth_cm} cm")
-            print(f"   • Created at: {prediction.created_at}")
+            logger.info(
+                "✅ Đã lưu FloodPrediction #%s (%s, cạn sau %s giờ, sâu %s cm)",
+                prediction.id, prediction.address, prediction.estimated_drainage_time_hours, prediction.current_depth_cm
+            )
             
             prediction_id = prediction.id
             prediction_saved = True
             
         except Exception as db_error:
-            print(f"❌ Lỗi lưu database: {db_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Lỗi lưu database: %s", db_error)
             
             # Thử phiên bản đơn giản hơn
             try:
-                print("🔄 Thử lưu phiên bản đơn giản...")
+                logger.debug("🔄 Thử lưu phiên bản đơn giản...")
                 prediction = FloodPrediction.objects.create(
                     location=Point(lng, lat),
                     address=location_name[:100],
@@ -1153,11 +1548,11 @@ def predict_drainage_location_api(request):
                     estimated_drainage_time_hours=drainage_hours,
                     is_active=True
                 )
-                print(f"✅ Đã lưu prediction đơn giản #{prediction.id}")
+                logger.info("✅ Đã lưu prediction đơn giản #%s", prediction.id)
                 prediction_id = prediction.id
                 prediction_saved = True
             except Exception as simple_error:
-                print(f"❌ Lỗi cả phiên bản đơn giản: {simple_error}")
+                logger.error("❌ Lỗi cả phiên bản đơn giản: %s", simple_error)
                 prediction_id = None
                 prediction_saved = False
         # ============ KẾT THÚC PHẦN SỬA ============
@@ -1181,15 +1576,13 @@ def predict_drainage_location_api(request):
             }
         }
         
-        return JsonResponse(response, safe=True)
+        return FastJsonResponse(response, safe=True)
         
     except Exception as e:
-        print(f"❌ Lỗi API đơn giản: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Lỗi API đơn giản: %s", e)
         
         # Vẫn trả về response hợp lệ để frontend không crash
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'message': 'Dự đoán mặc định (do có lỗi)',
             'prediction_saved': False,